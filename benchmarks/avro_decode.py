@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for sensor reading deserialization.
+
+Compares the current path (AvroDeserializer with a SerializationContext per
+message) with the compiled FastAvroDecoder on iot_sensor_reading.avsc.
+Messages are framed like the Confluent serializer output; the writer schema
+is served from memory, so no Schema Registry is needed.
+
+Usage:
+    python -m benchmarks.avro_decode [--messages 20000] [--repeat 5]
+"""
+
+import io
+import json
+import time
+import struct
+import random
+import argparse
+from typing import List, Callable, Any
+
+import fastavro
+from confluent_kafka.schema_registry import Schema
+from confluent_kafka.schema_registry.avro import AvroDeserializer
+from confluent_kafka.serialization import SerializationContext, MessageField
+
+from src.utils.avro_codec import FastAvroDecoder
+
+
+SCHEMA_PATH = "src/schemas/iot_sensor_reading.avsc"
+SCHEMA_ID = 1
+TOPIC = "iot-sensor-data"
+
+
+class InMemorySchemaRegistry:
+    """
+    Serves one schema by ID, standing in for SchemaRegistryClient.
+    """
+
+    def __init__(self, schema_str: str):
+        self.schema = Schema(schema_str, schema_type="AVRO")
+
+    def get_schema(self, schema_id: int, subject_name: str = None, fmt: str = None) -> Schema:
+        return self.schema
+
+
+def encoded_messages(schema_str: str, count: int) -> List[bytes]:
+    """
+    Build Confluent-framed Avro sensor readings.
+    """
+    parsed = fastavro.parse_schema(json.loads(schema_str))
+    header = struct.pack('>bI', 0, SCHEMA_ID)
+    rng = random.Random(42)
+
+    messages = []
+    for index in range(count):
+        buffer = io.BytesIO()
+        buffer.write(header)
+        fastavro.schemaless_writer(buffer, parsed, {
+            "device_id": f"AA:BB:CC:DD:EE:{index % 256:02X}_temperature",
+            "device_type": "temperature_sensor",
+            "timestamp": "2025-01-01T12:00:00.000000+00:00",
+            "value": round(rng.uniform(-10, 40), 2),
+            "unit": "°C",
+            "location": {"latitude": 60.17, "longitude": 24.94, "building": "main",
+                         "floor": 1, "zone": "lab", "room": "101"},
+            "battery_level": round(rng.uniform(20, 100), 2),
+            "signal_strength": -70.0,
+            "is_anomaly": False,
+            "firmware_version": "3.31.1",
+            "device_metadata": {"parent_device": "AA:BB:CC:DD:EE:FF", "sensor_type": "temperature"},
+            "status": "ACTIVE",
+            "tags": ["ruuvitag", "ble", "temperature"],
+            "maintenance_date": None
+        })
+        messages.append(buffer.getvalue())
+    return messages
+
+
+def best_time(decode: Callable[[bytes], Any], messages: List[bytes], repeat: int) -> float:
+    """
+    Get the best per-message time over several runs, in microseconds.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in messages:
+            decode(message)
+        best = min(best, time.perf_counter() - start)
+    return best / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sensor reading deserialization microbenchmark")
+    parser.add_argument("--messages", type=int, default=20000, help="Messages per run")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per decoder; the best run is reported")
+    args = parser.parse_args()
+
+    with open(SCHEMA_PATH) as f:
+        schema_str = f.read()
+    messages = encoded_messages(schema_str, args.messages)
+
+    registry = InMemorySchemaRegistry(schema_str)
+    deserializer = AvroDeserializer(
+        schema_registry_client=registry,
+        schema_str=schema_str,
+        from_dict=lambda record, ctx: record
+    )
+    fast_decoder = FastAvroDecoder(schema_str, schema_fetcher=lambda schema_id: schema_str)
+
+    # Both paths must produce the same records
+    for message in messages[:100]:
+        assert fast_decoder.decode(message) == deserializer(message, SerializationContext(TOPIC, MessageField.VALUE))
+
+    current = best_time(
+        lambda message: deserializer(message, SerializationContext(TOPIC, MessageField.VALUE)),
+        messages, args.repeat
+    )
+    compiled = best_time(fast_decoder.decode, messages, args.repeat)
+
+    print(f"{args.messages} messages, best of {args.repeat} runs")
+    print(f"  AvroDeserializer:   {current:7.2f} us/message")
+    print(f"  FastAvroDecoder:    {compiled:7.2f} us/message")
+    print(f"  speedup:            {current / compiled:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
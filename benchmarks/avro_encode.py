@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for sensor reading serialization.
+
+Compares the current path (AvroSerializer with a SerializationContext and a
+defaults-filled dict copy per message) with the compiled FastAvroEncoder on
+iot_sensor_reading.avsc, one message at a time and through encode_many() with
+the nine readings a RuuviTag advertisement produces. The schema ID is served
+from memory, so no Schema Registry is needed.
+
+Usage:
+    python -m benchmarks.avro_encode [--advertisements 5000] [--repeat 5]
+"""
+
+import time
+import random
+import argparse
+from typing import List, Dict, Any, Callable
+
+from confluent_kafka.schema_registry import Schema
+from confluent_kafka.schema_registry.avro import AvroSerializer
+from confluent_kafka.serialization import SerializationContext, MessageField
+
+from src.utils.avro_codec import FastAvroEncoder
+
+
+SCHEMA_PATH = "src/schemas/iot_sensor_reading.avsc"
+SCHEMA_ID = 1
+TOPIC = "iot-sensor-data"
+
+SENSORS = [
+    ("temperature", "temperature_sensor", "°C"),
+    ("humidity", "humidity_sensor", "%"),
+    ("pressure", "pressure_sensor", "Pa"),
+    ("acceleration_x", "acceleration_sensor", "g"),
+    ("acceleration_y", "acceleration_sensor", "g"),
+    ("acceleration_z", "acceleration_sensor", "g"),
+    ("battery_voltage", "battery_sensor", "V"),
+    ("tx_power", "signal_sensor", "dBm"),
+    ("movement_counter", "movement_sensor", "count"),
+]
+
+
+class InMemorySchemaRegistry:
+    """
+    Hands out one schema ID, standing in for SchemaRegistryClient.
+    """
+
+    def register_schema(self, subject_name: str, schema: Schema, normalize_schemas: bool = False) -> int:
+        return SCHEMA_ID
+
+
+def to_avro_dict(reading: Dict[str, Any], ctx) -> Dict[str, Any]:
+    """
+    Fill missing fields the way SchemaRegistry._sensor_to_dict does.
+    """
+    avro_reading = reading.copy()
+    if avro_reading.get('device_metadata') is None:
+        avro_reading['device_metadata'] = {}
+    if avro_reading.get('status') is None:
+        avro_reading['status'] = 'ACTIVE'
+    if avro_reading.get('tags') is None:
+        avro_reading['tags'] = []
+    return avro_reading
+
+
+def advertisements(count: int) -> List[List[Dict[str, Any]]]:
+    """
+    Build the sensor readings of RuuviTag advertisements, nine per advertisement.
+    """
+    rng = random.Random(42)
+    location = {"latitude": 60.17, "longitude": 24.94, "building": "main",
+                "floor": 1, "zone": "lab", "room": "101"}
+
+    result = []
+    for index in range(count):
+        mac = f"AA:BB:CC:DD:EE:{index % 256:02X}"
+        result.append([
+            {
+                "device_id": f"{mac}_{field}",
+                "device_type": device_type,
+                "timestamp": "2025-01-01T12:00:00.000000+00:00",
+                "value": round(rng.uniform(-10, 40), 2),
+                "unit": unit,
+                "location": location,
+                "battery_level": round(rng.uniform(20, 100), 2),
+                "signal_strength": -70.0,
+                "is_anomaly": False,
+                "firmware_version": "3.31.1",
+                "device_metadata": {"parent_device": mac, "sensor_type": field},
+                "tags": ["ruuvitag", "ble", field]
+            }
+            for field, device_type, unit in SENSORS
+        ])
+    return result
+
+
+def best_time(encode: Callable[[List[Dict[str, Any]]], Any], batches: List[List[Dict[str, Any]]], repeat: int) -> float:
+    """
+    Get the best per-message time over several runs, in microseconds.
+    """
+    messages = sum(len(batch) for batch in batches)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for batch in batches:
+            encode(batch)
+        best = min(best, time.perf_counter() - start)
+    return best / messages * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sensor reading serialization microbenchmark")
+    parser.add_argument("--advertisements", type=int, default=5000, help="RuuviTag advertisements per run")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per encoder; the best run is reported")
+    args = parser.parse_args()
+
+    with open(SCHEMA_PATH) as f:
+        schema_str = f.read()
+    batches = advertisements(args.advertisements)
+
+    serializer = AvroSerializer(
+        schema_registry_client=InMemorySchemaRegistry(),
+        schema_str=schema_str,
+        to_dict=to_avro_dict
+    )
+    encoder = FastAvroEncoder(
+        schema_str, SCHEMA_ID,
+        none_defaults={'device_metadata': {}, 'status': 'ACTIVE', 'tags': []}
+    )
+
+    def serialize(batch):
+        return [serializer(reading, SerializationContext(TOPIC, MessageField.VALUE)) for reading in batch]
+
+    # Both paths must produce the same bytes
+    for batch in batches[:20]:
+        assert encoder.encode_many(batch) == serialize(batch)
+
+    current = best_time(serialize, batches, args.repeat)
+    single = best_time(lambda batch: [encoder.encode(reading) for reading in batch], batches, args.repeat)
+    many = best_time(encoder.encode_many, batches, args.repeat)
+
+    print(f"{args.advertisements} advertisements x {len(SENSORS)} readings, best of {args.repeat} runs")
+    print(f"  AvroSerializer:          {current:7.2f} us/message")
+    print(f"  encode():                {single:7.2f} us/message")
+    print(f"  encode_many():           {many:7.2f} us/message")
+    print(f"  speedup:                 {current / many:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Kafka message count and size of RuuviTag data per message format.
+
+Encodes the same RuuviTag advertisements as one IoTSensorReading record per
+measurement and as one RuuviTagAdvertisement envelope each, then compares
+message count, value bytes and (with --compression) the size of compressed
+batches. Envelopes are decoded and expanded with readings() and checked
+against the per-measurement records. No Kafka or Schema Registry is needed.
+
+Usage:
+    python -m benchmarks.envelope_size [--advertisements 5000] [--batch 100] [--compression zstd]
+"""
+
+import time
+import random
+import argparse
+from typing import List
+
+from src.utils.avro_codec import FastAvroEncoder, FastAvroDecoder
+from src.data_storage.models import RuuviTagAdvertisement, CompactSensorReading, RUUVITAG_MEASUREMENTS
+
+
+SENSOR_SCHEMA_PATH = "src/schemas/iot_sensor_reading.avsc"
+ENVELOPE_SCHEMA_PATH = "src/schemas/ruuvitag_advertisement.avsc"
+
+LOCATION = {"latitude": 60.1699, "longitude": 24.9384, "building": "building-1",
+            "floor": 1, "zone": "main", "room": "room-101"}
+
+
+def advertisements(count: int) -> List[RuuviTagAdvertisement]:
+    """
+    Build RuuviTag advertisements with every measurement present.
+    """
+    rng = random.Random(42)
+    result = []
+    for index in range(count):
+        measurements = {
+            "temperature": round(rng.uniform(-10, 40), 2),
+            "humidity": round(rng.uniform(20, 90), 2),
+            "pressure": round(rng.uniform(98000, 103000), 0),
+            "acceleration_x": round(rng.uniform(-1, 1), 3),
+            "acceleration_y": round(rng.uniform(-1, 1), 3),
+            "acceleration_z": round(rng.uniform(-1, 1), 3),
+            "battery_voltage": round(rng.uniform(2.6, 3.0), 3),
+            "tx_power": 4.0,
+            "movement_counter": float(index % 200),
+        }
+        result.append(RuuviTagAdvertisement(
+            device_id=f"AA:BB:CC:DD:EE:{index % 32:02X}",
+            timestamp="2025-01-01T12:00:00.000000+00:00",
+            measurements=measurements,
+            anomalies=["temperature"] if measurements["temperature"] > 38 else [],
+            location=LOCATION,
+            battery_level=80.0,
+            signal_strength=-80.0,
+            firmware_version="3.31.1",
+        ))
+    return result
+
+
+def compressed_size(values: List[bytes], batch: int, codec: str) -> int:
+    """
+    Get the total size of values compressed in batches, like producer message sets.
+    """
+    if codec == "zstd":
+        import zstandard
+        compress = zstandard.ZstdCompressor().compress
+    else:
+        import zlib
+        compress = zlib.compress
+    return sum(len(compress(b"".join(values[start:start + batch]))) for start in range(0, len(values), batch))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RuuviTag message format size comparison")
+    parser.add_argument("--advertisements", type=int, default=5000, help="RuuviTag advertisements")
+    parser.add_argument("--batch", type=int, default=100, help="Advertisements per compressed batch")
+    parser.add_argument("--compression", default=None, help="zstd or gzip; omit to skip")
+    args = parser.parse_args()
+
+    with open(SENSOR_SCHEMA_PATH) as f:
+        sensor_schema = f.read()
+    with open(ENVELOPE_SCHEMA_PATH) as f:
+        envelope_schema = f.read()
+
+    sensor_encoder = FastAvroEncoder(sensor_schema, 1, none_defaults={'device_metadata': {}, 'status': 'ACTIVE', 'tags': []})
+    envelope_encoder = FastAvroEncoder(envelope_schema, 2)
+    envelope_decoder = FastAvroDecoder(envelope_schema, schema_fetcher=lambda schema_id: envelope_schema,
+                                       from_dict=RuuviTagAdvertisement.from_dict)
+    sensor_decoder = FastAvroDecoder(sensor_schema, schema_fetcher=lambda schema_id: sensor_schema,
+                                     from_dict=CompactSensorReading.from_dict)
+
+    ads = advertisements(args.advertisements)
+
+    start = time.perf_counter()
+    reading_values = [value for ad in ads for value in sensor_encoder.encode_many(ad.readings())]
+    readings_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    envelope_values = [envelope_encoder.encode(ad) for ad in ads]
+    envelope_time = time.perf_counter() - start
+
+    # Expanded envelopes must match the per-measurement records exactly
+    decoded_readings = [sensor_decoder.decode(value).to_dict() for value in reading_values]
+    expanded = [reading.to_dict() for value in envelope_values for reading in envelope_decoder.decode(value).readings()]
+    assert decoded_readings == expanded
+
+    reading_bytes = sum(map(len, reading_values))
+    envelope_bytes = sum(map(len, envelope_values))
+
+    print(f"{args.advertisements} advertisements with {len(RUUVITAG_MEASUREMENTS)} measurements each")
+    print(f"  readings:  {len(reading_values):8d} messages {reading_bytes:10d} bytes "
+          f"({reading_bytes / len(reading_values):6.1f} per message), encoded in {readings_time * 1e3:7.1f} ms")
+    print(f"  envelopes: {len(envelope_values):8d} messages {envelope_bytes:10d} bytes "
+          f"({envelope_bytes / len(envelope_values):6.1f} per message), encoded in {envelope_time * 1e3:7.1f} ms")
+    print(f"  reduction: {len(reading_values) / len(envelope_values):8.2f}x messages {reading_bytes / envelope_bytes:8.2f}x bytes")
+
+    if args.compression:
+        per_ad = len(RUUVITAG_MEASUREMENTS)
+        compressed_readings = compressed_size(reading_values, args.batch * per_ad, args.compression)
+        compressed_envelopes = compressed_size(envelope_values, args.batch, args.compression)
+        print(f"  {args.compression} batches of {args.batch} advertisements: readings {compressed_readings} bytes, "
+              f"envelopes {compressed_envelopes} bytes ({compressed_readings / compressed_envelopes:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Row size of sensor_readings rows versus sensor_facts rows.
+
+Encodes the same readings as binary COPY payloads for the main table and for
+the narrow fact table used with the devices dimension. The payload is close
+to the tuple data written to the heap and the WAL per row; the devices
+table is written once per device version, not per reading. No database is
+needed.
+
+Usage:
+    python -m benchmarks.normalized_row_size [--readings 50000] [--devices 200]
+"""
+
+import json
+import argparse
+
+from src.data_storage.copy_ingest import reading_to_row, encode_binary_rows, encode_binary_fact_rows
+from src.data_storage.device_dimension import device_attributes
+from benchmarks.reading_memory import encoded_readings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="sensor_readings vs sensor_facts row size")
+    parser.add_argument("--readings", type=int, default=50000, help="Readings to encode")
+    parser.add_argument("--devices", type=int, default=200, help="Distinct physical devices")
+    args = parser.parse_args()
+
+    rows = [reading_to_row(json.loads(payload)) for payload in encoded_readings(args.readings, args.devices)]
+
+    # Stand-in for DeviceKeyCache: one key per distinct device and attributes
+    device_keys = {}
+    facts = []
+    for row in rows:
+        version = (row[0], json.dumps(device_attributes(row), sort_keys=True, default=str))
+        device_key = device_keys.setdefault(version, len(device_keys) + 1)
+        facts.append((device_key, row[2], row[3], row[11], row[12], row[15], row[14]))
+
+    wide_bytes = len(encode_binary_rows(rows).getvalue())
+    fact_bytes = len(encode_binary_fact_rows(facts).getvalue())
+
+    print(f"{args.readings} readings from {len(device_keys)} device versions")
+    print(f"  sensor_readings: {wide_bytes:10d} bytes ({wide_bytes / len(rows):6.1f} per row)")
+    print(f"  sensor_facts:    {fact_bytes:10d} bytes ({fact_bytes / len(facts):6.1f} per row)")
+    print(f"  reduction:       {wide_bytes / fact_bytes:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for buffered sensor readings.
+
+Measures the bytes held per reading when a burst of decoded readings is kept
+in memory, comparing plain Avro-shaped dictionaries with CompactSensorReading.
+Readings are decoded from JSON one by one so every reading owns fresh string
+and location objects, as it does after Avro deserialization.
+
+Usage:
+    python -m benchmarks.reading_memory [--readings 50000] [--devices 200]
+"""
+
+import gc
+import json
+import random
+import argparse
+import tracemalloc
+from datetime import datetime, timezone, timedelta
+from typing import List, Callable, Any
+
+from src.data_storage.models import CompactSensorReading
+
+
+SENSORS = [
+    ("temperature", "temperature_sensor", "°C", ["ruuvitag", "ble", "temperature"]),
+    ("humidity", "humidity_sensor", "%", ["ruuvitag", "ble", "humidity"]),
+    ("pressure", "pressure_sensor", "Pa", ["ruuvitag", "ble", "pressure"]),
+    ("acceleration_x", "acceleration_sensor", "g", ["ruuvitag", "ble", "acceleration", "x-axis"]),
+    ("battery_voltage", "battery_sensor", "V", ["ruuvitag", "ble", "battery"]),
+]
+
+
+def encoded_readings(count: int, devices: int) -> List[bytes]:
+    """
+    Build JSON-encoded readings in the Avro record shape.
+
+    Args:
+        count: Number of readings
+        devices: Number of distinct physical devices
+
+    Returns:
+        List of encoded readings
+    """
+    rng = random.Random(42)
+    locations = [
+        {
+            "latitude": round(rng.uniform(-60, 60), 6),
+            "longitude": round(rng.uniform(-180, 180), 6),
+            "building": f"building-{index % 10}",
+            "floor": index % 5,
+            "zone": rng.choice(["north", "south", "east", "west"]),
+            "room": f"room-{index % 50}"
+        }
+        for index in range(devices)
+    ]
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    payloads = []
+    for index in range(count):
+        device = index % devices
+        field, device_type, unit, tags = SENSORS[index % len(SENSORS)]
+        payloads.append(json.dumps({
+            "device_id": f"AA:BB:CC:DD:{device // 256:02X}:{device % 256:02X}_{field}",
+            "device_type": device_type,
+            "timestamp": (start + timedelta(seconds=index)).isoformat(),
+            "value": round(rng.uniform(0, 100), 3),
+            "unit": unit,
+            "location": locations[device],
+            "battery_level": round(rng.uniform(20, 100), 2),
+            "signal_strength": -70.0,
+            "is_anomaly": False,
+            "firmware_version": "3.31.1",
+            "device_metadata": {"parent_device": f"AA:BB:CC:DD:{device // 256:02X}:{device % 256:02X}", "sensor_type": field},
+            "status": "ACTIVE",
+            "tags": tags,
+            "maintenance_date": None
+        }).encode('utf-8'))
+    return payloads
+
+
+def bytes_per_reading(payloads: List[bytes], decode: Callable[[bytes], Any]) -> float:
+    """
+    Measure the memory held by a buffer of decoded readings.
+
+    Args:
+        payloads: Encoded readings
+        decode: Function turning one payload into a buffered reading
+
+    Returns:
+        Allocated bytes per buffered reading
+    """
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    buffer = [decode(payload) for payload in payloads]
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del buffer
+    return held / len(payloads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes per buffered sensor reading")
+    parser.add_argument("--readings", type=int, default=50000, help="Number of buffered readings")
+    parser.add_argument("--devices", type=int, default=200, help="Number of distinct physical devices")
+    args = parser.parse_args()
+
+    payloads = encoded_readings(args.readings, args.devices)
+
+    as_dict = bytes_per_reading(payloads, json.loads)
+    compact = bytes_per_reading(payloads, lambda payload: CompactSensorReading.from_dict(json.loads(payload)))
+
+    print(f"{args.readings} readings from {args.devices} devices")
+    print(f"  dict reading:             {as_dict:8.1f} bytes/reading")
+    print(f"  CompactSensorReading:     {compact:8.1f} bytes/reading")
+    print(f"  reduction:                {100 * (1 - compact / as_dict):8.1f} %")
+
+
+if __name__ == "__main__":
+    main()
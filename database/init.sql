@@ -130,6 +130,183 @@ CREATE INDEX IF NOT EXISTS idx_sensor_readings_tags ON sensor_readings USING GIN
 CREATE INDEX IF NOT EXISTS idx_sensor_readings_archive_device_id ON sensor_readings_archive(device_id, timestamp DESC);
 CREATE INDEX IF NOT EXISTS idx_sensor_readings_archive_device_type ON sensor_readings_archive(device_type, timestamp DESC);
 
+-- Kafka offsets of the data sink, written in the same transaction as each batch
+-- so that restarts resume exactly after the last stored row
+CREATE TABLE IF NOT EXISTS sink_offsets (
+    consumer_group TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    partition INTEGER NOT NULL,
+    next_offset BIGINT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (consumer_group, topic, partition)
+);
+
+-- Newest reading and running counts per device, upserted by the data sink once
+-- per device and batch so status lookups do not aggregate sensor_readings.
+-- The counts only include rows a batch stored, not duplicates or replays.
+CREATE TABLE IF NOT EXISTS device_latest (
+    device_id TEXT PRIMARY KEY,
+    device_type TEXT NOT NULL,
+    first_seen TIMESTAMPTZ NOT NULL,
+    last_seen TIMESTAMPTZ NOT NULL,
+    last_value DOUBLE PRECISION,
+    battery_level DOUBLE PRECISION,
+    signal_strength DOUBLE PRECISION,
+    status device_status,
+    total_readings BIGINT NOT NULL DEFAULT 0,
+    anomaly_count BIGINT NOT NULL DEFAULT 0,
+    value_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    value_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_device_latest_last_seen ON device_latest(last_seen DESC);
+
+-- Optional wide RuuviTag table: one row per advertisement instead of one
+-- sensor_readings row per measurement (timescaledb.ruuvitag_wide_rows)
+CREATE TABLE IF NOT EXISTS ruuvitag_readings (
+    mac TEXT NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
+    
+    -- Measurements
+    temperature DOUBLE PRECISION,
+    humidity DOUBLE PRECISION,
+    pressure DOUBLE PRECISION,
+    accel_x DOUBLE PRECISION,
+    accel_y DOUBLE PRECISION,
+    accel_z DOUBLE PRECISION,
+    battery_voltage DOUBLE PRECISION,
+    tx_power DOUBLE PRECISION,
+    movement_counter DOUBLE PRECISION,
+    
+    -- Device information
+    battery_level DOUBLE PRECISION,
+    signal_strength DOUBLE PRECISION,
+    firmware_version TEXT,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    building TEXT,
+    floor INTEGER,
+    zone TEXT,
+    room TEXT,
+    status device_status DEFAULT 'ACTIVE',
+    
+    -- Names of the measurements flagged as anomalous
+    anomalies TEXT[]
+);
+
+SELECT create_hypertable('ruuvitag_readings', 'timestamp', 
+    chunk_time_interval => INTERVAL '1 day',
+    if_not_exists => TRUE
+);
+
+-- Measurements of one advertisement may arrive in separate batches and are merged on this key
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ruuvitag_readings_mac ON ruuvitag_readings(mac, timestamp DESC);
+
+-- Enable compression (safe to re-run)
+DO $$
+BEGIN
+    ALTER TABLE ruuvitag_readings SET (
+        timescaledb.compress,
+        timescaledb.compress_orderby = 'timestamp DESC',
+        timescaledb.compress_segmentby = 'mac'
+    );
+EXCEPTION WHEN others THEN
+    -- Do nothing if compression is already enabled
+    NULL;
+END
+$$;
+
+-- Optional normalized storage (timescaledb.normalized_storage): per-device
+-- attributes once per device version, readings in a narrow fact table
+CREATE TABLE IF NOT EXISTS devices (
+    device_key BIGSERIAL PRIMARY KEY,
+    device_id TEXT NOT NULL,
+    attributes_hash TEXT NOT NULL,
+    device_type TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    
+    -- Location information
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    building TEXT,
+    floor INTEGER,
+    zone TEXT,
+    room TEXT,
+    
+    -- Device information
+    firmware_version TEXT,
+    maintenance_date TIMESTAMPTZ,
+    device_metadata JSONB,
+    tags TEXT[],
+    
+    -- Type 2 slowly changing dimension: a changed device gets a new row and key,
+    -- the previous row is closed with valid_to
+    valid_from TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    valid_to TIMESTAMPTZ
+);
+
+-- At most one current version per device
+CREATE UNIQUE INDEX IF NOT EXISTS idx_devices_current ON devices(device_id) WHERE valid_to IS NULL;
+CREATE INDEX IF NOT EXISTS idx_devices_device_id ON devices(device_id, valid_from DESC);
+
+CREATE TABLE IF NOT EXISTS sensor_facts (
+    device_key BIGINT NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
+    value DOUBLE PRECISION,
+    battery_level DOUBLE PRECISION,
+    signal_strength DOUBLE PRECISION,
+    status device_status DEFAULT 'ACTIVE',
+    is_anomaly BOOLEAN DEFAULT FALSE
+);
+
+SELECT create_hypertable('sensor_facts', 'timestamp', 
+    chunk_time_interval => INTERVAL '1 day',
+    if_not_exists => TRUE
+);
+
+CREATE INDEX IF NOT EXISTS idx_sensor_facts_device_key ON sensor_facts(device_key, timestamp DESC);
+
+-- Enable compression (safe to re-run)
+DO $$
+BEGIN
+    ALTER TABLE sensor_facts SET (
+        timescaledb.compress,
+        timescaledb.compress_orderby = 'timestamp DESC',
+        timescaledb.compress_segmentby = 'device_key'
+    );
+EXCEPTION WHEN others THEN
+    -- Do nothing if compression is already enabled
+    NULL;
+END
+$$;
+
+-- Normalized readings with the columns of sensor_readings; each fact joins
+-- the device version that was current when it was written
+CREATE OR REPLACE VIEW sensor_readings_normalized AS
+SELECT 
+    d.device_id,
+    d.device_type,
+    f.timestamp,
+    f.value,
+    d.unit,
+    d.latitude,
+    d.longitude,
+    d.building,
+    d.floor,
+    d.zone,
+    d.room,
+    f.battery_level,
+    f.signal_strength,
+    d.firmware_version,
+    f.is_anomaly,
+    f.status,
+    d.maintenance_date,
+    d.device_metadata,
+    d.tags
+FROM sensor_facts f
+JOIN devices d ON d.device_key = f.device_key;
+
 -- Create a function to update the updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -159,61 +336,38 @@ FROM sensor_readings
 WHERE is_anomaly = TRUE
 ORDER BY timestamp DESC;
 
--- Create a view for device summary with TimescaleDB optimizations
+-- Create a view for device summary, read from the latest-value table
 CREATE OR REPLACE VIEW device_summary AS
 SELECT 
     device_id,
     device_type,
-    COUNT(*) as total_readings,
-    last(battery_level, timestamp) as latest_battery_level,
-    last(status, timestamp) as current_status,
-    first(timestamp, timestamp) as first_reading,
-    last(timestamp, timestamp) as last_reading,
-    avg(value) as avg_value,
-    COUNT(CASE WHEN is_anomaly THEN 1 END) as anomaly_count
-FROM sensor_readings
-GROUP BY device_id, device_type
+    total_readings,
+    battery_level as latest_battery_level,
+    status as current_status,
+    first_seen as first_reading,
+    last_seen as last_reading,
+    value_sum / NULLIF(value_count, 0) as avg_value,
+    anomaly_count,
+    last_value,
+    signal_strength as latest_signal_strength
+FROM device_latest
 ORDER BY last_reading DESC;
 
--- Create time-bucket aggregation views for different time windows
-CREATE OR REPLACE VIEW hourly_sensor_aggregates AS
-SELECT 
-    time_bucket('1 hour', timestamp) AS bucket,
-    device_id,
-    device_type,
-    COUNT(*) as reading_count,
-    AVG(value) as avg_value,
-    MIN(value) as min_value,
-    MAX(value) as max_value,
-    COUNT(CASE WHEN is_anomaly THEN 1 END) as anomaly_count,
-    last(battery_level, timestamp) as latest_battery_level
-FROM sensor_readings
-GROUP BY bucket, device_id, device_type
-ORDER BY bucket DESC;
-
--- Create daily aggregation view
-CREATE OR REPLACE VIEW daily_sensor_aggregates AS
-SELECT 
-    time_bucket('1 day', timestamp) AS bucket,
-    device_id,
-    device_type,
-    COUNT(*) as reading_count,
-    AVG(value) as avg_value,
-    MIN(value) as min_value,
-    MAX(value) as max_value,
-    COUNT(CASE WHEN is_anomaly THEN 1 END) as anomaly_count,
-    first(battery_level, timestamp) as first_battery_level,
-    last(battery_level, timestamp) as latest_battery_level
-FROM sensor_readings
-GROUP BY bucket, device_id, device_type
-ORDER BY bucket DESC;
+-- Time-bucket aggregates are served by the continuous aggregates below;
+-- drop the plain views that re-scanned sensor_readings on every query
+DROP VIEW IF EXISTS hourly_sensor_aggregates;
+DROP VIEW IF EXISTS daily_sensor_aggregates;
 
 -- TimescaleDB compression policy (compress data older than 7 days)
 SELECT add_compression_policy('sensor_readings', INTERVAL '7 days', if_not_exists => TRUE);
 SELECT add_compression_policy('sensor_readings_archive', INTERVAL '1 day', if_not_exists => TRUE);
+SELECT add_compression_policy('ruuvitag_readings', INTERVAL '7 days', if_not_exists => TRUE);
+SELECT add_compression_policy('sensor_facts', INTERVAL '7 days', if_not_exists => TRUE);
 
 -- TimescaleDB retention policy (automatically drop data older than 90 days from main table)
 SELECT add_retention_policy('sensor_readings', INTERVAL '90 days', if_not_exists => TRUE);
+SELECT add_retention_policy('ruuvitag_readings', INTERVAL '90 days', if_not_exists => TRUE);
+SELECT add_retention_policy('sensor_facts', INTERVAL '90 days', if_not_exists => TRUE);
 
 -- TimescaleDB retention policy for archive (keep for 1 year)
 SELECT add_retention_policy('sensor_readings_archive', INTERVAL '365 days', if_not_exists => TRUE);
@@ -320,52 +474,89 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
--- Create continuous aggregates for real-time analytics (TimescaleDB feature)
-CREATE MATERIALIZED VIEW sensor_readings_hourly
+-- Create hierarchical continuous aggregates for real-time analytics (TimescaleDB feature)
+-- 1 minute <- sensor_readings, 1 hour <- 1 minute, 1 day <- 1 hour, so refreshing a
+-- coarser tier reads the tier below instead of raw chunks. value_sum and value_count
+-- carry the average up the tiers. Refresh policies are applied by the data sink from
+-- timescaledb.continuous_aggregate_policies.
+CREATE MATERIALIZED VIEW IF NOT EXISTS sensor_readings_1m
 WITH (timescaledb.continuous) AS
 SELECT 
-    time_bucket('1 hour', timestamp) AS bucket,
+    time_bucket('1 minute', timestamp) AS bucket,
     device_id,
     device_type,
     COUNT(*) as reading_count,
     AVG(value) as avg_value,
     MIN(value) as min_value,
     MAX(value) as max_value,
+    SUM(value) as value_sum,
+    COUNT(value) as value_count,
     COUNT(CASE WHEN is_anomaly THEN 1 END) as anomaly_count,
+    first(battery_level, timestamp) as first_battery_level,
     last(battery_level, timestamp) as latest_battery_level
 FROM sensor_readings
-GROUP BY bucket, device_id, device_type
-ORDER BY bucket DESC;
-
--- Add refresh policy for continuous aggregate
-SELECT add_continuous_aggregate_policy('sensor_readings_hourly',
-    start_offset => INTERVAL '3 hours',
-    end_offset => INTERVAL '1 hour',
-    schedule_interval => INTERVAL '1 hour');
-
--- Create daily continuous aggregate
-CREATE MATERIALIZED VIEW sensor_readings_daily
+GROUP BY time_bucket('1 minute', timestamp), device_id, device_type;
+
+-- With timescaledb.normalized_storage the readings only reach sensor_facts; the
+-- sink refuses to start until the 1 minute tier reads it. Replace the definition
+-- above with this one (requires TimescaleDB 2.10+ for the join), then recreate the
+-- hourly and daily tiers below:
+-- CREATE MATERIALIZED VIEW IF NOT EXISTS sensor_readings_1m
+-- WITH (timescaledb.continuous) AS
+-- SELECT 
+--     time_bucket('1 minute', f.timestamp) AS bucket,
+--     d.device_id,
+--     d.device_type,
+--     COUNT(*) as reading_count,
+--     AVG(f.value) as avg_value,
+--     MIN(f.value) as min_value,
+--     MAX(f.value) as max_value,
+--     SUM(f.value) as value_sum,
+--     COUNT(f.value) as value_count,
+--     COUNT(CASE WHEN f.is_anomaly THEN 1 END) as anomaly_count,
+--     first(f.battery_level, f.timestamp) as first_battery_level,
+--     last(f.battery_level, f.timestamp) as latest_battery_level
+-- FROM sensor_facts f
+-- JOIN devices d ON d.device_key = f.device_key
+-- GROUP BY time_bucket('1 minute', f.timestamp), d.device_id, d.device_type;
+
+-- Create hourly continuous aggregate on the 1 minute tier
+CREATE MATERIALIZED VIEW IF NOT EXISTS sensor_readings_hourly
 WITH (timescaledb.continuous) AS
 SELECT 
-    time_bucket('1 day', timestamp) AS bucket,
+    time_bucket('1 hour', bucket) AS bucket,
     device_id,
     device_type,
-    COUNT(*) as reading_count,
-    AVG(value) as avg_value,
-    MIN(value) as min_value,
-    MAX(value) as max_value,
-    COUNT(CASE WHEN is_anomaly THEN 1 END) as anomaly_count,
-    first(battery_level, timestamp) as first_battery_level,
-    last(battery_level, timestamp) as latest_battery_level
-FROM sensor_readings
-GROUP BY bucket, device_id, device_type
-ORDER BY bucket DESC;
-
--- Add refresh policy for daily aggregate
-SELECT add_continuous_aggregate_policy('sensor_readings_daily',
-    start_offset => INTERVAL '3 days',
-    end_offset => INTERVAL '1 hour',
-    schedule_interval => INTERVAL '1 hour');
+    SUM(reading_count) as reading_count,
+    SUM(value_sum) / NULLIF(SUM(value_count), 0) as avg_value,
+    MIN(min_value) as min_value,
+    MAX(max_value) as max_value,
+    SUM(value_sum) as value_sum,
+    SUM(value_count) as value_count,
+    SUM(anomaly_count) as anomaly_count,
+    first(first_battery_level, bucket) as first_battery_level,
+    last(latest_battery_level, bucket) as latest_battery_level
+FROM sensor_readings_1m
+GROUP BY time_bucket('1 hour', bucket), device_id, device_type;
+
+-- Create daily continuous aggregate on the hourly tier
+CREATE MATERIALIZED VIEW IF NOT EXISTS sensor_readings_daily
+WITH (timescaledb.continuous) AS
+SELECT 
+    time_bucket('1 day', bucket) AS bucket,
+    device_id,
+    device_type,
+    SUM(reading_count) as reading_count,
+    SUM(value_sum) / NULLIF(SUM(value_count), 0) as avg_value,
+    MIN(min_value) as min_value,
+    MAX(max_value) as max_value,
+    SUM(value_sum) as value_sum,
+    SUM(value_count) as value_count,
+    SUM(anomaly_count) as anomaly_count,
+    first(first_battery_level, bucket) as first_battery_level,
+    last(latest_battery_level, bucket) as latest_battery_level
+FROM sensor_readings_hourly
+GROUP BY time_bucket('1 day', bucket), device_id, device_type;
 
 -- Insert some initial test data (optional)
 -- INSERT INTO sensor_readings (device_id, device_type, timestamp, value, unit, latitude, longitude, building, floor, zone, room)
@@ -377,6 +568,7 @@ SELECT add_continuous_aggregate_policy('sensor_readings_daily',
 GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA public TO iot_user;
 GRANT ALL PRIVILEGES ON ALL SEQUENCES IN SCHEMA public TO iot_user;
 GRANT EXECUTE ON ALL FUNCTIONS IN SCHEMA public TO iot_user;
+GRANT SELECT ON sensor_readings_1m TO iot_user;
 GRANT SELECT ON sensor_readings_hourly TO iot_user;
 GRANT SELECT ON sensor_readings_daily TO iot_user;
 
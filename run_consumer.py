@@ -55,7 +55,10 @@ def wait_for_kafka_and_schema_registry(max_retries=60, initial_backoff=1):
             
             # Try to get subjects from Schema Registry
             subjects = schema_registry.get_subjects()
-            log.info(f"Successfully connected to Schema Registry. Available subjects: {subjects}")
+            if not subjects and schema_registry.has_cached_schema(f"{settings.kafka.topic_name}-value"):
+                log.warning("Schema Registry returned no subjects, starting with cached schemas")
+            else:
+                log.info(f"Successfully connected to Schema Registry. Available subjects: {subjects}")
             
             return True
             
@@ -149,7 +152,10 @@ def main():
         
         # Start consuming messages in a continuous loop
         log.info("Starting continuous IoT data consumption with Avro deserialization...")
-        consumer.consume_loop(timeout=1.0)
+        if settings.consumer.batch_consume:
+            consumer.consume_batch_loop(timeout=1.0)
+        else:
+            consumer.consume_loop(timeout=1.0)
         
     except KeyboardInterrupt:
         log.info("Consumer interrupted by user")
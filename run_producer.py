@@ -69,7 +69,10 @@ def wait_for_kafka_and_schema_registry(max_retries=60, initial_backoff=1):
             
             # Try to get subjects from Schema Registry
             subjects = schema_registry.get_subjects()
-            log.info(f"Successfully connected to Schema Registry. Available subjects: {subjects}")
+            if not subjects and schema_registry.has_cached_schema(f"{settings.kafka.topic_name}-value"):
+                log.warning("Schema Registry returned no subjects, starting with cached schemas")
+            else:
+                log.info(f"Successfully connected to Schema Registry. Available subjects: {subjects}")
             
             return True
             
@@ -12,7 +12,8 @@ import random
 
 from src.utils.logger import log
 from src.config.config import settings
-from src.data_storage.timescaledb_sink import TimescaleDBSink
+from src.data_storage.timescaledb_sink import sink_manager
+from src.data_storage.sink_supervisor import SinkSupervisor
 from src.data_storage.database import db_manager
 from src.utils.schema_registry import schema_registry
 
@@ -65,10 +66,16 @@ def wait_for_dependencies(max_retries=60, initial_backoff=2):
             log.info(f"Attempt {attempt}/{max_retries}: Checking Schema Registry...")
             try:
                 subjects = schema_registry.get_subjects()
-                log.info(f"Schema Registry is ready with subjects: {subjects}")
+                if not subjects and schema_registry.has_cached_schema(f"{settings.kafka.topic_name}-value"):
+                    log.warning("Schema Registry returned no subjects, starting with cached schemas")
+                else:
+                    log.info(f"Schema Registry is ready with subjects: {subjects}")
             except Exception as e:
-                log.warning(f"Schema Registry check failed: {str(e)}")
-                dependencies_ready = False
+                if schema_registry.has_cached_schema(f"{settings.kafka.topic_name}-value"):
+                    log.warning(f"Schema Registry check failed, starting with cached schemas: {str(e)}")
+                else:
+                    log.warning(f"Schema Registry check failed: {str(e)}")
+                    dependencies_ready = False
             
             if dependencies_ready:
                 log.info("All dependencies are ready!")
@@ -123,6 +130,11 @@ def log_configuration():
     log.info(f"Commit interval: {settings.data_sink.commit_interval} seconds")
     log.info(f"Max retries: {settings.data_sink.max_retries}")
     log.info(f"Retry backoff: {settings.data_sink.retry_backoff} seconds")
+    log.info(f"Sink mode: {settings.data_sink.mode}")
+    log.info(f"Worker processes: {settings.data_sink.workers}")
+    if settings.data_sink.mode == 'pipelined':
+        log.info(f"Writer threads: {settings.data_sink.writer_threads}")
+        log.info(f"Batch queue size: {settings.data_sink.queue_max_batches} batches")
 
 
 def check_database_setup():
@@ -267,14 +279,7 @@ def run_initial_health_checks():
     if settings.timescaledb.enable_continuous_aggregates:
         try:
             # Check if continuous aggregates exist
-            cagg_query = """
-                SELECT view_name 
-                FROM timescaledb_information.continuous_aggregates 
-                WHERE view_name IN ('sensor_readings_hourly', 'sensor_readings_daily')
-            """
-            
-            cagg_result = db_manager.execute_query(cagg_query)
-            continuous_aggs = [row['view_name'] for row in cagg_result]
+            continuous_aggs = db_manager.continuous_aggregates.existing_tiers()
             
             if continuous_aggs:
                 log.info(f"Continuous aggregates found: {', '.join(continuous_aggs)}")
@@ -306,11 +311,19 @@ def main():
         log.error("Initial health checks failed. Exiting.")
         sys.exit(1)
     
+    # Run one sink per worker process under the supervisor
+    if settings.data_sink.workers > 1:
+        db_manager.close()
+        supervisor = SinkSupervisor()
+        supervisor.run()
+        log.info("TimescaleDB data sink shutdown complete")
+        return
+    
     # Initialize and start the data sink
     sink = None
     try:
         log.info("Initializing TimescaleDB data sink...")
-        sink = TimescaleDBSink()
+        sink = sink_manager.create_sink()
         
         # Setup signal handlers
         def signal_handler(sig, frame):
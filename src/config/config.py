@@ -25,6 +25,17 @@ def load_yaml_config():
 # Load configuration from YAML file
 yaml_config = load_yaml_config()
 
+def _bool_setting(yaml_value: Any, env_name: str, default: str) -> bool:
+    """
+    Resolve a boolean setting from its YAML value or environment variable.
+    
+    An explicit ``false`` in the YAML file wins; only a missing key falls
+    back to the environment.
+    """
+    if yaml_value is not None:
+        return yaml_value
+    return os.getenv(env_name, default).lower() in ("true", "1", "yes")
+
 class TimescaleDBSettings(BaseSettings):
     """
     TimescaleDB database configuration settings.
@@ -41,13 +52,42 @@ class TimescaleDBSettings(BaseSettings):
         pool_recycle: Pool recycle time in seconds
         batch_size: Batch size for bulk operations
         commit_interval: Commit interval in seconds
+        ingest_method: Batch insert method ('copy' or 'values')
+        copy_format: COPY payload format ('binary' or 'text')
+        copy_merge_conflicts: Merge COPY batches through a staging table with ON CONFLICT DO NOTHING
+        write_pool_min_size: Persistent write connections opened at startup
+        write_pool_max_size: Maximum persistent write connections
+        write_pool_health_check_interval: Idle seconds before a write connection is pinged
+        write_pool_acquire_timeout: Seconds to wait for a free write connection
+        write_pool_session_settings: Session-level settings applied to write connections
+        offsets_table: Table holding the sink's Kafka offsets
         main_table: Main table name for sensor readings
         archive_table: Archive table name
+        ruuvitag_wide_rows: Write RuuviTag readings to the wide RuuviTag table instead of the main table
+        ruuvitag_table: Wide hypertable with one row per RuuviTag advertisement
+        normalized_storage: Store readings in the narrow fact table with a devices dimension, read through sensor_readings_normalized
+        devices_table: Device dimension table with one row per device version
+        facts_table: Narrow fact hypertable referencing devices by device_key
+        device_latest_table: Table with the newest reading and running counts per device, upserted by the sink
+        export_fetch_size: Rows fetched per server-side cursor round trip by streaming exports
+        export_workers: Parallel connections of partitioned exports
+        export_partition_interval: Seconds of data per part file of partitioned exports
         retention_days: Data retention period in days
         archive_after_days: Archive data after days
         chunk_time_interval: TimescaleDB chunk time interval
         compression_after: Compress data after this interval
         retention_policy: Data retention policy
+        enable_continuous_aggregates: Refresh and manage the continuous aggregates
+        continuous_aggregate_policies: Refresh policy per continuous aggregate (start_offset, end_offset, schedule_interval); null removes the policy
+        cagg_refresh_interval: Seconds between refreshes of the time windows written by the sink
+        cagg_merge_gap: Dirty windows closer than this many seconds are refreshed together (0 merges only overlapping windows)
+        cagg_max_window: Longest time span refreshed by one refresh call in seconds
+        cagg_max_dirty_windows: Dirty windows kept before the closest ones are merged
+        query_cache_enabled: Whether read helper results are cached in process
+        query_cache_max_entries: Maximum number of cached query results
+        query_cache_max_mb: Maximum estimated size of cached query results in megabytes
+        query_cache_default_ttl: Seconds a cached result stays valid for query types without their own TTL
+        query_cache_ttls: Seconds a cached result stays valid per query type
     """
     host: str = Field(
         default_factory=lambda: yaml_config.get('timescaledb', {}).get('host') or
@@ -106,7 +146,56 @@ class TimescaleDBSettings(BaseSettings):
                         float(os.getenv("TIMESCALEDB_COMMIT_INTERVAL", "5.0"))
     )
     
+    # Bulk ingest settings
+    ingest_method: str = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('ingest_method') or 
+                        os.getenv("TIMESCALEDB_INGEST_METHOD", "copy")
+    )
+    
+    copy_format: str = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('copy_format') or 
+                        os.getenv("TIMESCALEDB_COPY_FORMAT", "binary")
+    )
+    
+    copy_merge_conflicts: bool = Field(
+        default_factory=lambda: _bool_setting(yaml_config.get('timescaledb', {}).get('copy_merge_conflicts'),
+                                              "TIMESCALEDB_COPY_MERGE_CONFLICTS", "True")
+    )
+    
+    # Write connection pool settings
+    write_pool_min_size: int = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('write_pool_min_size') or 
+                        int(os.getenv("TIMESCALEDB_WRITE_POOL_MIN_SIZE", "1"))
+    )
+    
+    write_pool_max_size: int = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('write_pool_max_size') or 
+                        int(os.getenv("TIMESCALEDB_WRITE_POOL_MAX_SIZE", "4"))
+    )
+    
+    write_pool_health_check_interval: float = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('write_pool_health_check_interval') or 
+                        float(os.getenv("TIMESCALEDB_WRITE_POOL_HEALTH_CHECK_INTERVAL", "30.0"))
+    )
+    
+    write_pool_acquire_timeout: float = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('write_pool_acquire_timeout') or 
+                        float(os.getenv("TIMESCALEDB_WRITE_POOL_ACQUIRE_TIMEOUT", "30.0"))
+    )
+    
+    write_pool_session_settings: Dict[str, Any] = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('write_pool_session_settings') or {
+            'synchronous_commit': os.getenv("TIMESCALEDB_WRITE_SYNCHRONOUS_COMMIT", "on"),
+            'application_name': 'iot-timescaledb-sink'
+        }
+    )
+    
     # Table configuration
+    offsets_table: str = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('offsets_table') or 
+                        os.getenv("TIMESCALEDB_OFFSETS_TABLE", "sink_offsets")
+    )
+    
     main_table: str = Field(
         default_factory=lambda: yaml_config.get('timescaledb', {}).get('main_table') or 
                         os.getenv("TIMESCALEDB_MAIN_TABLE", "sensor_readings")
@@ -116,6 +205,52 @@ class TimescaleDBSettings(BaseSettings):
         default_factory=lambda: yaml_config.get('timescaledb', {}).get('archive_table') or 
                         os.getenv("TIMESCALEDB_ARCHIVE_TABLE", "sensor_readings_archive")
     )
+    
+    ruuvitag_wide_rows: bool = Field(
+        default_factory=lambda: _bool_setting(yaml_config.get('timescaledb', {}).get('ruuvitag_wide_rows'),
+                                              "TIMESCALEDB_RUUVITAG_WIDE_ROWS", "False")
+    )
+    
+    ruuvitag_table: str = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('ruuvitag_table') or 
+                        os.getenv("TIMESCALEDB_RUUVITAG_TABLE", "ruuvitag_readings")
+    )
+    
+    normalized_storage: bool = Field(
+        default_factory=lambda: _bool_setting(yaml_config.get('timescaledb', {}).get('normalized_storage'),
+                                              "TIMESCALEDB_NORMALIZED_STORAGE", "False")
+    )
+    
+    devices_table: str = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('devices_table') or 
+                        os.getenv("TIMESCALEDB_DEVICES_TABLE", "devices")
+    )
+    
+    facts_table: str = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('facts_table') or 
+                        os.getenv("TIMESCALEDB_FACTS_TABLE", "sensor_facts")
+    )
+    
+    device_latest_table: str = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('device_latest_table') or 
+                        os.getenv("TIMESCALEDB_DEVICE_LATEST_TABLE", "device_latest")
+    )
+    
+    # Streaming export
+    export_fetch_size: int = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('export_fetch_size') or 
+                        int(os.getenv("TIMESCALEDB_EXPORT_FETCH_SIZE", "10000"))
+    )
+    
+    export_workers: int = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('export_workers') or 
+                        int(os.getenv("TIMESCALEDB_EXPORT_WORKERS", "4"))
+    )
+    
+    export_partition_interval: float = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('export_partition_interval') or 
+                        float(os.getenv("TIMESCALEDB_EXPORT_PARTITION_INTERVAL", "86400.0"))
+    )
 
     # Data retention
     retention_days: int = Field(
@@ -146,8 +281,74 @@ class TimescaleDBSettings(BaseSettings):
     
     # Continuous aggregates settings
     enable_continuous_aggregates: bool = Field(
-        default_factory=lambda: yaml_config.get('timescaledb', {}).get('enable_continuous_aggregates') or 
-                        os.getenv("TIMESCALEDB_ENABLE_CONTINUOUS_AGGREGATES", "True").lower() in ("true", "1", "yes")
+        default_factory=lambda: _bool_setting(yaml_config.get('timescaledb', {}).get('enable_continuous_aggregates'),
+                                              "TIMESCALEDB_ENABLE_CONTINUOUS_AGGREGATES", "True")
+    )
+    
+    continuous_aggregate_policies: Dict[str, Optional[Dict[str, str]]] = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('continuous_aggregate_policies') or {
+            'sensor_readings_1m': {'start_offset': '2 hours', 'end_offset': '1 minute', 'schedule_interval': '1 minute'},
+            'sensor_readings_hourly': {'start_offset': '3 hours', 'end_offset': '1 hour', 'schedule_interval': '30 minutes'},
+            'sensor_readings_daily': {'start_offset': '3 days', 'end_offset': '1 hour', 'schedule_interval': '1 hour'}
+        }
+    )
+    
+    cagg_refresh_interval: float = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('cagg_refresh_interval') or 
+                        float(os.getenv("TIMESCALEDB_CAGG_REFRESH_INTERVAL", "60.0"))
+    )
+    
+    cagg_merge_gap: float = Field(
+        default_factory=lambda: gap
+                        if (gap := yaml_config.get('timescaledb', {}).get('cagg_merge_gap')) is not None
+                        else float(os.getenv("TIMESCALEDB_CAGG_MERGE_GAP", "300.0"))
+    )
+    
+    cagg_max_window: float = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('cagg_max_window') or 
+                        float(os.getenv("TIMESCALEDB_CAGG_MAX_WINDOW", "21600.0"))
+    )
+    
+    cagg_max_dirty_windows: int = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('cagg_max_dirty_windows') or 
+                        int(os.getenv("TIMESCALEDB_CAGG_MAX_DIRTY_WINDOWS", "32"))
+    )
+    
+    # Read query result cache
+    query_cache_enabled: bool = Field(
+        default_factory=lambda: _bool_setting(yaml_config.get('timescaledb', {}).get('query_cache_enabled'),
+                                              "TIMESCALEDB_QUERY_CACHE_ENABLED", "True")
+    )
+    
+    query_cache_max_entries: int = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('query_cache_max_entries') or 
+                        int(os.getenv("TIMESCALEDB_QUERY_CACHE_MAX_ENTRIES", "1024"))
+    )
+    
+    query_cache_max_mb: float = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('query_cache_max_mb') or 
+                        float(os.getenv("TIMESCALEDB_QUERY_CACHE_MAX_MB", "64.0"))
+    )
+    
+    query_cache_default_ttl: float = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('query_cache_default_ttl') or 
+                        float(os.getenv("TIMESCALEDB_QUERY_CACHE_DEFAULT_TTL", "10.0"))
+    )
+    
+    query_cache_ttls: Dict[str, float] = Field(
+        default_factory=lambda: yaml_config.get('timescaledb', {}).get('query_cache_ttls') or {
+            'recent_readings': 5,
+            'device_stats': 30,
+            'device_latest': 5,
+            'device_status': 5,
+            'timeseries': 30,
+            'sensor_readings_1m': 30,
+            'sensor_readings_hourly': 300,
+            'sensor_readings_daily': 900,
+            'ruuvitag_readings': 5,
+            'ruuvitag_latest': 5,
+            'ruuvitag_timeseries': 30
+        }
     )
     
     @property
@@ -159,6 +360,16 @@ class TimescaleDBSettings(BaseSettings):
             Database URL string
         """
         return f"postgresql://{self.username}:{self.password}@{self.host}:{self.port}/{self.database}"
+    
+    @property
+    def readings_source(self) -> str:
+        """
+        Get the table or view the sensor readings are queried from.
+        
+        Returns:
+            sensor_readings_normalized with normalized storage, the main table otherwise
+        """
+        return 'sensor_readings_normalized' if self.normalized_storage else self.main_table
 
 class DataSinkSettings(BaseSettings):
     """
@@ -170,6 +381,34 @@ class DataSinkSettings(BaseSettings):
         commit_interval: Interval between commits in seconds
         max_retries: Maximum number of retries for failed operations
         retry_backoff: Backoff time between retries in seconds
+        mode: Sink mode ('inline' writes from the poll loop, 'pipelined' uses writer threads)
+        writer_threads: Number of DB writer threads in pipelined mode
+        queue_max_batches: Batches buffered between the poll loop and the writers
+        adaptive_batching: Resize batches at runtime from observed latency, throughput and lag
+        min_batch_size: Lower bound for adaptive batch sizes
+        max_batch_size: Upper bound for adaptive batch sizes
+        min_commit_interval: Commit interval at the minimum batch size in seconds
+        max_commit_interval: Commit interval at the maximum batch size in seconds
+        target_p99_latency: Target p99 end-to-end latency in seconds
+        batch_size_step: Rows added per adaptive increase
+        lag_threshold: Consumer lag in messages that triggers larger batches
+        offset_storage: Where consumed offsets are tracked ('database' stores them with each batch, 'kafka' uses auto-commit)
+        workers: Number of sink worker processes (more than 1 starts the supervisor)
+        worker_restart_backoff: Initial delay before restarting a crashed worker in seconds
+        worker_stall_timeout: Seconds without progress of a worker's processing loop before it is restarted
+        worker_report_interval: Seconds between worker progress/statistics reports
+        columnar_batches: Collect decoded records into columnar batches validated once per column
+        quarantine_enabled: Write readings rejected by batch validation to quarantine files
+        quarantine_directory: Directory for quarantine files
+        quarantine_max_mb: Size at which a quarantine file is rotated in MB
+        quarantine_max_files: Number of rotated quarantine files to keep
+        spill_enabled: Write batches that fail to insert to a disk spill buffer instead of retrying in place
+        spill_directory: Directory for spill buffer segment files
+        spill_segment_max_mb: Size of a spill segment file in MB
+        spill_max_mb: Maximum unreplayed spill data in MB before batches are dropped
+        spill_fsync: Flush every spilled batch to stable storage
+        spill_replay_rows_per_sec: Maximum rate at which spilled readings are replayed (0 disables the limit)
+        spill_replay_retry_interval: Seconds between replay attempts while TimescaleDB is unavailable
     """
     consumer_group_id: str = Field(
         default_factory=lambda: yaml_config.get('data_sink', {}).get('consumer_group_id') or
@@ -195,6 +434,151 @@ class DataSinkSettings(BaseSettings):
         default_factory=lambda: yaml_config.get('data_sink', {}).get('retry_backoff') or 
                         float(os.getenv("DATA_SINK_RETRY_BACKOFF", "2.0"))
     )
+    
+    # Pipelined sink settings
+    mode: str = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('mode') or 
+                        os.getenv("DATA_SINK_MODE", "inline")
+    )
+    
+    writer_threads: int = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('writer_threads') or 
+                        int(os.getenv("DATA_SINK_WRITER_THREADS", "4"))
+    )
+    
+    queue_max_batches: int = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('queue_max_batches') or 
+                        int(os.getenv("DATA_SINK_QUEUE_MAX_BATCHES", "16"))
+    )
+    
+    # Adaptive batching settings
+    adaptive_batching: bool = Field(
+        default_factory=lambda: _bool_setting(yaml_config.get('data_sink', {}).get('adaptive_batching'),
+                                              "DATA_SINK_ADAPTIVE_BATCHING", "True")
+    )
+    
+    min_batch_size: int = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('min_batch_size') or 
+                        int(os.getenv("DATA_SINK_MIN_BATCH_SIZE", "50"))
+    )
+    
+    max_batch_size: int = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('max_batch_size') or 
+                        int(os.getenv("DATA_SINK_MAX_BATCH_SIZE", "1000"))
+    )
+    
+    min_commit_interval: float = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('min_commit_interval') or 
+                        float(os.getenv("DATA_SINK_MIN_COMMIT_INTERVAL", "0.5"))
+    )
+    
+    max_commit_interval: float = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('max_commit_interval') or 
+                        float(os.getenv("DATA_SINK_MAX_COMMIT_INTERVAL", "5.0"))
+    )
+    
+    target_p99_latency: float = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('target_p99_latency') or 
+                        float(os.getenv("DATA_SINK_TARGET_P99_LATENCY", "2.0"))
+    )
+    
+    batch_size_step: int = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('batch_size_step') or 
+                        int(os.getenv("DATA_SINK_BATCH_SIZE_STEP", "50"))
+    )
+    
+    lag_threshold: int = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('lag_threshold') or 
+                        int(os.getenv("DATA_SINK_LAG_THRESHOLD", "5000"))
+    )
+    
+    # Offset storage
+    offset_storage: str = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('offset_storage') or 
+                        os.getenv("DATA_SINK_OFFSET_STORAGE", "database")
+    )
+    
+    # Multiprocess supervisor settings
+    workers: int = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('workers') or 
+                        int(os.getenv("DATA_SINK_WORKERS", "1"))
+    )
+    
+    worker_restart_backoff: float = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('worker_restart_backoff') or 
+                        float(os.getenv("DATA_SINK_WORKER_RESTART_BACKOFF", "5.0"))
+    )
+    
+    worker_stall_timeout: float = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('worker_stall_timeout') or 
+                        float(os.getenv("DATA_SINK_WORKER_STALL_TIMEOUT", "120.0"))
+    )
+    
+    worker_report_interval: float = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('worker_report_interval') or 
+                        float(os.getenv("DATA_SINK_WORKER_REPORT_INTERVAL", "10.0"))
+    )
+    
+    columnar_batches: bool = Field(
+        default_factory=lambda: _bool_setting(yaml_config.get('data_sink', {}).get('columnar_batches'),
+                                              "DATA_SINK_COLUMNAR_BATCHES", "True")
+    )
+    
+    quarantine_enabled: bool = Field(
+        default_factory=lambda: _bool_setting(yaml_config.get('data_sink', {}).get('quarantine_enabled'),
+                                              "DATA_SINK_QUARANTINE_ENABLED", "True")
+    )
+    
+    quarantine_directory: str = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('quarantine_directory') or 
+                        os.getenv("DATA_SINK_QUARANTINE_DIRECTORY", "/tmp/timescaledb-sink-quarantine")
+    )
+    
+    quarantine_max_mb: int = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('quarantine_max_mb') or 
+                        int(os.getenv("DATA_SINK_QUARANTINE_MAX_MB", "50"))
+    )
+    
+    quarantine_max_files: int = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('quarantine_max_files') or 
+                        int(os.getenv("DATA_SINK_QUARANTINE_MAX_FILES", "5"))
+    )
+    
+    spill_enabled: bool = Field(
+        default_factory=lambda: _bool_setting(yaml_config.get('data_sink', {}).get('spill_enabled'),
+                                              "DATA_SINK_SPILL_ENABLED", "True")
+    )
+    
+    spill_directory: str = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('spill_directory') or 
+                        os.getenv("DATA_SINK_SPILL_DIRECTORY", "/tmp/timescaledb-sink-spill")
+    )
+    
+    spill_segment_max_mb: int = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('spill_segment_max_mb') or 
+                        int(os.getenv("DATA_SINK_SPILL_SEGMENT_MAX_MB", "64"))
+    )
+    
+    spill_max_mb: int = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('spill_max_mb') or 
+                        int(os.getenv("DATA_SINK_SPILL_MAX_MB", "1024"))
+    )
+    
+    spill_fsync: bool = Field(
+        default_factory=lambda: _bool_setting(yaml_config.get('data_sink', {}).get('spill_fsync'),
+                                              "DATA_SINK_SPILL_FSYNC", "True")
+    )
+    
+    spill_replay_rows_per_sec: float = Field(
+        default_factory=lambda: rate
+                        if (rate := yaml_config.get('data_sink', {}).get('spill_replay_rows_per_sec')) is not None
+                        else float(os.getenv("DATA_SINK_SPILL_REPLAY_ROWS_PER_SEC", "5000"))
+    )
+    
+    spill_replay_retry_interval: float = Field(
+        default_factory=lambda: yaml_config.get('data_sink', {}).get('spill_replay_retry_interval') or 
+                        float(os.getenv("DATA_SINK_SPILL_REPLAY_RETRY_INTERVAL", "5.0"))
+    )
 
 class MQTTSettings(BaseSettings):
     """
@@ -268,6 +652,9 @@ class RuuviTagSettings(BaseSettings):
         anomaly_thresholds: Thresholds for anomaly detection
         signal_strength: Signal strength
         firmware_version: Firmware's version
+        message_format: What the adapter publishes per advertisement: "readings" (one record
+            per measurement), "envelope" (one RuuviTagAdvertisement record) or "dual" (both,
+            while consumers migrate)
     """
     device_type: str = Field(
         default_factory=lambda:yaml_config.get('device_type', {}).get('device_type') or
@@ -314,6 +701,11 @@ class RuuviTagSettings(BaseSettings):
                         os.getenv("FIRMWARE_VERSION", None)
     )
 
+    message_format: str = Field(
+        default_factory=lambda: yaml_config.get('ruuvitag', {}).get('message_format') or
+                        os.getenv("RUUVITAG_MESSAGE_FORMAT", "readings")
+    )
+
 class SchemaRegistrySettings(BaseSettings):
     """
     Schema Registry configuration settings.
@@ -323,6 +715,13 @@ class SchemaRegistrySettings(BaseSettings):
         auto_register_schemas: Whether to automatically register schemas
         compatibility_level: Schema compatibility level (e.g., BACKWARD, FORWARD, FULL)
         subject_name_strategy: Strategy for subject naming
+        compact_readings: Whether to deserialize sensor readings into CompactSensorReading objects
+        fast_decoder: Whether to decode sensor readings with the compiled Avro decoder
+        fast_encoder: Whether to encode sensor readings with the compiled Avro encoder
+        cache_enabled: Whether to keep an on-disk cache of schema lookups
+        cache_directory: Directory for the schema cache file
+        cache_refresh_interval: Seconds between background refreshes of the schema cache
+        envelope_schema_file: Schema file of RuuviTag advertisement envelopes
     """
     url: str = Field(
         default_factory=lambda: yaml_config.get('schema_registry', {}).get('url') or 
@@ -330,8 +729,8 @@ class SchemaRegistrySettings(BaseSettings):
     )
     
     auto_register_schemas: bool = Field(
-        default_factory=lambda: yaml_config.get('schema_registry', {}).get('auto_register_schemas') or 
-                        os.getenv("SCHEMA_AUTO_REGISTER", "True").lower() in ("true", "1", "yes")
+        default_factory=lambda: _bool_setting(yaml_config.get('schema_registry', {}).get('auto_register_schemas'),
+                                              "SCHEMA_AUTO_REGISTER", "True")
     )
     
     compatibility_level: str = Field(
@@ -355,12 +754,47 @@ class SchemaRegistrySettings(BaseSettings):
                         os.getenv("SENSOR_SCHEMA_FILE", "iot_sensor_reading.avsc")
     )
     
+    envelope_schema_file: str = Field(
+        default_factory=lambda: yaml_config.get('schema_registry', {}).get('envelope_schema_file') or 
+                        os.getenv("ENVELOPE_SCHEMA_FILE", "ruuvitag_advertisement.avsc")
+    )
+    
     # Serialization settings
     serialize_format: str = Field(
         default_factory=lambda: yaml_config.get('schema_registry', {}).get('serialize_format') or 
                        os.getenv("SERIALIZE_FORMAT", "avro")
     )
     
+    compact_readings: bool = Field(
+        default_factory=lambda: _bool_setting(yaml_config.get('schema_registry', {}).get('compact_readings'),
+                                              "COMPACT_READINGS", "True")
+    )
+    
+    fast_decoder: bool = Field(
+        default_factory=lambda: _bool_setting(yaml_config.get('schema_registry', {}).get('fast_decoder'),
+                                              "SCHEMA_FAST_DECODER", "True")
+    )
+    
+    fast_encoder: bool = Field(
+        default_factory=lambda: _bool_setting(yaml_config.get('schema_registry', {}).get('fast_encoder'),
+                                              "SCHEMA_FAST_ENCODER", "True")
+    )
+    
+    cache_enabled: bool = Field(
+        default_factory=lambda: _bool_setting(yaml_config.get('schema_registry', {}).get('cache_enabled'),
+                                              "SCHEMA_CACHE_ENABLED", "True")
+    )
+    
+    cache_directory: str = Field(
+        default_factory=lambda: yaml_config.get('schema_registry', {}).get('cache_directory') or 
+                        os.getenv("SCHEMA_CACHE_DIRECTORY", "/tmp/schema-registry-cache")
+    )
+    
+    cache_refresh_interval: float = Field(
+        default_factory=lambda: yaml_config.get('schema_registry', {}).get('cache_refresh_interval') or 
+                        float(os.getenv("SCHEMA_CACHE_REFRESH_INTERVAL", "300.0"))
+    )
+    
     @property
     def sensor_schema_path(self) -> str:
         """
@@ -370,6 +804,16 @@ class SchemaRegistrySettings(BaseSettings):
             Full path to the sensor schema file
         """
         return os.path.join(self.schema_dir, self.sensor_schema_file)
+    
+    @property
+    def envelope_schema_path(self) -> str:
+        """
+        Get the full path to the RuuviTag advertisement envelope schema file.
+        
+        Returns:
+            Full path to the envelope schema file
+        """
+        return os.path.join(self.schema_dir, self.envelope_schema_file)
 
 class KafkaSettings(BaseSettings):
     """
@@ -378,10 +822,13 @@ class KafkaSettings(BaseSettings):
     Attributes:
         bootstrap_servers: Comma-separated list of Kafka broker addresses
         topic_name: Name of the Kafka topic for IoT data
+        envelope_topic_name: Name of the Kafka topic for RuuviTag advertisement envelopes
+        consume_envelopes: Whether consumers also subscribe to the envelope topic
         consumer_group_id: ID of the consumer group for load balancing
         auto_offset_reset: Strategy for consuming messages ('earliest' or 'latest')
         replication_factor: Number of replicas for topic partitions
         partitions: Number of partitions for the topic
+        statistics_interval_ms: Interval of librdkafka statistics exported to Prometheus (0 disables them)
     """
     # Support comma-delimited string of brokers or use default if not provided
     bootstrap_servers: str = Field(
@@ -395,6 +842,16 @@ class KafkaSettings(BaseSettings):
                         os.getenv("KAFKA_TOPIC_NAME", "iot-sensor-data")
     )
     
+    envelope_topic_name: str = Field(
+        default_factory=lambda: yaml_config.get('kafka', {}).get('envelope_topic_name') or 
+                        os.getenv("KAFKA_ENVELOPE_TOPIC_NAME", "iot-sensor-envelopes")
+    )
+    
+    consume_envelopes: bool = Field(
+        default_factory=lambda: _bool_setting(yaml_config.get('kafka', {}).get('consume_envelopes'),
+                                              "KAFKA_CONSUME_ENVELOPES", "False")
+    )
+    
     consumer_group_id: str = Field(
         default_factory=lambda: yaml_config.get('kafka', {}).get('consumer_group_id') or 
                         os.getenv("KAFKA_CONSUMER_GROUP_ID", "iot-data-consumer")
@@ -415,6 +872,13 @@ class KafkaSettings(BaseSettings):
         default_factory=lambda: yaml_config.get('kafka', {}).get('partitions') or 
                         int(os.getenv("KAFKA_PARTITIONS", "6"))
     )
+    
+    # Client statistics; 0 in the YAML file disables them instead of falling back to the default
+    statistics_interval_ms: int = Field(
+        default_factory=lambda: interval
+                        if (interval := yaml_config.get('kafka', {}).get('statistics_interval_ms')) is not None
+                        else int(os.getenv("KAFKA_STATISTICS_INTERVAL_MS", "15000"))
+    )
 
     # Topic config
     topic_config: Dict[str, Any] = Field(
@@ -456,6 +920,10 @@ class ProducerSettings(BaseSettings):
         acks: Acknowledgement level
         retries: Number of retries
         retry_backoff_ms: Backoff time between retries
+        pipelined: Whether sends return without waiting for delivery, with a background delivery poller
+        max_in_flight_messages: Unacknowledged messages allowed before sends block in pipelined mode
+        backpressure_timeout: Seconds a send waits for room before the message is dropped
+        poll_interval: Seconds the delivery poller waits for delivery reports per poll
     """
     client_id: str = Field(
         default_factory=lambda: yaml_config.get('producer', {}).get('client_id') or 
@@ -514,6 +982,27 @@ class ProducerSettings(BaseSettings):
                         os.getenv("PRODUCER_COMPRESSION_TYPE", "snappy")
     )
     
+    # Pipelined sending
+    pipelined: bool = Field(
+        default_factory=lambda: _bool_setting(yaml_config.get('producer', {}).get('pipelined'),
+                                              "PRODUCER_PIPELINED", "True")
+    )
+    
+    max_in_flight_messages: int = Field(
+        default_factory=lambda: yaml_config.get('producer', {}).get('max_in_flight_messages') or 
+                        int(os.getenv("PRODUCER_MAX_IN_FLIGHT_MESSAGES", "10000"))
+    )
+    
+    backpressure_timeout: float = Field(
+        default_factory=lambda: yaml_config.get('producer', {}).get('backpressure_timeout') or 
+                        float(os.getenv("PRODUCER_BACKPRESSURE_TIMEOUT", "30.0"))
+    )
+    
+    poll_interval: float = Field(
+        default_factory=lambda: yaml_config.get('producer', {}).get('poll_interval') or 
+                        float(os.getenv("PRODUCER_POLL_INTERVAL", "0.1"))
+    )
+    
     def get_config(self) -> Dict[str, Any]:
         """
         Get producer configuration as a dictionary for Confluent Kafka.
@@ -544,10 +1033,15 @@ class ConsumerSettings(BaseSettings):
         enable_auto_commit: Whether to automatically commit offsets
         auto_commit_interval_ms: Interval between auto commits
         fetch_min_bytes: Minimum bytes to fetch
+        batch_consume: Whether consumers process whole fetches instead of single messages
+        consume_batch_size: Maximum number of messages returned by one consume() call
+        deserialize_workers: Number of parallel deserialization workers (0 deserializes on the poll thread)
+        deserialize_chunk_size: Maximum number of messages per deserialization chunk
+        deserialize_mode: Worker type: process, thread or auto (threads on free-threaded Python)
     """
     enable_auto_commit: bool = Field(
-        default_factory=lambda: yaml_config.get('consumer', {}).get('enable_auto_commit') or 
-                        os.getenv("CONSUMER_ENABLE_AUTO_COMMIT", "True").lower() in ("true", "1", "yes")
+        default_factory=lambda: _bool_setting(yaml_config.get('consumer', {}).get('enable_auto_commit'),
+                                              "CONSUMER_ENABLE_AUTO_COMMIT", "True")
     )
     
     auto_commit_interval_ms: int = Field(
@@ -560,6 +1054,34 @@ class ConsumerSettings(BaseSettings):
                         int(os.getenv("CONSUMER_FETCH_MIN_BYTES", "1"))
     )
     
+    # Batch consumption
+    batch_consume: bool = Field(
+        default_factory=lambda: _bool_setting(yaml_config.get('consumer', {}).get('batch_consume'),
+                                              "CONSUMER_BATCH_CONSUME", "True")
+    )
+    
+    consume_batch_size: int = Field(
+        default_factory=lambda: yaml_config.get('consumer', {}).get('consume_batch_size') or 
+                        int(os.getenv("CONSUMER_CONSUME_BATCH_SIZE", "500"))
+    )
+    
+    # Parallel deserialization
+    deserialize_workers: int = Field(
+        default_factory=lambda: workers
+                        if (workers := yaml_config.get('consumer', {}).get('deserialize_workers')) is not None
+                        else int(os.getenv("CONSUMER_DESERIALIZE_WORKERS", "0"))
+    )
+    
+    deserialize_chunk_size: int = Field(
+        default_factory=lambda: yaml_config.get('consumer', {}).get('deserialize_chunk_size') or 
+                        int(os.getenv("CONSUMER_DESERIALIZE_CHUNK_SIZE", "100"))
+    )
+    
+    deserialize_mode: str = Field(
+        default_factory=lambda: yaml_config.get('consumer', {}).get('deserialize_mode') or 
+                        os.getenv("CONSUMER_DESERIALIZE_MODE", "auto")
+    )
+    
     # Fault tolerance settings
     session_timeout_ms: int = Field(
         default_factory=lambda: yaml_config.get('consumer', {}).get('session_timeout_ms') or 
@@ -664,8 +1186,8 @@ class LoggingSettings(BaseSettings):
 
     # File logging settings
     file_logging_enabled: bool = Field(
-        default_factory=lambda: yaml_config.get('logging', {}).get('file_logging', {}).get('enabled') or 
-                        os.getenv("LOG_FILE_ENABLED", "False").lower() in ("true", "1", "yes")
+        default_factory=lambda: _bool_setting(yaml_config.get('logging', {}).get('file_logging', {}).get('enabled'),
+                                              "LOG_FILE_ENABLED", "False")
     )
     
     log_dir: str = Field(
@@ -690,8 +1212,8 @@ class LoggingSettings(BaseSettings):
     
     # Error log specific settings
     error_log_enabled: bool = Field(
-        default_factory=lambda: yaml_config.get('logging', {}).get('file_logging', {}).get('error_log', {}).get('enabled') or 
-                        os.getenv("ERROR_LOG_ENABLED", "False").lower() in ("true", "1", "yes")
+        default_factory=lambda: _bool_setting(yaml_config.get('logging', {}).get('file_logging', {}).get('error_log', {}).get('enabled'),
+                                              "ERROR_LOG_ENABLED", "False")
     )
     
     error_log_retention: str = Field(
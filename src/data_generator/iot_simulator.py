@@ -9,6 +9,7 @@ from faker import Faker
 
 from src.utils.logger import log
 from src.config.config import settings
+from src.data_storage.models import CompactSensorReading, SensorLocation
 
 # Initialize Faker for generating random data
 fake = Faker()
@@ -45,6 +46,8 @@ class IoTDevice:
             "zone": random.choice(["north", "south", "east", "west", "central"]),
             "room": f"room-{random.randint(100, 999)}"  # Added room field to match updated schema
         }
+        # Shared by every reading from this device
+        self.shared_location = SensorLocation.shared(self.location)
         
         # Set device-specific parameters for more realistic simulation
         self._set_device_parameters()
@@ -128,13 +131,13 @@ class IoTDevice:
             self.variation = random.uniform(1.0, 10.0)
             self.trend = random.uniform(-0.5, 0.5)
     
-    def generate_reading(self) -> Dict[str, Any]:
+    def generate_reading(self) -> CompactSensorReading:
         """
         Generate a simulated sensor reading based on the device type.
         The reading format is compatible with the Avro schema.
         
         Returns:
-            Dictionary containing the simulated reading data
+            CompactSensorReading containing the simulated reading data
         """
         # timestamp = datetime.utcnow().isoformat() + "Z" -- deprecated
         timestamp = datetime.now(datetime.timezone.utc).isoformat() + "Z"
@@ -239,22 +242,22 @@ class IoTDevice:
         }
         
         # Create the reading object with all device metadata according to Avro schema
-        reading = {
-            "device_id": self.device_id,
-            "device_type": self.device_type,
-            "timestamp": timestamp,
-            "value": float(value) if isinstance(value, (int, float)) else value,
-            "unit": unit,
-            "location": self.location,
-            "battery_level": round(self.battery_level, 2),
-            "signal_strength": signal_strength,
-            "is_anomaly": is_anomaly,
-            "firmware_version": self.firmware_version,
-            "device_metadata": device_metadata,
-            "status": self.status,
-            "tags": self.tags,
-            "maintenance_date": self.maintenance_date
-        }
+        reading = CompactSensorReading(
+            device_id=self.device_id,
+            device_type=self.device_type,
+            timestamp=timestamp,
+            value=float(value) if isinstance(value, (int, float)) else value,
+            unit=unit,
+            location=self.shared_location,
+            battery_level=round(self.battery_level, 2),
+            signal_strength=signal_strength,
+            is_anomaly=is_anomaly,
+            firmware_version=self.firmware_version,
+            device_metadata=device_metadata,
+            status=self.status,
+            tags=self.tags,
+            maintenance_date=self.maintenance_date
+        )
         
         return reading
 
@@ -311,7 +314,7 @@ class IoTSimulator:
         for device_type, count in type_counts.items():
             log.info(f"  - {device_type}: {count} devices")
     
-    def generate_batch(self) -> List[Dict[str, Any]]:
+    def generate_batch(self) -> List[CompactSensorReading]:
         """
         Generate a batch of readings from all devices.
         
@@ -354,7 +357,7 @@ if __name__ == "__main__":
     # Function to print readings
     def print_readings(readings):
         for reading in readings:
-            print(json.dumps(reading, indent=2))
+            print(json.dumps(reading.to_dict(), indent=2))
     
     # Generate data for 5 cycles
     for _ in range(5):
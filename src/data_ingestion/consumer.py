@@ -1,13 +1,39 @@
 import time
 import signal
 import os
-from typing import Dict, Any, Callable, Optional, List
-from confluent_kafka import Consumer, KafkaError, KafkaException
+from typing import Dict, Any, Callable, Optional, List, Tuple
+from confluent_kafka import Consumer, KafkaError, KafkaException, TopicPartition
 
 from src.utils.logger import log
 from src.config.config import settings
 from src.utils.schema_registry import schema_registry
+from src.data_storage.models import RuuviTagAdvertisement
 from src.utils.metrics import get_metrics_instance, MetricsServer, timed_operation
+from src.utils.kafka_stats import KafkaStatsCollector
+
+class ConsumedBatch:
+    """
+    Deserialized records from one consume() call.
+    
+    Attributes:
+        records: Deserialized sensor readings in fetch order
+        positions: (topic, partition, offset) of each record
+        first_offsets: Lowest offset per (topic, partition), including messages that failed to deserialize
+        last_offsets: Highest offset per (topic, partition), including messages that failed to deserialize
+        message_count: Number of Kafka messages in the fetch, including failed ones
+    """
+    
+    __slots__ = ('records', 'positions', 'first_offsets', 'last_offsets', 'message_count')
+    
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+        self.positions: List[Tuple[str, int, int]] = []
+        self.first_offsets: Dict[Tuple[str, int], int] = {}
+        self.last_offsets: Dict[Tuple[str, int], int] = {}
+        self.message_count = 0
+    
+    def __len__(self) -> int:
+        return len(self.records)
 
 class KafkaConsumer:
     """
@@ -23,7 +49,8 @@ class KafkaConsumer:
         bootstrap_servers: str = None,
         topic_name: str = None,
         group_id: str = None,
-        auto_offset_reset: str = None
+        auto_offset_reset: str = None,
+        config_overrides: Dict[str, Any] = None
     ):
         """
         Initialize Kafka consumer with configuration for a multi-broker environment.
@@ -33,23 +60,46 @@ class KafkaConsumer:
             topic_name: Name of the Kafka topic to consume messages from
             group_id: Consumer group ID for load balancing
             auto_offset_reset: Strategy for consuming messages ('earliest' or 'latest')
+            config_overrides: Optional librdkafka properties applied on top of the settings
         """
         self.bootstrap_servers = bootstrap_servers or settings.kafka.bootstrap_servers
         self.topic_name = topic_name or settings.kafka.topic_name
         self.group_id = group_id or settings.kafka.consumer_group_id
         self.auto_offset_reset = auto_offset_reset or settings.kafka.auto_offset_reset
         
+        # RuuviTag advertisement envelopes are consumed alongside the readings and expanded into readings
+        self.envelope_topic_name = settings.kafka.envelope_topic_name if settings.kafka.consume_envelopes else None
+        self.topics = [self.topic_name]
+        if self.envelope_topic_name and self.envelope_topic_name != self.topic_name:
+            self.topics.append(self.envelope_topic_name)
+        
         # Flag to control consumption loop
         self.running = False
         
+        # Raw Kafka message currently being processed by consume_loop
+        self.last_message = None
+        
+        # Batch currently being processed by consume_batch_loop
+        self.last_batch: Optional[ConsumedBatch] = None
+        
+        # Optional callable returning externally stored offsets for assigned partitions
+        self.offset_provider: Optional[Callable[[List[TopicPartition]], Dict[Tuple[str, int], int]]] = None
+        
+        # Start of the latest consumption loop iteration, for stall detection
+        self.last_poll_time = time.time()
+        
+        # Optional callable run before partitions are revoked, e.g. to flush pending work
+        self.revoke_handler: Optional[Callable[[List[TopicPartition]], None]] = None
+        
         # Initialize metrics
         self.metrics = get_metrics_instance("consumer")
         
-        # Start metrics server
+        # Start metrics server (METRICS_PORT=0 disables it, e.g. in supervised sink workers)
         metrics_port = int(os.getenv("METRICS_PORT", "8001"))
-        self.metrics_server = MetricsServer(port=metrics_port)
-        self.metrics_server.start()
-        log.info(f"Consumer metrics server started on port {metrics_port}")
+        if metrics_port > 0:
+            self.metrics_server = MetricsServer(port=metrics_port)
+            self.metrics_server.start()
+            log.info(f"Consumer metrics server started on port {metrics_port}")
         
         # Get consumer configuration from settings
         self.conf = settings.consumer.get_config(
@@ -61,6 +111,14 @@ class KafkaConsumer:
         if bootstrap_servers:
             self.conf['bootstrap.servers'] = bootstrap_servers
         
+        # Export librdkafka statistics; they are delivered from poll()/consume()
+        if settings.kafka.statistics_interval_ms > 0:
+            self.conf['statistics.interval.ms'] = settings.kafka.statistics_interval_ms
+            self.conf['stats_cb'] = KafkaStatsCollector(self.metrics)
+        
+        if config_overrides:
+            self.conf.update(config_overrides)
+        
         # Create consumer instance
         self.consumer = Consumer(self.conf)
         log.info(f"Kafka consumer initialized with bootstrap servers: {self.bootstrap_servers}")
@@ -70,6 +128,17 @@ class KafkaConsumer:
         self.schema_registry_client = schema_registry
         log.info("Schema Registry client initialized for consumer")
         
+        # Optional worker pool that deserializes each fetch in parallel chunks
+        self.deserialization_pool = None
+        if settings.consumer.deserialize_workers > 0:
+            self.deserialization_pool = self.schema_registry_client.create_deserialization_pool(
+                self.topic_name,
+                workers=settings.consumer.deserialize_workers,
+                chunk_size=settings.consumer.deserialize_chunk_size,
+                mode=settings.consumer.deserialize_mode,
+                metrics=self.metrics
+            )
+        
         # Setup signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
@@ -93,12 +162,16 @@ class KafkaConsumer:
         to assign partitions among consumers in the group.
         """
         try:
-            self.consumer.subscribe([self.topic_name], on_assign=self._on_assign_callback)
-            log.info(f"Subscribed to topic: {self.topic_name}")
+            self.consumer.subscribe(
+                self.topics,
+                on_assign=self._on_assign_callback,
+                on_revoke=self._on_revoke_callback
+            )
+            log.info(f"Subscribed to topics: {', '.join(self.topics)}")
             # Set connection status to connected
             self.metrics.set_connection_status(True, "kafka")
         except KafkaException as e:
-            log.error(f"Error subscribing to topic {self.topic_name}: {str(e)}")
+            log.error(f"Error subscribing to topics {', '.join(self.topics)}: {str(e)}")
             self.metrics.set_connection_status(False, "kafka")
             self.metrics.record_message_failed(error_type="subscription_error")
             raise
@@ -117,6 +190,56 @@ class KafkaConsumer:
             self.metrics.record_rebalance()
         else:
             log.warning("No partitions assigned to this consumer")
+        
+        if self.offset_provider and partitions:
+            self._seek_to_stored_offsets(consumer, partitions)
+    
+    def _on_revoke_callback(self, consumer, partitions):
+        """
+        Callback executed before partitions are taken away from this consumer.
+        
+        Args:
+            consumer: The consumer instance
+            partitions: List of TopicPartition objects being revoked
+        """
+        if partitions:
+            partition_info = [f"{p.topic}[{p.partition}]" for p in partitions]
+            log.info(f"Revoking partitions: {', '.join(partition_info)}")
+        
+        if self.revoke_handler:
+            try:
+                self.revoke_handler(partitions)
+            except Exception as e:
+                log.error(f"Error in partition revoke handler: {str(e)}")
+    
+    def _seek_to_stored_offsets(self, consumer, partitions):
+        """
+        Start assigned partitions from externally stored offsets.
+        
+        Partitions without a stored offset keep the group's committed
+        position (or auto.offset.reset).
+        
+        Args:
+            consumer: The consumer instance
+            partitions: List of TopicPartition objects assigned
+        """
+        try:
+            stored = self.offset_provider(partitions)
+        except Exception as e:
+            log.error(f"Could not load stored offsets, using committed Kafka offsets: {str(e)}")
+            return
+        
+        for p in partitions:
+            next_offset = stored.get((p.topic, p.partition))
+            if next_offset is not None:
+                p.offset = next_offset
+                log.info(f"Resuming {p.topic}[{p.partition}] from stored offset {next_offset}")
+        
+        # Assigning explicitly makes librdkafka start from the offsets set above
+        if self.conf.get('partition.assignment.strategy') == 'cooperative-sticky':
+            consumer.incremental_assign(partitions)
+        else:
+            consumer.assign(partitions)
     
     @timed_operation(None, "message_processing")  # Will be updated in __init__
     def process_message(self, message: Dict[str, Any]) -> None:
@@ -140,6 +263,19 @@ class KafkaConsumer:
         
         log.info(f"Received data from device {device_id} ({device_type}): {value} {unit}")
     
+    def process_batch(self, batch: ConsumedBatch) -> None:
+        """
+        Process all records of one fetch.
+        
+        The base implementation calls process_message for each record;
+        subclasses override it to handle the whole fetch at once.
+        
+        Args:
+            batch: Records deserialized from one consume() call
+        """
+        for record in batch.records:
+            self.process_message(record)
+    
     def _handle_message_errors(self, msg):
         """
         Handle errors in Kafka messages.
@@ -169,15 +305,163 @@ class KafkaConsumer:
         
         return True
     
+    def get_consumer_lag(self) -> int:
+        """
+        Get the total consumer lag across the assigned partitions.
+        
+        Uses the high watermarks cached from fetch responses, so no broker
+        round trip is made. Per-partition lag is also exported as a metric.
+        
+        Returns:
+            Total number of messages between the current position and the high watermark
+        """
+        total_lag = 0
+        try:
+            assignment = self.consumer.assignment()
+            if not assignment:
+                return 0
+            
+            for tp in self.consumer.position(assignment):
+                low, high = self.consumer.get_watermark_offsets(tp, cached=True)
+                if high < 0:
+                    continue
+                position = tp.offset if tp.offset >= 0 else low
+                lag = max(0, high - position)
+                total_lag += lag
+                self.metrics.set_consumer_lag(lag, topic=tp.topic, partition=str(tp.partition))
+        except Exception as e:
+            log.debug(f"Could not compute consumer lag: {str(e)}")
+        
+        return total_lag
+    
+    def deserialize_message(self, msg) -> Any:
+        """
+        Deserialize the value of one Kafka message according to its topic.
+        
+        Args:
+            msg: Kafka message without errors
+            
+        Returns:
+            Sensor reading, or RuuviTagAdvertisement for messages from the envelope topic
+        """
+        if self.envelope_topic_name is not None and msg.topic() == self.envelope_topic_name:
+            return self.schema_registry_client.deserialize_envelope(msg.value(), msg.topic())
+        return self.schema_registry_client.deserialize_sensor_reading(msg.value(), self.topic_name)
+    
+    def deserialize_messages(self, messages: List[Any]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Deserialize the values of several Kafka messages, preserving their order.
+        
+        Uses the deserialization pool for sensor readings when one is
+        configured; envelopes are decoded on the calling thread. Failures are
+        logged and counted, and returned as None.
+        
+        Args:
+            messages: Kafka messages without errors
+            
+        Returns:
+            Deserialized sensor readings (or RuuviTagAdvertisement envelopes) in message order
+        """
+        envelope_topic = self.envelope_topic_name
+        if self.deserialization_pool is not None and (
+                envelope_topic is None or not any(msg.topic() == envelope_topic for msg in messages)):
+            records, errors = self.deserialization_pool.decode([msg.value() for msg in messages])
+        elif self.deserialization_pool is not None:
+            # Readings go through the pool, envelopes are decoded here
+            reading_indexes = [index for index, msg in enumerate(messages) if msg.topic() != envelope_topic]
+            decoded, pool_errors = self.deserialization_pool.decode([messages[index].value() for index in reading_indexes])
+            records = [None] * len(messages)
+            errors = [(reading_indexes[position], error) for position, error in pool_errors]
+            for index, record in zip(reading_indexes, decoded):
+                records[index] = record
+            for index, msg in enumerate(messages):
+                if msg.topic() != envelope_topic:
+                    continue
+                try:
+                    records[index] = self.deserialize_message(msg)
+                except Exception as e:
+                    errors.append((index, str(e)))
+        else:
+            records = []
+            errors = []
+            for index, msg in enumerate(messages):
+                try:
+                    records.append(self.deserialize_message(msg))
+                except Exception as e:
+                    records.append(None)
+                    errors.append((index, str(e)))
+        
+        for _, error in errors:
+            log.error(f"Error deserializing message: {error}")
+        if errors:
+            self.metrics.record_message_failed(error_type="deserialization_error", count=len(errors))
+        
+        return records
+    
+    def fetch_batch(self, batch_size: int = None, timeout: float = 1.0) -> ConsumedBatch:
+        """
+        Fetch and deserialize up to batch_size messages with a single consume() call.
+        
+        Messages with Kafka errors are skipped; messages that fail to deserialize
+        are counted in the batch offsets but not returned as records.
+        
+        Args:
+            batch_size: Maximum number of messages (defaults to consumer.consume_batch_size)
+            timeout: Maximum time to wait for the first message in seconds
+            
+        Returns:
+            ConsumedBatch with the deserialized records and their positions
+        """
+        batch = ConsumedBatch()
+        messages = self.consumer.consume(
+            num_messages=batch_size or settings.consumer.consume_batch_size,
+            timeout=timeout
+        )
+        if not messages:
+            return batch
+        
+        consumed: Dict[Tuple[str, int], int] = {}
+        
+        # Skip messages with errors
+        valid = [msg for msg in messages if self._handle_message_errors(msg)]
+        
+        for msg, record in zip(valid, self.deserialize_messages(valid)):
+            topic_partition = (msg.topic(), msg.partition())
+            offset = msg.offset()
+            consumed[topic_partition] = consumed.get(topic_partition, 0) + 1
+            batch.first_offsets.setdefault(topic_partition, offset)
+            batch.last_offsets[topic_partition] = offset
+            batch.message_count += 1
+            
+            if record is None:
+                continue
+            
+            # Envelopes become one record per measurement, all at the envelope's position
+            if isinstance(record, RuuviTagAdvertisement):
+                readings = record.readings()
+                batch.records.extend(readings)
+                batch.positions.extend([(topic_partition[0], topic_partition[1], offset)] * len(readings))
+                continue
+            
+            batch.records.append(record)
+            batch.positions.append((topic_partition[0], topic_partition[1], offset))
+        
+        # One metric update per partition instead of one per message
+        for (topic, partition), count in consumed.items():
+            self.metrics.record_message_consumed(topic=topic, partition=str(partition), count=count)
+        
+        return batch
+    
     def consume_batch(self, batch_size: int = 100, timeout: float = 1.0) -> List[Dict[str, Any]]:
         """
         Consume a batch of messages from Kafka topic.
         
-        This method polls for a batch of messages and processes them.
+        This method fetches up to batch_size messages in one consume() call
+        and processes them.
         
         Args:
             batch_size: Maximum number of messages to consume in one batch
-            timeout: Poll timeout in seconds
+            timeout: Consume timeout in seconds
             
         Returns:
             List of processed messages
@@ -187,50 +471,17 @@ class KafkaConsumer:
             if not self.consumer.assignment():
                 self.subscribe()
             
-            messages = []
-            start_time = time.time()
-            
-            # Poll for messages until we get a batch or timeout
-            while len(messages) < batch_size and (time.time() - start_time) < (timeout * 5):
-                msg = self.consumer.poll(timeout=timeout)
-                
-                # Skip message if it has errors
-                if not self._handle_message_errors(msg):
-                    continue
-                
-                # Record message consumed
-                self.metrics.record_message_consumed(
-                    topic=msg.topic(),
-                    partition=str(msg.partition())
-                )
-                
-                # Deserialize the message value using Avro and Schema Registry
-                try:
-                    # Deserialization context
-                    value_bytes = msg.value()
-                    
-                    # Deserialize with Schema Registry
-                    message = self.schema_registry_client.deserialize_sensor_reading(
-                        value_bytes, 
-                        self.topic_name
-                    )
-                    
-                    messages.append(message)
-                except Exception as e:
-                    log.error(f"Error deserializing message: {str(e)}")
-                    self.metrics.record_message_failed(error_type="deserialization_error")
-                    continue
+            batch = self.fetch_batch(batch_size=batch_size, timeout=timeout)
             
             # Process the batch of messages
-            if messages:
-                log.info(f"Consumed {len(messages)} Avro-serialized messages from topic: {self.topic_name}")
-                for message in messages:
-                    self.process_message(message)
+            if batch.records:
+                log.info(f"Consumed {len(batch.records)} Avro-serialized messages from topic: {self.topic_name}")
+                self.process_batch(batch)
                 
                 # Update queue size metric
-                self.metrics.set_queue_size(len(messages))
+                self.metrics.set_queue_size(len(batch.records))
             
-            return messages
+            return batch.records
             
         except KafkaException as e:
             log.error(f"Kafka error during batch consumption: {str(e)}")
@@ -241,6 +492,58 @@ class KafkaConsumer:
             self.metrics.record_message_failed(error_type=type(e).__name__)
             raise
     
+    def consume_batch_loop(self, process_batch_fn: Optional[Callable[[ConsumedBatch], None]] = None,
+                           batch_size: int = None, timeout: float = 1.0) -> None:
+        """
+        Start a continuous consumption loop that processes whole fetches.
+        
+        Each iteration makes one consume() call and hands all records it
+        returned to the batch processor, so per-message overhead (metrics,
+        exception handling, callbacks) is paid once per fetch.
+        
+        Args:
+            process_batch_fn: Optional function to process each ConsumedBatch, defaults to self.process_batch
+            batch_size: Maximum messages per fetch (defaults to consumer.consume_batch_size)
+            timeout: Consume timeout in seconds
+        """
+        try:
+            # Make sure we're subscribed
+            self.subscribe()
+            
+            processor = process_batch_fn if process_batch_fn is not None else self.process_batch
+            batch_size = batch_size or settings.consumer.consume_batch_size
+            
+            self.running = True
+            log.info(f"Starting batch consumption loop from topic: {self.topic_name} (up to {batch_size} messages per fetch)")
+            
+            while self.running:
+                self.last_poll_time = time.time()
+                batch = self.fetch_batch(batch_size=batch_size, timeout=timeout)
+                
+                # Batches without records still carry offsets of skipped messages
+                if not batch.message_count:
+                    continue
+                
+                self.last_batch = batch
+                try:
+                    processor(batch)
+                except Exception as e:
+                    log.error(f"Error processing batch of {len(batch.records)} messages: {str(e)}")
+                    self.metrics.record_message_failed(error_type=type(e).__name__)
+                    continue
+                
+        except KafkaException as e:
+            log.error(f"Kafka error during batch consumption loop: {str(e)}")
+            self.metrics.set_connection_status(False, "kafka")
+            if not self.running:
+                raise
+        except Exception as e:
+            log.error(f"Unexpected error during batch consumption loop: {str(e)}")
+            self.metrics.record_message_failed(error_type=type(e).__name__)
+            raise
+        finally:
+            self.close()
+    
     def consume_loop(self, process_fn: Optional[Callable[[Dict[str, Any]], None]] = None, timeout: float = 1.0) -> None:
         """
         Start a continuous consumption loop from Kafka topic.
@@ -265,6 +568,7 @@ class KafkaConsumer:
             
             # Main consumption loop
             while self.running:
+                self.last_poll_time = time.time()
                 msg = self.consumer.poll(timeout=timeout)
                 
                 # Skip message if it has errors
@@ -278,16 +582,17 @@ class KafkaConsumer:
                 )
                 
                 # Parse and process the message
+                self.last_message = msg
                 try:
                     # Deserialize with Schema Registry
-                    value_bytes = msg.value()
-                    message = self.schema_registry_client.deserialize_sensor_reading(
-                        value_bytes,
-                        self.topic_name
-                    )
+                    message = self.deserialize_message(msg)
                     
-                    # Process the deserialized message
-                    processor(message)
+                    # Process the deserialized message, or each reading of an envelope
+                    if isinstance(message, RuuviTagAdvertisement):
+                        for reading in message.readings():
+                            processor(reading)
+                    else:
+                        processor(message)
                     
                 except Exception as e:
                     log.error(f"Error processing message: {str(e)}")
@@ -321,13 +626,20 @@ class KafkaConsumer:
             try:
                 # Use auto commit interval from config or default to 5 seconds for final commit timeout
                 commit_timeout = self.conf.get('auto.commit.interval.ms', 5000) / 1000
+                commit_start = time.time()
                 self.consumer.commit(asynchronous=False)
+                self.metrics.record_commit_duration(time.time() - commit_start)
                 log.info("Final offsets committed successfully")
             except Exception as e:
                 log.warning(f"Error committing final offsets: {str(e)}")
                 
             self.consumer.close()
             log.info("Kafka consumer closed")
+        
+        # Stop deserialization workers
+        if getattr(self, 'deserialization_pool', None) is not None:
+            self.deserialization_pool.close()
+            self.deserialization_pool = None
             
         # Stop metrics server
         if hasattr(self, 'metrics_server'):
@@ -367,6 +679,38 @@ class IoTAlertConsumer(KafkaConsumer):
         # Record message received
         self.metrics.record_message_received()
         
+        if self._process_reading(message):
+            self.metrics.record_message_processed()
+    
+    def process_batch(self, batch: ConsumedBatch):
+        """
+        Process all readings of one fetch, updating the metrics once per batch.
+        
+        Args:
+            batch: Readings deserialized from one consume() call
+        """
+        start_time = time.time()
+        self.metrics.record_message_received(count=len(batch.records))
+        
+        processed = 0
+        for message in batch.records:
+            if self._process_reading(message):
+                processed += 1
+        
+        if processed:
+            self.metrics.record_message_processed(count=processed)
+        self.metrics.record_processing_time(time.time() - start_time, operation="batch_processing")
+    
+    def _process_reading(self, message) -> bool:
+        """
+        Generate alerts for a single sensor reading.
+        
+        Args:
+            message: Deserialized IoT sensor reading
+            
+        Returns:
+            True if the reading was processed, False if its value could not be handled
+        """
         device_id = message.get('device_id', 'unknown')
         device_type = message.get('device_type', 'unknown')
         value = message.get('value', 'unknown')
@@ -499,10 +843,11 @@ class IoTAlertConsumer(KafkaConsumer):
                         f"Tags: {tags_str}")
                 
             # Record successful processing
-            self.metrics.record_message_processed()
+            return True
             
         except (ValueError, TypeError) as e:
             # Handle case where value conversion fails
             log.error(f"Error processing value from device {device_id}: {str(e)}")
             log.info(f"Raw message: {message}")
-            self.metrics.record_message_failed(error_type="value_conversion_error")
\ No newline at end of file
+            self.metrics.record_message_failed(error_type="value_conversion_error")
+            return False
\ No newline at end of file
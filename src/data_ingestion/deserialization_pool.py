@@ -0,0 +1,234 @@
+"""
+Parallel deserialization of fetched Kafka message values.
+
+The values of one fetch are split into contiguous chunks that worker
+processes (or threads, on free-threaded Python builds) decode concurrently.
+Chunks are reassembled in submission order, so records come back in fetch
+order and per-partition ordering is preserved.
+
+Worker processes don't talk to the Schema Registry: the parent resolves the
+writer schemas of each fetch through its schema cache and sends them along
+with the chunks.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import struct
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+from src.utils.logger import log
+from src.utils.avro_codec import FastAvroDecoder
+
+
+# Confluent wire format header: magic byte and schema ID
+_HEADER = struct.Struct('>bI')
+
+# Per-process state of pool workers, set up by _init_worker
+_worker_decoder: Optional[FastAvroDecoder] = None
+_worker_schemas: Dict[int, str] = {}
+_worker_parsed: Dict[Optional[int], Any] = {}
+
+
+def free_threading_enabled() -> bool:
+    """
+    Check whether the interpreter runs without the GIL.
+    """
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def _fastavro_fallback(data: bytes, topic: str = None) -> Dict[str, Any]:
+    """
+    Decode a message whose writer schema the compiled decoder can't handle.
+    """
+    import fastavro
+
+    _, schema_id = _HEADER.unpack_from(data, 0)
+    if schema_id not in _worker_parsed:
+        _worker_parsed[schema_id] = fastavro.parse_schema(json.loads(_worker_schemas[schema_id]))
+    if None not in _worker_parsed:
+        _worker_parsed[None] = fastavro.parse_schema(json.loads(_worker_decoder.reader_schema_str))
+    return fastavro.schemaless_reader(io.BytesIO(data[_HEADER.size:]), _worker_parsed[schema_id], _worker_parsed[None])
+
+
+def _init_worker(reader_schema_str: str):
+    """
+    Create the decoder of a worker process.
+    """
+    global _worker_decoder
+    _worker_decoder = FastAvroDecoder(
+        reader_schema_str,
+        schema_fetcher=_worker_schemas.__getitem__,
+        fallback=_fastavro_fallback
+    )
+
+
+def _decode_chunk(payloads: List[bytes], schemas: Dict[int, str]) -> Tuple[List[Any], List[Tuple[int, str]], float]:
+    """
+    Decode a chunk of message values in a worker process.
+
+    Args:
+        payloads: Message values
+        schemas: Writer schema strings by schema ID for the values in the chunk
+
+    Returns:
+        Decoded records (None where decoding failed), (index, error) per failure, and decode time
+    """
+    _worker_schemas.update(schemas)
+    return _decode_with(_worker_decoder.decode, payloads)
+
+
+def _decode_with(decode: Callable[[bytes], Any], payloads: List[bytes]) -> Tuple[List[Any], List[Tuple[int, str]], float]:
+    """
+    Decode a chunk of message values with the given decode function.
+    """
+    start_time = time.perf_counter()
+    records = []
+    errors = []
+    for index, payload in enumerate(payloads):
+        try:
+            records.append(decode(payload))
+        except Exception as e:
+            records.append(None)
+            errors.append((index, str(e)))
+    return records, errors, time.perf_counter() - start_time
+
+
+class DeserializationPool:
+    """
+    Decodes the message values of a fetch in parallel chunks.
+
+    In process mode, workers return plain decoded dictionaries and from_dict
+    (e.g. CompactSensorReading.from_dict) runs in the parent, since plain
+    dictionaries are much cheaper to send between processes. Thread mode
+    shares decode_fn between the threads and only helps on free-threaded
+    builds. Fetches that fit in one chunk are decoded inline.
+    """
+
+    def __init__(
+        self,
+        decode_fn: Callable[[bytes], Any],
+        reader_schema_str: str,
+        schema_fetcher: Callable[[int], str],
+        from_dict: Callable[[Dict[str, Any]], Any] = None,
+        workers: int = None,
+        chunk_size: int = 100,
+        mode: str = "auto",
+        metrics=None
+    ):
+        """
+        Initialize the pool.
+
+        Args:
+            decode_fn: Decodes one message value in this process
+            reader_schema_str: Schema records are read as
+            schema_fetcher: Returns the writer schema string for a schema ID
+            from_dict: Optional conversion applied to records decoded by worker processes
+            workers: Number of workers (defaults to the number of CPUs)
+            chunk_size: Maximum number of values per chunk
+            mode: "process", "thread" or "auto" (threads on free-threaded builds, else processes)
+            metrics: Optional KafkaConsumerMetrics instance for queue depth and chunk decode time
+        """
+        self.decode_fn = decode_fn
+        self.reader_schema_str = reader_schema_str
+        self.schema_fetcher = schema_fetcher
+        self.from_dict = from_dict
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = max(1, chunk_size)
+        self.metrics = metrics
+
+        if mode == "auto":
+            mode = "thread" if free_threading_enabled() else "process"
+        if mode not in ("process", "thread"):
+            raise ValueError(f"Unknown deserialization pool mode: {mode}")
+        self.mode = mode
+
+        self._schemas: Dict[int, str] = {}
+        self._executor: Executor = self._create_executor()
+        log.info(f"Deserialization pool started with {self.workers} {self.mode} workers, "
+                 f"{self.chunk_size} messages per chunk")
+
+    def _create_executor(self) -> Executor:
+        if self.mode == "thread":
+            return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="deserializer")
+        # Forking would copy the librdkafka threads' state into the workers
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.reader_schema_str,)
+        )
+
+    def _writer_schemas(self, payloads: List[bytes]) -> Dict[int, str]:
+        """
+        Resolve the writer schemas referenced by a fetch.
+
+        Values without a valid header are left for the workers to reject.
+        """
+        schemas = {}
+        schema_ids = {_HEADER.unpack_from(payload)[1] for payload in payloads if payload and len(payload) > _HEADER.size}
+        for schema_id in schema_ids:
+            if schema_id not in self._schemas:
+                try:
+                    self._schemas[schema_id] = self.schema_fetcher(schema_id)
+                except Exception as e:
+                    log.error(f"Could not resolve writer schema {schema_id}: {str(e)}")
+                    continue
+            schemas[schema_id] = self._schemas[schema_id]
+        return schemas
+
+    def decode(self, payloads: List[bytes]) -> Tuple[List[Any], List[Tuple[int, str]]]:
+        """
+        Decode message values, preserving their order.
+
+        Args:
+            payloads: Message values in fetch order
+
+        Returns:
+            Decoded records in input order (None where decoding failed) and (index, error) per failure
+        """
+        if len(payloads) <= self.chunk_size:
+            records, errors, _ = _decode_with(self.decode_fn, payloads)
+            return records, errors
+
+        chunk_size = self.chunk_size
+        chunks = [payloads[start:start + chunk_size] for start in range(0, len(payloads), chunk_size)]
+
+        if self.mode == "process":
+            schemas = self._writer_schemas(payloads)
+            futures = [self._executor.submit(_decode_chunk, chunk, schemas) for chunk in chunks]
+        else:
+            futures = [self._executor.submit(_decode_with, self.decode_fn, chunk) for chunk in chunks]
+
+        if self.metrics:
+            self.metrics.set_deserialization_queue_depth(len(futures))
+
+        records: List[Any] = []
+        errors: List[Tuple[int, str]] = []
+        from_dict = self.from_dict if self.mode == "process" else None
+        for index, future in enumerate(futures):
+            chunk_records, chunk_errors, duration = future.result()
+            offset = index * chunk_size
+
+            if from_dict is not None:
+                chunk_records = [from_dict(record) if record is not None else None for record in chunk_records]
+            records.extend(chunk_records)
+            errors.extend((offset + position, error) for position, error in chunk_errors)
+
+            if self.metrics:
+                self.metrics.record_deserialization_chunk(duration)
+                self.metrics.set_deserialization_queue_depth(len(futures) - index - 1)
+
+        return records, errors
+
+    def close(self):
+        """
+        Shut down the workers.
+        """
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        log.info("Deserialization pool stopped")
@@ -1,4 +1,7 @@
-from typing import Dict, Any, List
+import time
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, List, Optional, Callable
 from confluent_kafka import Producer
 from confluent_kafka.admin import AdminClient, NewTopic
 from confluent_kafka import KafkaException
@@ -6,6 +9,8 @@ from confluent_kafka import KafkaException
 from src.utils.logger import log
 from src.config.config import settings
 from src.utils.schema_registry import schema_registry
+from src.utils.metrics import get_metrics_instance
+from src.utils.kafka_stats import KafkaStatsCollector
 
 class KafkaProducer:
     """
@@ -14,18 +19,25 @@ class KafkaProducer:
     This class handles the connection to a Kafka cluster, ensures the target
     topic exists with proper replication, and provides methods to publish
     IoT sensor data to the Kafka topic using Avro serialization.
+    
+    In pipelined mode a background thread serves delivery reports, sends
+    never wait for acknowledgements, and callers only block when more than
+    producer.max_in_flight_messages messages are unacknowledged. Flushing
+    happens on close() or an explicit flush().
     """
     
-    def __init__(self, bootstrap_servers: str = None, topic_name: str = None):
+    def __init__(self, bootstrap_servers: str = None, topic_name: str = None, envelope_topic_name: str = None):
         """
         Initialize Kafka producer with configuration for a multi-broker environment.
         
         Args:
             bootstrap_servers: Comma-separated list of broker addresses (host:port)
             topic_name: Name of the Kafka topic to produce messages to
+            envelope_topic_name: Optional topic for RuuviTag advertisement envelopes sent with send_envelope
         """
         self.bootstrap_servers = bootstrap_servers or settings.kafka.bootstrap_servers
         self.topic_name = topic_name or settings.kafka.topic_name
+        self.envelope_topic_name = envelope_topic_name
         
         # Get producer configuration from settings
         self.conf = settings.producer.get_config()
@@ -34,11 +46,34 @@ class KafkaProducer:
         if bootstrap_servers:
             self.conf['bootstrap.servers'] = bootstrap_servers
         
+        self.metrics = get_metrics_instance("producer")
+        
+        # Export librdkafka statistics; they are delivered from poll()
+        if settings.kafka.statistics_interval_ms > 0:
+            self.conf['statistics.interval.ms'] = settings.kafka.statistics_interval_ms
+            self.conf['stats_cb'] = KafkaStatsCollector(self.metrics)
+        
         # Create producer instance
         self.producer = Producer(self.conf)
         log.info(f"Kafka producer initialized with bootstrap servers: {self.bootstrap_servers}")
         log.debug(f"Producer configuration: {self.conf}")
         
+        # Delivery accounting; the condition is notified on every delivery report
+        self.pipelined = settings.producer.pipelined
+        self.max_in_flight = settings.producer.max_in_flight_messages
+        self._window = threading.Condition()
+        self.in_flight = 0
+        self.delivered = 0
+        self.failed = 0
+        self.backpressure_waits = 0
+        self._published_delivered = 0
+        
+        # Background delivery report poller for pipelined mode
+        self._polling = False
+        self._poller = None
+        if self.pipelined:
+            self._start_poller()
+        
         # Schema Registry
         self.schema_registry_client = schema_registry
         log.info("Schema Registry client initialized for producer")
@@ -48,6 +83,8 @@ class KafkaProducer:
         
         # Ensure the topic exists with proper replication
         self._ensure_topic_exists()
+        if self.envelope_topic_name:
+            self._ensure_topic_exists(self.envelope_topic_name)
     
     def _register_schema(self):
         """
@@ -60,15 +97,31 @@ class KafkaProducer:
                 self.schema_registry_client.sensor_schema_str
             )
             log.info(f"Registered schema for subject {subject} with ID: {schema_id}")
+            
+            # Resolve the schema ID and compile the encoder once instead of per message
+            self.schema_registry_client.prepare_sensor_encoder(self.topic_name)
+            
+            if self.envelope_topic_name:
+                envelope_subject = f"{self.envelope_topic_name}-value"
+                schema_id = self.schema_registry_client.register_schema(
+                    envelope_subject,
+                    self.schema_registry_client.envelope_schema_str
+                )
+                log.info(f"Registered schema for subject {envelope_subject} with ID: {schema_id}")
+                self.schema_registry_client.prepare_envelope_encoder(self.envelope_topic_name)
         except Exception as e:
             log.error(f"Error registering schema: {str(e)}")
             raise
     
-    def _ensure_topic_exists(self) -> None:
+    def _ensure_topic_exists(self, topic_name: str = None) -> None:
         """
         Ensure that the Kafka topic exists with proper settings for a multi-broker environment.
         Creates the topic if it doesn't exist yet.
+        
+        Args:
+            topic_name: Topic to check (defaults to the producer's topic)
         """
+        topic_name = topic_name or self.topic_name
         try:
             # Get replication factor and partitions from settings
             num_partitions = settings.kafka.partitions
@@ -82,8 +135,8 @@ class KafkaProducer:
             # Check if topic already exists
             topics = admin_client.list_topics(timeout=10)
             
-            if self.topic_name not in topics.topics:
-                log.info(f"Topic {self.topic_name} does not exist. Creating it with {num_partitions} " +
+            if topic_name not in topics.topics:
+                log.info(f"Topic {topic_name} does not exist. Creating it with {num_partitions} " +
                          f"partitions and replication factor {replication_factor}...")
                 
                 # Convert topic config dict to the format expected by NewTopic
@@ -97,7 +150,7 @@ class KafkaProducer:
                 
                 topic_list = [
                     NewTopic(
-                        self.topic_name,
+                        topic_name,
                         num_partitions=num_partitions,
                         replication_factor=replication_factor,
                         config=config
@@ -116,9 +169,9 @@ class KafkaProducer:
                         log.error(f"Failed to create topic {topic}: {str(e)}")
             else:
                 # Topic exists, log its configuration
-                topic_metadata = topics.topics[self.topic_name]
+                topic_metadata = topics.topics[topic_name]
                 partitions_count = len(topic_metadata.partitions)
-                log.info(f"Topic {self.topic_name} already exists with {partitions_count} partitions")
+                log.info(f"Topic {topic_name} already exists with {partitions_count} partitions")
                 
                 # Check replication
                 replication_counts = [len(p.replicas) for p in topic_metadata.partitions.values()]
@@ -128,6 +181,31 @@ class KafkaProducer:
             log.warning(f"Kafka operation failed: {str(e)}")
             log.info("Will continue and try to use the topic even if we couldn't verify its existence")
     
+    def _start_poller(self):
+        """
+        Start the thread that serves delivery reports.
+        """
+        def poll_deliveries():
+            while self._polling:
+                self.producer.poll(settings.producer.poll_interval)
+                self._publish_delivery_metrics()
+        
+        self._polling = True
+        self._poller = threading.Thread(target=poll_deliveries, name="producer-poller", daemon=True)
+        self._poller.start()
+    
+    def _publish_delivery_metrics(self):
+        """
+        Export delivery counters gathered by the delivery report callback.
+        """
+        with self._window:
+            delivered = self.delivered - self._published_delivered
+            self._published_delivered = self.delivered
+            in_flight = self.in_flight
+        if delivered:
+            self.metrics.record_message_sent(topic=self.topic_name, count=delivered)
+        self.metrics.set_in_flight_messages(in_flight)
+    
     def _delivery_report(self, err, msg) -> None:
         """
         Delivery report callback for produced messages.
@@ -137,52 +215,167 @@ class KafkaProducer:
             err: Error (or None if success)
             msg: Message object
         """
+        with self._window:
+            self.in_flight -= 1
+            if err is None:
+                self.delivered += 1
+            else:
+                self.failed += 1
+            self._window.notify()
+        
         if err is not None:
             log.error(f"Message delivery failed: {err}")
+            self.metrics.record_send_failure(topic=msg.topic(), error_type=err.name())
         else:
             # For verbose logging, uncomment this line
             # log.debug(f"Message delivered to {msg.topic()} [{msg.partition()}] at offset {msg.offset()}")
             pass
     
-    def send_message(self, message: Dict[str, Any], key: str = None) -> None:
+    def _acquire_slot(self):
+        """
+        Reserve a place in the in-flight window, waiting while it is full.
+        
+        Raises:
+            BufferError: If no delivery report frees a place within producer.backpressure_timeout
+        """
+        with self._window:
+            if self.pipelined and self.in_flight >= self.max_in_flight:
+                self.backpressure_waits += 1
+                if not self._window.wait_for(lambda: self.in_flight < self.max_in_flight,
+                                             timeout=settings.producer.backpressure_timeout):
+                    raise BufferError(f"{self.in_flight} messages still unacknowledged after "
+                                      f"{settings.producer.backpressure_timeout}s")
+            self.in_flight += 1
+    
+    def _release_slot(self):
+        with self._window:
+            self.in_flight -= 1
+            self._window.notify()
+    
+    def _produce(self, key_bytes: Optional[bytes], value_bytes: bytes, callback: Callable, topic: str = None) -> None:
+        """
+        Hand a serialized message to librdkafka, applying backpressure.
+        
+        When librdkafka's local queue is full, delivery reports are served
+        until it has room again instead of flushing everything.
+        """
+        self._acquire_slot()
+        deadline = None
+        while True:
+            try:
+                self.producer.produce(
+                    topic=topic or self.topic_name,
+                    key=key_bytes,
+                    value=value_bytes,
+                    callback=callback
+                )
+                break
+            except BufferError:
+                if deadline is None:
+                    log.warning("Producer queue is full. Waiting for deliveries...")
+                    deadline = time.time() + settings.producer.backpressure_timeout
+                    with self._window:
+                        self.backpressure_waits += 1
+                if time.time() >= deadline:
+                    self._release_slot()
+                    raise
+                if self.pipelined:
+                    with self._window:
+                        self._window.wait(timeout=0.1)
+                else:
+                    self.producer.poll(0.1)
+            except Exception:
+                self._release_slot()
+                raise
+        
+        if not self.pipelined:
+            # Serve delivery callback queue (non-blocking)
+            self.producer.poll(0)
+    
+    def _encode(self, message: Dict[str, Any], key: str, value_bytes: Optional[bytes]):
+        """
+        Get the key and value bytes of a message.
+        """
+        # Use device_id as the key if not specified
+        if key is None and 'device_id' in message:
+            key = message['device_id']
+        
+        # Convert key to bytes if it's a string
+        key_bytes = key.encode('utf-8') if isinstance(key, str) else None
+        
+        # Serialize the message using Avro and Schema Registry
+        if value_bytes is None:
+            value_bytes = self.schema_registry_client.serialize_sensor_reading(message, self.topic_name)
+        
+        return key_bytes, value_bytes
+    
+    def send_message(self, message: Dict[str, Any], key: str = None, value_bytes: bytes = None) -> None:
         """
         Send a single message to Kafka topic with Avro serialization.
         
         Args:
             message: Dictionary containing the message data
             key: Optional key for partitioning (defaults to device_id from message)
+            value_bytes: Already serialized message, e.g. from serialize_many
         """
         try:
-            # Use device_id as the key if not specified
-            if key is None and 'device_id' in message:
-                key = message['device_id']
+            key_bytes, value_bytes = self._encode(message, key, value_bytes)
+            self._produce(key_bytes, value_bytes, self._delivery_report)
+        except BufferError as e:
+            log.error(f"Dropping message, producer queue stayed full: {str(e)}")
+            self.metrics.record_send_failure(topic=self.topic_name, error_type="backpressure_timeout")
+        except Exception as e:
+            log.error(f"Error sending message to Kafka: {str(e)}")
+    
+    def send_message_async(self, message: Dict[str, Any], key: str = None, value_bytes: bytes = None) -> Future:
+        """
+        Send a single message and get a future for its delivery.
+        
+        Args:
+            message: Dictionary containing the message data
+            key: Optional key for partitioning (defaults to device_id from message)
+            value_bytes: Already serialized message
             
-            # Convert key to bytes if it's a string
+        Returns:
+            Future resolved with the delivered message, or failed with the KafkaException
+        """
+        future = Future()
+        
+        def on_delivery(err, msg):
+            self._delivery_report(err, msg)
+            if err is None:
+                future.set_result(msg)
+            else:
+                future.set_exception(KafkaException(err))
+        
+        try:
+            key_bytes, value_bytes = self._encode(message, key, value_bytes)
+            self._produce(key_bytes, value_bytes, on_delivery)
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    
+    def send_envelope(self, advertisement: Dict[str, Any], key: str = None) -> None:
+        """
+        Send a RuuviTag advertisement envelope to the envelope topic.
+        
+        Args:
+            advertisement: RuuviTagAdvertisement or advertisement dictionary
+            key: Optional key for partitioning (defaults to the RuuviTag MAC address)
+        """
+        if not self.envelope_topic_name:
+            raise ValueError("Producer was created without an envelope topic")
+        
+        try:
+            key = key if key is not None else advertisement.get('device_id')
             key_bytes = key.encode('utf-8') if isinstance(key, str) else None
-            
-            # Serialize the message using Avro and Schema Registry
-            value_bytes = self.schema_registry_client.serialize_sensor_reading(message, self.topic_name)
-            
-            # Produce the message
-            self.producer.produce(
-                topic=self.topic_name,
-                key=key_bytes,
-                value=value_bytes,
-                callback=self._delivery_report
-            )
-            
-            # Serve delivery callback queue (non-blocking)
-            self.producer.poll(0)
-            
-        except BufferError:
-            # Handle case where producer queue is full
-            log.warning("Producer queue is full. Waiting for queue to drain...")
-            self.producer.flush(5)  # Wait up to 5 seconds for messages to be sent
-            
-            # Try again after flushing
-            self.send_message(message, key)
+            value_bytes = self.schema_registry_client.serialize_envelope(advertisement, self.envelope_topic_name)
+            self._produce(key_bytes, value_bytes, self._delivery_report, topic=self.envelope_topic_name)
+        except BufferError as e:
+            log.error(f"Dropping envelope, producer queue stayed full: {str(e)}")
+            self.metrics.record_send_failure(topic=self.envelope_topic_name, error_type="backpressure_timeout")
         except Exception as e:
-            log.error(f"Error sending message to Kafka: {str(e)}")
+            log.error(f"Error sending envelope to Kafka: {str(e)}")
     
     def send_batch(self, messages: List[Dict[str, Any]]) -> None:
         """
@@ -195,23 +388,62 @@ class KafkaProducer:
         Args:
             messages: List of dictionaries containing the message data
         """
+        try:
+            values = self.schema_registry_client.serialize_many(messages, self.topic_name)
+        except Exception as e:
+            log.error(f"Error serializing batch, sending messages one by one: {str(e)}")
+            values = [None] * len(messages)
+        
         device_count = {}
-        for message in messages:
-            self.send_message(message)
+        for message, value_bytes in zip(messages, values):
+            self.send_message(message, value_bytes=value_bytes)
             
             # Count messages per device for logging
             device_id = message.get('device_id', 'unknown')
             device_count[device_id] = device_count.get(device_id, 0) + 1
         
-        # Flush to ensure all messages are sent
-        # Longer timeout to account for multiple brokers
-        flush_timeout = settings.producer.message_timeout_ms / 1000 * 3  # Convert ms to seconds and triple it
-        self.producer.flush(timeout=flush_timeout)
+        self.metrics.record_batch_size(len(messages))
+        
+        if not self.pipelined:
+            # Flush to ensure all messages are sent
+            # Longer timeout to account for multiple brokers
+            flush_timeout = settings.producer.message_timeout_ms / 1000 * 3  # Convert ms to seconds and triple it
+            self.flush(timeout=flush_timeout)
         
         # Log summary of sent messages
         unique_devices = len(device_count)
         total_messages = sum(device_count.values())
-        log.info(f"Batch of {total_messages} Avro-serialized messages from {unique_devices} devices sent to Kafka topic: {self.topic_name}")
+        log.info(f"Batch of {total_messages} Avro-serialized messages from {unique_devices} devices "
+                 f"{'queued for' if self.pipelined else 'sent to'} Kafka topic: {self.topic_name}")
+    
+    def flush(self, timeout: float = None) -> int:
+        """
+        Wait until all in-flight messages are delivered or the timeout expires.
+        
+        Args:
+            timeout: Maximum time to wait in seconds (None waits indefinitely)
+            
+        Returns:
+            Number of messages still in flight
+        """
+        remaining = self.producer.flush(timeout) if timeout is not None else self.producer.flush()
+        self._publish_delivery_metrics()
+        return remaining
+    
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get delivery counters.
+        
+        Returns:
+            Dictionary with in-flight, delivered and failed message counts and backpressure waits
+        """
+        with self._window:
+            return {
+                'in_flight': self.in_flight,
+                'delivered': self.delivered,
+                'failed': self.failed,
+                'backpressure_waits': self.backpressure_waits
+            }
     
     def close(self) -> None:
         """
@@ -219,5 +451,11 @@ class KafkaProducer:
         Always call this method when done with the producer to ensure all messages are sent.
         """
         log.info("Closing Kafka producer, flushing any pending messages...")
-        self.producer.flush(timeout=30.0)  # Give plenty of time for pending messages to be sent
-        log.info("Kafka producer closed")
\ No newline at end of file
+        if self._poller is not None:
+            self._polling = False
+            self._poller.join(timeout=5)
+            self._poller = None
+        remaining = self.flush(timeout=30.0)  # Give plenty of time for pending messages to be sent
+        if remaining:
+            log.warning(f"{remaining} messages were not delivered before closing")
+        log.info(f"Kafka producer closed: {self.get_stats()}")
\ No newline at end of file
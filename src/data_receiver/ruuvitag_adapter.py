@@ -16,6 +16,7 @@ from typing import Dict, Any, List, Optional
 from src.utils.logger import log
 from src.config.config import settings
 from src.data_ingestion.producer import KafkaProducer
+from src.data_storage.models import CompactSensorReading, RuuviTagAdvertisement, RUUVITAG_MEASUREMENTS
 from src.utils.metrics import get_metrics_instance, MetricsServer, timed_operation
 
 
@@ -51,6 +52,13 @@ class MetricsAwareRuuviTagAdapter:
         self.client_id = client_id or settings.mqtt.client_id
         self.qos = settings.mqtt.qos
         self.keep_alive = settings.mqtt.keep_alive
+        
+        # One record per measurement, one envelope per advertisement, or both while consumers migrate
+        self.message_format = settings.ruuvitag.message_format
+        if self.message_format not in ("readings", "envelope", "dual"):
+            raise ValueError(f"Unknown RuuviTag message format: {self.message_format}")
+        self.send_readings = self.message_format in ("readings", "dual")
+        self.send_envelopes = self.message_format in ("envelope", "dual")
 
         # Initialize metrics
         self.metrics = get_metrics_instance("adapter")
@@ -73,7 +81,9 @@ class MetricsAwareRuuviTagAdapter:
 
         # Create Kafka producer for sending data with exception handling
         try:
-            self.kafka_producer = KafkaProducer()
+            self.kafka_producer = KafkaProducer(
+                envelope_topic_name=settings.kafka.envelope_topic_name if self.send_envelopes else None
+            )
             log.info("Kafka producer initialized successfully")
             self.metrics.set_connection_status(True, "kafka")
         except Exception as e:
@@ -91,6 +101,7 @@ class MetricsAwareRuuviTagAdapter:
         self.metrics.set_connection_status(False, "mqtt")  # Will be set to True on successful connect
 
         log.info(f"RuuviTag adapter with metrics initialized: {self.mqtt_broker}:{self.mqtt_port}")
+        log.info(f"Publishing RuuviTag data as {self.message_format}")
 
     def on_connect(self, client, userdata, flags, rc):
         """
@@ -157,54 +168,25 @@ class MetricsAwareRuuviTagAdapter:
             self.message_count += 1
             
             # Process and adapt data for Kafka with metrics
-            kafka_messages = self.adapt_ruuvitag_data_with_metrics(data)
+            advertisement = self.build_advertisement(data)
 
-            # Send each message to Kafka with detailed metrics
-            if kafka_messages:
-                log.debug(f"Sending {len(kafka_messages)} separate sensor readings to Kafka")
-                
-                successful_sends = 0
-                for kafka_message in kafka_messages:
-                    try:
-                        send_start = time.time()
-                        self.kafka_producer.send_message(kafka_message)
-                        send_duration = time.time() - send_start
-                        
-                        # Record successful send metrics
-                        self.metrics.record_message_sent(topic=settings.kafka.topic_name)
-                        self.metrics.record_send_duration(send_duration, topic=settings.kafka.topic_name)
-                        self.metrics.record_message_processed()
-                        successful_sends += 1
-                        
-                    except Exception as e:
-                        log.error(f"Failed to send Kafka message: {e}")
-                        self.metrics.record_send_failure(
-                            topic=settings.kafka.topic_name,
-                            error_type=type(e).__name__
-                        )
-                        self.metrics.record_message_failed(error_type=type(e).__name__)
+            if advertisement is not None:
+                if self.send_envelopes:
+                    self._send_envelope(advertisement)
+
+                if self.send_readings:
+                    kafka_messages = self._readings_from_advertisement(advertisement)
+                    if kafka_messages:
+                        self._send_readings(kafka_messages)
 
                 # Update device tracking and metrics
-                if kafka_messages:
-                    parent_device_id = kafka_messages[0].get('device_metadata', {}).get('parent_device', 'unknown')
-                    device_id = kafka_messages[0].get('device_id', 'unknown')
-                    
-                    # Store in devices dictionary
-                    if device_id:
-                        self.devices[device_id] = {
-                            'last_seen': datetime.now(),
-                            'data': kafka_messages[0],
-                            'parent_device': parent_device_id
-                        }
-                    
-                    # Update metrics for unique devices seen
-                    unique_parent_devices = len(set(
-                        device_data.get('parent_device', 'unknown') 
-                        for device_data in self.devices.values()
-                    ))
-                    self.metrics.set_ruuvitag_devices_count(unique_parent_devices)
-                
-                log.debug(f"Successfully processed {successful_sends}/{len(kafka_messages)} sensor readings")
+                device_id = advertisement.device_id
+                self.devices[device_id] = {
+                    'last_seen': datetime.now(),
+                    'data': advertisement,
+                    'parent_device': device_id
+                }
+                self.metrics.set_ruuvitag_devices_count(len(self.devices))
                 
             else:
                 log.warning(f"Failed to adapt message: {payload[:100]}...")
@@ -225,16 +207,79 @@ class MetricsAwareRuuviTagAdapter:
             log.error(traceback.format_exc())
             self.metrics.record_message_failed(error_type=type(e).__name__)
 
+    def _send_envelope(self, advertisement: RuuviTagAdvertisement):
+        """
+        Send one advertisement envelope to Kafka with metrics.
+
+        Args:
+            advertisement: Adapted RuuviTag advertisement
+        """
+        topic = self.kafka_producer.envelope_topic_name
+        try:
+            send_start = time.time()
+            self.kafka_producer.send_envelope(advertisement)
+            send_duration = time.time() - send_start
+
+            self.metrics.record_message_sent(topic=topic)
+            self.metrics.record_send_duration(send_duration, topic=topic)
+            self.metrics.record_message_processed()
+
+        except Exception as e:
+            log.error(f"Failed to send Kafka envelope: {e}")
+            self.metrics.record_send_failure(topic=topic, error_type=type(e).__name__)
+            self.metrics.record_message_failed(error_type=type(e).__name__)
+
+    def _send_readings(self, kafka_messages: List[CompactSensorReading]):
+        """
+        Send the sensor readings of one advertisement to Kafka with metrics.
+
+        Args:
+            kafka_messages: Sensor readings, one per measurement
+        """
+        log.debug(f"Sending {len(kafka_messages)} separate sensor readings to Kafka")
+        
+        # Serialize all readings of the advertisement in one pass
+        try:
+            values = self.kafka_producer.schema_registry_client.serialize_many(
+                kafka_messages, self.kafka_producer.topic_name
+            )
+        except Exception as e:
+            log.error(f"Failed to serialize sensor readings as a batch: {e}")
+            values = [None] * len(kafka_messages)
+        
+        successful_sends = 0
+        for kafka_message, value_bytes in zip(kafka_messages, values):
+            try:
+                send_start = time.time()
+                self.kafka_producer.send_message(kafka_message, value_bytes=value_bytes)
+                send_duration = time.time() - send_start
+                
+                # Record successful send metrics
+                self.metrics.record_message_sent(topic=settings.kafka.topic_name)
+                self.metrics.record_send_duration(send_duration, topic=settings.kafka.topic_name)
+                self.metrics.record_message_processed()
+                successful_sends += 1
+                
+            except Exception as e:
+                log.error(f"Failed to send Kafka message: {e}")
+                self.metrics.record_send_failure(
+                    topic=settings.kafka.topic_name,
+                    error_type=type(e).__name__
+                )
+                self.metrics.record_message_failed(error_type=type(e).__name__)
+        
+        log.debug(f"Successfully processed {successful_sends}/{len(kafka_messages)} sensor readings")
+
     @timed_operation(get_metrics_instance("adapter"), "data_adaptation")
-    def adapt_ruuvitag_data_with_metrics(self, ruuvitag_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def build_advertisement(self, ruuvitag_data: Dict[str, Any]) -> Optional[RuuviTagAdvertisement]:
         """
-        Adapt RuuviTag data to match the Kafka schema with comprehensive metrics tracking.
+        Adapt RuuviTag data into one advertisement envelope with metrics tracking.
 
         Args:
             ruuvitag_data: Raw data from RuuviTag via ESP32
 
         Returns:
-            List of adapted data matching Kafka schema, one entry per sensor type
+            RuuviTagAdvertisement with every known measurement, or None if the data is invalid
         """
 
         try:
@@ -247,142 +292,78 @@ class MetricsAwareRuuviTagAdapter:
                 if field not in ruuvitag_data:
                     log.warning(f"Missing required field in RuuviTag data: {field}")
                     self.metrics.record_validation_failure("missing_device_id")
-                    return []
+                    return None
                 
             # Get device ID (MAC address)
             device_id = ruuvitag_data['device_id']
 
-            # Handle timestamp
-            iso_timestamp = self._get_timestamp(ruuvitag_data)
-
-            # List to hold all messages
-            kafka_messages = []
-
-            # Common properties
-            common_properties = {
-                "location": settings.ruuvitag.default_location,
-                "battery_level": self._calculate_battery_level(self._safe_float(ruuvitag_data.get('battery_voltage', 0))),
-                "signal_strength": settings.ruuvitag.signal_strength,
-                "firmware_version": settings.ruuvitag.firmware_version,
-                "timestamp": iso_timestamp,
-                "status": "ACTIVE",
-                "maintenance_date": None
-            }
-
-            # Define sensor mapping
-            sensor_mapping = [
-                {
-                    "field": "temperature",
-                    "device_type": "temperature_sensor",
-                    "unit": "°C",
-                    "tags": ["ruuvitag", "ble", "temperature"],
-                },
-                {
-                    "field": "humidity",
-                    "device_type": "humidity_sensor",
-                    "unit": "%",
-                    "tags": ["ruuvitag", "ble", "humidity"],
-                },
-                {
-                    "field": "pressure",
-                    "device_type": "pressure_sensor",
-                    "unit": "Pa",
-                    "tags": ["ruuvitag", "ble", "pressure"],
-                },
-                {
-                    "field": "acceleration_x",
-                    "device_type": "acceleration_sensor",
-                    "unit": "g",
-                    "tags": ["ruuvitag", "ble", "acceleration", "x-axis"],
-                    "metadata_extra": {"axis": "x", "sensor_type": "acceleration"}
-                },
-                {
-                    "field": "acceleration_y",
-                    "device_type": "acceleration_sensor",
-                    "unit": "g",
-                    "tags": ["ruuvitag", "ble", "acceleration", "y-axis"],
-                    "metadata_extra": {"axis": "y", "sensor_type": "acceleration"}
-                },
-                {
-                    "field": "acceleration_z",
-                    "device_type": "acceleration_sensor",
-                    "unit": "g",
-                    "tags": ["ruuvitag", "ble", "acceleration", "z-axis"],
-                    "metadata_extra": {"axis": "z", "sensor_type": "acceleration"}
-                },
-                {
-                    "field": "battery_voltage",
-                    "device_type": "battery_sensor",
-                    "unit": "V",
-                    "tags": ["ruuvitag", "ble", "battery"],
-                },
-                {
-                    "field": "tx_power",
-                    "device_type": "transmit_power_sensor",
-                    "unit": "dBm",
-                    "tags": ["ruuvitag", "ble", "tx_power"],
-                },
-                {
-                    "field": "movement_counter",
-                    "device_type": "movement_sensor",
-                    "unit": "count",
-                    "tags": ["ruuvitag", "ble", "movement"],
-                }
-            ]
-
-            # Process each sensor mapping with validation
-            for mapping in sensor_mapping:
-                field = mapping["field"]
-                if field in ruuvitag_data:
-                    value = self._safe_float(ruuvitag_data[field])
-
-                    # Create device ID for this specific sensor
-                    sensor_device_id = f"{device_id}_{field}"
-
-                    # Build device metadata
-                    device_metadata = {
-                        "parent_device": device_id,
-                        "sensor_type": field
-                    }
-
-                    # Add any extra metadata specified in the mapping
-                    if "metadata_extra" in mapping:
-                        device_metadata.update(mapping["metadata_extra"])
-
-                    # Detect anomalies and update metrics
-                    is_anomaly = self._detect_anomaly({field: value})
-                    if is_anomaly:
-                        self.metrics.record_anomaly_detected(
-                            device_type=mapping["device_type"]
-                        )
-
-                    # Create message for this sensor
-                    sensor_message = {
-                        "device_id": sensor_device_id,
-                        "device_type": mapping["device_type"],
-                        "value": value,
-                        "unit": mapping["unit"],
-                        "is_anomaly": is_anomaly,
-                        "device_metadata": device_metadata,
-                        "tags": mapping["tags"],
-                    }
-
-                    # Add common properties
-                    sensor_message.update(common_properties)
-
-                    # Validate the final message
-                    if self._validate_sensor_message(sensor_message):
-                        kafka_messages.append(sensor_message)
-                    else:
-                        self.metrics.record_validation_failure("invalid_sensor_message")
-
-            return kafka_messages
+            measurements = {}
+            anomalies = []
+            for field, device_type, _, _, _ in RUUVITAG_MEASUREMENTS:
+                if field not in ruuvitag_data:
+                    continue
+                value = self._safe_float(ruuvitag_data[field])
+                measurements[field] = value
+
+                # Detect anomalies and update metrics
+                if self._detect_anomaly({field: value}):
+                    anomalies.append(field)
+                    self.metrics.record_anomaly_detected(device_type=device_type)
+
+            if not measurements:
+                log.warning(f"No known measurements in RuuviTag data from {device_id}")
+                return None
+
+            return RuuviTagAdvertisement(
+                device_id=device_id,
+                timestamp=self._get_timestamp(ruuvitag_data),
+                measurements=measurements,
+                anomalies=anomalies,
+                location=settings.ruuvitag.default_location,
+                battery_level=self._calculate_battery_level(self._safe_float(ruuvitag_data.get('battery_voltage', 0))),
+                signal_strength=settings.ruuvitag.signal_strength,
+                firmware_version=settings.ruuvitag.firmware_version,
+                status="ACTIVE"
+            )
         
         except Exception as e:
             log.error(f"Error adapting RuuviTag data: {e}")
             log.error(traceback.format_exc())
             self.metrics.record_message_failed(error_type=type(e).__name__)
+            return None
+
+    def _readings_from_advertisement(self, advertisement: RuuviTagAdvertisement) -> List[CompactSensorReading]:
+        """
+        Expand an advertisement into validated sensor readings, one per measurement.
+
+        Args:
+            advertisement: Adapted RuuviTag advertisement
+
+        Returns:
+            Sensor readings that passed validation
+        """
+        kafka_messages = []
+        for reading in advertisement.readings():
+            if self._validate_sensor_message(reading):
+                kafka_messages.append(reading)
+            else:
+                self.metrics.record_validation_failure("invalid_sensor_message")
+        return kafka_messages
+
+    def adapt_ruuvitag_data_with_metrics(self, ruuvitag_data: Dict[str, Any]) -> List[CompactSensorReading]:
+        """
+        Adapt RuuviTag data to match the Kafka schema with comprehensive metrics tracking.
+
+        Args:
+            ruuvitag_data: Raw data from RuuviTag via ESP32
+
+        Returns:
+            List of adapted data matching Kafka schema, one entry per sensor type
+        """
+        advertisement = self.build_advertisement(ruuvitag_data)
+        if advertisement is None:
             return []
+        return self._readings_from_advertisement(advertisement)
 
     def _validate_sensor_message(self, message: Dict[str, Any]) -> bool:
         """
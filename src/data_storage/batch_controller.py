@@ -0,0 +1,228 @@
+"""
+Adaptive batch sizing for the TimescaleDB sink.
+"""
+
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+from src.utils.logger import log
+
+
+class AdaptiveBatchController:
+    """
+    AIMD controller that resizes sink batches from observed latency, throughput and lag.
+
+    Every few batches the controller looks at the p99 end-to-end latency
+    (reading timestamp to commit), the database insert rate and the consumer
+    lag, then:
+    - halves the batch size when an increase made inserts slower
+      (multiplicative decrease)
+    - grows it by a fixed step while there is a backlog; p99 is ignored then,
+      because backlogged readings are already old when they are consumed
+    - halves it when p99 exceeds the target
+    - grows it when batches fill up well within the latency budget
+      (additive increase)
+    - otherwise keeps it unchanged
+
+    The commit interval follows the batch size between its configured bounds
+    and never exceeds half of the latency target, so quiet periods still
+    commit promptly.
+    """
+
+    def __init__(
+        self,
+        initial_batch_size: int,
+        min_batch_size: int,
+        max_batch_size: int,
+        min_commit_interval: float,
+        max_commit_interval: float,
+        target_p99_latency: float,
+        additive_step: int = 50,
+        decrease_factor: float = 0.5,
+        lag_threshold: int = 5000,
+        evaluation_batches: int = 5,
+        window_size: int = 200,
+        metrics=None
+    ):
+        """
+        Initialize the controller.
+
+        Args:
+            initial_batch_size: Starting batch size
+            min_batch_size: Lower bound for the batch size
+            max_batch_size: Upper bound for the batch size
+            min_commit_interval: Commit interval used at the minimum batch size (seconds)
+            max_commit_interval: Commit interval used at the maximum batch size (seconds)
+            target_p99_latency: Target p99 end-to-end latency in seconds
+            additive_step: Rows added per increase
+            decrease_factor: Multiplier applied on decrease
+            lag_threshold: Consumer lag (messages) treated as a backlog
+            evaluation_batches: Batches observed between decisions
+            window_size: Number of recent batches used for latency percentiles
+            metrics: Optional TimescaleDBSinkMetrics instance
+        """
+        self.min_batch_size = max(1, min_batch_size)
+        self.max_batch_size = max(self.min_batch_size, max_batch_size)
+        self.min_commit_interval = min_commit_interval
+        self.max_commit_interval = max(min_commit_interval, max_commit_interval)
+        self.target_p99_latency = target_p99_latency
+        self.additive_step = max(1, additive_step)
+        self.decrease_factor = decrease_factor
+        self.lag_threshold = lag_threshold
+        self.evaluation_batches = max(1, evaluation_batches)
+        self.metrics = metrics
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window_size)
+        self._fill_ratios = deque(maxlen=evaluation_batches)
+        self._batches_since_decision = 0
+        self._insert_rate = None
+        self._rate_before_increase = None
+        self._consumer_lag = 0
+
+        self.batch_size = min(max(initial_batch_size, self.min_batch_size), self.max_batch_size)
+        self.commit_interval = self._interval_for(self.batch_size)
+        self.last_decision = 'hold'
+        self.decisions = {}
+
+        self._publish()
+
+    def _interval_for(self, batch_size: int) -> float:
+        """
+        Scale the commit interval with the batch size, capped by the latency budget.
+        """
+        span = self.max_batch_size - self.min_batch_size
+        fraction = (batch_size - self.min_batch_size) / span if span else 0.0
+        interval = self.min_commit_interval + fraction * (self.max_commit_interval - self.min_commit_interval)
+        return max(self.min_commit_interval, min(interval, self.target_p99_latency / 2))
+
+    def observe_lag(self, lag: int):
+        """
+        Record the latest total consumer lag in messages.
+
+        Args:
+            lag: Messages between the committed position and the high watermark
+        """
+        with self._lock:
+            self._consumer_lag = max(0, lag)
+
+    def record_batch(self, size: int, insert_seconds: float, latency_seconds: Optional[float]) -> Optional[str]:
+        """
+        Record a committed batch and resize if an evaluation is due.
+
+        Args:
+            size: Number of readings in the batch
+            insert_seconds: Time spent in the database insert
+            latency_seconds: End-to-end latency of the oldest reading in the batch
+
+        Returns:
+            The decision taken, or None if no evaluation was due
+        """
+        with self._lock:
+            if latency_seconds is not None:
+                self._latencies.append(latency_seconds)
+            self._fill_ratios.append(size / self.batch_size)
+
+            if insert_seconds > 0:
+                rate = size / insert_seconds
+                self._insert_rate = rate if self._insert_rate is None else 0.7 * self._insert_rate + 0.3 * rate
+
+            self._batches_since_decision += 1
+            if self._batches_since_decision < self.evaluation_batches:
+                return None
+            self._batches_since_decision = 0
+
+            decision = self._decide()
+            self._apply(decision)
+
+        self._publish(decision)
+        return decision
+
+    def _p99(self) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+    def _decide(self) -> str:
+        """
+        Choose the next action from the current observations.
+        """
+        p99 = self._p99()
+        avg_fill = sum(self._fill_ratios) / len(self._fill_ratios) if self._fill_ratios else 0.0
+
+        # Undo an increase that made the database slower per row
+        if (self.last_decision.startswith('increase') and self._rate_before_increase and
+                self._insert_rate is not None and self._insert_rate < 0.8 * self._rate_before_increase):
+            return 'decrease_throughput'
+
+        # Under a backlog the readings are old before the sink sees them, so
+        # their latency says nothing about the batch size; catch up instead
+        if self._consumer_lag > self.lag_threshold:
+            return 'increase_lag' if self.batch_size < self.max_batch_size else 'hold'
+
+        if p99 is not None and p99 > self.target_p99_latency:
+            return 'decrease_latency'
+
+        if self.batch_size >= self.max_batch_size:
+            return 'hold'
+
+        if avg_fill >= 0.9 and (p99 is None or p99 < 0.5 * self.target_p99_latency):
+            return 'increase_fill'
+
+        return 'hold'
+
+    def _apply(self, decision: str):
+        """
+        Apply a decision to the batch size and commit interval.
+        """
+        previous = self.batch_size
+        p99 = self._p99()
+
+        if decision.startswith('decrease'):
+            self.batch_size = max(self.min_batch_size, int(self.batch_size * self.decrease_factor))
+            self._rate_before_increase = None
+        elif decision.startswith('increase'):
+            self._rate_before_increase = self._insert_rate
+            self.batch_size = min(self.max_batch_size, self.batch_size + self.additive_step)
+
+        # Judge the new size on its own latencies
+        if self.batch_size != previous:
+            self._latencies.clear()
+            self._fill_ratios.clear()
+
+        self.commit_interval = self._interval_for(self.batch_size)
+        self.last_decision = decision
+        self.decisions[decision] = self.decisions.get(decision, 0) + 1
+
+        if self.batch_size != previous:
+            log.info(f"Adaptive batching: {decision}, batch size {previous} -> {self.batch_size}, "
+                     f"commit interval {self.commit_interval:.2f}s "
+                     f"(p99 {p99 or 0:.2f}s, lag {self._consumer_lag})")
+
+    def _publish(self, decision: str = None):
+        if not self.metrics:
+            return
+        self.metrics.set_adaptive_batch(self.batch_size, self.commit_interval)
+        if decision:
+            self.metrics.record_batch_controller_decision(decision)
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Get the controller state for health and statistics output.
+
+        Returns:
+            Dictionary with the current controller state
+        """
+        with self._lock:
+            return {
+                'batch_size': self.batch_size,
+                'commit_interval': self.commit_interval,
+                'p99_latency': self._p99(),
+                'target_p99_latency': self.target_p99_latency,
+                'insert_rows_per_sec': self._insert_rate,
+                'consumer_lag': self._consumer_lag,
+                'last_decision': self.last_decision,
+                'decisions': dict(self.decisions)
+            }
@@ -0,0 +1,212 @@
+"""
+Vectorized validation of columnar sensor reading batches.
+
+The sink's validation rules run with NumPy over whole columns instead of once
+per message, and invalid rows are written to a quarantine file instead of
+being logged one by one.
+"""
+
+import os
+import json
+import threading
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from src.utils.logger import log
+from src.data_storage.models import DeviceStatus, CompactSensorReading
+
+
+# Rejection rules in evaluation order; a rejected row is attributed to the first rule it fails
+VALIDATION_RULES = ('missing_field', 'battery_level', 'coordinates', 'status')
+
+_VALID_STATUSES = frozenset(status.value for status in DeviceStatus)
+
+
+class ValidationResult:
+    """
+    Outcome of validating one batch.
+
+    Attributes:
+        keep: Boolean mask of rows that passed every rule
+        timestamp_us: Epoch microseconds per row, with invalid or skewed timestamps replaced by now
+        failures: Number of rows per failed rule or repaired timestamp type
+        reasons: Failed rule per rejected row, in row order
+    """
+
+    __slots__ = ('keep', 'timestamp_us', 'failures', 'reasons')
+
+    def __init__(self, keep: np.ndarray, timestamp_us: np.ndarray, failures: Dict[str, int], reasons: List[str]):
+        self.keep = keep
+        self.timestamp_us = timestamp_us
+        self.failures = failures
+        self.reasons = reasons
+
+    @property
+    def rejected(self) -> int:
+        return len(self.reasons)
+
+
+class QuarantineWriter:
+    """
+    Appends rejected readings as JSON lines to a size-rotated file.
+
+    Each line holds the original record, the rule it failed and when it was
+    quarantined, so rejected data can be inspected or re-ingested later.
+    """
+
+    def __init__(self, directory: str, max_file_bytes: int = 50 * 1024 * 1024, max_files: int = 5):
+        """
+        Initialize the quarantine writer.
+
+        Args:
+            directory: Directory for quarantine files
+            max_file_bytes: Size at which the current file is rotated
+            max_files: Number of rotated files to keep
+        """
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max(1, max_files)
+        self.path = os.path.join(directory, "quarantine.ndjson")
+        self.records_written = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _rotate(self):
+        """
+        Shift quarantine.ndjson.N files up by one and start a new file.
+        """
+        for index in range(self.max_files, 0, -1):
+            source = f"{self.path}.{index - 1}" if index > 1 else self.path
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index}")
+
+    def write(self, records: List[Dict[str, Any]], reasons: List[str]):
+        """
+        Quarantine rejected records.
+
+        Args:
+            records: Original decoded records
+            reasons: Failed rule per record
+        """
+        quarantined_at = datetime.now(timezone.utc).isoformat()
+        lines = ''.join(
+            json.dumps({
+                'quarantined_at': quarantined_at,
+                'reason': reason,
+                'record': record.to_dict() if isinstance(record, CompactSensorReading) else record
+            }, default=str) + '\n'
+            for record, reason in zip(records, reasons)
+        )
+
+        with self._lock:
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_file_bytes:
+                    self._rotate()
+                with open(self.path, 'a') as f:
+                    f.write(lines)
+                self.records_written += len(records)
+            except OSError as e:
+                log.error(f"Could not write {len(records)} records to quarantine: {str(e)}")
+
+
+class BatchValidator:
+    """
+    Applies the sink's reading validation rules to whole columns at once.
+
+    Rows are rejected when device_id, device_type or unit is empty, the
+    battery level is outside 0-100, only one coordinate is set or either is
+    out of range, or the status is unknown. Timestamps that are missing,
+    unparseable or further than max_clock_skew from now are replaced with the
+    current time rather than rejected.
+    """
+
+    def __init__(self, max_clock_skew: float = 86400.0, quarantine: QuarantineWriter = None, metrics=None):
+        """
+        Initialize the validator.
+
+        Args:
+            max_clock_skew: Allowed distance of a timestamp from now in seconds
+            quarantine: Optional writer for rejected rows
+            metrics: Optional PrometheusMetrics instance for validation_failures_total
+        """
+        self.max_clock_skew_us = int(max_clock_skew * 1000000)
+        self.quarantine = quarantine
+        self.metrics = metrics
+
+    def validate(self, batch, timestamps: List[Optional[int]], now_us: int,
+                 records: List[Dict[str, Any]] = None) -> ValidationResult:
+        """
+        Validate the extracted columns of a batch.
+
+        Args:
+            batch: ColumnarBatch with its columns extracted
+            timestamps: Parsed epoch microseconds per row (None if unparseable)
+            now_us: Current time in epoch microseconds
+            records: Original records, used for quarantine output
+
+        Returns:
+            ValidationResult with the keep mask and per-rule counts
+        """
+        count = len(timestamps)
+
+        required_ok = np.fromiter(
+            map(all, zip(batch.device_id, batch.device_type, batch.unit)), dtype=bool, count=count
+        )
+
+        # None becomes NaN, i.e. "not set"
+        battery = np.array(batch.battery_level, dtype=np.float64)
+        battery_ok = np.isnan(battery) | ((battery >= 0) & (battery <= 100))
+
+        latitude = np.array(batch.latitude, dtype=np.float64)
+        longitude = np.array(batch.longitude, dtype=np.float64)
+        latitude_missing = np.isnan(latitude)
+        longitude_missing = np.isnan(longitude)
+        coordinates_ok = (latitude_missing & longitude_missing) | (
+            ~latitude_missing & ~longitude_missing &
+            (np.abs(latitude) <= 90) & (np.abs(longitude) <= 180)
+        )
+
+        status_ok = np.fromiter(map(_VALID_STATUSES.__contains__, batch.status), dtype=bool, count=count)
+
+        checks = np.vstack((required_ok, battery_ok, coordinates_ok, status_ok))
+        keep = checks.all(axis=0)
+
+        failures = {}
+        for rule, passed in zip(VALIDATION_RULES, checks.sum(axis=1)):
+            if passed < count:
+                failures[rule] = int(count - passed)
+
+        reasons = []
+        if not keep.all():
+            # argmin over booleans finds the first failed rule of each rejected row
+            first_failed = checks[:, ~keep].argmin(axis=0)
+            reasons = [VALIDATION_RULES[index] for index in first_failed.tolist()]
+
+        # Timestamps are repaired rather than rejected
+        timestamp_obj = np.array(timestamps, dtype=object)
+        invalid = np.equal(timestamp_obj, None)
+        timestamp_us = np.where(invalid, now_us, timestamp_obj).astype(np.int64)
+        skewed = np.abs(timestamp_us - now_us) > self.max_clock_skew_us
+        timestamp_us[skewed] = now_us
+
+        if invalid.any():
+            failures['timestamp_invalid'] = int(invalid.sum())
+        if skewed.any():
+            failures['timestamp_out_of_range'] = int(skewed.sum())
+
+        if self.metrics:
+            for failure_type, failed in failures.items():
+                self.metrics.record_validation_failure(failure_type=failure_type, count=failed)
+
+        if reasons and self.quarantine and records is not None:
+            rejected_records = [records[index] for index in np.flatnonzero(~keep).tolist()]
+            self.quarantine.write(rejected_records, reasons)
+
+        return ValidationResult(keep, timestamp_us, failures, reasons)
+
+
+# Default validator for batches built without an explicit one
+default_validator = BatchValidator()
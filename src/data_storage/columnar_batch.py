@@ -0,0 +1,260 @@
+"""
+Columnar batches of sensor readings for the TimescaleDB sink.
+
+Decoded Kafka records are collected as-is and turned into one list per
+column when the batch is written, so each field is extracted, validated and
+encoded once per batch instead of going through a SensorReadingDTO and a
+dict per reading.
+"""
+
+from array import array
+from itertools import compress
+from operator import itemgetter
+from datetime import datetime, timezone, timedelta
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+from src.data_storage.copy_ingest import SENSOR_READING_COLUMNS
+from src.data_storage.batch_validator import BatchValidator, default_validator
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch_us(value: Any) -> Optional[int]:
+    """
+    Convert an ISO-8601 string or datetime into microseconds since the Unix epoch.
+
+    Naive values are taken as UTC.
+
+    Args:
+        value: Timestamp value
+
+    Returns:
+        Epoch microseconds, or None if the value is empty or unparseable
+    """
+    if not value:
+        return None
+    try:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return (value - _EPOCH) // _ONE_MICROSECOND
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def from_epoch_us(micros: Optional[int]) -> Optional[datetime]:
+    """
+    Convert epoch microseconds back into an aware UTC datetime.
+    """
+    if micros is None:
+        return None
+    return _EPOCH + timedelta(microseconds=micros)
+
+
+def _column(records: List[Dict[str, Any]], key: str, default: Any = None) -> List[Any]:
+    """
+    Extract one field from every record.
+
+    Avro-decoded records carry every field, so the fast path is a single
+    C-level map; records missing the field fall back to dict.get.
+    """
+    try:
+        return list(map(itemgetter(key), records))
+    except (KeyError, TypeError):
+        return [record.get(key, default) if record else default for record in records]
+
+
+class ColumnarBatch:
+    """
+    A batch of sensor readings stored column by column.
+
+    Records are appended as decoded from Kafka. build() extracts the columns,
+    validates them with a BatchValidator and drops invalid rows; the result
+    feeds the COPY encoder directly. Timestamps are kept as epoch microseconds.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty batch.
+        """
+        self.records: List[Dict[str, Any]] = []
+        self.built = False
+        self.failures: Dict[str, int] = {}
+        self.rejected = 0
+
+        self.device_id: List[str] = []
+        self.device_type: List[str] = []
+        self.timestamp_us = array('q')
+        self.value: List[Optional[float]] = []
+        self.unit: List[str] = []
+        self.latitude: List[Optional[float]] = []
+        self.longitude: List[Optional[float]] = []
+        self.building: List[Optional[str]] = []
+        self.floor: List[Optional[int]] = []
+        self.zone: List[Optional[str]] = []
+        self.room: List[Optional[str]] = []
+        self.battery_level: List[Optional[float]] = []
+        self.signal_strength: List[Optional[float]] = []
+        self.firmware_version: List[Optional[str]] = []
+        self.is_anomaly: List[bool] = []
+        self.status: List[str] = []
+        self.maintenance_us: List[Optional[int]] = []
+        self.device_metadata: List[Optional[Dict[str, Any]]] = []
+        self.tags: List[List[str]] = []
+
+    def __len__(self) -> int:
+        return len(self.device_id) if self.built else len(self.records)
+
+    def append(self, record: Dict[str, Any]):
+        """
+        Add a decoded Kafka record to the batch.
+
+        Args:
+            record: Avro-decoded sensor reading
+        """
+        self.records.append(record)
+
+    def extend(self, records: List[Dict[str, Any]]):
+        """
+        Add several decoded Kafka records to the batch.
+
+        Args:
+            records: Avro-decoded sensor readings
+        """
+        self.records.extend(records)
+
+    def clear(self):
+        """
+        Reset the batch so it can be reused.
+        """
+        self.__init__()
+
+    def build(self, now_us: int = None, validator: BatchValidator = None) -> Dict[str, int]:
+        """
+        Extract and validate the columns, dropping invalid rows.
+
+        Args:
+            now_us: Current time in epoch microseconds (defaults to now)
+            validator: BatchValidator to apply (defaults to one without quarantine or metrics)
+
+        Returns:
+            Number of rejected or repaired rows per failure type
+        """
+        if self.built:
+            return self.failures
+
+        records = self.records
+        if now_us is None:
+            now_us = to_epoch_us(datetime.now(timezone.utc))
+
+        locations = [record.get('location') or {} for record in records]
+
+        self.device_id = _column(records, 'device_id', '')
+        self.device_type = _column(records, 'device_type', '')
+        self.unit = _column(records, 'unit', '')
+        self.value = _column(records, 'value')
+        self.latitude = _column(locations, 'latitude')
+        self.longitude = _column(locations, 'longitude')
+        self.building = _column(locations, 'building')
+        self.floor = _column(locations, 'floor')
+        self.zone = _column(locations, 'zone')
+        self.room = _column(locations, 'room')
+        self.battery_level = _column(records, 'battery_level')
+        self.signal_strength = _column(records, 'signal_strength')
+        self.firmware_version = _column(records, 'firmware_version')
+        self.is_anomaly = [bool(flag) for flag in _column(records, 'is_anomaly', False)]
+        self.status = [status or 'ACTIVE' for status in _column(records, 'status', 'ACTIVE')]
+        self.maintenance_us = [to_epoch_us(value) for value in _column(records, 'maintenance_date')]
+        self.device_metadata = [metadata or None for metadata in _column(records, 'device_metadata')]
+        self.tags = [tags if tags is not None else [] for tags in _column(records, 'tags', [])]
+        timestamps = [to_epoch_us(value) for value in _column(records, 'timestamp')]
+
+        result = (validator or default_validator).validate(self, timestamps, now_us, records=records)
+        self.timestamp_us = array('q', result.timestamp_us.tolist())
+
+        if result.rejected:
+            self._keep_rows(result.keep.tolist())
+
+        self.records = []
+        self.built = True
+        self.failures = result.failures
+        self.rejected = result.rejected
+        return self.failures
+
+    def _keep_rows(self, keep: List[bool]):
+        """
+        Drop the rows whose flag in keep is false from every column.
+        """
+        for name in ('device_id', 'device_type', 'value', 'unit', 'latitude', 'longitude',
+                     'building', 'floor', 'zone', 'room', 'battery_level', 'signal_strength',
+                     'firmware_version', 'is_anomaly', 'status', 'maintenance_us',
+                     'device_metadata', 'tags'):
+            setattr(self, name, list(compress(getattr(self, name), keep)))
+        self.timestamp_us = array('q', compress(self.timestamp_us, keep))
+
+    def without_rows(self, remove: List[bool]) -> 'ColumnarBatch':
+        """
+        Get a copy of a built batch without some rows, e.g. readings written to another table.
+
+        The batch itself is left unchanged, so a failed insert can still
+        retry or spill every reading.
+
+        Args:
+            remove: One flag per row, in rows() order
+
+        Returns:
+            New built batch with the remaining rows (the batch itself if nothing is removed)
+        """
+        self.build()
+        if not any(remove):
+            return self
+        remaining = ColumnarBatch()
+        remaining.__dict__.update(self.__dict__)
+        remaining.failures = dict(self.failures)
+        remaining._keep_rows([not flag for flag in remove])
+        return remaining
+
+    def min_timestamp_us(self) -> Optional[int]:
+        """
+        Get the timestamp of the oldest reading in epoch microseconds.
+        """
+        if self.built:
+            return min(self.timestamp_us) if self.timestamp_us else None
+        timestamps = [micros for micros in map(to_epoch_us, _column(self.records, 'timestamp')) if micros is not None]
+        return min(timestamps) if timestamps else None
+
+    def rows(self) -> Iterator[Tuple[Any, ...]]:
+        """
+        Iterate over the rows in SENSOR_READING_COLUMNS order.
+
+        Yields:
+            Row tuples with datetimes for the timestamp columns
+        """
+        self.build()
+        return zip(
+            self.device_id, self.device_type, map(from_epoch_us, self.timestamp_us), self.value,
+            self.unit, self.latitude, self.longitude, self.building, self.floor, self.zone,
+            self.room, self.battery_level, self.signal_strength, self.firmware_version,
+            self.is_anomaly, self.status, map(from_epoch_us, self.maintenance_us),
+            self.device_metadata, map(list, self.tags)
+        )
+
+    def to_readings(self) -> List[Dict[str, Any]]:
+        """
+        Convert the batch into flat reading dictionaries, as produced by SensorReadingDTO.to_dict.
+
+        Returns:
+            List of sensor reading dictionaries
+        """
+        readings = []
+        for row in self.rows():
+            reading = dict(zip(SENSOR_READING_COLUMNS, row))
+            reading['timestamp'] = reading['timestamp'].isoformat()
+            if reading['maintenance_date'] is not None:
+                reading['maintenance_date'] = reading['maintenance_date'].isoformat()
+            readings.append(reading)
+        return readings
+
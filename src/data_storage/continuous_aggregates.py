@@ -0,0 +1,493 @@
+"""
+Hierarchical continuous aggregates of the sensor readings.
+
+database/init.sql defines three tiers, each built on the one before it:
+sensor_readings_1m on the sensor_readings hypertable, sensor_readings_hourly
+on the 1 minute tier and sensor_readings_daily on the hourly tier, so only
+the 1 minute tier ever reads raw chunks. With timescaledb.normalized_storage
+the 1 minute tier has to read the fact table joined to the devices table
+instead; database/init.sql has that definition commented out next to the
+default one. ContinuousAggregateManager keeps
+their refresh policies in line with timescaledb.continuous_aggregate_policies
+and refreshes the tiers bottom-up.
+
+Instead of refreshing the whole history, the sink records the time range of
+every batch it commits in a DirtyWindowTracker and a
+ContinuousAggregateRefresher thread periodically refreshes just those
+windows.
+"""
+
+import time
+import threading
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+from src.utils.logger import log
+from src.config.config import settings
+from src.data_storage.columnar_batch import from_epoch_us
+
+
+# Refresh order: every tier reads the one before it
+CONTINUOUS_AGGREGATE_TIERS = ('sensor_readings_1m', 'sensor_readings_hourly', 'sensor_readings_daily')
+
+# Bucket width of each tier in microseconds; refresh windows are widened to whole buckets
+_TIER_BUCKET_US = {
+    'sensor_readings_1m': 60 * 1000000,
+    'sensor_readings_hourly': 3600 * 1000000,
+    'sensor_readings_daily': 86400 * 1000000,
+}
+
+# Table each tier is expected to read
+_TIER_SOURCES = {
+    'sensor_readings_1m': None,  # the raw readings hypertable, see raw_readings_table()
+    'sensor_readings_hourly': 'sensor_readings_1m',
+    'sensor_readings_daily': 'sensor_readings_hourly',
+}
+
+
+def raw_readings_table() -> str:
+    """
+    Get the hypertable the sink writes readings to and the 1 minute tier reads.
+
+    Returns:
+        The fact table with normalized storage, the main table otherwise
+    """
+    if settings.timescaledb.normalized_storage:
+        return settings.timescaledb.facts_table
+    return settings.timescaledb.main_table
+
+
+def merge_windows(windows: List[Tuple[int, int, int]], gap_us: int = 0) -> List[Tuple[int, int, int]]:
+    """
+    Merge overlapping time windows and windows closer than gap_us.
+
+    Args:
+        windows: (start_us, end_us, rows) tuples, end exclusive
+        gap_us: Largest gap between windows that are merged
+
+    Returns:
+        Sorted, non-overlapping windows with their row counts summed
+    """
+    merged: List[List[int]] = []
+    for start, end, rows in sorted(windows):
+        if merged and start <= merged[-1][1] + gap_us:
+            last = merged[-1]
+            last[1] = max(last[1], end)
+            last[2] += rows
+        else:
+            merged.append([start, end, rows])
+    return [tuple(window) for window in merged]
+
+
+class DirtyWindowTracker:
+    """
+    Time ranges written since the last continuous aggregate refresh.
+
+    Thread-safe; writer threads mark() the range of every committed batch
+    and the refresher take()s the merged windows. The number of windows is
+    bounded: beyond max_windows, the two closest windows are merged, which
+    refreshes the gap between them too but keeps memory and the number of
+    refresh calls flat under scattered late data.
+    """
+
+    def __init__(self, merge_gap: float = None, max_windows: int = None):
+        """
+        Initialize an empty tracker.
+
+        Args:
+            merge_gap: Windows closer than this many seconds are merged (defaults to timescaledb.cagg_merge_gap)
+            max_windows: Windows kept before the closest are merged (defaults to timescaledb.cagg_max_dirty_windows)
+        """
+        merge_gap = settings.timescaledb.cagg_merge_gap if merge_gap is None else merge_gap
+        self.merge_gap_us = int(merge_gap * 1000000)
+        self.max_windows = max(1, max_windows or settings.timescaledb.cagg_max_dirty_windows)
+        self._windows: List[Tuple[int, int, int]] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._windows = self._compact(self._windows)
+            return len(self._windows)
+
+    def mark(self, min_us: int, max_us: int, rows: int = 0):
+        """
+        Record that rows between two timestamps were written.
+
+        Args:
+            min_us: Oldest timestamp in epoch microseconds
+            max_us: Newest timestamp in epoch microseconds
+            rows: Number of rows written
+        """
+        if min_us is None or max_us is None:
+            return
+        with self._lock:
+            self._windows.append((min_us, max_us + 1, rows))
+            # Compact lazily; batches of a live stream mostly extend the last window
+            if len(self._windows) > 2 * self.max_windows:
+                self._windows = self._compact(self._windows)
+
+    def take(self) -> List[Tuple[int, int, int]]:
+        """
+        Remove and return the merged dirty windows.
+
+        Returns:
+            (start_us, end_us, rows) tuples, end exclusive
+        """
+        with self._lock:
+            windows = self._compact(self._windows)
+            self._windows = []
+        return windows
+
+    def restore(self, windows: List[Tuple[int, int, int]]):
+        """
+        Put back windows whose refresh failed.
+
+        Args:
+            windows: Windows returned by take()
+        """
+        with self._lock:
+            self._windows.extend(windows)
+
+    def _compact(self, windows: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+        """
+        Merge close windows, then the closest pairs until at most max_windows remain.
+        """
+        windows = merge_windows(windows, self.merge_gap_us)
+        while len(windows) > self.max_windows:
+            i = min(range(len(windows) - 1), key=lambda k: windows[k + 1][0] - windows[k][1])
+            (start, _, rows), (_, end, more_rows) = windows[i], windows[i + 1]
+            windows[i:i + 2] = [(start, end, rows + more_rows)]
+        return windows
+
+
+class ContinuousAggregateManager:
+    """
+    Applies refresh policies to the continuous aggregate tiers and refreshes them in order.
+    """
+
+    def __init__(self, db_manager, policies: Dict[str, Optional[Dict[str, str]]] = None):
+        """
+        Initialize the manager.
+
+        Args:
+            db_manager: TimescaleDBManager instance
+            policies: Refresh policy per aggregate (defaults to timescaledb.continuous_aggregate_policies)
+        """
+        self.db_manager = db_manager
+        self.policies = settings.timescaledb.continuous_aggregate_policies if policies is None else policies
+        self.dirty_windows = DirtyWindowTracker()
+        self.max_window_us = int(settings.timescaledb.cagg_max_window * 1000000)
+        self.metrics = None
+        # Called with the names of refreshed aggregates, e.g. to drop cached results
+        self.on_refresh: Optional[Callable[[List[str]], None]] = None
+    
+    def mark_dirty(self, min_us: int, max_us: int, rows: int = 0):
+        """
+        Record the time range of a committed batch of sensor readings.
+
+        Args:
+            min_us: Oldest timestamp in epoch microseconds
+            max_us: Newest timestamp in epoch microseconds
+            rows: Number of rows written
+        """
+        self.dirty_windows.mark(min_us, max_us, rows)
+
+    def existing_tiers(self) -> List[str]:
+        """
+        Get the aggregate tiers that exist in the database, in refresh order.
+
+        Returns:
+            List of continuous aggregate names
+        """
+        rows = self.db_manager.execute_query("""
+            SELECT view_name FROM timescaledb_information.continuous_aggregates
+            WHERE view_schema = 'public'
+        """)
+        names = {row['view_name'] for row in rows}
+        return [name for name in CONTINUOUS_AGGREGATE_TIERS if name in names]
+
+    def tier_sources(self) -> Dict[str, str]:
+        """
+        Get the table or aggregate each existing tier reads.
+
+        Returns:
+            Source name per continuous aggregate
+        """
+        rows = self.db_manager.execute_query("""
+            SELECT ca.view_name, ca.hypertable_name, src.view_name AS source_view
+            FROM timescaledb_information.continuous_aggregates ca
+            LEFT JOIN timescaledb_information.continuous_aggregates src
+                ON src.materialization_hypertable_schema = ca.hypertable_schema
+                AND src.materialization_hypertable_name = ca.hypertable_name
+            WHERE ca.view_schema = 'public'
+        """)
+        return {row['view_name']: row['source_view'] or row['hypertable_name'] for row in rows}
+
+    def check_hierarchy(self) -> bool:
+        """
+        Check that every tier is built on the tier below it.
+
+        Databases created before the 1 minute tier have hourly and daily
+        aggregates that read sensor_readings directly; they keep working but
+        every refresh scans raw chunks until they are recreated from
+        database/init.sql.
+
+        Returns:
+            True if all existing tiers read their expected source
+        """
+        try:
+            sources = self.tier_sources()
+        except Exception as e:
+            log.error(f"Error checking continuous aggregate hierarchy: {str(e)}")
+            return False
+
+        hierarchical = True
+        for name, expected in _TIER_SOURCES.items():
+            expected = expected or raw_readings_table()
+            if name in sources and sources[name] != expected:
+                log.warning(f"Continuous aggregate {name} reads {sources[name]} "
+                            f"instead of {expected}; recreate it from database/init.sql")
+                hierarchical = False
+        return hierarchical
+
+    def apply_policies(self) -> Dict[str, str]:
+        """
+        Add, replace or remove refresh policies so they match the configuration.
+
+        Policies that already match are left alone, so restarts do not
+        reschedule the refresh jobs.
+
+        Returns:
+            Action taken per aggregate ('unchanged', 'added', 'replaced', 'removed' or 'failed')
+        """
+        try:
+            existing = set(self.existing_tiers())
+        except Exception as e:
+            log.error(f"Error listing continuous aggregates: {str(e)}")
+            return {}
+        actions = {}
+
+        for name in CONTINUOUS_AGGREGATE_TIERS:
+            if name not in existing or name not in self.policies:
+                continue
+            policy = self.policies[name]
+            try:
+                actions[name] = self._apply_policy(name, policy)
+            except Exception as e:
+                log.error(f"Error applying refresh policy to {name}: {str(e)}")
+                actions[name] = 'failed'
+
+        changed = {name: action for name, action in actions.items() if action != 'unchanged'}
+        if changed:
+            log.info(f"Continuous aggregate refresh policies: {changed}")
+        return actions
+
+    def _apply_policy(self, name: str, policy: Optional[Dict[str, str]]) -> str:
+        """
+        Bring the refresh policy of one aggregate in line with its configuration.
+        """
+        if policy:
+            parameters = {
+                'view_name': name,
+                'start_offset': policy['start_offset'],
+                'end_offset': policy['end_offset'],
+                'schedule_interval': policy['schedule_interval'],
+            }
+            rows = self.db_manager.execute_query("""
+                SELECT j.job_id,
+                    (j.config->>'start_offset')::interval = CAST(:start_offset AS interval)
+                    AND (j.config->>'end_offset')::interval = CAST(:end_offset AS interval)
+                    AND j.schedule_interval = CAST(:schedule_interval AS interval) AS matches
+                FROM timescaledb_information.jobs j
+                JOIN timescaledb_information.continuous_aggregates ca
+                    ON ca.materialization_hypertable_schema = j.hypertable_schema
+                    AND ca.materialization_hypertable_name = j.hypertable_name
+                WHERE j.proc_name = 'policy_refresh_continuous_aggregate'
+                    AND ca.view_name = :view_name
+            """, parameters)
+        else:
+            rows = []
+
+        if rows and rows[0]['matches']:
+            return 'unchanged'
+
+        self.db_manager.execute_non_query(
+            "SELECT remove_continuous_aggregate_policy(:view_name, if_exists => TRUE)", {'view_name': name}
+        )
+        if not policy:
+            return 'removed'
+
+        self.db_manager.execute_non_query("""
+            SELECT add_continuous_aggregate_policy(:view_name,
+                start_offset => CAST(:start_offset AS interval),
+                end_offset => CAST(:end_offset AS interval),
+                schedule_interval => CAST(:schedule_interval AS interval))
+        """, parameters)
+        return 'replaced' if rows else 'added'
+
+    def refresh(self, window_start: Any = None, window_end: Any = None) -> List[str]:
+        """
+        Refresh the tiers bottom-up so each one reads an up-to-date tier below it.
+
+        Args:
+            window_start: Start of the refresh window (None for the beginning of the data)
+            window_end: End of the refresh window (None for the end of the data)
+
+        Returns:
+            Names of the refreshed aggregates
+        """
+        refreshed = []
+        for name in self.existing_tiers():
+            try:
+                self.db_manager.execute_autocommit(
+                    "CALL refresh_continuous_aggregate(:view_name, :window_start, :window_end)",
+                    {'view_name': name, 'window_start': window_start, 'window_end': window_end}
+                )
+                refreshed.append(name)
+                log.info(f"Refreshed continuous aggregate {name}")
+            except Exception as e:
+                # Coarser tiers would only re-read stale data
+                log.error(f"Error refreshing continuous aggregate {name}: {str(e)}")
+                break
+        self._notify(refreshed)
+        return refreshed
+
+    def tier_windows(self, name: str, windows: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+        """
+        Widen dirty windows to whole buckets of a tier and split them into bounded refreshes.
+
+        refresh_continuous_aggregate only recomputes buckets that lie fully
+        inside the window, so windows are aligned outwards. Spans longer
+        than timescaledb.cagg_max_window (but at least one bucket) are
+        refreshed in several calls so no single refresh holds locks and I/O
+        for long.
+
+        Args:
+            name: Aggregate tier
+            windows: Merged dirty windows
+
+        Returns:
+            (start_us, end_us, rows) refresh windows; rows are split evenly
+        """
+        bucket = _TIER_BUCKET_US[name]
+        aligned = merge_windows([
+            (start - start % bucket, end + (-end) % bucket, rows) for start, end, rows in windows
+        ])
+        step = max(bucket, self.max_window_us - self.max_window_us % bucket)
+
+        result = []
+        for start, end, rows in aligned:
+            pieces = -(-(end - start) // step)
+            for piece in range(pieces):
+                piece_start = start + piece * step
+                result.append((piece_start, min(end, piece_start + step), rows // pieces))
+        return result
+
+    def refresh_dirty(self) -> Dict[str, int]:
+        """
+        Refresh the windows written since the last call, finest tier first.
+
+        If a refresh fails, all windows are put back so the next call starts
+        again from the finest tier; refreshing a window twice is harmless.
+
+        Returns:
+            Number of refresh calls per aggregate
+        """
+        windows = self.dirty_windows.take()
+        if not windows:
+            self._report_pending()
+            return {}
+
+        refreshed = {}
+        try:
+            tiers = self.existing_tiers()
+        except Exception as e:
+            log.error(f"Error listing continuous aggregates: {str(e)}")
+            self.dirty_windows.restore(windows)
+            return refreshed
+
+        for name in tiers:
+            for start_us, end_us, rows in self.tier_windows(name, windows):
+                start_time = time.time()
+                try:
+                    self.db_manager.execute_autocommit(
+                        "CALL refresh_continuous_aggregate(:view_name, :window_start, :window_end)",
+                        {'view_name': name, 'window_start': from_epoch_us(start_us), 'window_end': from_epoch_us(end_us)}
+                    )
+                except Exception as e:
+                    log.error(f"Error refreshing {name} from {from_epoch_us(start_us)} to {from_epoch_us(end_us)}: {str(e)}")
+                    if self.metrics:
+                        self.metrics.record_cagg_refresh(name, time.time() - start_time, 0, 0, status="error")
+                    self.dirty_windows.restore(windows)
+                    self._report_pending()
+                    self._notify(list(refreshed))
+                    return refreshed
+
+                duration = time.time() - start_time
+                refreshed[name] = refreshed.get(name, 0) + 1
+                if self.metrics:
+                    self.metrics.record_cagg_refresh(name, duration, rows, (end_us - start_us) / 1000000)
+                log.debug(f"Refreshed {name} from {from_epoch_us(start_us)} to {from_epoch_us(end_us)} "
+                          f"({rows} rows) in {duration:.3f}s")
+
+        self._report_pending()
+        self._notify(list(refreshed))
+        log.info(f"Refreshed {len(windows)} dirty windows of continuous aggregates: {refreshed}")
+        return refreshed
+
+    def _report_pending(self):
+        if self.metrics:
+            self.metrics.set_cagg_dirty_windows(len(self.dirty_windows))
+
+    def _notify(self, names: List[str]):
+        if names and self.on_refresh:
+            self.on_refresh(names)
+
+
+class ContinuousAggregateRefresher:
+    """
+    Background thread that refreshes the dirty windows of the continuous aggregates.
+    """
+
+    def __init__(self, manager: ContinuousAggregateManager, interval: float = None):
+        """
+        Initialize the refresher.
+
+        Args:
+            manager: ContinuousAggregateManager holding the dirty windows
+            interval: Seconds between refreshes (defaults to timescaledb.cagg_refresh_interval)
+        """
+        self.manager = manager
+        self.interval = interval or settings.timescaledb.cagg_refresh_interval
+        self.running = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start the refresh thread.
+        """
+        self.running = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cagg-refresher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.manager.refresh_dirty()
+            except Exception as e:
+                log.error(f"Error in continuous aggregate refresher: {str(e)}")
+
+    def stop(self, flush: bool = True):
+        """
+        Stop the refresh thread.
+
+        Args:
+            flush: Refresh the remaining dirty windows before returning
+        """
+        self.running = False
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        if flush:
+            self.manager.refresh_dirty()
@@ -0,0 +1,657 @@
+"""
+COPY-based bulk ingest engine for TimescaleDB sensor readings.
+
+Streams batches into the hypertable with ``COPY ... FROM STDIN`` instead of
+building one large multi-row INSERT statement, in either the PostgreSQL text
+or binary COPY format.
+"""
+
+import io
+import json
+import struct
+from itertools import chain, repeat
+from datetime import datetime, timezone, timedelta
+from typing import List, Dict, Any, Tuple, Optional, Iterable
+
+from src.utils.logger import log
+from src.config.config import settings
+
+
+# Column order shared by every COPY payload and the staging table
+SENSOR_READING_COLUMNS = (
+    'device_id', 'device_type', 'timestamp', 'value', 'unit',
+    'latitude', 'longitude', 'building', 'floor', 'zone', 'room',
+    'battery_level', 'signal_strength', 'firmware_version',
+    'is_anomaly', 'status', 'maintenance_date', 'device_metadata', 'tags'
+)
+
+# Column order of the narrow fact table used with the devices dimension
+FACT_COLUMNS = (
+    'device_key', 'timestamp', 'value', 'battery_level',
+    'signal_strength', 'status', 'is_anomaly'
+)
+
+# Per-device counts of rows returned by an INSERT ... RETURNING device_id, is_anomaly, value
+DEVICE_COUNTS_QUERY = """
+    SELECT device_id, COUNT(*), COUNT(*) FILTER (WHERE is_anomaly), COALESCE(SUM(value), 0), COUNT(value)
+    FROM {source}
+    GROUP BY device_id
+"""
+
+COPY_FORMAT_TEXT = 'text'
+COPY_FORMAT_BINARY = 'binary'
+
+# PostgreSQL binary COPY framing
+_PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+_PGCOPY_TRAILER = struct.pack('!h', -1)
+_PG_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+_PG_EPOCH_OFFSET_US = 946684800 * 1000000  # 2000-01-01 in Unix epoch microseconds
+_UNIX_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_TEXT_OID = 25
+_JSONB_VERSION = b'\x01'
+
+_INT16 = struct.Struct('!h')
+_INT32 = struct.Struct('!i')
+_FLOAT8_FIELD = struct.Struct('!id')
+_INT4_FIELD = struct.Struct('!ii')
+_INT8_FIELD = struct.Struct('!iq')
+_NULL_FIELD = _INT32.pack(-1)
+_TRUE_FIELD = _INT32.pack(1) + b'\x01'
+_FALSE_FIELD = _INT32.pack(1) + b'\x00'
+_FIELD_COUNT = _INT16.pack(len(SENSOR_READING_COLUMNS))
+_FACT_FIELD_COUNT = _INT16.pack(len(FACT_COLUMNS))
+
+# Escapes required by the COPY text format
+_COPY_TEXT_ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    '\t': '\\t',
+    '\n': '\\n',
+    '\r': '\\r',
+})
+
+
+def device_counts(readings: Iterable[Tuple[str, Any, Any]]) -> List[Tuple[str, int, int, float, int]]:
+    """
+    Group written readings into counts per device.
+
+    Args:
+        readings: (device_id, is_anomaly, value) of each written reading
+
+    Returns:
+        (device_id, readings, anomalies, value_sum, value_count) per device,
+        the columns of DEVICE_COUNTS_QUERY
+    """
+    counts: Dict[str, List[Any]] = {}
+    for device_id, is_anomaly, value in readings:
+        count = counts.get(device_id)
+        if count is None:
+            count = counts[device_id] = [device_id, 0, 0, 0.0, 0]
+        count[1] += 1
+        if is_anomaly:
+            count[2] += 1
+        if value is not None:
+            count[3] += value
+            count[4] += 1
+    return [tuple(count) for count in counts.values()]
+
+
+def reading_to_row(reading: Dict[str, Any]) -> Tuple[Any, ...]:
+    """
+    Flatten a sensor reading dictionary into a tuple in SENSOR_READING_COLUMNS order.
+
+    Args:
+        reading: Sensor reading data (flat DTO dict or nested Kafka message)
+
+    Returns:
+        Tuple of column values
+    """
+    location = reading.get('location') or reading
+
+    return (
+        reading.get('device_id'),
+        reading.get('device_type'),
+        reading.get('timestamp'),
+        reading.get('value'),
+        reading.get('unit'),
+        location.get('latitude'),
+        location.get('longitude'),
+        location.get('building'),
+        location.get('floor'),
+        location.get('zone'),
+        location.get('room'),
+        reading.get('battery_level'),
+        reading.get('signal_strength'),
+        reading.get('firmware_version'),
+        reading.get('is_anomaly', False),
+        reading.get('status', 'ACTIVE'),
+        reading.get('maintenance_date'),
+        reading.get('device_metadata') or None,
+        list(reading.get('tags') or ())
+    )
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    """
+    Coerce an ISO-8601 string or datetime into an aware UTC datetime.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+# ---------------------------------------------------------------------------
+# Text format encoding
+# ---------------------------------------------------------------------------
+
+def _text_field(value: Any) -> str:
+    """
+    Encode a scalar value for the COPY text format.
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).translate(_COPY_TEXT_ESCAPES)
+
+
+def _text_array(values: List[Any]) -> str:
+    """
+    Encode a list of strings as a PostgreSQL array literal for the COPY text format.
+    """
+    if not values:
+        return '{}'
+    elements = []
+    for item in values:
+        item = str(item).replace('\\', '\\\\').replace('"', '\\"')
+        elements.append(f'"{item}"')
+    return ('{' + ','.join(elements) + '}').translate(_COPY_TEXT_ESCAPES)
+
+
+def encode_text_rows(rows: List[Tuple[Any, ...]]) -> io.StringIO:
+    """
+    Encode rows into a COPY text format buffer.
+
+    Args:
+        rows: Row tuples in SENSOR_READING_COLUMNS order
+
+    Returns:
+        StringIO positioned at the start of the payload
+    """
+    lines = []
+    for row in rows:
+        fields = [_text_field(v) for v in row[:17]]
+
+        device_metadata = row[17]
+        fields.append(_text_field(json.dumps(device_metadata)) if device_metadata else '\\N')
+
+        tags = row[18]
+        fields.append(_text_array(tags) if tags is not None else '\\N')
+
+        lines.append('\t'.join(fields))
+
+    return io.StringIO('\n'.join(lines) + '\n' if lines else '')
+
+
+def encode_text_fact_rows(rows: List[Tuple[Any, ...]]) -> io.StringIO:
+    """
+    Encode fact rows into a COPY text format buffer.
+
+    Args:
+        rows: Row tuples in FACT_COLUMNS order
+
+    Returns:
+        StringIO positioned at the start of the payload
+    """
+    lines = ['\t'.join(map(_text_field, row)) for row in rows]
+    return io.StringIO('\n'.join(lines) + '\n' if lines else '')
+
+
+# ---------------------------------------------------------------------------
+# Binary format encoding
+# ---------------------------------------------------------------------------
+
+def _binary_text(value: Any) -> bytes:
+    if value is None:
+        return _NULL_FIELD
+    data = str(value).encode('utf-8')
+    return _INT32.pack(len(data)) + data
+
+
+def _binary_float8(value: Any) -> bytes:
+    if value is None:
+        return _NULL_FIELD
+    return _FLOAT8_FIELD.pack(8, float(value))
+
+
+def _binary_int4(value: Any) -> bytes:
+    if value is None:
+        return _NULL_FIELD
+    return _INT4_FIELD.pack(4, int(value))
+
+
+def _binary_int8(value: Any) -> bytes:
+    if value is None:
+        return _NULL_FIELD
+    return _INT8_FIELD.pack(8, int(value))
+
+
+def _binary_bool(value: Any) -> bytes:
+    if value is None:
+        return _NULL_FIELD
+    return _TRUE_FIELD if value else _FALSE_FIELD
+
+
+def _binary_timestamptz(value: Any) -> bytes:
+    timestamp = _parse_timestamp(value)
+    if timestamp is None:
+        return _NULL_FIELD
+    delta = timestamp - _PG_EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    return _INT8_FIELD.pack(8, micros)
+
+
+def _binary_jsonb(value: Any) -> bytes:
+    if not value:
+        return _NULL_FIELD
+    data = _JSONB_VERSION + json.dumps(value).encode('utf-8')
+    return _INT32.pack(len(data)) + data
+
+
+def _binary_text_array(values: Optional[List[Any]]) -> bytes:
+    if values is None:
+        return _NULL_FIELD
+    if not values:
+        # Zero-dimension empty array: ndim, has_null, element oid
+        payload = struct.pack('!iii', 0, 0, _TEXT_OID)
+        return _INT32.pack(len(payload)) + payload
+
+    parts = [struct.pack('!iiiii', 1, 0, _TEXT_OID, len(values), 1)]
+    for item in values:
+        data = str(item).encode('utf-8')
+        parts.append(_INT32.pack(len(data)))
+        parts.append(data)
+    payload = b''.join(parts)
+    return _INT32.pack(len(payload)) + payload
+
+
+def encode_binary_rows(rows: List[Tuple[Any, ...]]) -> io.BytesIO:
+    """
+    Encode rows into a COPY binary format buffer.
+
+    Args:
+        rows: Row tuples in SENSOR_READING_COLUMNS order
+
+    Returns:
+        BytesIO positioned at the start of the payload
+    """
+    parts = [_PGCOPY_HEADER]
+    append = parts.append
+
+    for row in rows:
+        append(_FIELD_COUNT)
+        append(_binary_text(row[0]))            # device_id
+        append(_binary_text(row[1]))            # device_type
+        append(_binary_timestamptz(row[2]))     # timestamp
+        append(_binary_float8(row[3]))          # value
+        append(_binary_text(row[4]))            # unit
+        append(_binary_float8(row[5]))          # latitude
+        append(_binary_float8(row[6]))          # longitude
+        append(_binary_text(row[7]))            # building
+        append(_binary_int4(row[8]))            # floor
+        append(_binary_text(row[9]))            # zone
+        append(_binary_text(row[10]))           # room
+        append(_binary_float8(row[11]))         # battery_level
+        append(_binary_float8(row[12]))         # signal_strength
+        append(_binary_text(row[13]))           # firmware_version
+        append(_binary_bool(row[14]))           # is_anomaly
+        append(_binary_text(row[15]))           # status (enum accepts its label)
+        append(_binary_timestamptz(row[16]))    # maintenance_date
+        append(_binary_jsonb(row[17]))          # device_metadata
+        append(_binary_text_array(row[18]))     # tags
+
+    append(_PGCOPY_TRAILER)
+    return io.BytesIO(b''.join(parts))
+
+
+def encode_binary_fact_rows(rows: List[Tuple[Any, ...]]) -> io.BytesIO:
+    """
+    Encode fact rows into a COPY binary format buffer.
+
+    Args:
+        rows: Row tuples in FACT_COLUMNS order
+
+    Returns:
+        BytesIO positioned at the start of the payload
+    """
+    parts = [_PGCOPY_HEADER]
+    append = parts.append
+
+    for row in rows:
+        append(_FACT_FIELD_COUNT)
+        append(_binary_int8(row[0]))            # device_key
+        append(_binary_timestamptz(row[1]))     # timestamp
+        append(_binary_float8(row[2]))          # value
+        append(_binary_float8(row[3]))          # battery_level
+        append(_binary_float8(row[4]))          # signal_strength
+        append(_binary_text(row[5]))            # status (enum accepts its label)
+        append(_binary_bool(row[6]))            # is_anomaly
+
+    append(_PGCOPY_TRAILER)
+    return io.BytesIO(b''.join(parts))
+
+
+# ---------------------------------------------------------------------------
+# Columnar encoding
+# ---------------------------------------------------------------------------
+
+def _binary_text_column(values: List[Any]) -> List[bytes]:
+    """
+    Encode a text column, encoding each distinct value once.
+    """
+    cache = {}
+    fields = []
+    append = fields.append
+    for value in values:
+        field = cache.get(value)
+        if field is None:
+            field = cache[value] = _binary_text(value)
+        append(field)
+    return fields
+
+
+def _binary_float8_column(values: List[Any]) -> List[bytes]:
+    pack = _FLOAT8_FIELD.pack
+    return [_NULL_FIELD if value is None else pack(8, value) for value in values]
+
+
+def _binary_int4_column(values: List[Any]) -> List[bytes]:
+    pack = _INT4_FIELD.pack
+    return [_NULL_FIELD if value is None else pack(4, int(value)) for value in values]
+
+
+def _binary_text_array_column(values: List[Optional[List[Any]]]) -> List[bytes]:
+    """
+    Encode a text[] column; devices usually repeat the same tags, so each distinct list is encoded once.
+    """
+    cache = {}
+    fields = []
+    append = fields.append
+    for tags in values:
+        key = tuple(tags) if tags is not None else None
+        field = cache.get(key)
+        if field is None:
+            field = cache[key] = _binary_text_array(tags)
+        append(field)
+    return fields
+
+
+def _binary_epoch_us_column(values) -> List[bytes]:
+    pack = _INT8_FIELD.pack
+    return [_NULL_FIELD if value is None else pack(8, value - _PG_EPOCH_OFFSET_US) for value in values]
+
+
+def encode_binary_columns(batch) -> io.BytesIO:
+    """
+    Encode a built ColumnarBatch into a COPY binary format buffer.
+
+    Every column is encoded in one pass and the fields are then interleaved
+    into rows, so no per-row tuple or dictionary is created.
+
+    Args:
+        batch: ColumnarBatch after build()
+
+    Returns:
+        BytesIO positioned at the start of the payload
+    """
+    columns = (
+        _binary_text_column(batch.device_id),
+        _binary_text_column(batch.device_type),
+        _binary_epoch_us_column(batch.timestamp_us),
+        _binary_float8_column(batch.value),
+        _binary_text_column(batch.unit),
+        _binary_float8_column(batch.latitude),
+        _binary_float8_column(batch.longitude),
+        _binary_text_column(batch.building),
+        _binary_int4_column(batch.floor),
+        _binary_text_column(batch.zone),
+        _binary_text_column(batch.room),
+        _binary_float8_column(batch.battery_level),
+        _binary_float8_column(batch.signal_strength),
+        _binary_text_column(batch.firmware_version),
+        [_TRUE_FIELD if flag else _FALSE_FIELD for flag in batch.is_anomaly],
+        _binary_text_column(batch.status),
+        _binary_epoch_us_column(batch.maintenance_us),
+        [_binary_jsonb(metadata) for metadata in batch.device_metadata],
+        _binary_text_array_column(batch.tags),
+    )
+
+    rows = zip(repeat(_FIELD_COUNT, len(batch)), *columns)
+    return io.BytesIO(b''.join(chain((_PGCOPY_HEADER,), chain.from_iterable(rows), (_PGCOPY_TRAILER,))))
+
+
+def _text_epoch_us(value: Any) -> str:
+    if value is None:
+        return '\\N'
+    return (_UNIX_EPOCH + timedelta(microseconds=value)).isoformat()
+
+
+def encode_text_columns(batch) -> io.StringIO:
+    """
+    Encode a built ColumnarBatch into a COPY text format buffer.
+
+    Args:
+        batch: ColumnarBatch after build()
+
+    Returns:
+        StringIO positioned at the start of the payload
+    """
+    def text_column(values):
+        cache = {}
+        return [cache[v] if v in cache else cache.setdefault(v, _text_field(v)) for v in values]
+
+    columns = (
+        text_column(batch.device_id),
+        text_column(batch.device_type),
+        [_text_epoch_us(value) for value in batch.timestamp_us],
+        [_text_field(value) for value in batch.value],
+        text_column(batch.unit),
+        [_text_field(value) for value in batch.latitude],
+        [_text_field(value) for value in batch.longitude],
+        text_column(batch.building),
+        [_text_field(value) for value in batch.floor],
+        text_column(batch.zone),
+        text_column(batch.room),
+        [_text_field(value) for value in batch.battery_level],
+        [_text_field(value) for value in batch.signal_strength],
+        text_column(batch.firmware_version),
+        ['t' if flag else 'f' for flag in batch.is_anomaly],
+        text_column(batch.status),
+        [_text_epoch_us(value) for value in batch.maintenance_us],
+        [_text_field(json.dumps(metadata)) if metadata else '\\N' for metadata in batch.device_metadata],
+        [_text_array(tags) if tags is not None else '\\N' for tags in batch.tags],
+    )
+
+    lines = ['\t'.join(fields) for fields in zip(*columns)]
+    return io.StringIO('\n'.join(lines) + '\n' if lines else '')
+
+
+class CopyIngestEngine:
+    """
+    Bulk ingest engine that loads sensor readings with COPY FROM STDIN.
+
+    Rows are either copied straight into the target table, or copied into a
+    session-local staging table and merged with ``INSERT ... SELECT ... ON
+    CONFLICT DO NOTHING`` so the duplicate handling of the old INSERT path is
+    preserved.
+    """
+
+    def __init__(self, table: str = None, copy_format: str = None, merge_conflicts: bool = None):
+        """
+        Initialize the COPY ingest engine.
+
+        Args:
+            table: Target table name (defaults to the main hypertable)
+            copy_format: COPY format, 'text' or 'binary'
+            merge_conflicts: Route rows through a staging table with ON CONFLICT DO NOTHING
+        """
+        self.table = table or settings.timescaledb.main_table
+        self.copy_format = copy_format or settings.timescaledb.copy_format
+        self.merge_conflicts = (
+            settings.timescaledb.copy_merge_conflicts if merge_conflicts is None else merge_conflicts
+        )
+
+        if self.copy_format not in (COPY_FORMAT_TEXT, COPY_FORMAT_BINARY):
+            raise ValueError(f"Unsupported COPY format: {self.copy_format}")
+
+        self.staging_table = f"_{self.table}_copy_stage"
+        self._column_list = ', '.join(SENSOR_READING_COLUMNS)
+
+    def _copy_sql(self, target: str) -> str:
+        """
+        Build the COPY statement for the configured format.
+        """
+        if self.copy_format == COPY_FORMAT_BINARY:
+            return f"COPY {target} ({self._column_list}) FROM STDIN WITH (FORMAT binary)"
+        return f"COPY {target} ({self._column_list}) FROM STDIN WITH (FORMAT text)"
+
+    def _encode(self, rows: List[Tuple[Any, ...]]):
+        """
+        Encode rows into a file-like payload for copy_expert.
+        """
+        if self.copy_format == COPY_FORMAT_BINARY:
+            return encode_binary_rows(rows)
+        return encode_text_rows(rows)
+
+    def _encode_columns(self, batch):
+        """
+        Encode a columnar batch into a file-like payload for copy_expert.
+        """
+        if self.copy_format == COPY_FORMAT_BINARY:
+            return encode_binary_columns(batch)
+        return encode_text_columns(batch)
+
+    def _ensure_staging_table(self, cur):
+        """
+        Create the session-local staging table if it does not exist yet.
+
+        The table is emptied automatically at the end of every transaction so
+        it can be reused by long-lived connections.
+        """
+        cur.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS {self.staging_table}
+            ON COMMIT DELETE ROWS
+            AS SELECT {self._column_list} FROM {self.table} WITH NO DATA
+        """)
+
+    def copy_rows(self, cur, readings: List[Dict[str, Any]], counts: List[Tuple[Any, ...]] = None) -> int:
+        """
+        Copy a batch of readings using an open cursor.
+
+        The caller owns the transaction and must commit afterwards.
+
+        Args:
+            cur: psycopg2 cursor
+            readings: List of sensor reading data
+            counts: Optional list extended with the device_counts() of the rows written
+
+        Returns:
+            Number of rows written to the target table
+        """
+        if not readings:
+            return 0
+
+        rows = [reading_to_row(reading) for reading in readings]
+        if counts is not None and not self.merge_conflicts:
+            counts.extend(device_counts((row[0], row[14], row[3]) for row in rows))
+        return self._copy_payload(cur, self._encode(rows), len(rows), counts)
+
+    def copy_columns(self, cur, batch, counts: List[Tuple[Any, ...]] = None) -> int:
+        """
+        Copy a columnar batch using an open cursor.
+
+        The caller owns the transaction and must commit afterwards.
+
+        Args:
+            cur: psycopg2 cursor
+            batch: ColumnarBatch after build()
+            counts: Optional list extended with the device_counts() of the rows written
+
+        Returns:
+            Number of rows written to the target table
+        """
+        if not len(batch):
+            return 0
+
+        if counts is not None and not self.merge_conflicts:
+            counts.extend(device_counts(zip(batch.device_id, batch.is_anomaly, batch.value)))
+        return self._copy_payload(cur, self._encode_columns(batch), len(batch), counts)
+
+    def copy_facts(self, cur, table: str, rows: List[Tuple[Any, ...]]) -> int:
+        """
+        Copy rows into the narrow fact table using an open cursor.
+
+        The fact table has no unique key, so rows are copied straight in
+        without the staging table.
+
+        Args:
+            cur: psycopg2 cursor
+            table: Fact table name
+            rows: Row tuples in FACT_COLUMNS order
+
+        Returns:
+            Number of rows written to the fact table
+        """
+        if not rows:
+            return 0
+
+        columns = ', '.join(FACT_COLUMNS)
+        if self.copy_format == COPY_FORMAT_BINARY:
+            sql = f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT binary)"
+            payload = encode_binary_fact_rows(rows)
+        else:
+            sql = f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT text)"
+            payload = encode_text_fact_rows(rows)
+
+        cur.copy_expert(sql, payload)
+        return cur.rowcount if cur.rowcount >= 0 else len(rows)
+
+    def _copy_payload(self, cur, payload, row_count: int, counts: List[Tuple[Any, ...]] = None) -> int:
+        """
+        Run COPY for an encoded payload, merging through the staging table if configured.
+
+        Merged rows that conflict are skipped, so their counts come from the
+        rows the merge returned.
+        """
+        if not self.merge_conflicts:
+            cur.copy_expert(self._copy_sql(self.table), payload)
+            return cur.rowcount if cur.rowcount >= 0 else row_count
+
+        self._ensure_staging_table(cur)
+        cur.copy_expert(self._copy_sql(self.staging_table), payload)
+        merge = f"""
+            INSERT INTO {self.table} ({self._column_list})
+            SELECT {self._column_list} FROM {self.staging_table}
+            ON CONFLICT DO NOTHING
+        """
+        if counts is None:
+            cur.execute(merge)
+            rows_inserted = cur.rowcount
+        else:
+            cur.execute(
+                f"WITH merged AS ({merge} RETURNING device_id, is_anomaly, value) "
+                + DEVICE_COUNTS_QUERY.format(source='merged')
+            )
+            merged = cur.fetchall()
+            counts.extend(merged)
+            rows_inserted = sum(count[1] for count in merged)
+
+        log.debug(f"COPY ({self.copy_format}) staged {row_count} rows, merged {rows_inserted} into {self.table}")
+        return rows_inserted
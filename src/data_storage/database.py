@@ -4,17 +4,30 @@ TimescaleDB connection and operations for time-series IoT data.
 
 import json
 import time
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Set
 from contextlib import contextmanager
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
 from sqlalchemy.pool import QueuePool
 from sqlalchemy.exc import SQLAlchemyError, OperationalError
 import psycopg2
+import psycopg2.extras
 from psycopg2.extras import RealDictCursor
 
 from src.utils.logger import log
 from src.config.config import settings
+from src.data_storage.copy_ingest import (
+    CopyIngestEngine, SENSOR_READING_COLUMNS, DEVICE_COUNTS_QUERY, reading_to_row, device_counts
+)
+from src.data_storage.device_dimension import DeviceKeyCache
+from src.data_storage.device_latest import DeviceLatestCollector, DEVICE_LATEST_COLUMNS
+from src.data_storage.continuous_aggregates import ContinuousAggregateManager
+from src.data_storage.query_cache import QueryCache
+from src.data_storage.columnar_batch import ColumnarBatch, to_epoch_us
+from src.data_storage.ruuvitag_rows import (
+    RuuviTagRowCollector, RUUVITAG_ROW_COLUMNS, MEASUREMENT_COLUMNS, DEVICE_COLUMNS, new_measurements
+)
+from src.data_storage.write_pool import WriteConnectionPool
 
 
 class TimescaleDBManager:
@@ -31,6 +44,31 @@ class TimescaleDBManager:
         self._max_retries = 5
         self._retry_delay = 2
         
+        # COPY-based bulk ingest engine for sensor reading batches
+        self.copy_engine = CopyIngestEngine()
+        
+        # Current device version keys for normalized storage
+        self.device_keys = DeviceKeyCache() if settings.timescaledb.normalized_storage else None
+        
+        # Results of the read helpers, invalidated by committed batches
+        self.query_cache = QueryCache() if settings.timescaledb.query_cache_enabled else None
+        
+        # Hierarchical continuous aggregates and their refresh policies
+        self.continuous_aggregates = ContinuousAggregateManager(self)
+        if self.query_cache is not None:
+            self.continuous_aggregates.on_refresh = self.query_cache.invalidate
+        
+        # Long-lived write connections for batch inserts; opened lazily
+        self._metrics = None
+        self.write_pool = WriteConnectionPool(
+            dsn=settings.timescaledb.database_url,
+            min_size=settings.timescaledb.write_pool_min_size,
+            max_size=settings.timescaledb.write_pool_max_size,
+            session_settings=settings.timescaledb.write_pool_session_settings,
+            health_check_interval=settings.timescaledb.write_pool_health_check_interval,
+            acquire_timeout=settings.timescaledb.write_pool_acquire_timeout
+        )
+        
         # Initialize the database connection
         self._create_engine()
     
@@ -104,6 +142,7 @@ class TimescaleDBManager:
             try:
                 if self.test_connection():
                     log.info(f"TimescaleDB is available after {attempt} attempt(s)")
+                    self.write_pool.warm_up()
                     return True
             except Exception as e:
                 log.warning(f"TimescaleDB connection attempt {attempt}/{max_retries} failed: {str(e)}")
@@ -212,6 +251,25 @@ class TimescaleDBManager:
             log.debug(f"Parameters: {parameters}")
             raise
     
+    def execute_autocommit(self, query: str, parameters: Dict[str, Any] = None):
+        """
+        Execute a statement outside a transaction block, e.g. CALL refresh_continuous_aggregate.
+        
+        Args:
+            query: SQL statement
+            parameters: Query parameters
+        """
+        try:
+            with self.get_connection() as conn:
+                conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+                conn.execute(text(query), parameters or {})
+                
+        except Exception as e:
+            log.error(f"Error executing autocommit statement: {str(e)}")
+            log.debug(f"Query: {query}")
+            log.debug(f"Parameters: {parameters}")
+            raise
+    
     def insert_sensor_reading(self, reading_data: Dict[str, Any]) -> bool:
         """
         Insert a single sensor reading into the TimescaleDB hypertable.
@@ -261,7 +319,7 @@ class TimescaleDBManager:
                 'status': reading_data.get('status', 'ACTIVE'),
                 'maintenance_date': reading_data.get('maintenance_date'),
                 'device_metadata': json.dumps(device_metadata) if device_metadata else None,
-                'tags': reading_data.get('tags', [])
+                'tags': list(reading_data.get('tags') or [])
             }
             
             rows_affected = self.execute_non_query(query, parameters)
@@ -272,78 +330,641 @@ class TimescaleDBManager:
             log.debug(f"Reading data: {reading_data}")
             return False
     
-    def insert_sensor_readings_batch(self, readings: List[Dict[str, Any]]) -> int:
+    def insert_sensor_readings_batch(self, readings,
+                                     write_pool: WriteConnectionPool = None,
+                                     offsets: Dict[Tuple[str, int], int] = None,
+                                     consumer_group: str = None,
+                                     raise_on_error: bool = False) -> int:
         """
         Insert multiple sensor readings in a batch using TimescaleDB optimizations.
         
+        Readings are streamed with COPY FROM STDIN by default; set
+        ``timescaledb.ingest_method`` to ``values`` to fall back to
+        multi-row INSERT statements.
+        
+        ``readings`` may also be a ColumnarBatch, which is validated and
+        encoded column by column without per-reading dictionaries.
+        
+        When ``offsets`` is given, the Kafka offsets of the batch are stored in
+        the offsets table in the same transaction, so the rows and the
+        position they were read up to are committed atomically.
+        
+        The time range of rows committed to the main table or the fact table
+        is recorded as dirty for the continuous aggregate refresher.
+        
+        With ``timescaledb.normalized_storage`` enabled, readings are written
+        to the narrow fact table and their devices to the devices dimension
+        instead of the main table.
+        
+        With ``timescaledb.ruuvitag_wide_rows`` enabled, RuuviTag readings are
+        merged into one row per advertisement and upserted into the RuuviTag
+        table in the same transaction instead of the main table.
+        
+        Every batch also upserts one device_latest row per device with its
+        newest reading and running counts, in the same transaction. The
+        counts only include the rows the batch actually stored.
+        
+        After commit, the query cache commit sequence advances for the written
+        devices, invalidating cached results loaded before it.
+        
         Args:
-            readings: List of sensor reading data
+            readings: List of sensor reading data, or a ColumnarBatch
+            write_pool: Optional dedicated pool (defaults to the shared write pool)
+            offsets: Optional last consumed offset per (topic, partition)
+            consumer_group: Consumer group the offsets belong to
+            raise_on_error: Re-raise insert errors instead of returning 0
             
         Returns:
             Number of successfully inserted rows
         """
-        if not readings:
+        if isinstance(readings, ColumnarBatch):
+            readings.build()
+        
+        written_devices = self._batch_devices(readings) if self.query_cache is not None else None
+        
+        # Collapsed before RuuviTag readings are split off, so every device is covered
+        latest = DeviceLatestCollector()
+        latest.add_batch(readings)
+        
+        ruuvitag_rows = []
+        if settings.timescaledb.ruuvitag_wide_rows and len(readings):
+            readings, ruuvitag_rows = self._split_ruuvitag_readings(readings)
+            if written_devices is not None:
+                # Wide rows are queried by MAC
+                written_devices.update(row[0] for row in ruuvitag_rows)
+        
+        if not len(readings) and not ruuvitag_rows:
             return 0
         
-        try:
-            # Use raw psycopg2 for better batch performance with TimescaleDB
-            with psycopg2.connect(settings.timescaledb.database_url) as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    # Prepare the INSERT query with ON CONFLICT handling
-                    query = f"""
-                        INSERT INTO {settings.timescaledb.main_table} (
-                            device_id, device_type, timestamp, value, unit,
-                            latitude, longitude, building, floor, zone, room,
-                            battery_level, signal_strength, firmware_version,
-                            is_anomaly, status, maintenance_date, device_metadata, tags
-                        ) VALUES %s
-                        ON CONFLICT DO NOTHING
-                    """
-                    
-                    # Prepare values for batch insert
-                    values = []
-                    for reading in readings:
-                        location = reading.get('location', {})
-                        device_metadata = reading.get('device_metadata')
+        pool = write_pool or self.write_pool
+        
+        # A connection-level failure is retried once on a fresh pooled connection
+        for attempt in range(2):
+            device_versions = None
+            dirty_range = None
+            # Readings stored per device, for the device_latest counts
+            counts = []
+            try:
+                with pool.connection() as conn:
+                    with conn.cursor() as cur:
+                        if not len(readings):
+                            rows_inserted = 0
+                        else:
+                            if self.device_keys is not None:
+                                rows_inserted, device_versions = self._insert_facts(cur, readings, counts)
+                            elif settings.timescaledb.ingest_method != 'copy':
+                                rows_inserted = self._insert_batch_values(cur, readings, counts)
+                            elif isinstance(readings, ColumnarBatch):
+                                rows_inserted = self.copy_engine.copy_columns(cur, readings, counts)
+                            else:
+                                rows_inserted = self.copy_engine.copy_rows(cur, readings, counts)
+                            if settings.timescaledb.enable_continuous_aggregates:
+                                dirty_range = self._timestamp_range(readings)
                         
-                        value_tuple = (
-                            reading.get('device_id'),
-                            reading.get('device_type'),
-                            reading.get('timestamp'),
-                            reading.get('value'),
-                            reading.get('unit'),
-                            location.get('latitude'),
-                            location.get('longitude'),
-                            location.get('building'),
-                            location.get('floor'),
-                            location.get('zone'),
-                            location.get('room'),
-                            reading.get('battery_level'),
-                            reading.get('signal_strength'),
-                            reading.get('firmware_version'),
-                            reading.get('is_anomaly', False),
-                            reading.get('status', 'ACTIVE'),
-                            reading.get('maintenance_date'),
-                            psycopg2.extras.Json(device_metadata) if device_metadata else None,
-                            reading.get('tags', [])
-                        )
-                        values.append(value_tuple)
-                    
-                    # Execute batch insert with larger page size for TimescaleDB
-                    psycopg2.extras.execute_values(
-                        cur, query, values, template=None, page_size=2000
-                    )
+                        if ruuvitag_rows:
+                            counts.extend(device_counts(self._new_ruuvitag_measurements(cur, ruuvitag_rows)))
+                            rows_inserted += self._upsert_ruuvitag_rows(cur, ruuvitag_rows)
+                        
+                        if len(latest):
+                            self._upsert_device_latest(cur, latest.rows(counts))
+                        
+                        if offsets:
+                            self._store_offsets(cur, consumer_group, offsets)
                     
-                    rows_inserted = cur.rowcount
                     conn.commit()
-                    
-                    log.info(f"Successfully inserted {rows_inserted} sensor readings into TimescaleDB")
-                    return rows_inserted
-                    
+                
+                if device_versions:
+                    self.device_keys.commit(device_versions)
+                
+                if dirty_range:
+                    self.continuous_aggregates.mark_dirty(*dirty_range)
+                
+                if written_devices is not None:
+                    self.query_cache.record_commit(written_devices)
+                
+                log.info(f"Successfully inserted {rows_inserted} sensor readings into TimescaleDB")
+                return rows_inserted
+                
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                if attempt == 0:
+                    log.warning(f"TimescaleDB write connection failed, reconnecting: {str(e)}")
+                    continue
+                log.error(f"Error in TimescaleDB batch insert: {str(e)}")
+                log.debug(f"Number of readings: {len(readings)}")
+                if raise_on_error:
+                    raise
+                return 0
+                
+            except Exception as e:
+                log.error(f"Error in TimescaleDB batch insert: {str(e)}")
+                log.debug(f"Number of readings: {len(readings)}")
+                if raise_on_error:
+                    raise
+                return 0
+        
+        return 0
+    
+    def _timestamp_range(self, readings) -> Optional[Tuple[int, int, int]]:
+        """
+        Get the oldest and newest timestamp of a batch.
+        
+        Args:
+            readings: List of sensor reading data, or a built ColumnarBatch
+            
+        Returns:
+            (min_us, max_us, rows) in epoch microseconds, or None if no timestamp is known
+        """
+        if isinstance(readings, ColumnarBatch):
+            timestamps = readings.timestamp_us
+        else:
+            timestamps = [micros for micros in (to_epoch_us(reading.get('timestamp')) for reading in readings)
+                          if micros is not None]
+        if not len(timestamps):
+            return None
+        return min(timestamps), max(timestamps), len(readings)
+    
+    def _batch_devices(self, readings) -> Set[str]:
+        """
+        Get the devices a batch writes, for the query cache.
+        
+        Args:
+            readings: List of sensor reading data, or a built ColumnarBatch
+            
+        Returns:
+            Device IDs of the batch
+        """
+        if isinstance(readings, ColumnarBatch):
+            return set(readings.device_id)
+        return {reading.get('device_id') for reading in readings}
+    
+    def _cached_query(self, query_type: str, query: str, parameters: Dict[str, Any] = None,
+                      device: str = None, versioned: bool = True) -> List[Dict[str, Any]]:
+        """
+        Execute a read query through the query cache.
+        
+        Args:
+            query_type: Query type, selects the TTL and labels the cache metrics
+            query: SQL query string
+            parameters: Query parameters
+            device: Device ID or MAC the query is limited to, None for all devices
+            versioned: Whether committed batches invalidate the cached result
+            
+        Returns:
+            List of dictionaries representing rows
+        """
+        if self.query_cache is None:
+            return self.execute_query(query, parameters)
+        return self.query_cache.get_or_load(
+            query_type, query, parameters, lambda: self.execute_query(query, parameters),
+            device, versioned
+        )
+    
+    def _insert_facts(self, cur, readings, counts: List[Tuple[Any, ...]] = None) -> Tuple[int, Dict[str, Tuple[Any, int]]]:
+        """
+        Write a batch to the narrow fact table, resolving device keys first.
+        
+        Args:
+            cur: psycopg2 cursor inside the batch transaction
+            readings: List of sensor reading data, or a ColumnarBatch
+            counts: Optional list extended with the device_counts() of the rows written
+            
+        Returns:
+            Tuple of the number of inserted rows and the device versions to cache after commit
+        """
+        rows = list(readings.rows()) if isinstance(readings, ColumnarBatch) else [reading_to_row(r) for r in readings]
+        if counts is not None:
+            # The fact table has no unique key, every row is written
+            counts.extend(device_counts((row[0], row[14], row[3]) for row in rows))
+        keys, device_versions = self.device_keys.resolve(cur, rows)
+        facts = [
+            (device_key, row[2], row[3], row[11], row[12], row[15], row[14])
+            for device_key, row in zip(keys, rows)
+        ]
+        return self.copy_engine.copy_facts(cur, settings.timescaledb.facts_table, facts), device_versions
+    
+    def ensure_device_tables(self) -> bool:
+        """
+        Create the devices dimension, the fact hypertable and their view if the database predates them.
+        
+        Returns:
+            True if the tables exist, False otherwise
+        """
+        devices = settings.timescaledb.devices_table
+        facts = settings.timescaledb.facts_table
+        try:
+            self.execute_non_query(f"""
+                CREATE TABLE IF NOT EXISTS {devices} (
+                    device_key BIGSERIAL PRIMARY KEY,
+                    device_id TEXT NOT NULL,
+                    attributes_hash TEXT NOT NULL,
+                    device_type TEXT NOT NULL,
+                    unit TEXT NOT NULL,
+                    latitude DOUBLE PRECISION,
+                    longitude DOUBLE PRECISION,
+                    building TEXT,
+                    floor INTEGER,
+                    zone TEXT,
+                    room TEXT,
+                    firmware_version TEXT,
+                    maintenance_date TIMESTAMPTZ,
+                    device_metadata JSONB,
+                    tags TEXT[],
+                    valid_from TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    valid_to TIMESTAMPTZ
+                )
+            """)
+            self.execute_non_query(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{devices}_current ON {devices}(device_id) WHERE valid_to IS NULL"
+            )
+            self.execute_non_query(f"""
+                CREATE TABLE IF NOT EXISTS {facts} (
+                    device_key BIGINT NOT NULL,
+                    timestamp TIMESTAMPTZ NOT NULL,
+                    value DOUBLE PRECISION,
+                    battery_level DOUBLE PRECISION,
+                    signal_strength DOUBLE PRECISION,
+                    status device_status DEFAULT 'ACTIVE',
+                    is_anomaly BOOLEAN DEFAULT FALSE
+                )
+            """)
+            self.execute_non_query(f"""
+                SELECT create_hypertable('{facts}', 'timestamp',
+                    chunk_time_interval => INTERVAL '{settings.timescaledb.chunk_time_interval}',
+                    if_not_exists => TRUE)
+            """)
+            self.execute_non_query(
+                f"CREATE INDEX IF NOT EXISTS idx_{facts}_device_key ON {facts}(device_key, timestamp DESC)"
+            )
+            self.execute_non_query(f"""
+                CREATE OR REPLACE VIEW sensor_readings_normalized AS
+                SELECT d.device_id, d.device_type, f.timestamp, f.value, d.unit,
+                    d.latitude, d.longitude, d.building, d.floor, d.zone, d.room,
+                    f.battery_level, f.signal_strength, d.firmware_version,
+                    f.is_anomaly, f.status, d.maintenance_date, d.device_metadata, d.tags
+                FROM {facts} f
+                JOIN {devices} d ON d.device_key = f.device_key
+            """)
+            return True
         except Exception as e:
-            log.error(f"Error in TimescaleDB batch insert: {str(e)}")
-            log.debug(f"Number of readings: {len(readings)}")
-            return 0
+            log.error(f"Error creating device dimension tables: {str(e)}")
+            return False
+    
+    def _split_ruuvitag_readings(self, readings) -> Tuple[Any, List[Tuple[Any, ...]]]:
+        """
+        Take the RuuviTag readings out of a batch and merge them into wide rows.
+        
+        Args:
+            readings: List of sensor reading data, or a built ColumnarBatch
+            
+        Returns:
+            Tuple of the remaining readings (a new list or batch; the given
+            readings are not modified) and the wide rows
+        """
+        collector = RuuviTagRowCollector()
+        if isinstance(readings, ColumnarBatch):
+            readings = readings.without_rows([collector.add(row) for row in readings.rows()])
+        else:
+            readings = [reading for reading in readings if not collector.add(reading_to_row(reading))]
+        
+        if collector.readings:
+            log.debug(f"Merged {collector.readings} RuuviTag readings into {len(collector)} wide rows")
+        return readings, collector.rows()
+    
+    def _new_ruuvitag_measurements(self, cur, rows: List[Tuple[Any, ...]]) -> List[Tuple[str, bool, Any]]:
+        """
+        Get the measurements of wide RuuviTag rows that are not stored yet.
+        
+        Must run before the rows are upserted, in the same transaction.
+        
+        Args:
+            cur: psycopg2 cursor inside the batch transaction
+            rows: Rows in RUUVITAG_ROW_COLUMNS order
+            
+        Returns:
+            (device_id, is_anomaly, value) of each measurement the upsert adds
+        """
+        table = settings.timescaledb.ruuvitag_table
+        timestamps = [row[1] for row in rows]
+        cur.execute(f"""
+            SELECT mac, timestamp, {', '.join(f'{column} IS NOT NULL' for column in MEASUREMENT_COLUMNS)}
+            FROM {table}
+            WHERE timestamp BETWEEN %s AND %s
+              AND (mac, timestamp) IN (SELECT * FROM unnest(%s::text[], %s::timestamptz[]))
+        """, (min(timestamps), max(timestamps), [row[0] for row in rows], timestamps))
+        stored = {(row[0], row[1]): row[2:] for row in cur.fetchall()}
+        return new_measurements(rows, stored)
+    
+    def _upsert_ruuvitag_rows(self, cur, rows: List[Tuple[Any, ...]]) -> int:
+        """
+        Upsert wide RuuviTag rows, merging measurements written by earlier batches.
+        
+        Measurements of one advertisement can be split across batches or
+        partitions, and replayed batches write the same rows again, so new
+        values fill in the existing row instead of replacing it.
+        
+        Args:
+            cur: psycopg2 cursor inside the batch transaction
+            rows: Rows in RUUVITAG_ROW_COLUMNS order
+            
+        Returns:
+            Number of upserted rows
+        """
+        table = settings.timescaledb.ruuvitag_table
+        merged = [
+            f"{column} = COALESCE(EXCLUDED.{column}, {table}.{column})"
+            for column in MEASUREMENT_COLUMNS + DEVICE_COLUMNS
+        ]
+        merged.append(
+            f"anomalies = NULLIF(ARRAY(SELECT DISTINCT unnest("
+            f"COALESCE({table}.anomalies, '{{}}') || COALESCE(EXCLUDED.anomalies, '{{}}'))), '{{}}')"
+        )
+        query = f"""
+            INSERT INTO {table} (
+                {', '.join(RUUVITAG_ROW_COLUMNS)}
+            ) VALUES %s
+            ON CONFLICT (mac, timestamp) DO UPDATE SET
+                {', '.join(merged)}
+        """
+        psycopg2.extras.execute_values(cur, query, rows, template=None, page_size=2000)
+        return len(rows)
+    
+    def _upsert_device_latest(self, cur, rows: List[Tuple[Any, ...]]):
+        """
+        Merge the newest reading and counts of each device into device_latest.
+        
+        Latest values are only replaced by rows that are at least as new, so
+        late or replayed batches never roll the status of a device back. The
+        counts only cover readings the batch stored and are added to the
+        stored ones.
+        
+        Args:
+            cur: psycopg2 cursor inside the batch transaction
+            rows: Rows in DEVICE_LATEST_COLUMNS order, sorted by device ID
+        """
+        table = settings.timescaledb.device_latest_table
+        newer = f"EXCLUDED.last_seen >= {table}.last_seen"
+        query = f"""
+            INSERT INTO {table} (
+                {', '.join(DEVICE_LATEST_COLUMNS)}
+            ) VALUES %s
+            ON CONFLICT (device_id) DO UPDATE SET
+                device_type = CASE WHEN {newer} THEN EXCLUDED.device_type ELSE {table}.device_type END,
+                first_seen = LEAST({table}.first_seen, EXCLUDED.first_seen),
+                last_seen = GREATEST({table}.last_seen, EXCLUDED.last_seen),
+                last_value = CASE WHEN {newer} THEN EXCLUDED.last_value ELSE {table}.last_value END,
+                battery_level = CASE WHEN {newer} THEN COALESCE(EXCLUDED.battery_level, {table}.battery_level)
+                    ELSE COALESCE({table}.battery_level, EXCLUDED.battery_level) END,
+                signal_strength = CASE WHEN {newer} THEN COALESCE(EXCLUDED.signal_strength, {table}.signal_strength)
+                    ELSE COALESCE({table}.signal_strength, EXCLUDED.signal_strength) END,
+                status = CASE WHEN {newer} THEN EXCLUDED.status ELSE {table}.status END,
+                total_readings = {table}.total_readings + EXCLUDED.total_readings,
+                anomaly_count = {table}.anomaly_count + EXCLUDED.anomaly_count,
+                value_sum = {table}.value_sum + EXCLUDED.value_sum,
+                value_count = {table}.value_count + EXCLUDED.value_count,
+                updated_at = now()
+        """
+        psycopg2.extras.execute_values(cur, query, rows, template=None, page_size=2000)
+    
+    def ensure_device_latest_table(self) -> bool:
+        """
+        Create the device_latest table if the database predates it.
+        
+        device_summary is pointed at the table, and an empty table is filled
+        once from the stored readings so existing devices are not missing
+        until they report again.
+        
+        Returns:
+            True if the table exists, False otherwise
+        """
+        table = settings.timescaledb.device_latest_table
+        source = settings.timescaledb.readings_source
+        try:
+            self.execute_non_query(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    device_id TEXT PRIMARY KEY,
+                    device_type TEXT NOT NULL,
+                    first_seen TIMESTAMPTZ NOT NULL,
+                    last_seen TIMESTAMPTZ NOT NULL,
+                    last_value DOUBLE PRECISION,
+                    battery_level DOUBLE PRECISION,
+                    signal_strength DOUBLE PRECISION,
+                    status device_status,
+                    total_readings BIGINT NOT NULL DEFAULT 0,
+                    anomaly_count BIGINT NOT NULL DEFAULT 0,
+                    value_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+                    value_count BIGINT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self.execute_non_query(
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_last_seen ON {table}(last_seen DESC)"
+            )
+            backfilled = self.execute_non_query(f"""
+                INSERT INTO {table} (
+                    {', '.join(DEVICE_LATEST_COLUMNS)}
+                )
+                SELECT 
+                    device_id,
+                    last(device_type, timestamp),
+                    MIN(timestamp),
+                    MAX(timestamp),
+                    last(value, timestamp),
+                    last(battery_level, timestamp) FILTER (WHERE battery_level IS NOT NULL),
+                    last(signal_strength, timestamp) FILTER (WHERE signal_strength IS NOT NULL),
+                    last(status, timestamp),
+                    COUNT(*),
+                    COUNT(*) FILTER (WHERE is_anomaly),
+                    COALESCE(SUM(value), 0),
+                    COUNT(value)
+                FROM {source}
+                WHERE NOT EXISTS (SELECT 1 FROM {table})
+                GROUP BY device_id
+                ON CONFLICT (device_id) DO NOTHING
+            """)
+            if backfilled:
+                log.info(f"Filled {table} with {backfilled} devices from {source}")
+            self.execute_non_query(f"""
+                CREATE OR REPLACE VIEW device_summary AS
+                SELECT 
+                    device_id,
+                    device_type,
+                    total_readings,
+                    battery_level as latest_battery_level,
+                    status as current_status,
+                    first_seen as first_reading,
+                    last_seen as last_reading,
+                    value_sum / NULLIF(value_count, 0) as avg_value,
+                    anomaly_count,
+                    last_value,
+                    signal_strength as latest_signal_strength
+                FROM {table}
+                ORDER BY last_reading DESC
+            """)
+            return True
+        except Exception as e:
+            log.error(f"Error creating device latest table: {str(e)}")
+            return False
+    
+    def ensure_ruuvitag_table(self) -> bool:
+        """
+        Create the wide RuuviTag hypertable if the database predates it.
+        
+        Returns:
+            True if the table exists, False otherwise
+        """
+        table = settings.timescaledb.ruuvitag_table
+        try:
+            self.execute_non_query(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    mac TEXT NOT NULL,
+                    timestamp TIMESTAMPTZ NOT NULL,
+                    temperature DOUBLE PRECISION,
+                    humidity DOUBLE PRECISION,
+                    pressure DOUBLE PRECISION,
+                    accel_x DOUBLE PRECISION,
+                    accel_y DOUBLE PRECISION,
+                    accel_z DOUBLE PRECISION,
+                    battery_voltage DOUBLE PRECISION,
+                    tx_power DOUBLE PRECISION,
+                    movement_counter DOUBLE PRECISION,
+                    battery_level DOUBLE PRECISION,
+                    signal_strength DOUBLE PRECISION,
+                    firmware_version TEXT,
+                    latitude DOUBLE PRECISION,
+                    longitude DOUBLE PRECISION,
+                    building TEXT,
+                    floor INTEGER,
+                    zone TEXT,
+                    room TEXT,
+                    status device_status DEFAULT 'ACTIVE',
+                    anomalies TEXT[]
+                )
+            """)
+            self.execute_non_query(f"""
+                SELECT create_hypertable('{table}', 'timestamp',
+                    chunk_time_interval => INTERVAL '{settings.timescaledb.chunk_time_interval}',
+                    if_not_exists => TRUE)
+            """)
+            self.execute_non_query(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_mac ON {table}(mac, timestamp DESC)"
+            )
+            return True
+        except Exception as e:
+            log.error(f"Error creating RuuviTag table: {str(e)}")
+            return False
+    
+    def _store_offsets(self, cur, consumer_group: str, offsets: Dict[Tuple[str, int], int]):
+        """
+        Upsert the next offset to consume for each partition of a batch.
+        
+        Args:
+            cur: psycopg2 cursor inside the batch transaction
+            consumer_group: Consumer group ID
+            offsets: Last consumed offset per (topic, partition)
+        """
+        query = f"""
+            INSERT INTO {settings.timescaledb.offsets_table}
+                (consumer_group, topic, partition, next_offset, updated_at)
+            VALUES %s
+            ON CONFLICT (consumer_group, topic, partition)
+            DO UPDATE SET next_offset = EXCLUDED.next_offset, updated_at = EXCLUDED.updated_at
+        """
+        values = [
+            (consumer_group, topic, partition, offset + 1)
+            for (topic, partition), offset in offsets.items()
+        ]
+        psycopg2.extras.execute_values(cur, query, values, template="(%s, %s, %s, %s, now())")
+    
+    def ensure_offsets_table(self) -> bool:
+        """
+        Create the sink offsets table if the database predates it.
+        
+        Returns:
+            True if the table exists, False otherwise
+        """
+        try:
+            self.execute_non_query(f"""
+                CREATE TABLE IF NOT EXISTS {settings.timescaledb.offsets_table} (
+                    consumer_group TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    partition INTEGER NOT NULL,
+                    next_offset BIGINT NOT NULL,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (consumer_group, topic, partition)
+                )
+            """)
+            return True
+        except Exception as e:
+            log.error(f"Error creating offsets table: {str(e)}")
+            return False
+    
+    def get_stored_offsets(self, consumer_group: str, topic: str) -> Dict[Tuple[str, int], int]:
+        """
+        Get the stored next offsets for a consumer group and topic.
+        
+        Args:
+            consumer_group: Consumer group ID
+            topic: Kafka topic name
+            
+        Returns:
+            Next offset to consume per (topic, partition)
+        """
+        query = f"""
+            SELECT partition, next_offset
+            FROM {settings.timescaledb.offsets_table}
+            WHERE consumer_group = :consumer_group AND topic = :topic
+        """
+        rows = self.execute_query(query, {'consumer_group': consumer_group, 'topic': topic})
+        return {(topic, row['partition']): row['next_offset'] for row in rows}
+    
+    def _insert_batch_values(self, cur, readings, counts: List[Tuple[Any, ...]] = None) -> int:
+        """
+        Insert a batch with a multi-row INSERT built by execute_values.
+        
+        Args:
+            cur: psycopg2 cursor
+            readings: List of sensor reading data, or a ColumnarBatch
+            counts: Optional list extended with the device_counts() of the rows
+                inserted; rows skipped by ON CONFLICT are not counted
+            
+        Returns:
+            Number of inserted rows
+        """
+        # Prepare the INSERT query with ON CONFLICT handling
+        query = f"""
+            INSERT INTO {settings.timescaledb.main_table} (
+                {', '.join(SENSOR_READING_COLUMNS)}
+            ) VALUES %s
+            ON CONFLICT DO NOTHING
+        """
+        
+        # Prepare values for batch insert
+        rows = readings.rows() if isinstance(readings, ColumnarBatch) else map(reading_to_row, readings)
+        values = []
+        for value_tuple in rows:
+            device_metadata = value_tuple[17]
+            values.append(value_tuple[:17] + (
+                psycopg2.extras.Json(device_metadata) if device_metadata else None,
+                value_tuple[18]
+            ))
+        
+        if counts is not None:
+            # One grouped result per page, a device may appear in several
+            inserted = psycopg2.extras.execute_values(
+                cur,
+                f"WITH inserted AS ({query} RETURNING device_id, is_anomaly, value) "
+                + DEVICE_COUNTS_QUERY.format(source='inserted'),
+                values, template=None, page_size=2000, fetch=True
+            )
+            counts.extend(inserted)
+            return sum(count[1] for count in inserted)
+        
+        # Execute batch insert with larger page size for TimescaleDB
+        psycopg2.extras.execute_values(
+            cur, query, values, template=None, page_size=2000
+        )
+        
+        return cur.rowcount
     
     def get_recent_readings(self, device_id: str = None, limit: int = 100, hours: int = 24) -> List[Dict[str, Any]]:
         """
@@ -360,7 +981,7 @@ class TimescaleDBManager:
         try:
             if device_id:
                 query = f"""
-                    SELECT * FROM {settings.timescaledb.main_table} 
+                    SELECT * FROM {settings.timescaledb.readings_source} 
                     WHERE device_id = :device_id 
                     AND timestamp >= NOW() - INTERVAL '%s hours'
                     ORDER BY timestamp DESC 
@@ -369,14 +990,14 @@ class TimescaleDBManager:
                 parameters = {'device_id': device_id, 'limit': limit}
             else:
                 query = f"""
-                    SELECT * FROM {settings.timescaledb.main_table}
+                    SELECT * FROM {settings.timescaledb.readings_source}
                     WHERE timestamp >= NOW() - INTERVAL '%s hours'
                     ORDER BY timestamp DESC 
                     LIMIT :limit
                 """ % hours
                 parameters = {'limit': limit}
             
-            return self.execute_query(query, parameters)
+            return self._cached_query('recent_readings', query, parameters, device_id)
             
         except Exception as e:
             log.error(f"Error getting recent readings: {str(e)}")
@@ -386,6 +1007,10 @@ class TimescaleDBManager:
         """
         Get device statistics using TimescaleDB functions.
         
+        The query matches the get_device_stats() function of
+        database/init.sql but reads timescaledb.readings_source, so it also
+        covers normalized storage.
+        
         Args:
             device_id: Optional device ID filter
             
@@ -393,15 +1018,86 @@ class TimescaleDBManager:
             List of device statistics
         """
         try:
-            query = "SELECT * FROM get_device_stats(:device_id)"
+            query = f"""
+                SELECT 
+                    device_id,
+                    device_type,
+                    COUNT(*) as total_readings,
+                    first(timestamp, timestamp) as first_reading,
+                    last(timestamp, timestamp) as last_reading,
+                    AVG(value) as avg_value,
+                    MIN(value) as min_value,
+                    MAX(value) as max_value,
+                    (COUNT(CASE WHEN is_anomaly THEN 1 END) * 100.0 / COUNT(*)) as anomaly_percentage
+                FROM {settings.timescaledb.readings_source}
+                WHERE (CAST(:device_id AS TEXT) IS NULL OR device_id = :device_id)
+                GROUP BY device_id, device_type
+                ORDER BY last_reading DESC
+            """
             parameters = {'device_id': device_id}
             
-            return self.execute_query(query, parameters)
+            return self._cached_query('device_stats', query, parameters, device_id)
             
         except Exception as e:
             log.error(f"Error getting device stats: {str(e)}")
             return []
     
+    def get_device_latest(self, device_id: str = None) -> List[Dict[str, Any]]:
+        """
+        Get the newest reading and running counts of devices from the latest-value table.
+        
+        Args:
+            device_id: Optional device ID filter
+            
+        Returns:
+            One row per device, most recently seen first
+        """
+        try:
+            table = settings.timescaledb.device_latest_table
+            if device_id:
+                query = f"SELECT * FROM {table} WHERE device_id = :device_id"
+                parameters = {'device_id': device_id}
+            else:
+                query = f"SELECT * FROM {table} ORDER BY last_seen DESC"
+                parameters = {}
+            
+            return self._cached_query('device_latest', query, parameters, device_id)
+            
+        except Exception as e:
+            log.error(f"Error getting latest device readings: {str(e)}")
+            return []
+    
+    def get_device_status_counts(self, stale_minutes: int = 15) -> Dict[str, Any]:
+        """
+        Count devices by status and those that stopped reporting.
+        
+        Args:
+            stale_minutes: Minutes without a reading after which a device counts as stale
+            
+        Returns:
+            Dictionary with total, stale and per-status device counts
+        """
+        try:
+            query = f"""
+                SELECT 
+                    status,
+                    COUNT(*) as devices,
+                    COUNT(*) FILTER (WHERE last_seen < NOW() - INTERVAL '%s minutes') as stale
+                FROM {settings.timescaledb.device_latest_table}
+                GROUP BY status
+            """ % stale_minutes
+            rows = self._cached_query('device_status', query)
+            
+            return {
+                'total': sum(row['devices'] for row in rows),
+                'stale': sum(row['stale'] for row in rows),
+                'by_status': {str(row['status']): row['devices'] for row in rows}
+            }
+            
+        except Exception as e:
+            log.error(f"Error getting device status counts: {str(e)}")
+            return {}
+    
     def get_timeseries_data(self, device_id: str, start_time: str = None, end_time: str = None, 
                            bucket_interval: str = '1 hour') -> List[Dict[str, Any]]:
         """
@@ -438,7 +1134,7 @@ class TimescaleDBManager:
                     AVG(value) as avg_value,
                     MIN(value) as min_value,
                     MAX(value) as max_value
-                FROM {settings.timescaledb.main_table}
+                FROM {settings.timescaledb.readings_source}
                 WHERE device_id = :device_id
                     AND timestamp >= {start_time}
                     AND timestamp <= {end_time}
@@ -447,12 +1143,40 @@ class TimescaleDBManager:
             """
             
             parameters = {'device_id': device_id}
-            return self.execute_query(query, parameters)
+            return self._cached_query('timeseries', query, parameters, device_id)
             
         except Exception as e:
             log.error(f"Error getting timeseries data: {str(e)}")
             return []
     
+    def get_minute_aggregates(self, device_id: str = None, hours: int = 6) -> List[Dict[str, Any]]:
+        """
+        Get 1 minute aggregated data from the finest continuous aggregate tier.
+        
+        Args:
+            device_id: Optional device ID filter
+            hours: Number of hours back to query
+            
+        Returns:
+            List of 1 minute aggregated data
+        """
+        try:
+            device_filter = "AND device_id = :device_id" if device_id else ""
+            query = f"""
+                SELECT * FROM sensor_readings_1m
+                WHERE bucket >= NOW() - INTERVAL '%s hours'
+                {device_filter}
+                ORDER BY bucket DESC
+            """ % hours
+            parameters = {'device_id': device_id} if device_id else {}
+            
+            # Aggregates change when they are refreshed, not when readings are committed
+            return self._cached_query('sensor_readings_1m', query, parameters, versioned=False)
+            
+        except Exception as e:
+            log.error(f"Error getting minute aggregates: {str(e)}")
+            return []
+    
     def get_hourly_aggregates(self, device_id: str = None, days_back: int = 7) -> List[Dict[str, Any]]:
         """
         Get hourly aggregated data using TimescaleDB continuous aggregates.
@@ -481,7 +1205,7 @@ class TimescaleDBManager:
                 """ % days_back
                 parameters = {}
             
-            return self.execute_query(query, parameters)
+            return self._cached_query('sensor_readings_hourly', query, parameters, versioned=False)
             
         except Exception as e:
             log.error(f"Error getting hourly aggregates: {str(e)}")
@@ -515,12 +1239,97 @@ class TimescaleDBManager:
                 """ % days_back
                 parameters = {}
             
-            return self.execute_query(query, parameters)
+            return self._cached_query('sensor_readings_daily', query, parameters, versioned=False)
             
         except Exception as e:
             log.error(f"Error getting daily aggregates: {str(e)}")
             return []
     
+    def get_ruuvitag_readings(self, mac: str = None, limit: int = 100, hours: int = 24) -> List[Dict[str, Any]]:
+        """
+        Get recent RuuviTag advertisements from the wide RuuviTag table.
+        
+        Args:
+            mac: Optional RuuviTag MAC address filter
+            limit: Maximum number of rows to return
+            hours: Number of hours back to query
+            
+        Returns:
+            List of rows with one column per measurement
+        """
+        try:
+            mac_filter = "AND mac = :mac" if mac else ""
+            query = f"""
+                SELECT * FROM {settings.timescaledb.ruuvitag_table}
+                WHERE timestamp >= NOW() - INTERVAL '%s hours'
+                {mac_filter}
+                ORDER BY timestamp DESC
+                LIMIT :limit
+            """ % hours
+            parameters = {'mac': mac, 'limit': limit} if mac else {'limit': limit}
+            
+            return self._cached_query('ruuvitag_readings', query, parameters, mac)
+            
+        except Exception as e:
+            log.error(f"Error getting RuuviTag readings: {str(e)}")
+            return []
+    
+    def get_ruuvitag_latest(self) -> List[Dict[str, Any]]:
+        """
+        Get the latest advertisement of every RuuviTag seen in the last day.
+        
+        Returns:
+            One row per MAC address
+        """
+        try:
+            query = f"""
+                SELECT DISTINCT ON (mac) *
+                FROM {settings.timescaledb.ruuvitag_table}
+                WHERE timestamp >= NOW() - INTERVAL '1 day'
+                ORDER BY mac, timestamp DESC
+            """
+            return self._cached_query('ruuvitag_latest', query)
+            
+        except Exception as e:
+            log.error(f"Error getting latest RuuviTag readings: {str(e)}")
+            return []
+    
+    def get_ruuvitag_timeseries(self, mac: str, hours: int = 24,
+                                bucket_interval: str = '15 minutes') -> List[Dict[str, Any]]:
+        """
+        Get time-bucketed averages of every RuuviTag measurement in one query.
+        
+        Args:
+            mac: RuuviTag MAC address
+            hours: Number of hours back to query
+            bucket_interval: Time bucket interval (e.g., '1 hour', '15 minutes')
+            
+        Returns:
+            List of buckets with an average per measurement
+        """
+        try:
+            averages = ',\n                    '.join(
+                f"AVG({column}) AS avg_{column}" for column in MEASUREMENT_COLUMNS
+            )
+            query = f"""
+                SELECT 
+                    time_bucket('{bucket_interval}', timestamp) AS time_bucket,
+                    COUNT(*) as advertisement_count,
+                    {averages},
+                    MAX(movement_counter) - MIN(movement_counter) as movements
+                FROM {settings.timescaledb.ruuvitag_table}
+                WHERE mac = :mac
+                    AND timestamp >= NOW() - INTERVAL '%s hours'
+                GROUP BY time_bucket
+                ORDER BY time_bucket
+            """ % hours
+            
+            return self._cached_query('ruuvitag_timeseries', query, {'mac': mac}, mac)
+            
+        except Exception as e:
+            log.error(f"Error getting RuuviTag timeseries data: {str(e)}")
+            return []
+    
     def cleanup_old_data(self, archive_days: int = None, cleanup_days: int = None) -> Dict[str, int]:
         """
         Clean up old data using TimescaleDB retention policies.
@@ -588,23 +1397,41 @@ class TimescaleDBManager:
         except Exception as e:
             log.error(f"Error during vacuum and analyze operation: {str(e)}")
     
-    def refresh_continuous_aggregates(self):
+    def refresh_dirty_aggregates(self) -> Dict[str, int]:
         """
-        Manually refresh TimescaleDB continuous aggregates.
+        Refresh the continuous aggregates over the time windows written since the last refresh.
+        
+        Returns:
+            Number of refresh calls per aggregate
         """
         try:
-            log.info("Refreshing TimescaleDB continuous aggregates...")
+            return self.continuous_aggregates.refresh_dirty()
             
-            # Refresh hourly aggregates
-            self.execute_non_query("CALL refresh_continuous_aggregate('sensor_readings_hourly', NULL, NULL)")
-            log.info("Refreshed hourly continuous aggregate")
+        except Exception as e:
+            log.error(f"Error refreshing dirty continuous aggregate windows: {str(e)}")
+            return {}
+    
+    def refresh_continuous_aggregates(self, window_start: Any = None, window_end: Any = None) -> List[str]:
+        """
+        Manually refresh the TimescaleDB continuous aggregates, finest tier first.
+        
+        Without a window this recomputes the whole history; the sink
+        refreshes only what it wrote with refresh_dirty_aggregates.
+        
+        Args:
+            window_start: Start of the refresh window (None for the beginning of the data)
+            window_end: End of the refresh window (None for the end of the data)
             
-            # Refresh daily aggregates  
-            self.execute_non_query("CALL refresh_continuous_aggregate('sensor_readings_daily', NULL, NULL)")
-            log.info("Refreshed daily continuous aggregate")
+        Returns:
+            Names of the refreshed aggregates
+        """
+        try:
+            log.info("Refreshing TimescaleDB continuous aggregates...")
+            return self.continuous_aggregates.refresh(window_start, window_end)
             
         except Exception as e:
             log.error(f"Error refreshing continuous aggregates: {str(e)}")
+            return []
     
     def get_hypertable_info(self) -> Dict[str, Any]:
         """
@@ -653,10 +1480,66 @@ class TimescaleDBManager:
             log.error(f"Error getting hypertable info: {str(e)}")
             return {}
  
+    def create_write_pool(self, name: str, size: int = 1) -> WriteConnectionPool:
+        """
+        Create a dedicated write pool, e.g. one connection per sink writer thread.
+        
+        Args:
+            name: Pool name used in logs
+            size: Number of connections held by the pool
+            
+        Returns:
+            WriteConnectionPool with the same session settings as the shared pool
+        """
+        pool = WriteConnectionPool(
+            dsn=settings.timescaledb.database_url,
+            min_size=size,
+            max_size=size,
+            session_settings=settings.timescaledb.write_pool_session_settings,
+            health_check_interval=settings.timescaledb.write_pool_health_check_interval,
+            acquire_timeout=settings.timescaledb.write_pool_acquire_timeout,
+            name=name
+        )
+        if self._metrics:
+            pool.set_metrics(self._metrics)
+        return pool
+    
+    def set_metrics(self, metrics):
+        """
+        Report write pool statistics to the given sink metrics.
+        
+        Args:
+            metrics: TimescaleDBSinkMetrics instance
+        """
+        self._metrics = metrics
+        self.write_pool.set_metrics(metrics)
+        self.continuous_aggregates.metrics = metrics
+        if self.query_cache is not None:
+            self.query_cache.metrics = metrics
+    
+    def get_write_pool_stats(self) -> Dict[str, Any]:
+        """
+        Get statistics for the persistent write connection pool.
+        
+        Returns:
+            Dictionary with write pool statistics
+        """
+        return self.write_pool.get_stats()
+    
+    def get_query_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get statistics for the read query cache.
+        
+        Returns:
+            Dictionary with query cache statistics (empty when the cache is disabled)
+        """
+        return self.query_cache.get_stats() if self.query_cache is not None else {}
+    
     def close(self):
         """
         Close the database engine and all connections.
         """
+        self.write_pool.close()
         if self.engine:
             self.engine.dispose()
             log.info("TimescaleDB connections closed")
@@ -0,0 +1,200 @@
+"""
+Device dimension for the normalized sensor storage.
+
+Every sensor_readings row repeats the device type, unit, location,
+firmware, metadata and tags of its device. In normalized storage these live
+once per device version in the devices table (a type 2 slowly changing
+dimension) and readings go to a narrow fact table that references the
+version by its surrogate device_key.
+
+DeviceKeyCache maps device IDs to the key of their current version, so the
+sink only touches the dimension when a device is new or its attributes
+change.
+"""
+
+import json
+import hashlib
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+import psycopg2.extras
+
+from src.utils.logger import log
+from src.config.config import settings
+from src.data_storage.columnar_batch import to_epoch_us, from_epoch_us
+
+
+# Per-device columns of the devices table, in device_attributes() order
+DEVICE_ATTRIBUTE_COLUMNS = (
+    'device_type', 'unit', 'latitude', 'longitude', 'building', 'floor', 'zone', 'room',
+    'firmware_version', 'maintenance_date', 'device_metadata', 'tags'
+)
+
+
+def device_attributes(row: Tuple[Any, ...]) -> Tuple[Any, ...]:
+    """
+    Get the per-device attributes of a reading.
+
+    Timestamps are normalized to epoch microseconds so readings decoded from
+    Kafka and replayed from the spill buffer compare equal.
+
+    Args:
+        row: Reading in SENSOR_READING_COLUMNS order
+
+    Returns:
+        Tuple in DEVICE_ATTRIBUTE_COLUMNS order
+    """
+    return (
+        row[1], row[4], row[5], row[6], row[7], row[8], row[9], row[10], row[13],
+        to_epoch_us(row[16]), row[17] or None, list(row[18] or ())
+    )
+
+
+def attributes_hash(attributes: Tuple[Any, ...]) -> str:
+    """
+    Get a stable fingerprint of device attributes, stored with each version.
+
+    Args:
+        attributes: Tuple in DEVICE_ATTRIBUTE_COLUMNS order
+
+    Returns:
+        Hex digest
+    """
+    encoded = json.dumps(attributes, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.md5(encoded.encode('utf-8')).hexdigest()
+
+
+class DeviceKeyCache:
+    """
+    In-process cache of the current device_key per device ID.
+
+    resolve() runs inside the batch transaction and returns the versions it
+    created; they are only added to the cache by commit() once that
+    transaction has committed, so a rolled back batch never leaves keys that
+    do not exist in the database.
+    """
+
+    def __init__(self, table: str = None):
+        """
+        Initialize an empty cache.
+
+        Args:
+            table: Devices table name (defaults to timescaledb.devices_table)
+        """
+        self.table = table or settings.timescaledb.devices_table
+        self._keys: Dict[str, Tuple[Optional[Tuple[Any, ...]], int]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def resolve(self, cur, rows: List[Tuple[Any, ...]]) -> Tuple[List[int], Dict[str, Tuple[Any, int]]]:
+        """
+        Get the device_key of every reading, creating device versions as needed.
+
+        A device whose attributes change within a batch gets one new
+        version, with the attributes of its last reading in the batch.
+
+        Args:
+            cur: psycopg2 cursor inside the batch transaction
+            rows: Readings in SENSOR_READING_COLUMNS order
+
+        Returns:
+            Tuple of the keys in row order and the resolved versions to commit()
+        """
+        keys: List[Optional[int]] = []
+        changed: Dict[str, Tuple[Any, ...]] = {}
+        cached_keys = self._keys
+
+        for row in rows:
+            device_id = row[0]
+            attributes = device_attributes(row)
+            cached = cached_keys.get(device_id)
+            if cached is not None and cached[0] == attributes and device_id not in changed:
+                keys.append(cached[1])
+            else:
+                changed[device_id] = attributes
+                keys.append(None)
+
+        self.hits += len(rows) - len(changed)
+        if not changed:
+            return keys, {}
+
+        self.misses += len(changed)
+        versions = self._upsert_versions(cur, changed)
+        for i, key in enumerate(keys):
+            if key is None:
+                keys[i] = versions[rows[i][0]][1]
+        return keys, versions
+
+    def commit(self, versions: Dict[str, Tuple[Any, int]]):
+        """
+        Cache versions resolved by a batch after its transaction has committed.
+
+        Args:
+            versions: Versions returned by resolve()
+        """
+        if versions:
+            with self._lock:
+                self._keys.update(versions)
+
+    def clear(self):
+        """
+        Forget all cached keys, e.g. after the devices table was rebuilt.
+        """
+        with self._lock:
+            self._keys.clear()
+
+    def _upsert_versions(self, cur, changed: Dict[str, Tuple[Any, ...]]) -> Dict[str, Tuple[Any, int]]:
+        """
+        Close outdated device versions and insert or look up the current ones.
+
+        Args:
+            cur: psycopg2 cursor inside the batch transaction
+            changed: Attributes per device ID that missed the cache
+
+        Returns:
+            (attributes, device_key) per device ID; attributes are None when
+            another writer stored a different version first
+        """
+        hashes = {device_id: attributes_hash(attributes) for device_id, attributes in changed.items()}
+
+        # Close current versions whose attributes differ
+        psycopg2.extras.execute_values(cur, f"""
+            UPDATE {self.table} AS d SET valid_to = now()
+            FROM (VALUES %s) AS v(device_id, attributes_hash)
+            WHERE d.device_id = v.device_id
+                AND d.valid_to IS NULL
+                AND d.attributes_hash <> v.attributes_hash
+        """, list(hashes.items()))
+        closed = cur.rowcount
+
+        # Insert the new versions; devices whose current version already
+        # matches (e.g. after a restart) return their existing key
+        values = []
+        for device_id, attributes in changed.items():
+            values.append((device_id, hashes[device_id]) + attributes[:9] + (
+                from_epoch_us(attributes[9]),
+                psycopg2.extras.Json(attributes[10]) if attributes[10] else None,
+                attributes[11]
+            ))
+        returned = psycopg2.extras.execute_values(cur, f"""
+            INSERT INTO {self.table} (
+                device_id, attributes_hash, {', '.join(DEVICE_ATTRIBUTE_COLUMNS)}, valid_from
+            ) VALUES %s
+            ON CONFLICT (device_id) WHERE valid_to IS NULL
+            DO UPDATE SET valid_from = {self.table}.valid_from
+            RETURNING device_id, device_key, attributes_hash
+        """, values, template=f"({', '.join(['%s'] * (len(DEVICE_ATTRIBUTE_COLUMNS) + 2))}, now())", fetch=True)
+
+        versions = {}
+        for device_id, device_key, stored_hash in returned:
+            attributes = changed[device_id] if stored_hash == hashes[device_id] else None
+            versions[device_id] = (attributes, device_key)
+
+        if closed:
+            log.info(f"Created new versions of {closed} devices with changed attributes")
+        log.debug(f"Resolved {len(versions)} device keys in {self.table}")
+        return versions
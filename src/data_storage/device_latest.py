@@ -0,0 +1,135 @@
+"""
+Latest-value rows for the device_latest table.
+
+device_summary used to aggregate the whole sensor_readings hypertable,
+compressed chunks included, on every query. Instead the sink keeps one row
+per device with its newest reading and running counts. DeviceLatestCollector
+collapses a batch to one row per device, in DEVICE_LATEST_COLUMNS order, so
+the table is upserted once per device per batch.
+
+Latest values come from every reading of the batch, but the counts only
+from the rows the batch actually stored, as reported by the insert, so
+duplicates and replayed batches are not counted twice.
+"""
+
+from typing import List, Dict, Any, Iterable, Tuple
+
+from src.data_storage.columnar_batch import ColumnarBatch, to_epoch_us, from_epoch_us
+from src.data_storage.copy_ingest import reading_to_row
+
+
+DEVICE_LATEST_COLUMNS = (
+    'device_id', 'device_type', 'first_seen', 'last_seen', 'last_value',
+    'battery_level', 'signal_strength', 'status',
+    'total_readings', 'anomaly_count', 'value_sum', 'value_count'
+)
+
+# Positions in a collected row
+_DEVICE_TYPE, _FIRST, _LAST, _VALUE, _BATTERY, _SIGNAL, _STATUS = 1, 2, 3, 4, 5, 6, 7
+_READINGS, _ANOMALIES, _VALUE_SUM, _VALUE_COUNT = 8, 9, 10, 11
+
+
+class DeviceLatestCollector:
+    """
+    Collapses sensor readings to the newest reading and counts per device.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty collector.
+        """
+        self._rows: Dict[str, List[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, device_id: str, device_type: str, timestamp_us: int, value: Any,
+            battery_level: Any, signal_strength: Any, status: Any):
+        """
+        Merge one reading into the row of its device.
+
+        The last value, device type and status come from the newest reading;
+        battery level and signal strength keep the previous value when the
+        newest reading has none. Counts are passed to rows() once stored.
+
+        Args:
+            device_id: Device ID
+            device_type: Device type
+            timestamp_us: Reading timestamp in epoch microseconds
+            value: Reading value
+            battery_level: Battery level
+            signal_strength: Signal strength
+            status: Device status
+        """
+        if not device_id or timestamp_us is None:
+            return
+        row = self._rows.get(device_id)
+        if row is None:
+            row = [device_id, device_type, timestamp_us, timestamp_us, value,
+                   battery_level, signal_strength, status, 0, 0, 0.0, 0]
+            self._rows[device_id] = row
+        elif timestamp_us >= row[_LAST]:
+            row[_DEVICE_TYPE] = device_type
+            row[_LAST] = timestamp_us
+            row[_VALUE] = value
+            row[_STATUS] = status
+            if battery_level is not None:
+                row[_BATTERY] = battery_level
+            if signal_strength is not None:
+                row[_SIGNAL] = signal_strength
+        elif timestamp_us < row[_FIRST]:
+            row[_FIRST] = timestamp_us
+
+    def add_batch(self, readings):
+        """
+        Merge the latest values of every reading of a batch.
+
+        Args:
+            readings: List of sensor reading data, or a built ColumnarBatch
+        """
+        if isinstance(readings, ColumnarBatch):
+            columns: Iterable[Tuple[Any, ...]] = zip(
+                readings.device_id, readings.device_type, readings.timestamp_us, readings.value,
+                readings.battery_level, readings.signal_strength, readings.status
+            )
+        else:
+            columns = (
+                (row[0], row[1], to_epoch_us(row[2]), row[3], row[11], row[12], row[15])
+                for row in map(reading_to_row, readings)
+            )
+        add = self.add
+        for reading in columns:
+            add(*reading)
+
+    def rows(self, counts: Iterable[Tuple[str, int, int, float, int]] = ()) -> List[Tuple[Any, ...]]:
+        """
+        Get one row per device in DEVICE_LATEST_COLUMNS order.
+
+        Rows are sorted by device ID so concurrent writers upserting
+        overlapping batches lock rows in the same order.
+
+        Args:
+            counts: (device_id, readings, anomalies, value_sum, value_count) of
+                the readings the batch stored, as returned by device_counts();
+                a device may appear more than once
+
+        Returns:
+            Row tuples with datetime first and last seen times
+        """
+        merged = {device_id: list(row) for device_id, row in self._rows.items()}
+        for device_id, readings, anomalies, value_sum, value_count in counts:
+            row = merged.get(device_id)
+            if row is None:
+                continue
+            row[_READINGS] += readings
+            row[_ANOMALIES] += anomalies
+            row[_VALUE_SUM] += value_sum
+            row[_VALUE_COUNT] += value_count
+
+        rows = []
+        for device_id in sorted(merged):
+            row = merged[device_id]
+            row[_FIRST] = from_epoch_us(row[_FIRST])
+            row[_LAST] = from_epoch_us(row[_LAST])
+            rows.append(tuple(row))
+        return rows
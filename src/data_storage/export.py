@@ -0,0 +1,381 @@
+"""
+Streaming export of sensor readings.
+
+execute_query materializes a whole result as a list of dictionaries, which
+does not scale to months of readings. StreamingExporter reads through a
+dedicated read-only connection instead: CSV is produced by the server with
+``COPY (SELECT ...) TO STDOUT`` and written straight to the output, NDJSON
+and Parquet are built from fixed-size chunks of a named server-side cursor,
+so memory stays constant whatever the size of the export.
+
+Large exports can be split into per-range part files that are written in
+parallel, each on its own connection.
+
+Usage:
+    python -m src.data_storage.export --format csv --start 2026-07-01 --end 2026-10-01 --output readings.csv
+    LOG_LEVEL=WARNING python -m src.data_storage.export --format ndjson --device-id temp-001 | jq .
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Iterator
+
+import psycopg2
+
+from src.utils.logger import log
+from src.config.config import settings
+from src.data_storage.copy_ingest import SENSOR_READING_COLUMNS
+
+
+EXPORT_FORMATS = ('csv', 'ndjson', 'parquet')
+
+
+def _json_default(value: Any) -> Any:
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Treat naive datetimes as UTC so they compare with database timestamps.
+    """
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _parquet_schema():
+    """
+    Build the Parquet schema of an export; needs the optional pyarrow package.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("Parquet exports require pyarrow (pip install pyarrow)")
+
+    types = {
+        'timestamp': pa.timestamp('us', tz='UTC'), 'maintenance_date': pa.timestamp('us', tz='UTC'),
+        'value': pa.float64(), 'latitude': pa.float64(), 'longitude': pa.float64(),
+        'battery_level': pa.float64(), 'signal_strength': pa.float64(),
+        'floor': pa.int32(), 'is_anomaly': pa.bool_(), 'tags': pa.list_(pa.string()),
+    }
+    # Everything else, device_metadata included, is exported as text
+    return pa.schema([pa.field(column, types.get(column, pa.string())) for column in SENSOR_READING_COLUMNS])
+
+
+class StreamingExporter:
+    """
+    Exports sensor readings with constant memory in CSV, NDJSON or Parquet.
+
+    Filters select readings by device, device type and a half-open time
+    range [start, end); rows are ordered by timestamp.
+    """
+
+    def __init__(self, dsn: str = None, table: str = None, fetch_size: int = None,
+                 workers: int = None, partition_interval: float = None):
+        """
+        Initialize the exporter.
+
+        Args:
+            dsn: Database connection string (defaults to the TimescaleDB database URL)
+            table: Table or view to export (defaults to timescaledb.readings_source)
+            fetch_size: Rows fetched per server-side cursor round trip (defaults to timescaledb.export_fetch_size)
+            workers: Parallel connections of export_parallel (defaults to timescaledb.export_workers)
+            partition_interval: Seconds of data per part file (defaults to timescaledb.export_partition_interval)
+        """
+        self.dsn = dsn or settings.timescaledb.database_url
+        self.table = table or settings.timescaledb.readings_source
+        self.fetch_size = fetch_size or settings.timescaledb.export_fetch_size
+        self.workers = workers or settings.timescaledb.export_workers
+        self.partition_interval = timedelta(
+            seconds=partition_interval or settings.timescaledb.export_partition_interval
+        )
+
+    @contextmanager
+    def _connection(self):
+        conn = psycopg2.connect(self.dsn)
+        try:
+            conn.set_session(readonly=True)
+            yield conn
+        finally:
+            conn.close()
+
+    def query(self, device_id: str = None, device_type: str = None,
+              start: datetime = None, end: datetime = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Build the export query.
+
+        Args:
+            device_id: Optional device ID filter
+            device_type: Optional device type filter
+            start: Optional inclusive start of the time range
+            end: Optional exclusive end of the time range
+
+        Returns:
+            Tuple of the SQL query and its psycopg2 parameters
+        """
+        conditions, parameters = self._conditions(device_id, device_type, start, end)
+        where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+        query = f"""
+            SELECT {', '.join(SENSOR_READING_COLUMNS)}
+            FROM {self.table}
+            {where_clause}
+            ORDER BY timestamp
+        """
+        return query, parameters
+
+    def _conditions(self, device_id, device_type, start, end) -> Tuple[List[str], Dict[str, Any]]:
+        conditions = []
+        parameters = {}
+        start, end = _as_utc(start), _as_utc(end)
+        if device_id:
+            conditions.append("device_id = %(device_id)s")
+            parameters['device_id'] = device_id
+        if device_type:
+            conditions.append("device_type = %(device_type)s")
+            parameters['device_type'] = device_type
+        if start:
+            conditions.append("timestamp >= %(start)s")
+            parameters['start'] = start
+        if end:
+            conditions.append("timestamp < %(end)s")
+            parameters['end'] = end
+        return conditions, parameters
+
+    def iter_chunks(self, device_id: str = None, device_type: str = None,
+                    start: datetime = None, end: datetime = None) -> Iterator[List[Tuple[Any, ...]]]:
+        """
+        Stream readings in chunks from a named server-side cursor.
+
+        Args:
+            device_id: Optional device ID filter
+            device_type: Optional device type filter
+            start: Optional inclusive start of the time range
+            end: Optional exclusive end of the time range
+
+        Yields:
+            Lists of at most fetch_size row tuples in SENSOR_READING_COLUMNS order
+        """
+        query, parameters = self.query(device_id, device_type, start, end)
+        with self._connection() as conn:
+            with conn.cursor(name=f"export_{uuid.uuid4().hex}") as cur:
+                cur.itersize = self.fetch_size
+                cur.execute(query, parameters)
+                while True:
+                    rows = cur.fetchmany(self.fetch_size)
+                    if not rows:
+                        break
+                    yield rows
+
+    def iter_rows(self, device_id: str = None, device_type: str = None,
+                  start: datetime = None, end: datetime = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream readings one by one.
+
+        Args:
+            device_id: Optional device ID filter
+            device_type: Optional device type filter
+            start: Optional inclusive start of the time range
+            end: Optional exclusive end of the time range
+
+        Yields:
+            Sensor reading dictionaries
+        """
+        for rows in self.iter_chunks(device_id, device_type, start, end):
+            for row in rows:
+                yield dict(zip(SENSOR_READING_COLUMNS, row))
+
+    def export(self, output, fmt: str = 'csv', device_id: str = None, device_type: str = None,
+               start: datetime = None, end: datetime = None) -> int:
+        """
+        Write readings to a file or stdout.
+
+        Args:
+            output: File path, '-' for stdout, or an open file object
+                (binary for Parquet, text otherwise)
+            fmt: One of EXPORT_FORMATS
+            device_id: Optional device ID filter
+            device_type: Optional device type filter
+            start: Optional inclusive start of the time range
+            end: Optional exclusive end of the time range
+
+        Returns:
+            Number of exported rows
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format {fmt!r}, expected one of {', '.join(EXPORT_FORMATS)}")
+
+        start_time = time.time()
+        with self._open(output, fmt) as out:
+            if fmt == 'csv':
+                rows = self._write_csv(out, device_id, device_type, start, end)
+            elif fmt == 'ndjson':
+                rows = self._write_ndjson(out, self.iter_chunks(device_id, device_type, start, end))
+            else:
+                rows = self._write_parquet(out, self.iter_chunks(device_id, device_type, start, end))
+
+        log.info(f"Exported {rows} readings as {fmt} in {time.time() - start_time:.1f}s")
+        return rows
+
+    def export_parallel(self, directory: str, fmt: str = 'csv', device_id: str = None,
+                        device_type: str = None, start: datetime = None, end: datetime = None,
+                        workers: int = None) -> List[Tuple[str, int]]:
+        """
+        Write readings to one part file per time range, several ranges at a time.
+
+        The range is split into partition_interval slices and every slice is
+        exported on its own connection to ``part-NNNNN.<fmt>``; reading the
+        parts in name order gives the readings in timestamp order. Without
+        start or end the bounds of the filtered data are used.
+
+        Args:
+            directory: Directory for the part files (created if missing)
+            fmt: One of EXPORT_FORMATS
+            device_id: Optional device ID filter
+            device_type: Optional device type filter
+            start: Optional inclusive start of the time range
+            end: Optional exclusive end of the time range
+            workers: Parallel connections (defaults to the exporter's workers)
+
+        Returns:
+            (path, rows) per part file, in time order
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format {fmt!r}, expected one of {', '.join(EXPORT_FORMATS)}")
+
+        ranges = self.partitions(device_id, device_type, start, end)
+        if not ranges:
+            log.info("No readings to export")
+            return []
+
+        os.makedirs(directory, exist_ok=True)
+        paths = [os.path.join(directory, f"part-{i:05d}.{fmt}") for i in range(len(ranges))]
+
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=workers or self.workers) as executor:
+            counts = list(executor.map(
+                lambda part: self.export(part[0], fmt, device_id, device_type, *part[1]),
+                zip(paths, ranges)
+            ))
+
+        log.info(f"Exported {sum(counts)} readings as {fmt} to {len(paths)} files in "
+                 f"{time.time() - start_time:.1f}s")
+        return list(zip(paths, counts))
+
+    def partitions(self, device_id: str = None, device_type: str = None,
+                   start: datetime = None, end: datetime = None) -> List[Tuple[datetime, datetime]]:
+        """
+        Split an export range into partition_interval slices.
+
+        Args:
+            device_id: Optional device ID filter
+            device_type: Optional device type filter
+            start: Optional inclusive start (defaults to the oldest matching reading)
+            end: Optional exclusive end (defaults to just after the newest matching reading)
+
+        Returns:
+            Consecutive [start, end) ranges, empty if there is nothing to export
+        """
+        start, end = _as_utc(start), _as_utc(end)
+        if start is None or end is None:
+            conditions, parameters = self._conditions(device_id, device_type, start, end)
+            where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+            with self._connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(f"SELECT MIN(timestamp), MAX(timestamp) FROM {self.table} {where_clause}", parameters)
+                    oldest, newest = cur.fetchone()
+            if oldest is None:
+                return []
+            start = start or oldest
+            end = end or newest + timedelta(microseconds=1)
+
+        ranges = []
+        while start < end:
+            ranges.append((start, min(end, start + self.partition_interval)))
+            start = ranges[-1][1]
+        return ranges
+
+    @contextmanager
+    def _open(self, output, fmt: str):
+        binary = fmt == 'parquet'
+        if output == '-':
+            yield sys.stdout.buffer if binary else sys.stdout
+        elif hasattr(output, 'write'):
+            yield output
+        else:
+            with open(output, 'wb' if binary else 'w', newline='' if not binary else None) as out:
+                yield out
+
+    def _write_csv(self, out, device_id, device_type, start, end) -> int:
+        query, parameters = self.query(device_id, device_type, start, end)
+        with self._connection() as conn:
+            with conn.cursor() as cur:
+                select = cur.mogrify(query, parameters).decode('utf-8')
+                cur.copy_expert(f"COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER true)", out)
+                return cur.rowcount
+
+    def _write_ndjson(self, out, chunks) -> int:
+        rows = 0
+        for chunk in chunks:
+            out.write(''.join(
+                json.dumps(dict(zip(SENSOR_READING_COLUMNS, row)), default=_json_default) + '\n'
+                for row in chunk
+            ))
+            rows += len(chunk)
+        return rows
+
+    def _write_parquet(self, out, chunks) -> int:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = _parquet_schema()
+        metadata = SENSOR_READING_COLUMNS.index('device_metadata')
+        rows = 0
+        with pq.ParquetWriter(out, schema) as writer:
+            for chunk in chunks:
+                columns = [list(column) for column in zip(*chunk)]
+                columns[metadata] = [json.dumps(value) if value is not None else None for value in columns[metadata]]
+                writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+                rows += len(chunk)
+        return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export sensor readings from TimescaleDB")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv", help="Output format")
+    parser.add_argument("--output", default="-", help="Output file, '-' for stdout")
+    parser.add_argument("--parallel", metavar="DIRECTORY", help="Write parallel part files to this directory")
+    parser.add_argument("--workers", type=int, help="Parallel connections with --parallel")
+    parser.add_argument("--device-id", help="Only readings of this device")
+    parser.add_argument("--device-type", help="Only readings of this device type")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="Inclusive start (ISO 8601)")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="Exclusive end (ISO 8601)")
+    args = parser.parse_args()
+
+    if args.output == '-' and not args.parallel:
+        # Keep stdout for the exported data
+        log.remove()
+        log.add(sys.stderr, format=settings.logging.format, level=settings.logging.level)
+
+    exporter = StreamingExporter()
+    filters = dict(device_id=args.device_id, device_type=args.device_type, start=args.start, end=args.end)
+    try:
+        if args.parallel:
+            exporter.export_parallel(args.parallel, args.format, workers=args.workers, **filters)
+        else:
+            exporter.export(args.output, args.format, **filters)
+    except Exception as e:
+        log.error(f"Error exporting data: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
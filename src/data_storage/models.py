@@ -2,9 +2,11 @@
 Data models for sensor readings and related entities.
 """
 
+import sys
 import enum
+from collections.abc import Mapping
 from datetime import datetime, timezone
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple, Iterator
 from dataclasses import dataclass, field
 from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, JSON, Enum as SQLEnum
 from sqlalchemy.dialects.postgresql import ARRAY, JSONB
@@ -281,10 +283,412 @@ class SensorReadingDTO:
             status=message.get('status', 'ACTIVE'),
             maintenance_date=maintenance_date,
             device_metadata=message.get('device_metadata', {}),
-            tags=message.get('tags', [])
+            tags=list(message.get('tags') or [])
         )
 
 
+# Upper bound on the number of distinct shared locations, tag lists and metadata maps kept per process
+_SHARED_CACHE_MAX = 65536
+
+_shared_locations: Dict[tuple, 'SensorLocation'] = {}
+_shared_tags: Dict[tuple, Tuple[str, ...]] = {}
+_shared_metadata: Dict[tuple, Dict[str, Any]] = {}
+
+
+def _intern(value: Any) -> Any:
+    """
+    Intern a string so equal values share one object; other values pass through.
+    """
+    return sys.intern(value) if type(value) is str else value
+
+
+def _share(cache: Dict[tuple, Any], key: tuple, factory) -> Any:
+    """
+    Look up a shared value in a bounded cache, creating it on a miss.
+
+    Args:
+        cache: Cache to use
+        key: Hashable key of the value
+        factory: Callable creating the value
+
+    Returns:
+        Shared value for the key
+    """
+    value = cache.get(key)
+    if value is None:
+        if len(cache) >= _SHARED_CACHE_MAX:
+            cache.clear()
+        value = cache[key] = factory()
+    return value
+
+
+def shared_tags(tags: Optional[List[str]]) -> Tuple[str, ...]:
+    """
+    Get a shared tuple of interned tags.
+
+    Args:
+        tags: List of tags
+
+    Returns:
+        Tuple shared by every reading with the same tags
+    """
+    if not tags:
+        return ()
+    key = tuple(tags)
+    return _share(_shared_tags, key, lambda: tuple(map(_intern, key)))
+
+
+def shared_metadata(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Get a shared device metadata dictionary with interned keys and values.
+
+    The returned dictionary is shared by every reading with the same metadata
+    and must not be modified.
+
+    Args:
+        metadata: Device metadata
+
+    Returns:
+        Shared metadata dictionary
+    """
+    if not metadata:
+        return {}
+    try:
+        key = tuple(metadata.items())
+        hash(key)
+    except TypeError:
+        return metadata
+    return _share(_shared_metadata, key, lambda: {_intern(k): _intern(v) for k, v in key})
+
+
+class SensorLocation(Mapping):
+    """
+    Immutable location of a sensor, shared by all readings from the same place.
+
+    Supports read-only dictionary access so code written against the Avro
+    location record keeps working.
+    """
+
+    __slots__ = ('latitude', 'longitude', 'building', 'floor', 'zone', 'room')
+
+    FIELDS = __slots__
+    _FIELD_SET = frozenset(FIELDS)
+
+    def __init__(self, latitude: Optional[float] = None, longitude: Optional[float] = None,
+                 building: Optional[str] = None, floor: Optional[int] = None,
+                 zone: Optional[str] = None, room: Optional[str] = None):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.building = _intern(building)
+        self.floor = floor
+        self.zone = _intern(zone)
+        self.room = _intern(room)
+
+    @classmethod
+    def shared(cls, location: Optional[Mapping]) -> Optional['SensorLocation']:
+        """
+        Get the shared SensorLocation for a location record.
+
+        Args:
+            location: Location dictionary or SensorLocation
+
+        Returns:
+            Shared SensorLocation, or None if no location is given
+        """
+        if location is None or isinstance(location, cls):
+            return location
+        get = location.get
+        key = (get('latitude'), get('longitude'), get('building'), get('floor'), get('zone'), get('room'))
+        return _share(_shared_locations, key, lambda: cls(*key))
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._FIELD_SET:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.FIELDS)
+
+    def __repr__(self) -> str:
+        return f"SensorLocation({self.to_dict()})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the location into an Avro location record.
+        """
+        return {
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'building': self.building,
+            'floor': self.floor,
+            'zone': self.zone,
+            'room': self.room
+        }
+
+
+class CompactSensorReading(Mapping):
+    """
+    Memory-compact sensor reading passed between pipeline stages.
+
+    Uses __slots__ instead of a per-instance __dict__, interns device_id,
+    device_type, unit, status and tags, and shares location, tag and device
+    metadata objects between readings with equal values. Read-only dictionary
+    access (reading['value'], reading.get('unit'), dict(reading)) matches the
+    Avro record, so it can be used wherever a decoded reading dict was used.
+    """
+
+    __slots__ = ('device_id', 'device_type', 'timestamp', 'value', 'unit', 'location',
+                 'battery_level', 'signal_strength', 'is_anomaly', 'firmware_version',
+                 'device_metadata', 'status', 'tags', 'maintenance_date')
+
+    FIELDS = __slots__
+    _FIELD_SET = frozenset(FIELDS)
+
+    def __init__(self, device_id: str, device_type: str, timestamp: str, value: Optional[float], unit: str,
+                 location: Optional[Mapping] = None, battery_level: Optional[float] = None,
+                 signal_strength: Optional[float] = None, is_anomaly: bool = False,
+                 firmware_version: Optional[str] = None, device_metadata: Optional[Dict[str, Any]] = None,
+                 status: str = DeviceStatus.ACTIVE.value, tags: Optional[List[str]] = None,
+                 maintenance_date: Optional[str] = None):
+        self.device_id = _intern(device_id)
+        self.device_type = _intern(device_type)
+        self.timestamp = timestamp
+        self.value = value
+        self.unit = _intern(unit)
+        self.location = SensorLocation.shared(location)
+        self.battery_level = battery_level
+        self.signal_strength = signal_strength
+        self.is_anomaly = is_anomaly
+        self.firmware_version = _intern(firmware_version)
+        self.device_metadata = shared_metadata(device_metadata)
+        self.status = _intern(status)
+        self.tags = shared_tags(tags)
+        self.maintenance_date = maintenance_date
+
+    @classmethod
+    def from_dict(cls, reading: Mapping) -> 'CompactSensorReading':
+        """
+        Create a compact reading from a sensor reading dictionary.
+
+        Args:
+            reading: Reading in the Avro record shape
+
+        Returns:
+            CompactSensorReading instance
+        """
+        if isinstance(reading, cls):
+            return reading
+        get = reading.get
+        return cls(
+            device_id=get('device_id', ''),
+            device_type=get('device_type', ''),
+            timestamp=get('timestamp'),
+            value=get('value'),
+            unit=get('unit', ''),
+            location=get('location'),
+            battery_level=get('battery_level'),
+            signal_strength=get('signal_strength'),
+            is_anomaly=get('is_anomaly', False),
+            firmware_version=get('firmware_version'),
+            device_metadata=get('device_metadata'),
+            status=get('status') or DeviceStatus.ACTIVE.value,
+            tags=get('tags'),
+            maintenance_date=get('maintenance_date')
+        )
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._FIELD_SET:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._FIELD_SET:
+            return getattr(self, key)
+        return default
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.FIELDS)
+
+    def __repr__(self) -> str:
+        return f"CompactSensorReading(device_id='{self.device_id}', timestamp='{self.timestamp}', value={self.value})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the reading into a new dictionary in the Avro record shape.
+
+        Returns:
+            Sensor reading dictionary, safe to modify
+        """
+        return {
+            'device_id': self.device_id,
+            'device_type': self.device_type,
+            'timestamp': self.timestamp,
+            'value': self.value,
+            'unit': self.unit,
+            'location': self.location.to_dict() if self.location is not None else None,
+            'battery_level': self.battery_level,
+            'signal_strength': self.signal_strength,
+            'is_anomaly': self.is_anomaly,
+            'firmware_version': self.firmware_version,
+            'device_metadata': dict(self.device_metadata),
+            'status': self.status,
+            'tags': list(self.tags),
+            'maintenance_date': self.maintenance_date
+        }
+
+
+# RuuviTag fields and how each is published as a separate sensor reading:
+# (field, device_type, unit, tags, extra device metadata)
+RUUVITAG_MEASUREMENTS: Tuple[Tuple[str, str, str, Tuple[str, ...], Dict[str, str]], ...] = (
+    ("temperature", "temperature_sensor", "°C", ("ruuvitag", "ble", "temperature"), {}),
+    ("humidity", "humidity_sensor", "%", ("ruuvitag", "ble", "humidity"), {}),
+    ("pressure", "pressure_sensor", "Pa", ("ruuvitag", "ble", "pressure"), {}),
+    ("acceleration_x", "acceleration_sensor", "g", ("ruuvitag", "ble", "acceleration", "x-axis"),
+     {"axis": "x", "sensor_type": "acceleration"}),
+    ("acceleration_y", "acceleration_sensor", "g", ("ruuvitag", "ble", "acceleration", "y-axis"),
+     {"axis": "y", "sensor_type": "acceleration"}),
+    ("acceleration_z", "acceleration_sensor", "g", ("ruuvitag", "ble", "acceleration", "z-axis"),
+     {"axis": "z", "sensor_type": "acceleration"}),
+    ("battery_voltage", "battery_sensor", "V", ("ruuvitag", "ble", "battery"), {}),
+    ("tx_power", "transmit_power_sensor", "dBm", ("ruuvitag", "ble", "tx_power"), {}),
+    ("movement_counter", "movement_sensor", "count", ("ruuvitag", "ble", "movement"), {}),
+)
+
+
+class RuuviTagAdvertisement(Mapping):
+    """
+    All measurements of one RuuviTag advertisement.
+
+    Carries the location, battery, signal, firmware and status once instead
+    of once per measurement. readings() expands it into the same sensor
+    readings the adapter publishes one by one, so consumers and the sink can
+    treat both formats alike. Read-only dictionary access matches the
+    RuuviTagAdvertisement Avro record.
+    """
+
+    __slots__ = ('device_id', 'timestamp', 'measurements', 'anomalies', 'location',
+                 'battery_level', 'signal_strength', 'firmware_version', 'status')
+
+    FIELDS = __slots__
+    _FIELD_SET = frozenset(FIELDS)
+
+    def __init__(self, device_id: str, timestamp: str, measurements: Dict[str, float],
+                 anomalies: Optional[List[str]] = None, location: Optional[Mapping] = None,
+                 battery_level: Optional[float] = None, signal_strength: Optional[float] = None,
+                 firmware_version: Optional[str] = None, status: str = DeviceStatus.ACTIVE.value):
+        self.device_id = _intern(device_id)
+        self.timestamp = timestamp
+        self.measurements = measurements
+        self.anomalies = shared_tags(anomalies)
+        self.location = SensorLocation.shared(location)
+        self.battery_level = battery_level
+        self.signal_strength = signal_strength
+        self.firmware_version = _intern(firmware_version)
+        self.status = _intern(status)
+
+    @classmethod
+    def from_dict(cls, advertisement: Mapping) -> 'RuuviTagAdvertisement':
+        """
+        Create an advertisement from a RuuviTagAdvertisement record.
+
+        Args:
+            advertisement: Advertisement in the Avro record shape
+
+        Returns:
+            RuuviTagAdvertisement instance
+        """
+        if isinstance(advertisement, cls):
+            return advertisement
+        get = advertisement.get
+        return cls(
+            device_id=get('device_id', ''),
+            timestamp=get('timestamp'),
+            measurements=get('measurements') or {},
+            anomalies=get('anomalies'),
+            location=get('location'),
+            battery_level=get('battery_level'),
+            signal_strength=get('signal_strength'),
+            firmware_version=get('firmware_version'),
+            status=get('status') or DeviceStatus.ACTIVE.value
+        )
+
+    def readings(self) -> List[CompactSensorReading]:
+        """
+        Expand the advertisement into one sensor reading per measurement.
+
+        Returns:
+            Readings in RUUVITAG_MEASUREMENTS order, for the measured fields only
+        """
+        measurements = self.measurements
+        anomalies = self.anomalies
+        readings = []
+        for field_name, device_type, unit, tags, metadata_extra in RUUVITAG_MEASUREMENTS:
+            if field_name not in measurements:
+                continue
+            device_metadata = {"parent_device": self.device_id, "sensor_type": field_name}
+            device_metadata.update(metadata_extra)
+            readings.append(CompactSensorReading(
+                device_id=f"{self.device_id}_{field_name}",
+                device_type=device_type,
+                timestamp=self.timestamp,
+                value=measurements[field_name],
+                unit=unit,
+                location=self.location,
+                battery_level=self.battery_level,
+                signal_strength=self.signal_strength,
+                is_anomaly=field_name in anomalies,
+                firmware_version=self.firmware_version,
+                device_metadata=device_metadata,
+                status=self.status,
+                tags=tags
+            ))
+        return readings
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._FIELD_SET:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._FIELD_SET:
+            return getattr(self, key)
+        return default
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.FIELDS)
+
+    def __repr__(self) -> str:
+        return f"RuuviTagAdvertisement(device_id='{self.device_id}', timestamp='{self.timestamp}', measurements={self.measurements})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the advertisement into a new dictionary in the Avro record shape.
+
+        Returns:
+            Advertisement dictionary, safe to modify
+        """
+        return {
+            'device_id': self.device_id,
+            'timestamp': self.timestamp,
+            'measurements': dict(self.measurements),
+            'anomalies': list(self.anomalies),
+            'location': self.location.to_dict() if self.location is not None else None,
+            'battery_level': self.battery_level,
+            'signal_strength': self.signal_strength,
+            'firmware_version': self.firmware_version,
+            'status': self.status
+        }
+
+
 @dataclass
 class DeviceStatistics:
     """
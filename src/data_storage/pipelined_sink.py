@@ -0,0 +1,540 @@
+"""
+Pipelined TimescaleDB sink - decouples Kafka polling from database writes.
+
+The poll loop deserializes and validates messages and hands complete batches
+to bounded per-writer queues. Each writer thread has its own TimescaleDB
+connection and owns a fixed subset of partitions, so batches of one partition
+are always written in order. When a writer's queue is full its partitions are
+paused so the consumer keeps polling (and stays in the group) without fetching
+more data than the writers can absorb.
+"""
+
+import time
+import queue
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple
+from confluent_kafka import TopicPartition
+
+from src.utils.logger import log
+from src.config.config import settings
+from src.data_ingestion.consumer import KafkaConsumer
+from src.data_storage.database import db_manager
+from src.data_storage.models import RuuviTagAdvertisement
+from src.data_storage.timescaledb_sink import TimescaleDBSink
+
+
+class PendingBatch:
+    """
+    A batch handed from the poll loop to the writer threads.
+    """
+
+    __slots__ = ('seq', 'readings', 'offsets')
+
+    def __init__(self, seq: int, readings: List[Dict[str, Any]], offsets: Dict[Tuple[str, int], int]):
+        self.seq = seq
+        self.readings = readings
+        self.offsets = offsets
+
+
+class OffsetTracker:
+    """
+    Tracks in-flight batches so offsets are only stored once every earlier batch is written.
+
+    Writers may finish out of order; offsets advance over the contiguous
+    prefix of completed batches so a restart never skips unwritten data.
+    Only the poll thread uses this class.
+    """
+
+    def __init__(self):
+        self.next_seq = 0
+        self.in_flight: "OrderedDict[int, Tuple[Dict[Tuple[str, int], int], bool]]" = OrderedDict()
+
+    def register(self, offsets: Dict[Tuple[str, int], int]) -> int:
+        """
+        Register a new batch and return its sequence number.
+        """
+        seq = self.next_seq
+        self.next_seq += 1
+        self.in_flight[seq] = (offsets, False)
+        return seq
+
+    def complete(self, seq: int) -> Dict[Tuple[str, int], int]:
+        """
+        Mark a batch as written.
+
+        Returns:
+            Highest consumed offset per partition that is now safe to store
+        """
+        if seq in self.in_flight:
+            self.in_flight[seq] = (self.in_flight[seq][0], True)
+
+        ready = {}
+        while self.in_flight:
+            first_seq, (offsets, done) = next(iter(self.in_flight.items()))
+            if not done:
+                break
+            ready.update(offsets)
+            del self.in_flight[first_seq]
+        return ready
+
+    def __len__(self) -> int:
+        return len(self.in_flight)
+
+
+class PipelinedTimescaleDBSink(TimescaleDBSink):
+    """
+    TimescaleDB sink with a poll stage, bounded batch queues and parallel writers.
+
+    Partition p is always handled by writer p % writer_threads. This keeps
+    per-partition write order, which the offsets stored with each batch rely
+    on, while different partitions are written in parallel.
+
+    Kafka offsets are also stored explicitly once a batch and every batch
+    before it have been written, so Kafka's auto-commit never runs ahead of
+    the database. A batch that is neither written nor spilled stops its
+    writer and then the sink, so no later batch stores offsets past it.
+    """
+
+    def __init__(self, writer_threads: int = None, queue_max_batches: int = None):
+        """
+        Initialize the pipelined sink.
+
+        Args:
+            writer_threads: Number of DB writer threads (defaults to data_sink.writer_threads)
+            queue_max_batches: Total queued batches across writers (defaults to data_sink.queue_max_batches)
+        """
+        self.writer_count = max(1, writer_threads or settings.data_sink.writer_threads)
+        max_batches = max(1, queue_max_batches or settings.data_sink.queue_max_batches)
+        per_writer = max(1, -(-max_batches // self.writer_count))
+
+        self.writer_queues: List["queue.Queue[PendingBatch]"] = [
+            queue.Queue(maxsize=per_writer) for _ in range(self.writer_count)
+        ]
+        self.resume_threshold = per_writer // 2
+        self.completed: "queue.Queue[int]" = queue.Queue()
+        self.offset_tracker = OffsetTracker()
+        self.write_failed = threading.Event()
+        self.progress_time = time.time()
+
+        # Per-writer batches being built by the poll loop
+        self.slot_batches = [self._new_batch() for _ in range(self.writer_count)]
+        self.slot_offsets: List[Dict[Tuple[str, int], int]] = [{} for _ in range(self.writer_count)]
+        self.slot_flush_times: List[float] = [time.time()] * self.writer_count
+        self.ready_batches: List[PendingBatch] = [None] * self.writer_count
+        self.paused_slots = set()
+
+        self.writers: List[threading.Thread] = []
+        self.writer_pools = []
+        self._stopped = False
+
+        super().__init__()
+
+        log.info(f"Pipelined sink: {self.writer_count} writer threads, "
+                 f"{per_writer} queued batches per writer")
+
+    def _create_kafka_consumer(self) -> KafkaConsumer:
+        """
+        Create the Kafka consumer with offsets stored only after batches are written.
+        """
+        return KafkaConsumer(
+            group_id=settings.data_sink.consumer_group_id,
+            auto_offset_reset='earliest',
+            config_overrides={'enable.auto.offset.store': False}
+        )
+
+    def _signal_handler(self, sig, frame):
+        """
+        Stop the poll loop; shutdown then drains the pipeline from the main thread.
+        """
+        log.info(f"Caught signal {sig}. Stopping pipelined TimescaleDB sink...")
+        self.running = False
+
+    def _slot(self, partition: int) -> int:
+        return partition % self.writer_count
+
+    def _start_writers(self):
+        """
+        Start the writer threads, each with a dedicated connection and queue.
+        """
+        for i in range(self.writer_count):
+            pool = db_manager.create_write_pool(name=f"writer-{i}")
+            pool.warm_up()
+            self.writer_pools.append(pool)
+
+            writer = threading.Thread(
+                target=self._writer_loop,
+                args=(self.writer_queues[i], pool),
+                name=f"timescaledb-writer-{i}",
+                daemon=True
+            )
+            writer.start()
+            self.writers.append(writer)
+
+    def _writer_loop(self, batch_queue, write_pool):
+        """
+        Drain a batch queue into TimescaleDB until a stop sentinel arrives.
+
+        Args:
+            batch_queue: Queue of batches for this writer's partitions
+            write_pool: Dedicated write pool for this thread
+        """
+        failed = False
+        while True:
+            pending = batch_queue.get()
+            try:
+                if pending is None:
+                    break
+                if failed:
+                    # Later batches of the lost batch's partitions would store offsets past it
+                    continue
+                rows_inserted = self._insert_with_retries(pending.readings, write_pool=write_pool,
+                                                          offsets=pending.offsets)
+                if rows_inserted is None:
+                    failed = True
+                    self.write_failed.set()
+                    continue
+                self.completed.put(pending.seq)
+            except Exception as e:
+                # Never mark a batch complete that may not have been written
+                log.error(f"Unexpected error in TimescaleDB writer: {str(e)}")
+                failed = True
+                self.write_failed.set()
+            finally:
+                batch_queue.task_done()
+
+    def _on_assign(self, consumer, partitions):
+        """
+        Position new partitions and keep them paused while their writer is backed up.
+        """
+        self.kafka_consumer._on_assign_callback(consumer, partitions)
+        paused = [p for p in partitions if self._slot(p.partition) in self.paused_slots]
+        if paused:
+            consumer.pause(paused)
+
+    def _on_revoke(self, consumer, partitions):
+        """
+        Flush in-flight batches and commit their offsets before partitions move.
+        """
+        if partitions:
+            log.info(f"Partitions revoked, draining {len(self.offset_tracker)} in-flight batches")
+        self._drain(timeout=settings.consumer.session_timeout_ms / 1000)
+        try:
+            commit_start = time.time()
+            consumer.commit(asynchronous=False)
+            self.kafka_consumer.metrics.record_commit_duration(time.time() - commit_start)
+        except Exception as e:
+            # Nothing stored yet is reported as an error; the next owner re-reads from the last commit
+            log.debug(f"Offset commit on revoke: {str(e)}")
+
+    def _enqueue_slot(self, slot: int) -> bool:
+        """
+        Hand a writer's current batch to its queue without blocking the poll loop.
+
+        Args:
+            slot: Writer index
+
+        Returns:
+            True if the batch was queued (or there was nothing to queue), False if the queue is full
+        """
+        if self.ready_batches[slot] is None:
+            offsets = self.slot_offsets[slot]
+            if not offsets:
+                return True
+
+            readings = self.slot_batches[slot]
+            seq = self.offset_tracker.register(offsets)
+            self.slot_batches[slot] = self._new_batch()
+            self.slot_offsets[slot] = {}
+            self.slot_flush_times[slot] = time.time()
+            self.last_commit_time = time.time()
+
+            if not readings:
+                # Only skipped messages: nothing to write, just advance their Kafka offsets
+                self.completed.put(seq)
+                return True
+            self.ready_batches[slot] = PendingBatch(seq, readings, offsets)
+
+        try:
+            self.writer_queues[slot].put_nowait(self.ready_batches[slot])
+        except queue.Full:
+            return False
+
+        self.ready_batches[slot] = None
+        self.metrics.set_queue_size(sum(q.qsize() for q in self.writer_queues))
+        return True
+
+    def _flush_due_slots(self):
+        """
+        Queue every writer batch that is full or older than the commit interval.
+        """
+        now = time.time()
+        batch_size = self._batch_size_threshold()
+        commit_interval = self._commit_interval()
+
+        for slot in range(self.writer_count):
+            if (self.ready_batches[slot] is not None or
+                    len(self.slot_batches[slot]) >= batch_size or
+                    (self.slot_offsets[slot] and now - self.slot_flush_times[slot] >= commit_interval)):
+                self._enqueue_slot(slot)
+
+    def _apply_backpressure(self):
+        """
+        Pause a writer's partitions while its queue is full and resume once it has drained.
+        """
+        consumer = self.kafka_consumer.consumer
+
+        for slot in range(self.writer_count):
+            if slot not in self.paused_slots and self.ready_batches[slot] is not None:
+                partitions = [tp for tp in consumer.assignment() if self._slot(tp.partition) == slot]
+                if partitions:
+                    consumer.pause(partitions)
+                self.paused_slots.add(slot)
+                log.debug(f"Writer {slot} queue full, pausing its partitions")
+
+            elif (slot in self.paused_slots and self.ready_batches[slot] is None and
+                    self.writer_queues[slot].qsize() <= self.resume_threshold):
+                partitions = [tp for tp in consumer.assignment() if self._slot(tp.partition) == slot]
+                if partitions:
+                    consumer.resume(partitions)
+                self.paused_slots.discard(slot)
+                log.debug(f"Writer {slot} queue drained, resuming its partitions")
+
+    def _store_completed_offsets(self, wait: float = 0.0):
+        """
+        Store Kafka offsets for batches that have been written, in order.
+
+        Args:
+            wait: Seconds to wait for the first completion
+        """
+        ready = {}
+        while True:
+            try:
+                seq = self.completed.get(timeout=wait) if wait else self.completed.get_nowait()
+            except queue.Empty:
+                break
+            wait = 0.0
+            ready.update(self.offset_tracker.complete(seq))
+            self.progress_time = time.time()
+
+        if not ready:
+            return
+
+        offsets = [TopicPartition(topic, partition, offset + 1)
+                   for (topic, partition), offset in ready.items()]
+        try:
+            self.kafka_consumer.consumer.store_offsets(offsets=offsets)
+        except Exception as e:
+            # Partitions revoked in the meantime cannot be stored; their new owner re-reads them
+            log.warning(f"Could not store offsets: {str(e)}")
+
+    def _drain(self, timeout: float):
+        """
+        Queue all pending batches and wait until every in-flight batch is written.
+
+        Args:
+            timeout: Maximum time to wait in seconds
+        """
+        deadline = time.time() + timeout
+
+        pending_slots = set(range(self.writer_count))
+        while pending_slots and time.time() < deadline:
+            pending_slots = {slot for slot in pending_slots if not self._enqueue_slot(slot)}
+            if pending_slots:
+                time.sleep(0.05)
+
+        # Batches behind a lost one never complete
+        while len(self.offset_tracker) > 0 and not self.write_failed.is_set() and time.time() < deadline:
+            self._store_completed_offsets(wait=0.1)
+
+        if self.write_failed.is_set():
+            self._store_completed_offsets()
+            log.warning(f"Not waiting for {len(self.offset_tracker)} in-flight batches after a lost batch")
+        elif len(self.offset_tracker) > 0:
+            log.warning(f"Timed out draining {len(self.offset_tracker)} in-flight batches")
+
+    def _handle_message(self, msg, message):
+        """
+        Validate and batch a single deserialized Kafka message.
+
+        Args:
+            msg: Kafka message
+            message: Deserialized reading or RuuviTagAdvertisement, or None if deserialization failed
+        """
+        with self._stats_lock:
+            self.stats['messages_processed'] += 1
+
+        slot = self._slot(msg.partition())
+        if message is None:
+            # Already logged and counted by the consumer
+            with self._stats_lock:
+                self.stats['errors'] += 1
+        else:
+            try:
+                # Envelopes are written as one row per measurement
+                readings = message.readings() if isinstance(message, RuuviTagAdvertisement) else (message,)
+                if settings.data_sink.columnar_batches:
+                    # Validated column by column in the writer thread
+                    self.slot_batches[slot].extend(readings)
+                else:
+                    for reading in readings:
+                        sensor_reading = self.validate_and_transform_message(reading)
+                        if sensor_reading:
+                            self.slot_batches[slot].append(sensor_reading.to_dict())
+            except Exception as e:
+                log.error(f"Error processing message: {str(e)}")
+                self.kafka_consumer.metrics.record_message_failed(error_type=type(e).__name__)
+                with self._stats_lock:
+                    self.stats['errors'] += 1
+
+        # Skipped and invalid messages still advance the offset with their batch
+        self.slot_offsets[slot][(msg.topic(), msg.partition())] = msg.offset()
+
+        if self.stats['messages_processed'] % 1000 == 0:
+            log.info(f"Processed {self.stats['messages_processed']} messages, "
+                     f"stored {self.stats['messages_stored']} readings, "
+                     f"queued batches: {sum(q.qsize() for q in self.writer_queues)}, "
+                     f"in flight: {len(self.offset_tracker)}")
+
+    def start(self):
+        """
+        Start the writer threads and run the poll loop.
+        """
+        log.info("Starting pipelined TimescaleDB data sink service...")
+
+        if self.maintenance_thread:
+            self.maintenance_thread.start()
+
+        self.running = True
+        self._start_writers()
+        if self.spill_replayer:
+            self.spill_replayer.start()
+        if self.cagg_refresher:
+            self.cagg_refresher.start()
+
+        consumer = self.kafka_consumer.consumer
+        consumer.subscribe(
+            self.kafka_consumer.topics,
+            on_assign=self._on_assign,
+            on_revoke=self._on_revoke
+        )
+        self.kafka_consumer.metrics.set_connection_status(True, "kafka")
+        log.info(f"Subscribed to topics: {', '.join(self.kafka_consumer.topics)}")
+
+        # A fetch of one message behaves like poll()
+        fetch_size = settings.consumer.consume_batch_size if settings.consumer.batch_consume else 1
+
+        try:
+            while self.running:
+                self._apply_backpressure()
+
+                # Poll briefly while paused so rebalances and queue drain are noticed quickly
+                messages = consumer.consume(
+                    num_messages=fetch_size,
+                    timeout=0.1 if self.paused_slots else settings.data_sink.commit_interval
+                )
+
+                self._store_completed_offsets()
+                if self.write_failed.is_set():
+                    raise RuntimeError("A batch was neither written nor spilled; stopping so its "
+                                       "partitions resume from the last stored offset")
+
+                consumed = {}
+                valid = [msg for msg in messages if self.kafka_consumer._handle_message_errors(msg)]
+                for msg, message in zip(valid, self.kafka_consumer.deserialize_messages(valid)):
+                    topic_partition = (msg.topic(), msg.partition())
+                    consumed[topic_partition] = consumed.get(topic_partition, 0) + 1
+                    self._handle_message(msg, message)
+
+                for (topic, partition), count in consumed.items():
+                    self.kafka_consumer.metrics.record_message_consumed(
+                        topic=topic,
+                        partition=str(partition),
+                        count=count
+                    )
+
+                self._sample_consumer_lag()
+                self._flush_due_slots()
+
+                if not len(self.offset_tracker):
+                    # Idle or caught up; otherwise only completed batches count as progress
+                    self.progress_time = time.time()
+
+        except KeyboardInterrupt:
+            log.info("Pipelined TimescaleDB sink interrupted by user")
+        except Exception as e:
+            log.error(f"Error in pipelined TimescaleDB sink poll loop: {str(e)}")
+            raise
+        finally:
+            self.stop()
+
+    def stop(self):
+        """
+        Drain the pipeline, stop the writers and close the consumer.
+        """
+        if self._stopped:
+            return
+        self._stopped = True
+
+        log.info("Stopping pipelined TimescaleDB data sink service...")
+        self.running = False
+
+        if self.writers:
+            self._drain(timeout=60)
+
+            for batch_queue in self.writer_queues:
+                batch_queue.put(None)
+            for writer in self.writers:
+                writer.join(timeout=10)
+
+            self._store_completed_offsets()
+
+        # Closing the consumer commits the stored offsets
+        if hasattr(self, 'kafka_consumer'):
+            self.kafka_consumer.close()
+
+        for pool in self.writer_pools:
+            pool.close()
+
+        self._stop_spill_replayer()
+        self._stop_cagg_refresher()
+
+        if self.maintenance_thread and self.maintenance_thread.is_alive():
+            log.info("Waiting for maintenance thread to finish...")
+            self.maintenance_thread.join(timeout=5)
+
+        self.log_statistics()
+
+        log.info("Pipelined TimescaleDB data sink stopped")
+
+    def last_progress(self) -> float:
+        """
+        Get the time the pipeline last made progress.
+
+        While batches are in flight only their completion counts, so hung
+        writers stall the worker even though the poll loop keeps running.
+
+        Returns:
+            Epoch seconds of the latest completed batch or idle poll
+        """
+        return self.progress_time
+
+    def get_health_status(self) -> Dict[str, Any]:
+        """
+        Get health status including pipeline state.
+
+        Returns:
+            Dictionary with health status information
+        """
+        status = super().get_health_status()
+        status['performance_mode'] = 'pipelined'
+        status['batch_size'] = sum(len(b) for b in self.slot_batches)
+        status['pipeline'] = {
+            'writer_threads': self.writer_count,
+            'writers_alive': sum(1 for w in self.writers if w.is_alive()),
+            'queued_batches': [q.qsize() for q in self.writer_queues],
+            'queue_capacity_per_writer': self.writer_queues[0].maxsize,
+            'in_flight_batches': len(self.offset_tracker),
+            'paused_writers': sorted(self.paused_slots)
+        }
+        return status
@@ -0,0 +1,233 @@
+"""
+Result cache for the TimescaleDB read helpers.
+
+Dashboards poll the same windows every few seconds. QueryCache keeps
+recent results keyed by the normalized query and its parameters, evicts
+least recently used entries beyond an entry and byte budget and expires
+them after a TTL chosen per query type.
+
+Entries are also invalidated by commit sequence numbers: every committed
+batch increments a global counter and stamps its devices with the new
+value. An entry remembers the counter of its device (or, for queries over
+all devices, the global counter) from before it was loaded and is reloaded
+once that counter moved. Late or backfilled readings invalidate like any
+other write, whatever their timestamps.
+"""
+
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Callable, Tuple, Iterable
+
+from src.utils.logger import log
+from src.config.config import settings
+
+
+def normalize_query(query: str) -> str:
+    """
+    Collapse whitespace so queries differing only in layout share an entry.
+    """
+    return ' '.join(query.split())
+
+
+def _freeze(value: Any) -> Any:
+    """
+    Turn a parameter value into something hashable.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _result_bytes(rows: List[Dict[str, Any]]) -> int:
+    """
+    Estimate the memory held by a query result.
+    """
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+    return size
+
+
+class _Entry:
+    __slots__ = ('rows', 'size', 'expires_at', 'device', 'sequence', 'query_type')
+
+    def __init__(self, rows, size, expires_at, device, sequence, query_type):
+        self.rows = rows
+        self.size = size
+        self.expires_at = expires_at
+        self.device = device
+        self.sequence = sequence
+        self.query_type = query_type
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache of read query results with TTL and commit invalidation.
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None,
+                 ttls: Dict[str, float] = None, default_ttl: float = None):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_entries: Maximum cached results (defaults to timescaledb.query_cache_max_entries)
+            max_bytes: Maximum estimated result bytes (defaults to timescaledb.query_cache_max_mb)
+            ttls: Seconds a result stays valid per query type (defaults to timescaledb.query_cache_ttls)
+            default_ttl: TTL for query types without their own (defaults to timescaledb.query_cache_default_ttl)
+        """
+        self.max_entries = max_entries or settings.timescaledb.query_cache_max_entries
+        self.max_bytes = max_bytes or settings.timescaledb.query_cache_max_mb * 1024 * 1024
+        self.ttls = settings.timescaledb.query_cache_ttls if ttls is None else ttls
+        self.default_ttl = settings.timescaledb.query_cache_default_ttl if default_ttl is None else default_ttl
+
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._sequences: Dict[str, int] = {}
+        self._global_sequence = 0
+        self._lock = threading.Lock()
+
+        self.metrics = None
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'invalidated': 0, 'evicted': 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_load(self, query_type: str, query: str, parameters: Optional[Dict[str, Any]],
+                    loader: Callable[[], List[Dict[str, Any]]], device: str = None,
+                    versioned: bool = True) -> List[Dict[str, Any]]:
+        """
+        Get a cached result or load and cache it.
+
+        Args:
+            query_type: Query type used for the TTL and metrics
+            query: SQL query
+            parameters: Query parameters
+            loader: Runs the query on a miss
+            device: Device the query is limited to, or None for queries over all devices
+            versioned: Whether committed batches invalidate the result; results
+                of tables not written by the sink only expire or are invalidated explicitly
+
+        Returns:
+            Query result rows; callers get their own copies
+        """
+        key = (normalize_query(query), _freeze(parameters or {}))
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result = self._check(entry, now)
+                if result == 'hit':
+                    self._entries.move_to_end(key)
+                    rows = entry.rows
+                else:
+                    self._remove(key)
+            else:
+                result = 'miss'
+            sequence = self._sequence(device) if versioned else None
+
+        self._record(query_type, result)
+        if result == 'hit':
+            return [dict(row) for row in rows]
+
+        rows = loader()
+        size = _result_bytes(rows)
+        if size > self.max_bytes:
+            return rows
+
+        entry = _Entry([dict(row) for row in rows], size, now + self.ttls.get(query_type, self.default_ttl),
+                       device, sequence, query_type)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += size
+            self._evict()
+            self._report_size()
+        return rows
+
+    def record_commit(self, devices: Iterable[str]):
+        """
+        Advance the commit sequence after a batch was committed.
+
+        Args:
+            devices: Device IDs and MACs the batch wrote
+        """
+        with self._lock:
+            self._global_sequence += 1
+            sequence = self._global_sequence
+            sequences = self._sequences
+            for device in devices:
+                sequences[device] = sequence
+
+    def invalidate(self, query_types: Iterable[str] = None):
+        """
+        Drop cached results, e.g. after continuous aggregates were refreshed.
+
+        Args:
+            query_types: Query types to drop (None drops everything)
+        """
+        query_types = None if query_types is None else set(query_types)
+        with self._lock:
+            keys = [key for key, entry in self._entries.items()
+                    if query_types is None or entry.query_type in query_types]
+            for key in keys:
+                self._remove(key)
+            self.stats['invalidated'] += len(keys)
+            self._report_size()
+        if keys:
+            log.debug(f"Dropped {len(keys)} cached query results")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dictionary with counters, entries and bytes
+        """
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self._bytes)
+
+    def _sequence(self, device: Optional[str]) -> int:
+        if device is None:
+            return self._global_sequence
+        return self._sequences.get(device, 0)
+
+    def _check(self, entry: _Entry, now: float) -> str:
+        if now >= entry.expires_at:
+            return 'expired'
+        if entry.sequence is not None and self._sequence(entry.device) > entry.sequence:
+            return 'invalidated'
+        return 'hit'
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.stats['evicted'] += 1
+            if self.metrics:
+                self.metrics.record_query_cache_eviction()
+
+    def _record(self, query_type: str, result: str):
+        if result == 'hit':
+            self.stats['hits'] += 1
+        else:
+            self.stats['misses'] += 1
+            if result != 'miss':
+                self.stats[result] += 1
+        if self.metrics:
+            self.metrics.record_query_cache_request(query_type, result)
+
+    def _report_size(self):
+        if self.metrics:
+            self.metrics.set_query_cache_size(len(self._entries), self._bytes)
+
@@ -0,0 +1,168 @@
+"""
+Wide rows for the RuuviTag hypertable.
+
+A RuuviTag advertisement reaches the sink as one sensor reading per
+measurement, whether it was published that way or as an envelope that the
+consumer expanded. RuuviTagRowCollector picks those readings out of a batch
+and merges them back into one row per MAC and timestamp with a typed column
+per measurement, in RUUVITAG_ROW_COLUMNS order.
+"""
+
+from typing import List, Dict, Any, Optional, Tuple
+
+from src.data_storage.models import RUUVITAG_MEASUREMENTS
+from src.data_storage.columnar_batch import to_epoch_us, from_epoch_us
+
+
+# Wide table column per RuuviTag measurement field
+RUUVITAG_COLUMNS: Dict[str, str] = {
+    field_name: field_name.replace('acceleration_', 'accel_')
+    for field_name, *_ in RUUVITAG_MEASUREMENTS
+}
+
+MEASUREMENT_COLUMNS = tuple(RUUVITAG_COLUMNS.values())
+
+# Device attributes copied from the readings; the first non-null value wins
+DEVICE_COLUMNS = (
+    'battery_level', 'signal_strength', 'firmware_version',
+    'latitude', 'longitude', 'building', 'floor', 'zone', 'room', 'status'
+)
+
+RUUVITAG_ROW_COLUMNS = ('mac', 'timestamp') + MEASUREMENT_COLUMNS + DEVICE_COLUMNS + ('anomalies',)
+
+# Positions in a SENSOR_READING_COLUMNS row
+_DEVICE_ID, _TIMESTAMP, _VALUE = 0, 2, 3
+_IS_ANOMALY, _DEVICE_METADATA, _TAGS = 14, 17, 18
+_DEVICE_SOURCES = (11, 12, 13, 5, 6, 7, 8, 9, 10, 15)
+
+_MEASUREMENT_INDEX = {field_name: 2 + i for i, field_name in enumerate(RUUVITAG_COLUMNS)}
+_DEVICE_START = 2 + len(MEASUREMENT_COLUMNS)
+
+
+def ruuvitag_field(row: Tuple[Any, ...]) -> Optional[Tuple[str, str]]:
+    """
+    Get the MAC and measurement field of a RuuviTag sensor reading.
+
+    RuuviTag readings are named ``{mac}_{field}`` and carry the MAC as
+    ``parent_device`` in their metadata and a ``ruuvitag`` tag. The
+    sensor_type metadata cannot be used because acceleration readings
+    override it.
+
+    Args:
+        row: Reading in SENSOR_READING_COLUMNS order
+
+    Returns:
+        (mac, field) tuple, or None for readings of other devices
+    """
+    metadata = row[_DEVICE_METADATA]
+    if not metadata:
+        return None
+    mac = metadata.get('parent_device')
+    device_id = row[_DEVICE_ID]
+    if not mac or not device_id or 'ruuvitag' not in (row[_TAGS] or ()):
+        return None
+    prefix = len(mac)
+    if not device_id.startswith(mac) or device_id[prefix:prefix + 1] != '_':
+        return None
+    field_name = device_id[prefix + 1:]
+    if field_name not in RUUVITAG_COLUMNS:
+        return None
+    return mac, field_name
+
+
+def new_measurements(rows: List[Tuple[Any, ...]],
+                     stored: Dict[Tuple[str, Any], Tuple[bool, ...]]) -> List[Tuple[str, bool, Any]]:
+    """
+    Get the readings that upserting wide rows adds to the table.
+
+    A measurement only adds a reading if its column was still empty, so
+    replayed advertisements and duplicates are not counted again.
+
+    Args:
+        rows: Wide rows in RUUVITAG_ROW_COLUMNS order
+        stored: Whether each measurement column is set, per (mac, timestamp)
+            of the rows already in the table
+
+    Returns:
+        (device_id, is_anomaly, value) of each new measurement
+    """
+    readings = []
+    for row in rows:
+        mac = row[0]
+        already_set = stored.get((mac, row[1]))
+        anomalies = row[-1] or ()
+        for i, field_name in enumerate(RUUVITAG_COLUMNS):
+            value = row[2 + i]
+            if value is None or (already_set and already_set[i]):
+                continue
+            readings.append((f"{mac}_{field_name}", field_name in anomalies, value))
+    return readings
+
+
+class RuuviTagRowCollector:
+    """
+    Merges RuuviTag sensor readings into wide rows keyed by MAC and timestamp.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty collector.
+        """
+        self._rows: Dict[Tuple[str, int], List[Any]] = {}
+        self.readings = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, row: Tuple[Any, ...]) -> bool:
+        """
+        Merge a reading into its wide row if it belongs to a RuuviTag.
+
+        Args:
+            row: Reading in SENSOR_READING_COLUMNS order
+
+        Returns:
+            True if the reading was taken, False if it belongs in the main table
+        """
+        match = ruuvitag_field(row)
+        if match is None:
+            return False
+        timestamp_us = to_epoch_us(row[_TIMESTAMP])
+        if timestamp_us is None:
+            return False
+
+        mac, field_name = match
+        key = (mac, timestamp_us)
+        wide = self._rows.get(key)
+        if wide is None:
+            wide = [mac, timestamp_us] + [None] * (len(RUUVITAG_ROW_COLUMNS) - 2)
+            wide[-1] = []
+            self._rows[key] = wide
+
+        wide[_MEASUREMENT_INDEX[field_name]] = row[_VALUE]
+        for offset, source in enumerate(_DEVICE_SOURCES):
+            if wide[_DEVICE_START + offset] is None:
+                wide[_DEVICE_START + offset] = row[source]
+        if row[_IS_ANOMALY]:
+            wide[-1].append(field_name)
+
+        self.readings += 1
+        return True
+
+    def rows(self) -> List[Tuple[Any, ...]]:
+        """
+        Get the wide rows in RUUVITAG_ROW_COLUMNS order.
+
+        Rows are sorted by MAC and timestamp so concurrent writers upserting
+        overlapping batches lock rows in the same order.
+
+        Returns:
+            Row tuples with a datetime timestamp and None for empty anomalies
+        """
+        rows = []
+        for key in sorted(self._rows):
+            wide = self._rows[key]
+            wide[1] = from_epoch_us(key[1])
+            wide[-1] = wide[-1] or None
+            rows.append(tuple(wide))
+        return rows
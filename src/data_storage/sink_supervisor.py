@@ -0,0 +1,310 @@
+"""
+Multiprocess supervisor for the TimescaleDB sink.
+
+Runs one sink per worker process so Avro decoding, validation and row
+building use every core of the pod instead of one GIL. All workers join the
+same consumer group, so Kafka spreads the partitions between them. The
+supervisor restarts crashed or stalled workers, aggregates their statistics
+and serves a single /metrics endpoint backed by the prometheus_client
+multiprocess collector.
+
+Worker reports carry the time the sink's processing loop last made
+progress rather than the time of the report, so a worker whose loop hangs
+is restarted even though its report thread keeps running.
+"""
+
+import os
+import time
+import queue
+import shutil
+import signal
+import tempfile
+import threading
+import multiprocessing
+from typing import Dict, Any, Optional
+
+from src.utils.logger import log
+from src.config.config import settings
+
+
+def run_sink_worker(worker_id: int, report_queue, report_interval: float):
+    """
+    Entry point of a sink worker process.
+
+    Args:
+        worker_id: Index of the worker slot
+        report_queue: Queue used to send progress heartbeats and statistics to the supervisor
+        report_interval: Seconds between reports
+    """
+    # The supervisor serves the aggregated metrics endpoint
+    os.environ["METRICS_PORT"] = "0"
+    # Lets the sink pick a per-worker spill directory that survives restarts
+    os.environ["SINK_WORKER_ID"] = str(worker_id)
+
+    from src.data_storage.timescaledb_sink import sink_manager
+
+    sink = sink_manager.create_sink()
+
+    def report():
+        while True:
+            try:
+                report_queue.put((worker_id, os.getpid(), sink.last_progress(), dict(sink.stats)))
+            except Exception as e:
+                log.warning(f"Sink worker {worker_id} could not report statistics: {str(e)}")
+            time.sleep(report_interval)
+
+    threading.Thread(target=report, daemon=True).start()
+
+    log.info(f"Sink worker {worker_id} started (pid {os.getpid()})")
+    sink.start()
+
+
+class SinkSupervisor:
+    """
+    Starts, monitors and restarts sink worker processes.
+    """
+
+    def __init__(self, workers: int = None, metrics_port: int = None):
+        """
+        Initialize the supervisor.
+
+        Args:
+            workers: Number of worker processes (defaults to data_sink.workers)
+            metrics_port: Port of the aggregated metrics endpoint (defaults to METRICS_PORT)
+        """
+        self.worker_count = max(1, workers or settings.data_sink.workers)
+        self.metrics_port = metrics_port or int(os.getenv("METRICS_PORT", "8003"))
+        self.restart_backoff = settings.data_sink.worker_restart_backoff
+        self.stall_timeout = settings.data_sink.worker_stall_timeout
+        self.report_interval = settings.data_sink.worker_report_interval
+
+        # Spawned workers start from a clean interpreter instead of inheriting
+        # the supervisor's database and Kafka sockets
+        self.context = multiprocessing.get_context("spawn")
+        self.report_queue = self.context.Queue()
+
+        self.processes: Dict[int, Any] = {}
+        self.started_at: Dict[int, float] = {}
+        self.last_progress: Dict[int, float] = {}
+        self.worker_stats: Dict[int, Dict[str, Any]] = {}
+        self.restart_counts: Dict[int, int] = {}
+        self.next_start: Dict[int, float] = {}
+        self.running = False
+        self.metrics_dir = None
+        self.metrics_server = None
+        self._owns_metrics_dir = False
+
+    def _setup_metrics(self):
+        """
+        Prepare the prometheus multiprocess directory and start the aggregated endpoint.
+
+        PROMETHEUS_MULTIPROC_DIR must be set before workers import prometheus_client.
+        """
+        self.metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+        if self.metrics_dir:
+            # Files left over from a previous run would be merged into the new totals
+            shutil.rmtree(self.metrics_dir, ignore_errors=True)
+            os.makedirs(self.metrics_dir, exist_ok=True)
+        else:
+            self.metrics_dir = tempfile.mkdtemp(prefix="timescaledb-sink-metrics-")
+            self._owns_metrics_dir = True
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = self.metrics_dir
+
+        from prometheus_client import CollectorRegistry, multiprocess
+        from src.utils.metrics import MetricsServer
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=self.metrics_dir)
+
+        self.metrics_server = MetricsServer(port=self.metrics_port, registry=registry)
+        self.metrics_server.start()
+        log.info(f"Aggregated sink metrics on port {self.metrics_port} (multiprocess dir {self.metrics_dir})")
+
+    def _start_worker(self, worker_id: int):
+        """
+        Start (or restart) the worker process for a slot.
+        """
+        process = self.context.Process(
+            target=run_sink_worker,
+            args=(worker_id, self.report_queue, self.report_interval),
+            name=f"timescaledb-sink-worker-{worker_id}",
+            daemon=False
+        )
+        process.start()
+
+        now = time.time()
+        self.processes[worker_id] = process
+        self.started_at[worker_id] = now
+        self.last_progress[worker_id] = now
+        self.next_start.pop(worker_id, None)
+        log.info(f"Started sink worker {worker_id} (pid {process.pid})")
+
+    def _collect_reports(self):
+        """
+        Drain progress heartbeat/statistics reports from the workers.
+        """
+        while True:
+            try:
+                worker_id, pid, progress_at, stats = self.report_queue.get(timeout=1.0)
+            except queue.Empty:
+                return
+
+            process = self.processes.get(worker_id)
+            if process is None or process.pid != pid:
+                continue  # Late report from a replaced worker
+
+            self.last_progress[worker_id] = progress_at
+            self.worker_stats[worker_id] = stats
+
+    def _retire_worker(self, worker_id: int, reason: str):
+        """
+        Clean up after a worker that exited or was stopped and schedule its restart.
+        """
+        process = self.processes.pop(worker_id)
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=30)
+            if process.is_alive():
+                process.kill()
+                process.join(timeout=5)
+
+        self._mark_process_dead(process.pid)
+
+        if not self.running:
+            return
+
+        # Reset the backoff once a worker has been up for a while
+        if time.time() - self.started_at.get(worker_id, 0) > 300:
+            self.restart_counts[worker_id] = 0
+        self.restart_counts[worker_id] = self.restart_counts.get(worker_id, 0) + 1
+
+        delay = min(self.restart_backoff * 2 ** (self.restart_counts[worker_id] - 1), 60.0)
+        self.next_start[worker_id] = time.time() + delay
+        log.warning(f"Sink worker {worker_id} (pid {process.pid}) {reason}; restarting in {delay:.1f}s")
+
+    def _mark_process_dead(self, pid: Optional[int]):
+        """
+        Drop live gauge values of a dead worker from the aggregated metrics.
+        """
+        if pid is None or not self.metrics_dir:
+            return
+        try:
+            from prometheus_client import multiprocess
+            multiprocess.mark_process_dead(pid, path=self.metrics_dir)
+        except Exception as e:
+            log.debug(f"Could not mark metrics of pid {pid} as dead: {str(e)}")
+
+    def _check_workers(self):
+        """
+        Restart workers that exited or whose processing loop stopped making progress.
+        """
+        now = time.time()
+
+        for worker_id, process in list(self.processes.items()):
+            if not process.is_alive():
+                self._retire_worker(worker_id, f"exited with code {process.exitcode}")
+            elif now - self.last_progress.get(worker_id, now) > self.stall_timeout:
+                self._retire_worker(worker_id, f"made no progress for {self.stall_timeout:.0f}s")
+
+        for worker_id, start_at in list(self.next_start.items()):
+            if now >= start_at:
+                self._start_worker(worker_id)
+
+    def _signal_handler(self, sig, frame):
+        """
+        Handle termination signals for graceful shutdown.
+        """
+        log.info(f"Caught signal {sig}. Stopping sink supervisor...")
+        self.running = False
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """
+        Get aggregated statistics across all workers.
+
+        Returns:
+            Dictionary with totals and per-worker statistics
+        """
+        totals = {}
+        for stats in self.worker_stats.values():
+            for key, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[key] = totals.get(key, 0) + value
+
+        return {
+            'workers': self.worker_count,
+            'workers_alive': sum(1 for p in self.processes.values() if p.is_alive()),
+            'restarts': dict(self.restart_counts),
+            'totals': totals,
+            'per_worker': {
+                worker_id: {
+                    'pid': self.processes[worker_id].pid if worker_id in self.processes else None,
+                    'last_progress_age': time.time() - self.last_progress.get(worker_id, time.time()),
+                    'statistics': stats
+                }
+                for worker_id, stats in self.worker_stats.items()
+            }
+        }
+
+    def log_statistics(self):
+        """
+        Log aggregated worker statistics.
+        """
+        stats = self.get_statistics()
+        totals = stats['totals']
+        log.info(f"=== TimescaleDB Sink Supervisor: {stats['workers_alive']}/{stats['workers']} workers alive ===")
+        log.info(f"Messages processed: {totals.get('messages_processed', 0)}, "
+                 f"stored: {totals.get('messages_stored', 0)}, "
+                 f"batches: {totals.get('batch_count', 0)}, "
+                 f"errors: {totals.get('errors', 0)}")
+        if any(stats['restarts'].values()):
+            log.info(f"Worker restarts: {stats['restarts']}")
+
+    def run(self):
+        """
+        Start the workers and supervise them until stopped.
+        """
+        log.info(f"Starting TimescaleDB sink supervisor with {self.worker_count} worker processes")
+
+        signal.signal(signal.SIGINT, self._signal_handler)
+        signal.signal(signal.SIGTERM, self._signal_handler)
+
+        self._setup_metrics()
+        self.running = True
+
+        for worker_id in range(self.worker_count):
+            self._start_worker(worker_id)
+
+        last_stats_log = time.time()
+        try:
+            while self.running:
+                self._collect_reports()
+                self._check_workers()
+
+                if time.time() - last_stats_log >= 60:
+                    self.log_statistics()
+                    last_stats_log = time.time()
+        finally:
+            self.stop()
+
+    def stop(self):
+        """
+        Stop all workers gracefully and clean up the metrics directory.
+        """
+        self.running = False
+
+        # SIGTERM lets each sink drain its batches and commit offsets
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+
+        for worker_id in list(self.processes):
+            self._retire_worker(worker_id, "stopped")
+
+        self.log_statistics()
+
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self._owns_metrics_dir and self.metrics_dir:
+            shutil.rmtree(self.metrics_dir, ignore_errors=True)
+
+        log.info("TimescaleDB sink supervisor stopped")
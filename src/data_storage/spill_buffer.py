@@ -0,0 +1,498 @@
+"""
+Disk-backed spill buffer for sink batches that could not be written to TimescaleDB.
+
+Failed batches are appended to segment files on local disk instead of being
+retried in the poll loop, and a background replayer writes them back once the
+database accepts inserts again.
+"""
+
+import os
+import json
+import time
+import zlib
+import struct
+import threading
+from typing import List, Dict, Any, Optional, Callable
+
+import psycopg2
+
+from src.utils.logger import log
+
+
+# Each record is <payload length><crc32 of payload><JSON payload>
+_RECORD_HEADER = struct.Struct(">II")
+_SEGMENT_SUFFIX = ".seg"
+_CURSOR_FILE = "cursor"
+
+
+class SpillBuffer:
+    """
+    Append-only queue of reading batches stored in segment files.
+
+    Batches are appended to the newest segment until it reaches
+    segment_max_bytes, then a new segment is started. The reader consumes
+    records oldest first; its position is persisted in a cursor file so a
+    restart does not replay records twice, and fully replayed segments are
+    deleted. Appends are refused once max_total_bytes of unreplayed data is
+    buffered.
+
+    The buffer supports one writer path (any thread, serialized by a lock)
+    and one reader.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_max_bytes: int = 64 * 1024 * 1024,
+        max_total_bytes: int = 1024 * 1024 * 1024,
+        fsync: bool = True,
+        metrics=None
+    ):
+        """
+        Initialize the spill buffer and recover segments left by a previous run.
+
+        Args:
+            directory: Directory holding the segment files
+            segment_max_bytes: Size at which a new segment is started
+            max_total_bytes: Maximum unreplayed bytes kept on disk
+            fsync: Flush every append to stable storage before returning
+            metrics: Optional TimescaleDBSinkMetrics instance
+        """
+        self.directory = directory
+        self.segment_max_bytes = max(1024, segment_max_bytes)
+        self.max_total_bytes = max(self.segment_max_bytes, max_total_bytes)
+        self.fsync = fsync
+        self.metrics = metrics
+
+        self._lock = threading.Lock()
+        self._segments: List[int] = []        # Segment numbers, oldest first
+        self._sizes: Dict[int, int] = {}      # Bytes written per segment
+        self._writer = None
+        self._reader = None
+        self._reader_segment = None
+        self._cursor_segment = None
+        self._cursor_offset = 0
+        self._peeked_size = 0
+        self._pending_batches = 0
+
+        self.stats = {
+            'batches_spilled': 0,
+            'rows_spilled': 0,
+            'batches_dropped': 0,
+            'batches_replayed': 0,
+            'corrupt_records': 0
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._recover()
+        self._publish()
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:012d}{_SEGMENT_SUFFIX}")
+
+    def _recover(self):
+        """
+        Load existing segments and the reader position from disk.
+        """
+        for name in os.listdir(self.directory):
+            if name.endswith(_SEGMENT_SUFFIX):
+                try:
+                    segment = int(name[:-len(_SEGMENT_SUFFIX)])
+                except ValueError:
+                    continue
+                self._segments.append(segment)
+                self._sizes[segment] = os.path.getsize(self._segment_path(segment))
+        self._segments.sort()
+
+        cursor_path = os.path.join(self.directory, _CURSOR_FILE)
+        if os.path.exists(cursor_path):
+            try:
+                with open(cursor_path) as f:
+                    segment, offset = f.read().split()
+                self._cursor_segment, self._cursor_offset = int(segment), int(offset)
+            except (OSError, ValueError) as e:
+                log.warning(f"Ignoring unreadable spill cursor: {str(e)}")
+
+        # Segments older than the cursor were fully replayed before a crash
+        if self._cursor_segment is not None:
+            for segment in [s for s in self._segments if s < self._cursor_segment]:
+                self._delete_segment(segment)
+            if self._cursor_segment not in self._sizes:
+                self._cursor_segment, self._cursor_offset = None, 0
+
+        if self._segments and self._cursor_segment is None:
+            self._cursor_segment, self._cursor_offset = self._segments[0], 0
+
+        self._pending_batches = self._count_records()
+        if self._pending_batches:
+            log.info(f"Recovered {self._pending_batches} spilled batches "
+                     f"({self.depth_bytes() / 1024 / 1024:.2f} MB) from {self.directory}")
+
+    def _count_records(self) -> int:
+        """
+        Count unreplayed records by walking the record headers.
+        """
+        count = 0
+        for segment in self._segments:
+            offset = self._cursor_offset if segment == self._cursor_segment else 0
+            size = self._sizes[segment]
+            with open(self._segment_path(segment), 'rb') as f:
+                while offset + _RECORD_HEADER.size <= size:
+                    f.seek(offset)
+                    length, _ = _RECORD_HEADER.unpack(f.read(_RECORD_HEADER.size))
+                    if offset + _RECORD_HEADER.size + length > size:
+                        break
+                    offset += _RECORD_HEADER.size + length
+                    count += 1
+        return count
+
+    def depth_bytes(self) -> int:
+        """
+        Get the number of unreplayed bytes on disk.
+        """
+        total = sum(self._sizes.values())
+        if self._cursor_segment in self._sizes:
+            total -= self._cursor_offset
+        return total
+
+    def pending_batches(self) -> int:
+        """
+        Get the number of unreplayed batches.
+        """
+        return self._pending_batches
+
+    def append(self, readings: List[Dict[str, Any]]) -> bool:
+        """
+        Append a batch to the buffer.
+
+        Args:
+            readings: List of sensor reading dictionaries
+
+        Returns:
+            True if the batch is on disk, False if the buffer is full or the write failed
+        """
+        payload = json.dumps(readings, default=str, separators=(',', ':')).encode('utf-8')
+        record = _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+        with self._lock:
+            if self.depth_bytes() + len(record) > self.max_total_bytes:
+                self.stats['batches_dropped'] += 1
+                if self.metrics:
+                    self.metrics.record_spill_dropped()
+                log.error(f"Spill buffer full ({self.depth_bytes() / 1024 / 1024:.2f} MB), "
+                          f"dropping batch of {len(readings)} readings")
+                return False
+
+            try:
+                if self._writer is None or self._sizes[self._segments[-1]] >= self.segment_max_bytes:
+                    self._roll_segment()
+
+                segment = self._segments[-1]
+                self._writer.write(record)
+                self._writer.flush()
+                if self.fsync:
+                    os.fsync(self._writer.fileno())
+                self._sizes[segment] += len(record)
+            except OSError as e:
+                log.error(f"Failed to spill batch of {len(readings)} readings: {str(e)}")
+                # A partial write may follow the last good record; continue in a new segment
+                if self._writer is not None:
+                    try:
+                        self._writer.close()
+                    except OSError:
+                        pass
+                    self._writer = None
+                self.stats['batches_dropped'] += 1
+                if self.metrics:
+                    self.metrics.record_spill_dropped()
+                return False
+
+            self._pending_batches += 1
+            self.stats['batches_spilled'] += 1
+            self.stats['rows_spilled'] += len(readings)
+
+        if self.metrics:
+            self.metrics.record_batch_spilled(len(readings))
+        self._publish()
+        return True
+
+    def _roll_segment(self):
+        """
+        Seal the current segment and start a new one.
+        """
+        if self._writer is not None:
+            self._writer.close()
+
+        segment = self._segments[-1] + 1 if self._segments else 0
+        self._writer = open(self._segment_path(segment), 'ab')
+        self._segments.append(segment)
+        self._sizes[segment] = 0
+
+        if self._cursor_segment is None:
+            self._cursor_segment, self._cursor_offset = segment, 0
+
+    def peek(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Read the oldest unreplayed batch without consuming it.
+
+        Returns:
+            List of sensor reading dictionaries, or None if the buffer is empty
+        """
+        with self._lock:
+            while self._cursor_segment is not None:
+                segment = self._cursor_segment
+                size = self._sizes[segment]
+
+                if self._cursor_offset + _RECORD_HEADER.size <= size:
+                    record = self._read_record(segment, self._cursor_offset, size)
+                    if record is not None:
+                        return record
+                    # Corrupt or torn record: nothing after it in this segment can be trusted
+                    self.stats['corrupt_records'] += 1
+                    log.error(f"Corrupt record in spill segment {segment} at offset {self._cursor_offset}, "
+                              f"skipping the rest of the segment")
+                    self._cursor_offset = size
+
+                if segment == self._segments[-1]:
+                    return None
+
+                # Fully replayed sealed segment
+                self._advance_segment()
+
+            return None
+
+    def _read_record(self, segment: int, offset: int, size: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Read and verify one record at the given position.
+        """
+        if self._reader_segment != segment:
+            if self._reader is not None:
+                self._reader.close()
+            self._reader = open(self._segment_path(segment), 'rb')
+            self._reader_segment = segment
+
+        self._reader.seek(offset)
+        length, checksum = _RECORD_HEADER.unpack(self._reader.read(_RECORD_HEADER.size))
+        if offset + _RECORD_HEADER.size + length > size:
+            return None
+
+        payload = self._reader.read(length)
+        if zlib.crc32(payload) != checksum:
+            return None
+
+        try:
+            readings = json.loads(payload)
+        except ValueError:
+            return None
+
+        self._peeked_size = _RECORD_HEADER.size + length
+        return readings
+
+    def ack(self):
+        """
+        Consume the batch returned by the last peek.
+        """
+        with self._lock:
+            if not self._peeked_size:
+                return
+            self._cursor_offset += self._peeked_size
+            self._peeked_size = 0
+            self._pending_batches = max(0, self._pending_batches - 1)
+            self.stats['batches_replayed'] += 1
+
+            if (self._cursor_offset >= self._sizes[self._cursor_segment] and
+                    self._cursor_segment != self._segments[-1]):
+                self._advance_segment()
+            else:
+                self._save_cursor()
+
+        self._publish()
+
+    def _advance_segment(self):
+        """
+        Delete the fully replayed cursor segment and move to the next one.
+        """
+        finished = self._cursor_segment
+        index = self._segments.index(finished)
+        self._cursor_segment = self._segments[index + 1]
+        self._cursor_offset = 0
+        self._save_cursor()
+        self._delete_segment(finished)
+
+    def _delete_segment(self, segment: int):
+        if self._reader_segment == segment:
+            self._reader.close()
+            self._reader, self._reader_segment = None, None
+        try:
+            os.remove(self._segment_path(segment))
+        except FileNotFoundError:
+            pass
+        self._segments.remove(segment)
+        self._sizes.pop(segment, None)
+
+    def _save_cursor(self):
+        """
+        Persist the reader position atomically.
+        """
+        cursor_path = os.path.join(self.directory, _CURSOR_FILE)
+        tmp_path = cursor_path + ".tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(f"{self._cursor_segment} {self._cursor_offset}")
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, cursor_path)
+        except OSError as e:
+            log.warning(f"Could not save spill cursor: {str(e)}")
+
+    def _publish(self):
+        if self.metrics:
+            self.metrics.set_spill_depth(self.depth_bytes(), self._pending_batches)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get spill buffer statistics.
+
+        Returns:
+            Dictionary with spill buffer statistics
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats['pending_batches'] = self._pending_batches
+            stats['depth_bytes'] = self.depth_bytes()
+            stats['segments'] = len(self._segments)
+        stats['max_bytes'] = self.max_total_bytes
+        return stats
+
+    def close(self):
+        """
+        Close open segment files; unreplayed batches stay on disk for the next run.
+        """
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            if self._reader is not None:
+                self._reader.close()
+                self._reader, self._reader_segment = None, None
+
+
+class SpillReplayer:
+    """
+    Background thread that writes spilled batches back to TimescaleDB.
+
+    Batches are replayed oldest first at no more than max_rows_per_second so
+    a recovering database is not flooded on top of the live ingest. After a
+    connection failure the replayer waits retry_interval before trying again
+    and reports the database as unavailable, which lets the live path spill
+    directly instead of waiting on a database that is known to be down. A
+    batch the database rejects for any other reason is logged and discarded
+    so it cannot block the batches behind it.
+    """
+
+    def __init__(
+        self,
+        spill_buffer: SpillBuffer,
+        insert_fn: Callable[[List[Dict[str, Any]]], int],
+        max_rows_per_second: float = 5000.0,
+        retry_interval: float = 5.0,
+        metrics=None
+    ):
+        """
+        Initialize the replayer.
+
+        Args:
+            spill_buffer: Buffer to drain
+            insert_fn: Inserts a batch and returns the row count; must raise on failure
+            max_rows_per_second: Replay rate limit (0 disables the limit)
+            retry_interval: Seconds to wait after a failed replay
+            metrics: Optional TimescaleDBSinkMetrics instance
+        """
+        self.spill_buffer = spill_buffer
+        self.insert_fn = insert_fn
+        self.max_rows_per_second = max_rows_per_second
+        self.retry_interval = retry_interval
+        self.metrics = metrics
+
+        self.db_available = True
+        self.rows_replayed = 0
+        self.batches_rejected = 0
+        self.running = False
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start the replay thread.
+        """
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="spill-replayer", daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """
+        Wake the replayer after a batch was spilled.
+        """
+        self._wake.set()
+
+    def _run(self):
+        while self.running:
+            readings = self.spill_buffer.peek()
+            if readings is None:
+                self._wake.wait(timeout=1.0)
+                self._wake.clear()
+                continue
+
+            start_time = time.time()
+            try:
+                rows = self.insert_fn(readings)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError, TimeoutError) as e:
+                if self.db_available:
+                    log.warning(f"Spill replay paused, TimescaleDB unavailable: {str(e)}")
+                self.db_available = False
+                time.sleep(self.retry_interval)
+                continue
+            except Exception as e:
+                log.error(f"TimescaleDB rejected spilled batch of {len(readings)} readings, discarding it: {str(e)}")
+                self.batches_rejected += 1
+                self.spill_buffer.ack()
+                continue
+
+            if not self.db_available:
+                log.info(f"TimescaleDB available again, replaying "
+                         f"{self.spill_buffer.pending_batches()} spilled batches")
+            self.db_available = True
+            self.spill_buffer.ack()
+            self.rows_replayed += rows
+            if self.metrics:
+                self.metrics.record_spill_replayed(rows)
+
+            if self.max_rows_per_second > 0:
+                remaining = len(readings) / self.max_rows_per_second - (time.time() - start_time)
+                if remaining > 0:
+                    time.sleep(remaining)
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Stop the replay thread; unreplayed batches stay on disk.
+        """
+        self.running = False
+        self._wake.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Get replayer state for health and statistics output.
+
+        Returns:
+            Dictionary with replayer state
+        """
+        return {
+            'running': self.running,
+            'db_available': self.db_available,
+            'rows_replayed': self.rows_replayed,
+            'batches_rejected': self.batches_rejected,
+            'max_rows_per_second': self.max_rows_per_second
+        }
@@ -3,19 +3,26 @@ TimescaleDB Data Sink - Consumes data from Kafka and stores in TimescaleDB.
 OPTIMIZED FOR LOW LATENCY PERFORMANCE
 """
 
+import os
 import time
 import signal
 import threading
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timezone, timedelta
-from confluent_kafka import Consumer, KafkaError, KafkaException
+from confluent_kafka import Consumer, KafkaError, KafkaException, TopicPartition
 
 from src.utils.logger import log
 from src.config.config import settings
-from src.data_ingestion.consumer import KafkaConsumer
+from src.data_ingestion.consumer import KafkaConsumer, ConsumedBatch
 from src.data_storage.database import db_manager
 from src.data_storage.models import SensorReadingDTO
+from src.data_storage.batch_controller import AdaptiveBatchController
+from src.data_storage.spill_buffer import SpillBuffer, SpillReplayer
+from src.data_storage.continuous_aggregates import ContinuousAggregateRefresher, raw_readings_table
+from src.data_storage.columnar_batch import ColumnarBatch
+from src.data_storage.batch_validator import BatchValidator, QuarantineWriter
 from src.utils.schema_registry import schema_registry
+from src.utils.metrics import get_metrics_instance
 
 
 class TimescaleDBSink:
@@ -41,7 +48,9 @@ class TimescaleDBSink:
         Initialize the TimescaleDB data sink.
         """
         self.running = False
-        self.batch = []
+        self.batch = self._new_batch()
+        self.batch_offsets: Dict[Tuple[str, int], int] = {}
+        self.batch_start_offsets: Dict[Tuple[str, int], int] = {}
         self.last_commit_time = time.time()
         self.last_maintenance_time = time.time()
         self.stats = {
@@ -49,23 +58,94 @@ class TimescaleDBSink:
             'messages_stored': 0,
             'batch_count': 0,
             'errors': 0,
+            'batches_spilled': 0,
+            'batches_dropped': 0,
             'last_processed': None,
             'maintenance_runs': 0
         }
+        self._stats_lock = threading.Lock()
         
         # Initialize Kafka consumer with data sink group ID
-        self.kafka_consumer = KafkaConsumer(
-            group_id=settings.data_sink.consumer_group_id,
-            auto_offset_reset='earliest'
-        )
+        self.kafka_consumer = self._create_kafka_consumer()
+        
+        # Report write pool statistics through the sink metrics
+        self.metrics = get_metrics_instance("sink")
+        db_manager.set_metrics(self.metrics)
+        
+        # Runtime batch sizing; the static settings are used when disabled
+        self.batch_controller = None
+        self.last_lag_check = 0.0
+        if settings.data_sink.adaptive_batching:
+            self.batch_controller = AdaptiveBatchController(
+                initial_batch_size=settings.data_sink.batch_size,
+                min_batch_size=settings.data_sink.min_batch_size,
+                max_batch_size=settings.data_sink.max_batch_size,
+                min_commit_interval=settings.data_sink.min_commit_interval,
+                max_commit_interval=settings.data_sink.max_commit_interval,
+                target_p99_latency=settings.data_sink.target_p99_latency,
+                additive_step=settings.data_sink.batch_size_step,
+                lag_threshold=settings.data_sink.lag_threshold,
+                metrics=self.metrics
+            )
+        
+        # Columnar batches are validated per column; rejected rows go to quarantine
+        quarantine = None
+        if settings.data_sink.quarantine_enabled:
+            quarantine = QuarantineWriter(
+                directory=settings.data_sink.quarantine_directory,
+                max_file_bytes=settings.data_sink.quarantine_max_mb * 1024 * 1024,
+                max_files=settings.data_sink.quarantine_max_files
+            )
+        self.batch_validator = BatchValidator(quarantine=quarantine, metrics=self.metrics)
         
         # Verify TimescaleDB connection
         if not db_manager.wait_for_database():
             raise Exception("TimescaleDB is not available")
         
+        # Store offsets with each batch and resume from them on assignment
+        self.store_offsets_in_db = settings.data_sink.offset_storage == 'database'
+        if self.store_offsets_in_db:
+            if not db_manager.ensure_offsets_table():
+                raise Exception("TimescaleDB offsets table is not available")
+            self.kafka_consumer.offset_provider = self._load_stored_offsets
+        
+        # Readings go to the narrow fact table with a devices dimension
+        if settings.timescaledb.normalized_storage:
+            if not db_manager.ensure_device_tables():
+                raise Exception("TimescaleDB device dimension tables are not available")
+            log.info(f"Normalized storage: {settings.timescaledb.facts_table} with {settings.timescaledb.devices_table} dimension")
+        
+        # Every batch upserts the newest reading per device; filled from the stored readings
+        if not db_manager.ensure_device_latest_table():
+            raise Exception("TimescaleDB device latest table is not available")
+        
+        # Continuous aggregate refresh policies follow the configuration
+        if settings.timescaledb.enable_continuous_aggregates:
+            self._check_aggregate_source()
+            db_manager.continuous_aggregates.check_hierarchy()
+            db_manager.continuous_aggregates.apply_policies()
+        
+        # RuuviTag readings are merged into the wide RuuviTag table
+        if settings.timescaledb.ruuvitag_wide_rows:
+            if not db_manager.ensure_ruuvitag_table():
+                raise Exception("TimescaleDB RuuviTag table is not available")
+            log.info(f"RuuviTag readings are written to {settings.timescaledb.ruuvitag_table}")
+        
+        # Write out pending rows before their partitions move to another consumer
+        self.kafka_consumer.revoke_handler = lambda partitions: self.commit_batch()
+        
+        # Failed batches go to disk and are replayed in the background
+        self.spill_buffer = None
+        self.spill_replayer = None
+        if settings.data_sink.spill_enabled:
+            self._setup_spill_buffer()
+        
         log.info("TimescaleDB data sink initialized")
         log.info(f"Batch size: {settings.data_sink.batch_size} (optimized for low latency)")
         log.info(f"Commit interval: {settings.data_sink.commit_interval} seconds (optimized for low latency)")
+        if self.batch_controller:
+            log.info(f"Adaptive batching enabled: {settings.data_sink.min_batch_size}-{settings.data_sink.max_batch_size} rows, "
+                     f"target p99 latency {settings.data_sink.target_p99_latency}s")
         log.info(f"Expected median latency: <1 second")
         log.info(f"TimescaleDB chunk interval: {settings.timescaledb.chunk_time_interval}")
         log.info(f"Compression after: {settings.timescaledb.compression_after}")
@@ -74,10 +154,107 @@ class TimescaleDBSink:
         self.maintenance_thread = None
         self.setup_maintenance_thread()
         
+        # Refresh the continuous aggregates over the time ranges written by this sink
+        self.cagg_refresher = None
+        if settings.timescaledb.enable_continuous_aggregates:
+            self.cagg_refresher = ContinuousAggregateRefresher(db_manager.continuous_aggregates)
+        
         # Setup signal handlers
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
     
+    def _create_kafka_consumer(self) -> KafkaConsumer:
+        """
+        Create the Kafka consumer used by the sink.
+        
+        Returns:
+            KafkaConsumer instance subscribed under the data sink group ID
+        """
+        return KafkaConsumer(
+            group_id=settings.data_sink.consumer_group_id,
+            auto_offset_reset='earliest'
+        )
+    
+    def _setup_spill_buffer(self):
+        """
+        Create the disk spill buffer and the replayer that drains it.
+        """
+        directory = settings.data_sink.spill_directory
+        worker_id = os.getenv("SINK_WORKER_ID")
+        if worker_id is not None:
+            # Worker processes of the supervisor each own a spill directory
+            directory = os.path.join(directory, f"worker-{worker_id}")
+        
+        self.spill_buffer = SpillBuffer(
+            directory=directory,
+            segment_max_bytes=settings.data_sink.spill_segment_max_mb * 1024 * 1024,
+            max_total_bytes=settings.data_sink.spill_max_mb * 1024 * 1024,
+            fsync=settings.data_sink.spill_fsync,
+            metrics=self.metrics
+        )
+        
+        replay_pool = db_manager.create_write_pool(name="spill-replay")
+        self.spill_replayer = SpillReplayer(
+            self.spill_buffer,
+            insert_fn=lambda readings: db_manager.insert_sensor_readings_batch(
+                readings, write_pool=replay_pool, raise_on_error=True
+            ),
+            max_rows_per_second=settings.data_sink.spill_replay_rows_per_sec,
+            retry_interval=settings.data_sink.spill_replay_retry_interval,
+            metrics=self.metrics
+        )
+        self.spill_pool = replay_pool
+        
+        replay_rate = settings.data_sink.spill_replay_rows_per_sec
+        log.info(f"Spill buffer: {directory} (max {settings.data_sink.spill_max_mb} MB, "
+                 f"replay {f'{replay_rate:.0f} rows/sec' if replay_rate > 0 else 'unlimited'})")
+    
+    def _new_batch(self):
+        """
+        Create an empty batch in the configured representation.
+        
+        Returns:
+            ColumnarBatch if columnar batches are enabled, otherwise a list of reading dicts
+        """
+        if settings.data_sink.columnar_batches:
+            return ColumnarBatch()
+        return []
+    
+    def _check_aggregate_source(self):
+        """
+        Refuse to start when the 1 minute aggregate does not read the table the sink writes to.
+        
+        With normalized storage the readings only reach the fact table, so an
+        aggregate built on the main table would silently stop receiving data.
+        
+        Raises:
+            Exception: If the 1 minute tier reads another table
+        """
+        if not settings.timescaledb.normalized_storage:
+            return
+        source = db_manager.continuous_aggregates.tier_sources().get('sensor_readings_1m')
+        if source is not None and source != raw_readings_table():
+            raise Exception(
+                f"Continuous aggregate sensor_readings_1m reads {source}, but normalized storage writes to "
+                f"{raw_readings_table()}; recreate it from the normalized definition in database/init.sql "
+                f"or disable timescaledb.enable_continuous_aggregates"
+            )
+    
+    def _load_stored_offsets(self, partitions) -> Dict[Tuple[str, int], int]:
+        """
+        Load the offsets stored alongside the data for newly assigned partitions.
+        
+        Args:
+            partitions: List of TopicPartition objects assigned
+            
+        Returns:
+            Next offset to consume per (topic, partition)
+        """
+        stored = {}
+        for topic in {p.topic for p in partitions}:
+            stored.update(db_manager.get_stored_offsets(settings.data_sink.consumer_group_id, topic))
+        return stored
+    
     def _signal_handler(self, sig, frame):
         """
         Handle termination signals for graceful shutdown.
@@ -101,10 +278,6 @@ class TimescaleDBSink:
                     if self.running:
                         log.info("Starting periodic TimescaleDB maintenance...")
                         
-                        # Refresh continuous aggregates
-                        if settings.timescaledb.enable_continuous_aggregates:
-                            db_manager.refresh_continuous_aggregates()
-                        
                         # Run vacuum and analyze
                         db_manager.vacuum_and_analyze()
                         
@@ -173,6 +346,49 @@ class TimescaleDBSink:
             log.debug(f"Invalid message: {message}")
             return None
     
+    def _batch_size_threshold(self) -> int:
+        """
+        Get the batch size that triggers a commit.
+        """
+        if self.batch_controller:
+            return self.batch_controller.batch_size
+        return settings.data_sink.batch_size
+    
+    def _commit_interval(self) -> float:
+        """
+        Get the maximum time between commits in seconds.
+        """
+        if self.batch_controller:
+            return self.batch_controller.commit_interval
+        return settings.data_sink.commit_interval
+    
+    def _sample_consumer_lag(self):
+        """
+        Feed the consumer lag to the batch controller, at most once per second.
+        """
+        if not self.batch_controller or time.time() - self.last_lag_check < 1.0:
+            return
+        self.last_lag_check = time.time()
+        self.batch_controller.observe_lag(self.kafka_consumer.get_consumer_lag())
+    
+    def _oldest_reading_age(self, batch) -> Optional[float]:
+        """
+        Get the end-to-end latency of the oldest reading in a batch, in seconds.
+        """
+        if isinstance(batch, ColumnarBatch):
+            oldest_us = batch.min_timestamp_us()
+            return time.time() - oldest_us / 1000000 if oldest_us is not None else None
+        
+        try:
+            oldest = min(r['timestamp'] for r in batch if r.get('timestamp'))
+            if isinstance(oldest, str):
+                oldest = datetime.fromisoformat(oldest)
+            if oldest.tzinfo is None:
+                oldest = oldest.replace(tzinfo=timezone.utc)
+            return (datetime.now(timezone.utc) - oldest).total_seconds()
+        except (ValueError, TypeError):
+            return None
+    
     def add_to_batch(self, sensor_reading: SensorReadingDTO):
         """
         Add a sensor reading to the current batch with configurable latency-throughput trade-off.
@@ -184,16 +400,24 @@ class TimescaleDBSink:
         This method respects the configured batch_size and commit_interval settings.
         For low latency: Use smaller batch_size (e.g., 50) and shorter commit_interval (e.g., 0.5s)
         For high throughput: Use larger batch_size (e.g., 1000) and longer commit_interval (e.g., 5s)
+        With adaptive_batching enabled the controller moves between the two at runtime.
         """
         self.batch.append(sensor_reading.to_dict())
+        self._commit_if_due()
+    
+    def _commit_if_due(self):
+        """
+        Commit the current batch once it is full or the commit interval has passed.
+        """
+        self._sample_consumer_lag()
         
         # Check if we should commit the batch
-        # Use configured batch size for optimal latency-throughput balance
-        batch_size_threshold = settings.data_sink.batch_size
+        # Use configured (or adaptive) batch size for optimal latency-throughput balance
+        batch_size_threshold = self._batch_size_threshold()
         
         should_commit = (
             len(self.batch) >= batch_size_threshold or
-            (time.time() - self.last_commit_time) >= settings.data_sink.commit_interval
+            (time.time() - self.last_commit_time) >= self._commit_interval()
         )
         
         if should_commit:
@@ -206,47 +430,187 @@ class TimescaleDBSink:
         if not self.batch:
             return
         
-        batch_size = len(self.batch)
+        rows_inserted = self._insert_with_retries(self.batch, offsets=self.batch_offsets)
+        if rows_inserted is None:
+            # Neither written nor spilled: read the batch again instead of storing offsets past it
+            self._rewind(self.batch_start_offsets)
+        
+        # Clear batch and update commit time
+        self.batch.clear()
+        self.batch_offsets = {}
+        self.batch_start_offsets = {}
+        self.last_commit_time = time.time()
+    
+    def _rewind(self, start_offsets: Dict[Tuple[str, int], int]):
+        """
+        Seek partitions back to the first offset of a batch that was not persisted.
+        
+        The readings are consumed again after a backoff, so a failing database
+        pauses consumption instead of moving the stored offsets past them. If a
+        partition that is still assigned cannot be rewound the sink stops; the
+        next start resumes from the last stored offset.
+        
+        Args:
+            start_offsets: First consumed offset per (topic, partition) of the batch
+        """
+        consumer = self.kafka_consumer.consumer
+        try:
+            assigned = {(tp.topic, tp.partition) for tp in consumer.assignment()}
+        except Exception:
+            assigned = set(start_offsets)
+        
+        for (topic, partition), offset in start_offsets.items():
+            try:
+                consumer.seek(TopicPartition(topic, partition, offset))
+            except Exception as e:
+                if (topic, partition) not in assigned:
+                    # Revoked partitions resume from their stored offset on the new owner
+                    log.warning(f"Not rewinding revoked partition {topic}[{partition}]: {str(e)}")
+                    continue
+                log.error(f"Could not rewind {topic}[{partition}] to offset {offset}, stopping sink: {str(e)}")
+                self.running = False
+                self.kafka_consumer.running = False
+                return
+        
+        if self.running:
+            log.warning(f"Rewound {len(start_offsets)} partitions to re-read the unpersisted batch")
+            time.sleep(settings.data_sink.retry_backoff)
+    
+    def _insert_with_retries(self, batch: List[Dict[str, Any]], write_pool=None,
+                             offsets: Dict[Tuple[str, int], int] = None) -> Optional[int]:
+        """
+        Insert a batch into TimescaleDB.
+        
+        With the spill buffer enabled a failed batch is written to disk right
+        away and replayed in the background, so the caller never sleeps on a
+        failing database. Otherwise the insert is retried with backoff and the
+        batch is dropped after max_retries. Callers must not store offsets past
+        a dropped batch.
+        
+        Args:
+            batch: List of sensor reading dictionaries
+            write_pool: Optional dedicated write connection pool
+            offsets: Last consumed offset per (topic, partition) covered by the batch
+            
+        Returns:
+            Number of rows inserted (0 if the batch was spilled), or None if the
+            batch was neither inserted nor spilled
+        """
+        if isinstance(batch, ColumnarBatch):
+            self._build_columnar_batch(batch)
+            if not len(batch):
+                return 0
+        
+        batch_size = len(batch)
         retry_count = 0
         max_retries = settings.data_sink.max_retries
         
+        if self.spill_buffer:
+            # Keep new batches behind the spilled ones while the database is known to be down
+            if not self.spill_replayer.db_available and self.spill_buffer.pending_batches():
+                return self._spill_batch(batch)
+            max_retries = 0
+        
         while retry_count <= max_retries:
             try:
                 # Insert batch into TimescaleDB using optimized batch insert
                 start_time = time.time()
-                rows_inserted = db_manager.insert_sensor_readings_batch(self.batch)
+                rows_inserted = db_manager.insert_sensor_readings_batch(
+                    batch,
+                    write_pool=write_pool,
+                    offsets=offsets if self.store_offsets_in_db else None,
+                    consumer_group=settings.data_sink.consumer_group_id,
+                    raise_on_error=True
+                )
                 insert_time = time.time() - start_time
                 
                 # Update statistics
-                self.stats['messages_stored'] += rows_inserted
-                self.stats['batch_count'] += 1
-                self.stats['last_processed'] = datetime.utcnow().isoformat()
+                with self._stats_lock:
+                    self.stats['messages_stored'] += rows_inserted
+                    self.stats['batch_count'] += 1
+                    self.stats['last_processed'] = datetime.utcnow().isoformat()
+                
+                table = settings.timescaledb.main_table
+                self.metrics.record_batch_size(batch_size, table=table)
+                self.metrics.record_insert_duration(insert_time, table=table)
+                self.metrics.record_records_inserted(rows_inserted, table=table)
                 
-                # Clear batch and update commit time
-                self.batch.clear()
-                self.last_commit_time = time.time()
+                if self.batch_controller:
+                    self.batch_controller.record_batch(batch_size, insert_time, self._oldest_reading_age(batch))
                 
                 if rows_inserted > 0:
                     rate = rows_inserted / insert_time if insert_time > 0 else 0
                     log.debug(f"TimescaleDB batch commit: {rows_inserted} rows in {insert_time:.2f}s ({rate:.0f} rows/sec)")
                 
-                break  # Success, exit retry loop
+                return rows_inserted
                 
             except Exception as e:
                 retry_count += 1
-                self.stats['errors'] += 1
+                with self._stats_lock:
+                    self.stats['errors'] += 1
                 
                 if retry_count <= max_retries:
                     backoff_time = settings.data_sink.retry_backoff * retry_count
                     log.warning(f"TimescaleDB batch commit failed (attempt {retry_count}/{max_retries + 1}): {str(e)}")
                     log.info(f"Retrying in {backoff_time} seconds...")
                     time.sleep(backoff_time)
+                elif self.spill_buffer:
+                    log.warning(f"TimescaleDB batch commit failed, spilling batch to disk: {str(e)}")
+                    return self._spill_batch(batch)
                 else:
                     log.error(f"Failed to commit batch to TimescaleDB after {max_retries + 1} attempts: {str(e)}")
-                    log.error(f"Dropping batch of {batch_size} readings")
-                    self.batch.clear()  # Drop the failed batch
-                    self.last_commit_time = time.time()
-                    break
+        
+        return self._drop_batch(batch_size)
+    
+    def _build_columnar_batch(self, batch: ColumnarBatch):
+        """
+        Validate a columnar batch and report the rows it rejected or repaired.
+        
+        Args:
+            batch: ColumnarBatch collected from Kafka
+        """
+        failures = batch.build(validator=self.batch_validator)
+        if batch.rejected:
+            destination = "quarantined" if self.batch_validator.quarantine else "dropped"
+            log.warning(f"Batch validation {destination} {batch.rejected} readings: {failures}")
+        elif failures:
+            log.debug(f"Batch validation repaired timestamps: {failures}")
+    
+    def _spill_batch(self, batch) -> Optional[int]:
+        """
+        Write a batch to the spill buffer for background replay.
+        
+        Args:
+            batch: List of sensor reading dictionaries
+            
+        Returns:
+            0 once the batch is on disk (no rows reached the database yet), or
+            None if the spill buffer is full or could not be written
+        """
+        if isinstance(batch, ColumnarBatch):
+            batch = batch.to_readings()
+        if not self.spill_buffer.append(batch):
+            return self._drop_batch(len(batch))
+        with self._stats_lock:
+            self.stats['batches_spilled'] += 1
+        self.spill_replayer.notify()
+        return 0
+    
+    def _drop_batch(self, batch_size: int) -> None:
+        """
+        Count a batch that was neither inserted nor spilled.
+        
+        Args:
+            batch_size: Number of readings in the batch
+            
+        Returns:
+            None, the result _insert_with_retries reports for a dropped batch
+        """
+        log.error(f"Dropping batch of {batch_size} readings, its offsets will not be stored")
+        with self._stats_lock:
+            self.stats['batches_dropped'] += 1
+        self.metrics.record_batch_dropped()
+        return None
     
     def process_message(self, message: Dict[str, Any]):
         """
@@ -259,24 +623,77 @@ class TimescaleDBSink:
             # Update statistics
             self.stats['messages_processed'] += 1
             
-            # Validate and transform the message
-            sensor_reading = self.validate_and_transform_message(message)
+            # Skipped messages still advance the offset stored with the next batch
+            msg = self.kafka_consumer.last_message
+            if msg is not None:
+                topic_partition = (msg.topic(), msg.partition())
+                self.batch_start_offsets.setdefault(topic_partition, msg.offset())
+                self.batch_offsets[topic_partition] = msg.offset()
             
-            if sensor_reading:
+            if isinstance(self.batch, ColumnarBatch):
+                # Validated column by column when the batch is written
+                self.batch.append(message)
+                self._commit_if_due()
+            else:
+                # Validate and transform the message
+                sensor_reading = self.validate_and_transform_message(message)
+                
+                if not sensor_reading:
+                    return
+                
                 # Add to batch for TimescaleDB insertion
                 self.add_to_batch(sensor_reading)
-                
-                # Log periodic status with TimescaleDB-specific metrics
-                if self.stats['messages_processed'] % 100 == 0:  # More frequent for low-latency monitoring
-                    log.info(f"Processed {self.stats['messages_processed']} messages, "
-                           f"stored {self.stats['messages_stored']} readings, "
-                           f"current batch size: {len(self.batch)}, "
-                           f"maintenance runs: {self.stats['maintenance_runs']}")
+            
+            # Log periodic status with TimescaleDB-specific metrics
+            if self.stats['messages_processed'] % 100 == 0:  # More frequent for low-latency monitoring
+                log.info(f"Processed {self.stats['messages_processed']} messages, "
+                       f"stored {self.stats['messages_stored']} readings, "
+                       f"current batch size: {len(self.batch)}, "
+                       f"maintenance runs: {self.stats['maintenance_runs']}")
             
         except Exception as e:
             log.error(f"Error processing message: {str(e)}")
             self.stats['errors'] += 1
     
+    def process_batch(self, batch: ConsumedBatch):
+        """
+        Process all messages of one Kafka fetch for TimescaleDB storage.
+        
+        The whole fetch is added to the current batch before the commit check,
+        so the offsets stored with a commit never run ahead of its rows.
+        
+        Args:
+            batch: Records deserialized from one consume() call
+        """
+        try:
+            processed_before = self.stats['messages_processed']
+            self.stats['messages_processed'] += batch.message_count
+            
+            if isinstance(self.batch, ColumnarBatch):
+                # Validated column by column when the batch is written
+                self.batch.extend(batch.records)
+            else:
+                for message in batch.records:
+                    sensor_reading = self.validate_and_transform_message(message)
+                    if sensor_reading:
+                        self.batch.append(sensor_reading.to_dict())
+            
+            # Skipped messages still advance the offset stored with the next batch
+            for topic_partition, offset in batch.first_offsets.items():
+                self.batch_start_offsets.setdefault(topic_partition, offset)
+            self.batch_offsets.update(batch.last_offsets)
+            self._commit_if_due()
+            
+            if processed_before // 1000 != self.stats['messages_processed'] // 1000:
+                log.info(f"Processed {self.stats['messages_processed']} messages, "
+                       f"stored {self.stats['messages_stored']} readings, "
+                       f"current batch size: {len(self.batch)}, "
+                       f"maintenance runs: {self.stats['maintenance_runs']}")
+            
+        except Exception as e:
+            log.error(f"Error processing batch of {len(batch.records)} messages: {str(e)}")
+            self.stats['errors'] += 1
+    
     def start(self):
         """
         Start the TimescaleDB data sink service.
@@ -291,12 +708,24 @@ class TimescaleDBSink:
         # Start consuming from Kafka
         self.running = True
         
+        if self.spill_replayer:
+            self.spill_replayer.start()
+        if self.cagg_refresher:
+            self.cagg_refresher.start()
+        
         try:
-            # Use the base consumer's consume_loop with our custom processor
-            self.kafka_consumer.consume_loop(
-                process_fn=self.process_message,
-                timeout=1.0
-            )
+            if settings.consumer.batch_consume:
+                # Whole fetches go into the batch at once
+                self.kafka_consumer.consume_batch_loop(
+                    process_batch_fn=self.process_batch,
+                    timeout=settings.data_sink.commit_interval
+                )
+            else:
+                # Use the base consumer's consume_loop with our custom processor
+                self.kafka_consumer.consume_loop(
+                    process_fn=self.process_message,
+                    timeout=1.0
+                )
             
         except KeyboardInterrupt:
             log.info("TimescaleDB sink interrupted by user")
@@ -323,6 +752,10 @@ class TimescaleDBSink:
         if hasattr(self, 'kafka_consumer'):
             self.kafka_consumer.close()
         
+        # Unreplayed batches stay on disk for the next start
+        self._stop_spill_replayer()
+        self._stop_cagg_refresher()
+        
         # Wait for maintenance thread to finish
         if self.maintenance_thread and self.maintenance_thread.is_alive():
             log.info("Waiting for maintenance thread to finish...")
@@ -333,6 +766,23 @@ class TimescaleDBSink:
         
         log.info("TimescaleDB data sink stopped")
     
+    def _stop_spill_replayer(self):
+        """
+        Stop the spill replayer and close the spill buffer.
+        """
+        if not self.spill_replayer:
+            return
+        self.spill_replayer.stop()
+        self.spill_buffer.close()
+        self.spill_pool.close()
+    
+    def _stop_cagg_refresher(self):
+        """
+        Stop the continuous aggregate refresher after refreshing what was written last.
+        """
+        if self.cagg_refresher and self.cagg_refresher.running:
+            self.cagg_refresher.stop(flush=True)
+    
     def log_statistics(self):
         """
         Log current statistics with TimescaleDB-specific information.
@@ -341,11 +791,16 @@ class TimescaleDBSink:
         log.info(f"Messages processed: {self.stats['messages_processed']}")
         log.info(f"Messages stored: {self.stats['messages_stored']}")
         log.info(f"Batches committed: {self.stats['batch_count']}")
+        log.info(f"Batches dropped: {self.stats['batches_dropped']}")
         log.info(f"Errors encountered: {self.stats['errors']}")
         log.info(f"Maintenance runs: {self.stats['maintenance_runs']}")
         log.info(f"Last processed: {self.stats['last_processed']}")
         log.info(f"Current batch size: {len(self.batch)}")
         
+        pool_stats = db_manager.get_write_pool_stats()
+        log.info(f"Write pool: {pool_stats['open_connections']} open, {pool_stats['checkouts']} checkouts, "
+                 f"{pool_stats['avg_wait_time'] * 1000:.2f} ms avg wait, {pool_stats['reconnects']} reconnects")
+        
         # Calculate processing rate
         if self.stats['messages_processed'] > 0:
             success_rate = (self.stats['messages_stored'] / self.stats['messages_processed']) * 100
@@ -356,6 +811,17 @@ class TimescaleDBSink:
             avg_batch_size = self.stats['messages_stored'] / self.stats['batch_count']
             log.info(f"Average batch size: {avg_batch_size:.1f} messages")
         
+        if self.spill_buffer:
+            spill_stats = self.spill_buffer.get_stats()
+            log.info(f"Spill buffer: {spill_stats['pending_batches']} batches pending "
+                     f"({spill_stats['depth_bytes'] / 1024 / 1024:.2f} MB), {spill_stats['batches_spilled']} spilled, "
+                     f"{spill_stats['batches_replayed']} replayed, {spill_stats['batches_dropped']} dropped")
+        
+        if self.batch_controller:
+            state = self.batch_controller.get_state()
+            log.info(f"Adaptive batching: size {state['batch_size']}, interval {state['commit_interval']:.2f}s, "
+                     f"last decision {state['last_decision']}, decisions {state['decisions']}")
+        
         # Log TimescaleDB hypertable information
         try:
             hypertable_info = db_manager.get_hypertable_info()
@@ -367,6 +833,18 @@ class TimescaleDBSink:
         except Exception as e:
             log.warning(f"Could not get hypertable info: {str(e)}")
     
+    def last_progress(self) -> float:
+        """
+        Get the time the processing loop last made progress.
+        
+        Each consumption loop iteration counts, idle or not; a batch insert
+        that hangs keeps the loop from coming back.
+        
+        Returns:
+            Epoch seconds of the latest loop iteration
+        """
+        return self.kafka_consumer.last_poll_time
+    
     def get_health_status(self) -> Dict[str, Any]:
         """
         Get health status of the TimescaleDB sink.
@@ -405,6 +883,13 @@ class TimescaleDBSink:
             'recent_activity': recent_activity,
             'batch_size': len(self.batch),
             'statistics': self.stats.copy(),
+            'write_pool': db_manager.get_write_pool_stats(),
+            'devices': db_manager.get_device_status_counts(),
+            'batch_controller': self.batch_controller.get_state() if self.batch_controller else None,
+            'spill_buffer': {
+                **self.spill_buffer.get_stats(),
+                'replayer': self.spill_replayer.get_state()
+            } if self.spill_buffer else None,
             'timescaledb_info': timescaledb_info,
             'performance_mode': 'low_latency',
             'config': {
@@ -413,16 +898,23 @@ class TimescaleDBSink:
             }
         }
     
-    def force_maintenance(self):
+    def force_maintenance(self, full_refresh: bool = False):
         """
         Force run maintenance operations.
+        
+        Args:
+            full_refresh: Recompute the whole history of the continuous aggregates
+                instead of only the windows written since the last refresh
         """
         log.info("Forcing TimescaleDB maintenance...")
         
         try:
             # Refresh continuous aggregates
             if settings.timescaledb.enable_continuous_aggregates:
-                db_manager.refresh_continuous_aggregates()
+                if full_refresh:
+                    db_manager.refresh_continuous_aggregates()
+                else:
+                    db_manager.refresh_dirty_aggregates()
             
             # Run vacuum and analyze
             db_manager.vacuum_and_analyze()
@@ -452,12 +944,16 @@ class TimescaleDBSinkManager:
     
     def create_sink(self) -> TimescaleDBSink:
         """
-        Create a new TimescaleDB sink instance.
+        Create a new TimescaleDB sink instance for the configured sink mode.
         
         Returns:
             TimescaleDB sink instance
         """
-        self.sink = TimescaleDBSink()
+        if settings.data_sink.mode == 'pipelined':
+            from src.data_storage.pipelined_sink import PipelinedTimescaleDBSink
+            self.sink = PipelinedTimescaleDBSink()
+        else:
+            self.sink = TimescaleDBSink()
         return self.sink
     
     def start_sink(self):
@@ -495,12 +991,15 @@ class TimescaleDBSinkManager:
             log.info("Forcing commit of current batch to TimescaleDB...")
             self.sink.commit_batch()
     
-    def force_maintenance(self):
+    def force_maintenance(self, full_refresh: bool = False):
         """
         Force run maintenance operations.
+        
+        Args:
+            full_refresh: Recompute the whole history of the continuous aggregates
         """
         if self.sink:
-            self.sink.force_maintenance()
+            self.sink.force_maintenance(full_refresh=full_refresh)
 
 
 # Create singleton instance
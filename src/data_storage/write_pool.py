@@ -0,0 +1,292 @@
+"""
+Pooled, long-lived psycopg2 write connections for the TimescaleDB sink.
+"""
+
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any
+
+import psycopg2
+
+from src.utils.logger import log
+
+
+# Open write connections across all pools in the process, reported on the
+# database_connections gauge
+_open_connections_total = 0
+_open_connections_lock = threading.Lock()
+
+
+def _adjust_open_connections(delta: int) -> int:
+    global _open_connections_total
+    with _open_connections_lock:
+        _open_connections_total += delta
+        return _open_connections_total
+
+
+class WriteConnectionPool:
+    """
+    Pool of persistent psycopg2 connections used for batch writes.
+
+    Connections are opened once, configured with per-pool session settings
+    (e.g. synchronous_commit), health-checked when they have been idle for a
+    while, and replaced transparently after a connection-level failure.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        min_size: int = 1,
+        max_size: int = 4,
+        session_settings: Dict[str, Any] = None,
+        health_check_interval: float = 30.0,
+        acquire_timeout: float = 30.0,
+        name: str = "write"
+    ):
+        """
+        Initialize the write connection pool.
+
+        Args:
+            dsn: PostgreSQL connection string
+            min_size: Number of connections opened eagerly
+            max_size: Maximum number of open connections
+            session_settings: Session-level GUCs applied to every new connection
+            health_check_interval: Idle seconds after which a connection is pinged before use
+            acquire_timeout: Seconds to wait for a free connection
+            name: Pool name used in logs
+        """
+        self.dsn = dsn
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.session_settings = dict(session_settings or {})
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self.name = name
+
+        # Idle connections as (connection, last_used) tuples, most recently used first
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._open_connections = 0
+        self._closed = False
+        self._metrics = None
+
+        self.stats = {
+            'checkouts': 0,
+            'wait_time_total': 0.0,
+            'reconnects': 0,
+            'health_check_failures': 0,
+            'connections_opened': 0,
+            'connections_closed': 0
+        }
+
+    def set_metrics(self, metrics):
+        """
+        Attach a TimescaleDBSinkMetrics instance for pool statistics.
+
+        Args:
+            metrics: TimescaleDBSinkMetrics instance
+        """
+        self._metrics = metrics
+        self._publish_connection_count(_adjust_open_connections(0))
+
+    def warm_up(self):
+        """
+        Open min_size connections ahead of the first batch.
+        """
+        opened = []
+        try:
+            for _ in range(self.min_size):
+                self._slots.acquire()
+                try:
+                    opened.append(self._connect())
+                except Exception:
+                    self._slots.release()
+                    raise
+        except Exception as e:
+            log.warning(f"Could not pre-open {self.name} pool connections: {str(e)}")
+        finally:
+            for conn in opened:
+                self._idle.put((conn, time.time()))
+                self._slots.release()
+
+        log.info(f"TimescaleDB {self.name} pool ready with {len(opened)} connection(s) "
+                 f"(max {self.max_size}, settings: {self.session_settings})")
+
+    def _connect(self):
+        """
+        Open and configure a new connection.
+        """
+        conn = psycopg2.connect(self.dsn)
+        try:
+            if self.session_settings:
+                with conn.cursor() as cur:
+                    for setting, value in self.session_settings.items():
+                        cur.execute("SELECT set_config(%s, %s, false)", (setting, str(value)))
+                conn.commit()
+        except Exception:
+            conn.close()
+            raise
+
+        with self._lock:
+            self._open_connections += 1
+            self.stats['connections_opened'] += 1
+        self._publish_connection_count(_adjust_open_connections(1))
+        return conn
+
+    def _discard(self, conn):
+        """
+        Close a connection and remove it from the pool accounting.
+        """
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+        with self._lock:
+            self._open_connections -= 1
+            self.stats['connections_closed'] += 1
+        self._publish_connection_count(_adjust_open_connections(-1))
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        """
+        Check whether an idle connection can still be used.
+        """
+        if conn.closed:
+            return False
+
+        if time.time() - last_used < self.health_check_interval:
+            return True
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            log.warning(f"TimescaleDB {self.name} pool health check failed: {str(e)}")
+            with self._lock:
+                self.stats['health_check_failures'] += 1
+            return False
+
+    def _acquire(self):
+        """
+        Check out a healthy connection, opening or replacing one as needed.
+        """
+        if self._closed:
+            raise RuntimeError(f"TimescaleDB {self.name} pool is closed")
+
+        wait_start = time.time()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"Timed out waiting for a TimescaleDB {self.name} connection")
+
+        try:
+            conn = None
+            while conn is None:
+                try:
+                    candidate, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    conn = self._connect()
+                    break
+
+                if self._is_healthy(candidate, last_used):
+                    conn = candidate
+                else:
+                    self._discard(candidate)
+                    self._record_reconnect()
+        except Exception:
+            self._slots.release()
+            raise
+
+        wait_time = time.time() - wait_start
+        with self._lock:
+            self.stats['checkouts'] += 1
+            self.stats['wait_time_total'] += wait_time
+        if self._metrics:
+            self._metrics.record_pool_checkout(wait_time)
+
+        return conn
+
+    def _release(self, conn, broken: bool = False):
+        """
+        Return a connection to the pool or discard it if it is no longer usable.
+        """
+        try:
+            if broken or conn.closed or self._closed:
+                self._discard(conn)
+                if broken:
+                    self._record_reconnect()
+            else:
+                self._idle.put((conn, time.time()))
+        finally:
+            self._slots.release()
+
+    def _record_reconnect(self):
+        with self._lock:
+            self.stats['reconnects'] += 1
+        if self._metrics:
+            self._metrics.record_pool_reconnect()
+
+    def _publish_connection_count(self, total: int):
+        if self._metrics:
+            self._metrics.set_database_connections(total)
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a pooled connection for the duration of a transaction.
+
+        The transaction is rolled back if the block raises. Connections that
+        fail at the connection level are discarded so that the next checkout
+        reconnects.
+
+        Yields:
+            psycopg2 connection object
+        """
+        conn = self._acquire()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self._release(conn, broken=broken or bool(conn.closed))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get pool statistics.
+
+        Returns:
+            Dictionary with pool statistics
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats['open_connections'] = self._open_connections
+        stats['idle_connections'] = self._idle.qsize()
+        stats['max_size'] = self.max_size
+        stats['avg_wait_time'] = (
+            stats['wait_time_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        )
+        return stats
+
+    def close(self):
+        """
+        Close all idle connections; in-use connections are closed when released.
+        """
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+        log.info(f"TimescaleDB {self.name} pool closed")
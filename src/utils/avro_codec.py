@@ -0,0 +1,833 @@
+"""
+Compiled Avro codec for Confluent Schema Registry framed messages.
+
+Each (writer schema, reader schema) pair is compiled once into a specialized
+Python function that decodes one record in place from the message bytes, so
+the per-message cost is the field reads themselves instead of a generic
+schema walk with runtime schema resolution.
+"""
+
+import json
+import struct
+import threading
+from collections.abc import Mapping
+from typing import Dict, Any, Callable, Optional, Tuple, List
+
+from src.utils.logger import log
+
+
+# Confluent wire format: magic byte 0 followed by a big-endian schema ID
+_MAGIC_BYTE = 0
+_HEADER = struct.Struct('>bI')
+_HEADER_SIZE = _HEADER.size
+
+_PRIMITIVES = frozenset(('null', 'boolean', 'int', 'long', 'float', 'double', 'bytes', 'string'))
+_NAMED = frozenset(('record', 'error', 'enum', 'fixed'))
+
+# Writer type -> reader types it can be read as (Avro schema resolution)
+_PROMOTIONS = {
+    'int': ('long', 'float', 'double'),
+    'long': ('float', 'double'),
+    'float': ('double',),
+    'string': ('bytes',),
+    'bytes': ('string',),
+}
+
+
+class UnsupportedSchemaError(ValueError):
+    """
+    Raised when a schema pair cannot be compiled; callers fall back to the generic decoder.
+    """
+
+
+def _read_long(buf, pos: int) -> Tuple[int, int]:
+    """
+    Read a zigzag-encoded variable-length int or long.
+
+    Args:
+        buf: Buffer to read from
+        pos: Offset of the first byte
+
+    Returns:
+        Tuple of (value, offset after the value)
+    """
+    b = buf[pos]
+    pos += 1
+    n = b & 0x7F
+    shift = 7
+    while b & 0x80:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        shift += 7
+    return (n >> 1) ^ -(n & 1), pos
+
+
+def parse_schema(schema_str: str) -> Dict[str, Any]:
+    """
+    Parse an Avro schema into nested dictionaries with named type references resolved.
+
+    Args:
+        schema_str: Avro schema JSON
+
+    Returns:
+        Normalized schema; every node has a 'type' key
+    """
+    return _normalize(json.loads(schema_str), {}, None)
+
+
+def _normalize(schema: Any, names: Dict[str, Dict[str, Any]], namespace: Optional[str]) -> Dict[str, Any]:
+    """
+    Normalize one schema node.
+
+    Args:
+        schema: Parsed schema JSON node
+        names: Named types defined so far, by full name
+        namespace: Enclosing namespace
+
+    Returns:
+        Normalized schema node
+    """
+    if isinstance(schema, str):
+        if schema in _PRIMITIVES:
+            return {'type': schema}
+        fullname = schema if '.' in schema or not namespace else f"{namespace}.{schema}"
+        if fullname in names:
+            return names[fullname]
+        if schema in names:
+            return names[schema]
+        raise UnsupportedSchemaError(f"Unknown Avro type: {schema}")
+
+    if isinstance(schema, list):
+        return {'type': 'union', 'branches': [_normalize(branch, names, namespace) for branch in schema]}
+
+    schema_type = schema['type']
+    if isinstance(schema_type, (dict, list)):
+        return _normalize(schema_type, names, namespace)
+
+    if schema.get('logicalType'):
+        # Logical types are converted by the generic decoder; keep its behavior
+        raise UnsupportedSchemaError(f"Logical type {schema['logicalType']} is not compiled")
+
+    if schema_type in _NAMED:
+        name = schema['name']
+        if '.' in name:
+            fullname = name
+            namespace = name.rsplit('.', 1)[0]
+        else:
+            namespace = schema.get('namespace', namespace)
+            fullname = f"{namespace}.{name}" if namespace else name
+
+        node = dict(schema)
+        node['type'] = 'record' if schema_type == 'error' else schema_type
+        node['fullname'] = fullname
+        node['shortname'] = fullname.rsplit('.', 1)[-1]
+        names[fullname] = node
+        if node['type'] == 'record':
+            node['fields'] = [
+                dict(field, type=_normalize(field['type'], names, namespace)) for field in schema['fields']
+            ]
+        return node
+
+    if schema_type == 'array':
+        return {'type': 'array', 'items': _normalize(schema['items'], names, namespace)}
+    if schema_type == 'map':
+        return {'type': 'map', 'values': _normalize(schema['values'], names, namespace)}
+    if schema_type in _PRIMITIVES:
+        return {'type': schema_type}
+    if schema_type in names:
+        return names[schema_type]
+
+    raise UnsupportedSchemaError(f"Unsupported Avro type: {schema_type}")
+
+
+def _matches(writer: Dict[str, Any], reader: Dict[str, Any]) -> bool:
+    """
+    Check whether data written with one schema node can be read as another.
+    """
+    writer_type = writer['type']
+    reader_type = reader['type']
+    if writer_type in ('record', 'enum', 'fixed') or reader_type in ('record', 'enum', 'fixed'):
+        return writer_type == reader_type and writer['shortname'] == reader['shortname']
+    return writer_type == reader_type or reader_type in _PROMOTIONS.get(writer_type, ())
+
+
+class _DecoderCompiler:
+    """
+    Generates the Python source of a decoder for one (writer, reader) schema pair.
+
+    Records become functions ``_rN(buf, pos) -> (record, pos)``; every other
+    type is decoded inline into a local variable.
+    """
+
+    def __init__(self):
+        self.namespace: Dict[str, Any] = {'_read_long': _read_long}
+        self.functions: List[str] = []
+        self.records: Dict[Tuple[int, int], str] = {}
+        self.counter = 0
+
+    def _name(self, prefix: str) -> str:
+        self.counter += 1
+        return f"{prefix}{self.counter}"
+
+    def _constant(self, value: Any) -> str:
+        name = self._name('_c')
+        self.namespace[name] = value
+        return name
+
+    def _emit_long(self, var: str, lines: List[str], pad: str):
+        """
+        Emit a zigzag varint read with the one-byte case inlined.
+
+        Lengths, counts and small values fit in one byte, so the common case
+        avoids a function call.
+        """
+        lines.append(f"{pad}{var} = buf[pos]")
+        lines.append(f"{pad}if {var} < 0x80:")
+        lines.append(f"{pad}    pos += 1")
+        lines.append(f"{pad}    {var} = ({var} >> 1) ^ -({var} & 1)")
+        lines.append(f"{pad}else:")
+        lines.append(f"{pad}    {var}, pos = _read_long(buf, pos)")
+
+    def compile(self, writer: Dict[str, Any], reader: Dict[str, Any]) -> Callable:
+        """
+        Compile a decoder function.
+
+        Args:
+            writer: Normalized writer schema
+            reader: Normalized reader schema
+
+        Returns:
+            Function decoding one datum: decode(buf, pos) -> (value, pos)
+        """
+        entry = self._name('_decode')
+        lines = [f"def {entry}(buf, pos):"]
+        self._emit(writer, reader, 'value', lines, 1)
+        lines.append("    return value, pos")
+        self.functions.append('\n'.join(lines))
+
+        source = '\n\n'.join(self.functions)
+        exec(compile(source, '<avro-decoder>', 'exec'), self.namespace)
+        return self.namespace[entry]
+
+    def _emit(self, writer: Dict[str, Any], reader: Optional[Dict[str, Any]], var: str, lines: List[str], depth: int):
+        """
+        Emit the statements that decode one value into var.
+
+        Args:
+            writer: Writer schema node
+            reader: Reader schema node, or None when the value is skipped
+            var: Local variable receiving the value
+            lines: Source lines being generated
+            depth: Indentation level
+        """
+        pad = '    ' * depth
+        writer_type = writer['type']
+
+        if writer_type == 'union':
+            self._emit_writer_union(writer, reader, var, lines, depth)
+            return
+
+        if reader is not None and reader['type'] == 'union':
+            for branch in reader['branches']:
+                if _matches(writer, branch):
+                    reader = branch
+                    break
+            else:
+                raise UnsupportedSchemaError(f"No reader branch matches writer type {writer_type}")
+        elif reader is not None and not _matches(writer, reader):
+            raise UnsupportedSchemaError(f"Writer type {writer_type} cannot be read as {reader['type']}")
+
+        reader_type = reader['type'] if reader is not None else writer_type
+
+        if writer_type == 'null':
+            lines.append(f"{pad}{var} = None")
+        elif writer_type == 'boolean':
+            lines.append(f"{pad}{var} = buf[pos] != 0")
+            lines.append(f"{pad}pos += 1")
+        elif writer_type in ('int', 'long'):
+            self._emit_long(var, lines, pad)
+            if reader_type in ('float', 'double'):
+                lines.append(f"{pad}{var} = float({var})")
+        elif writer_type == 'float':
+            unpack = self._constant(struct.Struct('<f').unpack_from)
+            lines.append(f"{pad}{var} = {unpack}(buf, pos)[0]")
+            lines.append(f"{pad}pos += 4")
+        elif writer_type == 'double':
+            unpack = self._constant(struct.Struct('<d').unpack_from)
+            lines.append(f"{pad}{var} = {unpack}(buf, pos)[0]")
+            lines.append(f"{pad}pos += 8")
+        elif writer_type in ('string', 'bytes'):
+            self._emit_long('size', lines, pad)
+            if reader_type == 'string':
+                lines.append(f"{pad}{var} = buf[pos:pos + size].decode()")
+            else:
+                lines.append(f"{pad}{var} = buf[pos:pos + size]")
+            lines.append(f"{pad}pos += size")
+        elif writer_type == 'fixed':
+            size = writer['size']
+            lines.append(f"{pad}{var} = buf[pos:pos + {size}]")
+            lines.append(f"{pad}pos += {size}")
+        elif writer_type == 'enum':
+            self._emit_long('index', lines, pad)
+            lines.append(f"{pad}{var} = {self._constant(self._enum_symbols(writer, reader))}[index]")
+        elif writer_type == 'array':
+            reader_items = reader['items'] if reader is not None else None
+            count = self._name('count')
+            item = self._name('item')
+            lines.append(f"{pad}{var} = []")
+            self._emit_long(count, lines, pad)
+            lines.append(f"{pad}while {count}:")
+            lines.append(f"{pad}    if {count} < 0:")
+            lines.append(f"{pad}        {count} = -{count}")
+            lines.append(f"{pad}        _, pos = _read_long(buf, pos)")
+            lines.append(f"{pad}    for _ in range({count}):")
+            self._emit(writer['items'], reader_items, item, lines, depth + 2)
+            lines.append(f"{pad}        {var}.append({item})")
+            lines.append(f"{pad}    {count}, pos = _read_long(buf, pos)")
+        elif writer_type == 'map':
+            reader_values = reader['values'] if reader is not None else None
+            count = self._name('count')
+            key = self._name('key')
+            item = self._name('item')
+            lines.append(f"{pad}{var} = {{}}")
+            self._emit_long(count, lines, pad)
+            lines.append(f"{pad}while {count}:")
+            lines.append(f"{pad}    if {count} < 0:")
+            lines.append(f"{pad}        {count} = -{count}")
+            lines.append(f"{pad}        _, pos = _read_long(buf, pos)")
+            lines.append(f"{pad}    for _ in range({count}):")
+            self._emit({'type': 'string'}, {'type': 'string'}, key, lines, depth + 2)
+            self._emit(writer['values'], reader_values, item, lines, depth + 2)
+            lines.append(f"{pad}        {var}[{key}] = {item}")
+            lines.append(f"{pad}    {count}, pos = _read_long(buf, pos)")
+        elif writer_type == 'record':
+            function = self._record_function(writer, reader)
+            lines.append(f"{pad}{var}, pos = {function}(buf, pos)")
+        else:
+            raise UnsupportedSchemaError(f"Unsupported Avro type: {writer_type}")
+
+    def _emit_writer_union(self, writer: Dict[str, Any], reader: Optional[Dict[str, Any]], var: str,
+                           lines: List[str], depth: int):
+        """
+        Emit a branch on the union index, resolving each writer branch separately.
+        """
+        pad = '    ' * depth
+        branch_var = self._name('branch')
+        if len(writer['branches']) <= 64:
+            # Indexes below 64 always encode as one byte
+            lines.append(f"{pad}{branch_var} = buf[pos] >> 1")
+            lines.append(f"{pad}pos += 1")
+        else:
+            lines.append(f"{pad}{branch_var}, pos = _read_long(buf, pos)")
+        for index, branch in enumerate(writer['branches']):
+            keyword = 'if' if index == 0 else 'elif'
+            lines.append(f"{pad}{keyword} {branch_var} == {index}:")
+            try:
+                self._emit(branch, reader, var, lines, depth + 1)
+            except UnsupportedSchemaError:
+                # Data in this branch cannot be read with the reader schema
+                lines.append(f"{pad}    raise ValueError('Writer union branch {index} does not match the reader schema')")
+        lines.append(f"{pad}else:")
+        lines.append(f"{pad}    raise ValueError(f'Invalid union index {{{branch_var}}}')")
+
+    def _enum_symbols(self, writer: Dict[str, Any], reader: Optional[Dict[str, Any]]) -> Tuple[str, ...]:
+        """
+        Map writer enum indexes to reader symbols.
+        """
+        if reader is None:
+            return tuple(writer['symbols'])
+        reader_symbols = set(reader['symbols'])
+        default = reader.get('default')
+        symbols = []
+        for symbol in writer['symbols']:
+            if symbol in reader_symbols:
+                symbols.append(symbol)
+            elif default is not None:
+                symbols.append(default)
+            else:
+                raise UnsupportedSchemaError(f"Enum symbol {symbol} is unknown to the reader")
+        return tuple(symbols)
+
+    def _record_function(self, writer: Dict[str, Any], reader: Optional[Dict[str, Any]]) -> str:
+        """
+        Get the name of the function decoding a record, generating it on first use.
+        """
+        key = (id(writer), id(reader))
+        if key in self.records:
+            return self.records[key]
+
+        function = self._name('_r')
+        self.records[key] = function
+
+        reader_fields = {}
+        if reader is not None:
+            for field in reader['fields']:
+                reader_fields[field['name']] = field
+                for alias in field.get('aliases', ()):
+                    reader_fields.setdefault(alias, field)
+
+        lines = [f"def {function}(buf, pos):"]
+        values = {}
+        for field in writer['fields']:
+            reader_field = reader_fields.get(field['name']) if reader is not None else field
+            var = self._name('f')
+            self._emit(field['type'], reader_field['type'] if reader_field is not None else None, var, lines, 1)
+            if reader_field is not None:
+                values[reader_field['name']] = var
+
+        output_fields = reader['fields'] if reader is not None else writer['fields']
+        items = []
+        for field in output_fields:
+            name = field['name']
+            if name in values:
+                items.append(f"{name!r}: {values[name]}")
+            elif 'default' in field:
+                default = field['default']
+                if isinstance(default, (list, dict)):
+                    items.append(f"{name!r}: {type(default).__name__}({self._constant(default)})")
+                else:
+                    items.append(f"{name!r}: {default!r}")
+            else:
+                raise UnsupportedSchemaError(f"Reader field {name} has no default and is missing from the writer schema")
+
+        lines.append(f"    return {{{', '.join(items)}}}, pos")
+        self.functions.append('\n'.join(lines))
+        return function
+
+
+def _write_varint(out: bytearray, n: int):
+    """
+    Append an already zigzag-encoded value as a variable-length integer.
+    """
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+class _EncoderCompiler:
+    """
+    Generates the Python source of an encoder for one writer schema.
+
+    Records become functions ``_wN(datum, out)`` appending to a bytearray;
+    record fields are read with ``datum.get`` so any mapping can be encoded.
+    """
+
+    def __init__(self):
+        self.namespace: Dict[str, Any] = {'_write_varint': _write_varint, 'Mapping': Mapping}
+        self.functions: List[str] = []
+        self.records: Dict[int, str] = {}
+        self.counter = 0
+
+    def _name(self, prefix: str) -> str:
+        self.counter += 1
+        return f"{prefix}{self.counter}"
+
+    def _constant(self, value: Any) -> str:
+        name = self._name('_c')
+        self.namespace[name] = value
+        return name
+
+    def compile(self, schema: Dict[str, Any], none_defaults: Dict[str, Any] = None) -> Callable:
+        """
+        Compile an encoder function.
+
+        Args:
+            schema: Normalized writer schema
+            none_defaults: Values substituted for missing or None top-level record fields
+
+        Returns:
+            Function encoding one datum: encode(datum, out)
+        """
+        if schema['type'] == 'record':
+            entry = self._record_function(schema, none_defaults or {})
+        else:
+            entry = self._name('_encode')
+            lines = [f"def {entry}(value, out):"]
+            self._emit(schema, 'value', lines, 1)
+            self.functions.append('\n'.join(lines))
+
+        source = '\n\n'.join(self.functions)
+        exec(compile(source, '<avro-encoder>', 'exec'), self.namespace)
+        return self.namespace[entry]
+
+    def _emit_long(self, value: str, lines: List[str], pad: str):
+        """
+        Emit a zigzag varint write with the one-byte case inlined.
+        """
+        encoded = self._name('n')
+        lines.append(f"{pad}{encoded} = ({value} << 1) ^ ({value} >> 63)")
+        lines.append(f"{pad}if {encoded} < 0x80:")
+        lines.append(f"{pad}    out.append({encoded})")
+        lines.append(f"{pad}else:")
+        lines.append(f"{pad}    _write_varint(out, {encoded})")
+
+    def _emit(self, schema: Dict[str, Any], var: str, lines: List[str], depth: int):
+        """
+        Emit the statements that encode the value in var.
+
+        Args:
+            schema: Schema node of the value
+            var: Local variable holding the value
+            lines: Source lines being generated
+            depth: Indentation level
+        """
+        pad = '    ' * depth
+        schema_type = schema['type']
+
+        if schema_type == 'null':
+            pass
+        elif schema_type == 'boolean':
+            lines.append(f"{pad}out.append(1 if {var} else 0)")
+        elif schema_type in ('int', 'long'):
+            self._emit_long(var, lines, pad)
+        elif schema_type == 'float':
+            lines.append(f"{pad}out += {self._constant(struct.Struct('<f').pack)}({var})")
+        elif schema_type == 'double':
+            lines.append(f"{pad}out += {self._constant(struct.Struct('<d').pack)}({var})")
+        elif schema_type in ('string', 'bytes'):
+            data = self._name('data')
+            size = self._name('size')
+            if schema_type == 'string':
+                lines.append(f"{pad}{data} = {var}.encode()")
+            else:
+                lines.append(f"{pad}{data} = {var}")
+            lines.append(f"{pad}{size} = len({data})")
+            self._emit_long(size, lines, pad)
+            lines.append(f"{pad}out += {data}")
+        elif schema_type == 'fixed':
+            lines.append(f"{pad}if len({var}) != {schema['size']}:")
+            lines.append(f"{pad}    raise ValueError('{schema['fullname']} must be {schema['size']} bytes')")
+            lines.append(f"{pad}out += {var}")
+        elif schema_type == 'enum':
+            symbols = self._constant({symbol: index for index, symbol in enumerate(schema['symbols'])})
+            index = self._name('index')
+            lines.append(f"{pad}{index} = {symbols}.get({var})")
+            lines.append(f"{pad}if {index} is None:")
+            lines.append(f"{pad}    raise ValueError(f'{{{var}!r}} is not a symbol of {schema['fullname']}')")
+            self._emit_long(index, lines, pad)
+        elif schema_type == 'array':
+            item = self._name('item')
+            count = self._name('count')
+            lines.append(f"{pad}if {var}:")
+            lines.append(f"{pad}    {count} = len({var})")
+            self._emit_long(count, lines, pad + '    ')
+            lines.append(f"{pad}    for {item} in {var}:")
+            self._emit(schema['items'], item, lines, depth + 2)
+            lines.append(f"{pad}out.append(0)")
+        elif schema_type == 'map':
+            key = self._name('key')
+            item = self._name('item')
+            count = self._name('count')
+            lines.append(f"{pad}if {var}:")
+            lines.append(f"{pad}    {count} = len({var})")
+            self._emit_long(count, lines, pad + '    ')
+            lines.append(f"{pad}    for {key}, {item} in {var}.items():")
+            self._emit({'type': 'string'}, key, lines, depth + 2)
+            self._emit(schema['values'], item, lines, depth + 2)
+            lines.append(f"{pad}out.append(0)")
+        elif schema_type == 'union':
+            self._emit_union(schema, var, lines, depth)
+        elif schema_type == 'record':
+            lines.append(f"{pad}{self._record_function(schema, {})}({var}, out)")
+        else:
+            raise UnsupportedSchemaError(f"Unsupported Avro type: {schema_type}")
+
+    def _branch_check(self, schema: Dict[str, Any], var: str) -> str:
+        """
+        Get the expression selecting a union branch for a value, mirroring fastavro's validation.
+        """
+        schema_type = schema['type']
+        if schema_type == 'null':
+            return f"{var} is None"
+        if schema_type == 'boolean':
+            return f"{var} is True or {var} is False"
+        if schema_type == 'int':
+            return f"type({var}) is int and -2147483648 <= {var} <= 2147483647"
+        if schema_type == 'long':
+            return f"type({var}) is int"
+        if schema_type in ('float', 'double'):
+            return f"(type({var}) is float or type({var}) is int)"
+        if schema_type == 'string':
+            return f"isinstance({var}, str)"
+        if schema_type in ('bytes', 'fixed'):
+            return f"isinstance({var}, (bytes, bytearray))"
+        if schema_type == 'enum':
+            return f"{var} in {self._constant(frozenset(schema['symbols']))}"
+        if schema_type == 'array':
+            return f"isinstance({var}, (list, tuple))"
+        if schema_type in ('map', 'record'):
+            return f"isinstance({var}, Mapping)"
+        raise UnsupportedSchemaError(f"Unsupported union branch type: {schema_type}")
+
+    def _emit_union(self, schema: Dict[str, Any], var: str, lines: List[str], depth: int):
+        """
+        Emit a branch selection on the Python type of the value.
+        """
+        pad = '    ' * depth
+        branches = schema['branches']
+        branch_types = [branch['type'] for branch in branches]
+        if branch_types.count('record') + branch_types.count('map') > 1:
+            # fastavro picks between several mappings by matching field names
+            raise UnsupportedSchemaError("Unions with several record or map branches are not compiled")
+        if len(branches) > 64:
+            raise UnsupportedSchemaError("Unions with more than 64 branches are not compiled")
+
+        # Like fastavro, a later double wins over an earlier float for Python floats
+        order = list(range(len(branches)))
+        if 'float' in branch_types and 'double' in branch_types:
+            double_index = branch_types.index('double')
+            order.remove(double_index)
+            order.insert(branch_types.index('float'), double_index)
+
+        for position, index in enumerate(order):
+            keyword = 'if' if position == 0 else 'elif'
+            lines.append(f"{pad}{keyword} {self._branch_check(branches[index], var)}:")
+            lines.append(f"{pad}    out.append({index << 1})")
+            if branches[index]['type'] != 'null':
+                self._emit(branches[index], var, lines, depth + 1)
+        lines.append(f"{pad}else:")
+        lines.append(f"{pad}    raise ValueError(f'{{{var}!r}} does not match any branch of the union')")
+
+    def _record_function(self, schema: Dict[str, Any], none_defaults: Dict[str, Any]) -> str:
+        """
+        Get the name of the function encoding a record, generating it on first use.
+        """
+        key = id(schema)
+        if key in self.records and not none_defaults:
+            return self.records[key]
+
+        function = self._name('_w')
+        if not none_defaults:
+            self.records[key] = function
+
+        lines = [f"def {function}(datum, out):", "    get = datum.get"]
+        for field in schema['fields']:
+            name = field['name']
+            var = self._name('f')
+            field_type = field['type']
+            accepts_null = field_type['type'] == 'null' or (
+                field_type['type'] == 'union' and any(branch['type'] == 'null' for branch in field_type['branches'])
+            )
+
+            if name in none_defaults:
+                default, has_default = none_defaults[name], True
+            elif 'default' in field and not accepts_null:
+                default, has_default = field['default'], True
+            else:
+                default, has_default = None, False
+
+            lines.append(f"    {var} = get({name!r})")
+            if has_default:
+                if isinstance(default, (list, dict)):
+                    lines.append(f"    if {var} is None:")
+                    lines.append(f"        {var} = {type(default).__name__}({self._constant(default)})")
+                else:
+                    lines.append(f"    if {var} is None:")
+                    lines.append(f"        {var} = {default!r}")
+            self._emit(field_type, var, lines, 1)
+
+        if len(lines) == 2:
+            lines.append("    pass")
+        self.functions.append('\n'.join(lines))
+        return function
+
+
+def compile_decoder(writer_schema_str: str, reader_schema_str: Optional[str] = None) -> Callable:
+    """
+    Compile a decoder for data written with one schema and read with another.
+
+    Args:
+        writer_schema_str: Schema the data was written with
+        reader_schema_str: Schema to read it as (defaults to the writer schema)
+
+    Returns:
+        Function decoding one datum: decode(buf, pos) -> (value, pos)
+
+    Raises:
+        UnsupportedSchemaError: If the schemas use features the compiler does not handle
+    """
+    writer = parse_schema(writer_schema_str)
+    reader = parse_schema(reader_schema_str) if reader_schema_str else None
+    return _DecoderCompiler().compile(writer, reader)
+
+
+def compile_encoder(schema_str: str, none_defaults: Dict[str, Any] = None) -> Callable:
+    """
+    Compile an encoder for a writer schema.
+
+    Missing record fields take their schema default when the field type does
+    not accept null, so readings do not need to be copied and patched first.
+
+    Args:
+        schema_str: Writer schema
+        none_defaults: Values substituted for missing or None top-level record fields
+
+    Returns:
+        Function encoding one datum: encode(datum, out) appends to a bytearray
+
+    Raises:
+        UnsupportedSchemaError: If the schema uses features the compiler does not handle
+    """
+    return _EncoderCompiler().compile(parse_schema(schema_str), none_defaults)
+
+
+class FastAvroDecoder:
+    """
+    Decoder for Confluent-framed Avro messages.
+
+    Parses the wire header, caches writer schemas by schema ID and compiles
+    one decoder per writer schema against the reader schema. Schemas the
+    compiler cannot handle are decoded with the fallback decoder instead.
+    """
+
+    def __init__(self, reader_schema_str: str, schema_fetcher: Callable[[int], str],
+                 from_dict: Callable[[Dict[str, Any]], Any] = None,
+                 fallback: Callable[[bytes, str], Any] = None):
+        """
+        Initialize the decoder.
+
+        Args:
+            reader_schema_str: Schema records are read as
+            schema_fetcher: Returns the writer schema string for a schema ID
+            from_dict: Optional conversion applied to each decoded record
+            fallback: Decoder for complete messages whose writer schema cannot be compiled,
+                called with the message and topic
+        """
+        self.reader_schema_str = reader_schema_str
+        self.schema_fetcher = schema_fetcher
+        self.from_dict = from_dict
+        self.fallback = fallback
+        self._decoders: Dict[int, Optional[Callable]] = {}
+        self._lock = threading.Lock()
+
+    def _decoder_for(self, schema_id: int) -> Optional[Callable]:
+        """
+        Get the compiled decoder for a writer schema ID, compiling it on first use.
+
+        Returns:
+            Decoder function, or None if the schema falls back to the generic decoder
+        """
+        with self._lock:
+            if schema_id in self._decoders:
+                return self._decoders[schema_id]
+
+            writer_schema_str = self.schema_fetcher(schema_id)
+            try:
+                decoder = compile_decoder(writer_schema_str, self.reader_schema_str)
+                log.info(f"Compiled Avro decoder for writer schema ID {schema_id}")
+            except UnsupportedSchemaError as e:
+                if self.fallback is None:
+                    raise
+                log.warning(f"Using generic Avro decoder for schema ID {schema_id}: {str(e)}")
+                decoder = None
+
+            self._decoders[schema_id] = decoder
+            return decoder
+
+    def decode(self, data: bytes, topic: str = None) -> Any:
+        """
+        Decode one Confluent-framed Avro message.
+
+        Args:
+            data: Message value
+            topic: Topic the message was read from, passed to the fallback decoder
+
+        Returns:
+            Decoded record, converted with from_dict if set
+        """
+        if data is None:
+            return None
+
+        # Fields are read by offset from the message itself; slicing bytes and
+        # decoding is faster than going through a memoryview for short strings
+        if type(data) is not bytes:
+            data = bytes(data)
+        if len(data) <= _HEADER_SIZE:
+            raise ValueError(f"Expecting data framing of length 6 bytes or more but total data size is {len(data)} bytes")
+
+        magic, schema_id = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC_BYTE:
+            raise ValueError(f"Unexpected magic byte {magic}; message was not produced with a Schema Registry serializer")
+
+        try:
+            decoder = self._decoders[schema_id]
+        except KeyError:
+            decoder = self._decoder_for(schema_id)
+
+        if decoder is None:
+            return self.fallback(data, topic)
+
+        record = decoder(data, _HEADER_SIZE)[0]
+        if self.from_dict is not None:
+            return self.from_dict(record)
+        return record
+
+
+class FastAvroEncoder:
+    """
+    Encoder producing Confluent-framed Avro messages for one registered schema.
+
+    The schema ID is resolved by the caller once, the writer is compiled once,
+    and every message is encoded into a reused per-thread buffer that already
+    holds the wire header.
+    """
+
+    def __init__(self, schema_str: str, schema_id: int, none_defaults: Dict[str, Any] = None):
+        """
+        Initialize the encoder.
+
+        Args:
+            schema_str: Writer schema
+            schema_id: Schema Registry ID of the writer schema
+            none_defaults: Values substituted for missing or None top-level fields
+        """
+        self.schema_id = schema_id
+        self.header = _HEADER.pack(_MAGIC_BYTE, schema_id)
+        self._encode = compile_encoder(schema_str, none_defaults)
+        self._local = threading.local()
+
+    def _buffer(self) -> bytearray:
+        """
+        Get this thread's output buffer.
+        """
+        try:
+            return self._local.buffer
+        except AttributeError:
+            self._local.buffer = bytearray(self.header)
+            return self._local.buffer
+
+    def encode(self, datum: Any) -> bytes:
+        """
+        Encode one record.
+
+        Args:
+            datum: Record as a dictionary or other mapping
+
+        Returns:
+            Confluent-framed Avro message
+        """
+        out = self._buffer()
+        del out[_HEADER_SIZE:]
+        self._encode(datum, out)
+        return bytes(out)
+
+    def encode_many(self, data: List[Any]) -> List[bytes]:
+        """
+        Encode several records.
+
+        Args:
+            data: Records as dictionaries or other mappings
+
+        Returns:
+            Confluent-framed Avro messages in input order
+        """
+        out = self._buffer()
+        encode = self._encode
+        messages = []
+        for datum in data:
+            del out[_HEADER_SIZE:]
+            encode(datum, out)
+            messages.append(bytes(out))
+        return messages
@@ -4,12 +4,13 @@ Database utility functions for management and maintenance tasks.
 
 import os
 import time
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterator, Tuple
 from datetime import datetime, timedelta
 
 from src.utils.logger import log
 from src.config.config import settings
 from src.data_storage.database import db_manager
+from src.data_storage.export import StreamingExporter
 
 
 class DatabaseUtils:
@@ -257,6 +258,9 @@ class DatabaseUtils:
         """
         Export data with optional filters.
         
+        The result is loaded into memory; use stream_data or export_to_file
+        for large time ranges.
+        
         Args:
             device_id: Optional device ID filter
             start_date: Optional start date filter
@@ -267,7 +271,7 @@ class DatabaseUtils:
             List of sensor readings
         """
         try:
-            main_table = settings.timescaledb.main_table
+            source = settings.timescaledb.readings_source
             
             # Build query with filters
             where_conditions = []
@@ -291,7 +295,7 @@ class DatabaseUtils:
             
             query = f"""
                 SELECT *
-                FROM {main_table}
+                FROM {source}
                 {where_clause}
                 ORDER BY timestamp DESC
                 LIMIT :limit
@@ -306,11 +310,70 @@ class DatabaseUtils:
             log.error(f"Error exporting data: {str(e)}")
             return []
     
+    @staticmethod
+    def stream_data(
+        device_id: str = None,
+        device_type: str = None,
+        start_date: datetime = None,
+        end_date: datetime = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream readings in timestamp order through a server-side cursor.
+        
+        Args:
+            device_id: Optional device ID filter
+            device_type: Optional device type filter
+            start_date: Optional inclusive start date filter
+            end_date: Optional exclusive end date filter
+            
+        Yields:
+            Sensor readings
+        """
+        return StreamingExporter().iter_rows(device_id, device_type, start_date, end_date)
+    
+    @staticmethod
+    def export_to_file(
+        output: str,
+        fmt: str = 'csv',
+        device_id: str = None,
+        device_type: str = None,
+        start_date: datetime = None,
+        end_date: datetime = None,
+        parallel: bool = False
+    ) -> List[Tuple[str, int]]:
+        """
+        Export readings to CSV, NDJSON or Parquet with constant memory.
+        
+        Args:
+            output: Output file ('-' for stdout), or a directory of part files when parallel
+            fmt: Output format ('csv', 'ndjson' or 'parquet')
+            device_id: Optional device ID filter
+            device_type: Optional device type filter
+            start_date: Optional inclusive start date filter
+            end_date: Optional exclusive end date filter
+            parallel: Split the range into part files written over several connections
+            
+        Returns:
+            (path, rows) per written file
+        """
+        try:
+            exporter = StreamingExporter()
+            if parallel:
+                return exporter.export_parallel(output, fmt, device_id, device_type, start_date, end_date)
+            return [(output, exporter.export(output, fmt, device_id, device_type, start_date, end_date))]
+            
+        except Exception as e:
+            log.error(f"Error exporting data: {str(e)}")
+            return []
+    
     @staticmethod
     def get_device_summary() -> List[Dict[str, Any]]:
         """
         Get a summary of all devices.
         
+        The device_summary view reads the device_latest table kept up to date
+        by the data sink, so this does not scan the readings.
+        
         Returns:
             List of device summaries
         """
@@ -334,11 +397,11 @@ class DatabaseUtils:
             Dictionary with integrity check results
         """
         try:
-            main_table = settings.timescaledb.main_table
+            source = settings.timescaledb.readings_source
             issues = []
             
             # Check for null device IDs
-            null_device_query = f"SELECT COUNT(*) as count FROM {main_table} WHERE device_id IS NULL OR device_id = ''"
+            null_device_query = f"SELECT COUNT(*) as count FROM {source} WHERE device_id IS NULL OR device_id = ''"
             result = db_manager.execute_query(null_device_query)
             null_devices = result[0]['count'] if result else 0
             
@@ -346,7 +409,7 @@ class DatabaseUtils:
                 issues.append(f"Found {null_devices} records with null/empty device_id")
             
             # Check for future timestamps
-            future_query = f"SELECT COUNT(*) as count FROM {main_table} WHERE timestamp > NOW()"
+            future_query = f"SELECT COUNT(*) as count FROM {source} WHERE timestamp > NOW()"
             result = db_manager.execute_query(future_query)
             future_timestamps = result[0]['count'] if result else 0
             
@@ -356,7 +419,7 @@ class DatabaseUtils:
             # Check for invalid battery levels
             invalid_battery_query = f"""
                 SELECT COUNT(*) as count 
-                FROM {main_table} 
+                FROM {source} 
                 WHERE battery_level IS NOT NULL AND (battery_level < 0 OR battery_level > 100)
             """
             result = db_manager.execute_query(invalid_battery_query)
@@ -368,7 +431,7 @@ class DatabaseUtils:
             # Check for invalid coordinates
             invalid_coords_query = f"""
                 SELECT COUNT(*) as count 
-                FROM {main_table} 
+                FROM {source} 
                 WHERE (latitude IS NOT NULL AND (latitude < -90 OR latitude > 90))
                    OR (longitude IS NOT NULL AND (longitude < -180 OR longitude > 180))
             """
@@ -383,7 +446,7 @@ class DatabaseUtils:
                 SELECT COUNT(*) as count
                 FROM (
                     SELECT device_id, timestamp, COUNT(*)
-                    FROM {main_table}
+                    FROM {source}
                     GROUP BY device_id, timestamp
                     HAVING COUNT(*) > 1
                 ) duplicates
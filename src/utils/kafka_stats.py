@@ -0,0 +1,127 @@
+"""
+Bridge from librdkafka statistics to Prometheus.
+
+librdkafka emits a JSON document every statistics.interval.ms describing
+each broker connection, topic and partition. KafkaStatsCollector is passed
+as the client's stats_cb and turns the parts that explain produce and fetch
+latency into gauges on the service's metrics instance.
+
+See https://github.com/confluentinc/librdkafka/blob/master/STATISTICS.md
+"""
+
+import json
+from typing import Dict, Any, Optional
+
+from src.utils.logger import log
+
+
+# librdkafka latency windows are in microseconds
+_MICROSECONDS = 1000000.0
+
+# Broker latency windows: rtt is request round trip (mostly Fetch requests for a
+# consumer), int_latency is time in the producer queue, outbuf_latency is time
+# waiting to be written to the socket
+_BROKER_LATENCIES = (('rtt', 'rtt'), ('int_latency', 'internal'), ('outbuf_latency', 'outbuf'))
+
+_WINDOW_STATS = ('avg', 'p99')
+
+
+class KafkaStatsCollector:
+    """
+    stats_cb for confluent_kafka clients that records librdkafka statistics.
+
+    Exports per-broker latency windows, per-partition queue depths, produced
+    batch sizes, the compression ratio and (for consumers) per-partition lag.
+    The callback runs on the thread that polls the client, so it only parses
+    and sets gauges.
+    """
+
+    def __init__(self, metrics):
+        """
+        Initialize the collector.
+
+        Args:
+            metrics: KafkaProducerMetrics or KafkaConsumerMetrics instance
+        """
+        self.metrics = metrics
+        self._last_message_bytes: Optional[int] = None
+        self._last_wire_bytes: Optional[int] = None
+
+    def __call__(self, stats_json: str):
+        try:
+            stats = json.loads(stats_json)
+        except ValueError as e:
+            log.warning(f"Ignoring unparseable librdkafka statistics: {str(e)}")
+            return
+
+        try:
+            self.record(stats)
+        except Exception as e:
+            log.error(f"Error recording librdkafka statistics: {str(e)}")
+
+    def record(self, stats: Dict[str, Any]):
+        """
+        Record one librdkafka statistics document.
+
+        Args:
+            stats: Parsed statistics
+        """
+        wire_bytes = 0
+        for broker in stats.get('brokers', {}).values():
+            # Bootstrap and internal pseudo-brokers have no node ID
+            if broker.get('nodeid', -1) < 0:
+                continue
+            wire_bytes += broker.get('txbytes', 0)
+            name = broker.get('nodename') or broker.get('name', 'unknown')
+            for key, stage in _BROKER_LATENCIES:
+                window = broker.get(key) or {}
+                if not window.get('cnt'):
+                    continue
+                for stat in _WINDOW_STATS:
+                    self.metrics.set_broker_latency(name, stage, stat, window.get(stat, 0) / _MICROSECONDS)
+
+        is_producer = stats.get('type') == 'producer'
+        message_bytes = 0
+        for topic, topic_stats in stats.get('topics', {}).items():
+            if is_producer:
+                batch_bytes = topic_stats.get('batchsize') or {}
+                batch_messages = topic_stats.get('batchcnt') or {}
+                if batch_bytes.get('cnt'):
+                    for stat in _WINDOW_STATS:
+                        self.metrics.set_client_batch_size(
+                            topic, stat, batch_bytes.get(stat, 0), batch_messages.get(stat, 0)
+                        )
+
+            for partition_id, partition in topic_stats.get('partitions', {}).items():
+                # Partition -1 holds messages not yet assigned to a partition
+                if partition.get('partition', int(partition_id)) < 0:
+                    continue
+                partition_label = str(partition_id)
+                if is_producer:
+                    message_bytes += partition.get('txbytes', 0)
+                    self.metrics.set_partition_queue_depth(topic, partition_label, 'msgq', partition.get('msgq_cnt', 0))
+                    self.metrics.set_partition_queue_depth(topic, partition_label, 'xmit_msgq', partition.get('xmit_msgq_cnt', 0))
+                else:
+                    self.metrics.set_partition_queue_depth(topic, partition_label, 'fetchq', partition.get('fetchq_cnt', 0))
+                    lag = partition.get('consumer_lag', -1)
+                    if lag >= 0 and hasattr(self.metrics, 'set_consumer_lag'):
+                        self.metrics.set_consumer_lag(lag, topic=topic, partition=partition_label)
+
+        if is_producer:
+            self._record_compression_ratio(message_bytes, wire_bytes)
+
+    def _record_compression_ratio(self, message_bytes: int, wire_bytes: int):
+        """
+        Derive the compression ratio from the bytes sent since the previous statistics.
+
+        Partition txbytes count uncompressed keys and values; broker txbytes
+        count everything written to the socket, including request framing,
+        so the ratio is slightly understated for small batches.
+        """
+        if self._last_message_bytes is not None:
+            sent_messages = message_bytes - self._last_message_bytes
+            sent_wire = wire_bytes - self._last_wire_bytes
+            if sent_messages > 0 and sent_wire > 0:
+                self.metrics.set_compression_ratio(sent_messages / sent_wire)
+        self._last_message_bytes = message_bytes
+        self._last_wire_bytes = wire_bytes
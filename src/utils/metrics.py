@@ -14,6 +14,26 @@ from functools import wraps
 from src.utils.logger import log
 
 
+# Collectors shared by every service in the same registry, keyed by (registry id, metric name)
+_shared_collectors: Dict[Any, Any] = {}
+_shared_collectors_lock = threading.Lock()
+
+
+def _shared_collector(metric_cls, name: str, documentation: str, labelnames, registry: CollectorRegistry, **kwargs):
+    """
+    Get or create a collector that may be declared by several services in one process.
+    
+    The common iot_* metrics are distinguished by their 'service' label, so a
+    process that hosts more than one component (e.g. the sink, which also runs
+    a Kafka consumer) must reuse the collector instead of registering it twice.
+    """
+    key = (id(registry), name)
+    with _shared_collectors_lock:
+        if key not in _shared_collectors:
+            _shared_collectors[key] = metric_cls(name, documentation, labelnames, registry=registry, **kwargs)
+        return _shared_collectors[key]
+
+
 class PrometheusMetrics:
     """
     Prometheus metrics collector for IoT pipeline components.
@@ -43,68 +63,127 @@ class PrometheusMetrics:
         Initialize all metrics for the service.
         """
         # Message processing metrics
-        self.messages_received_total = Counter(
+        self.messages_received_total = _shared_collector(
+            Counter,
             'iot_messages_received_total',
             'Total number of messages received',
             self.common_labels,
-            registry=self.registry
+            self.registry
         )
         
-        self.messages_processed_total = Counter(
+        self.messages_processed_total = _shared_collector(
+            Counter,
             'iot_messages_processed_total',
             'Total number of messages successfully processed',
             self.common_labels,
-            registry=self.registry
+            self.registry
         )
         
-        self.messages_failed_total = Counter(
+        self.messages_failed_total = _shared_collector(
+            Counter,
             'iot_messages_failed_total',
             'Total number of messages that failed processing',
             self.common_labels + ['error_type'],
-            registry=self.registry
+            self.registry
         )
         
         # Processing time metrics
-        self.processing_duration_seconds = Histogram(
+        self.processing_duration_seconds = _shared_collector(
+            Histogram,
             'iot_processing_duration_seconds',
             'Time spent processing messages',
             self.common_labels + ['operation'], # ['service', 'instance', 'operation']
-            registry=self.registry
+            self.registry
         )
         
         # Queue/buffer metrics
-        self.queue_size = Gauge(
+        self.queue_size = _shared_collector(
+            Gauge,
             'iot_queue_size',
             'Current size of processing queue/buffer',
             self.common_labels,
-            registry=self.registry
+            self.registry,
+            multiprocess_mode='livesum'
         )
         
         # Connection status metrics
-        self.connection_status = Gauge(
+        self.connection_status = _shared_collector(
+            Gauge,
             'iot_connection_status',
             'Connection status (1=connected, 0=disconnected)',
             self.common_labels + ['connection_type'],
-            registry=self.registry
+            self.registry,
+            multiprocess_mode='livemin'
         )
         
         # Data quality metrics
-        self.anomaly_detected_total = Counter(
+        self.anomaly_detected_total = _shared_collector(
+            Counter,
             'iot_anomaly_detected_total',
             'Total number of anomalies detected',
             self.common_labels + ['device_type'],
-            registry=self.registry
+            self.registry
         )
         
-        self.validation_failures_total = Counter(
+        self.validation_failures_total = _shared_collector(
+            Counter,
             'iot_validation_failures_total',
             'Total number of validation failures',
             self.common_labels + ['failure_type'],
-            registry=self.registry
+            self.registry
         )
         
         # Application-specific metrics will be added by subclasses
     
+    def _init_client_stats_metrics(self):
+        """
+        Initialize metrics fed from librdkafka statistics, shared by Kafka producers and consumers.
+        """
+        self.client_broker_latency_seconds = _shared_collector(
+            Gauge,
+            'kafka_client_broker_latency_seconds',
+            'Per-broker latency from librdkafka statistics (stage: rtt, internal queue, output buffer)',
+            self.common_labels + ['broker', 'stage', 'stat'],
+            self.registry,
+            multiprocess_mode='livemax'
+        )
+        
+        self.client_partition_queue_messages = _shared_collector(
+            Gauge,
+            'kafka_client_partition_queue_messages',
+            'Messages queued per partition in librdkafka (msgq/xmit_msgq when producing, fetchq when consuming)',
+            self.common_labels + ['topic', 'partition', 'queue'],
+            self.registry,
+            multiprocess_mode='livesum'
+        )
+        
+        self.client_batch_bytes = _shared_collector(
+            Gauge,
+            'kafka_client_batch_bytes',
+            'Size of produced message batches in bytes over the last statistics window',
+            self.common_labels + ['topic', 'stat'],
+            self.registry,
+            multiprocess_mode='livemax'
+        )
+        
+        self.client_batch_messages = _shared_collector(
+            Gauge,
+            'kafka_client_batch_messages',
+            'Messages per produced batch over the last statistics window',
+            self.common_labels + ['topic', 'stat'],
+            self.registry,
+            multiprocess_mode='livemax'
+        )
+        
+        self.client_compression_ratio = _shared_collector(
+            Gauge,
+            'kafka_client_compression_ratio',
+            'Uncompressed message bytes per byte sent to the brokers over the last statistics window',
+            self.common_labels,
+            self.registry,
+            multiprocess_mode='livemax'
+        )
+    
     def get_common_labels_dict(self, **extra_labels) -> Dict[str, str]:
         """
         Get common labels as a dictionary.
@@ -122,19 +201,19 @@ class PrometheusMetrics:
         labels.update(extra_labels)
         return labels
     
-    def record_message_received(self, **labels):
-        """Record a message received."""
-        self.messages_received_total.labels(**self.get_common_labels_dict(**labels)).inc()
+    def record_message_received(self, count: int = 1, **labels):
+        """Record messages received."""
+        self.messages_received_total.labels(**self.get_common_labels_dict(**labels)).inc(count)
     
-    def record_message_processed(self, **labels):
-        """Record a message successfully processed."""
-        self.messages_processed_total.labels(**self.get_common_labels_dict(**labels)).inc()
+    def record_message_processed(self, count: int = 1, **labels):
+        """Record messages successfully processed."""
+        self.messages_processed_total.labels(**self.get_common_labels_dict(**labels)).inc(count)
     
-    def record_message_failed(self, error_type: str = "unknown", **labels):
-        """Record a message processing failure."""
+    def record_message_failed(self, error_type: str = "unknown", count: int = 1, **labels):
+        """Record message processing failures."""
         self.messages_failed_total.labels(
             **self.get_common_labels_dict(error_type=error_type, **labels)
-        ).inc()
+        ).inc(count)
     
     def record_processing_time(self, duration: float, **labels):
         """Record processing time."""
@@ -157,11 +236,32 @@ class PrometheusMetrics:
             **self.get_common_labels_dict(device_type=device_type, **labels)
         ).inc()
     
-    def record_validation_failure(self, failure_type: str = "unknown", **labels):
+    def record_validation_failure(self, failure_type: str = "unknown", count: int = 1, **labels):
         """Record a validation failure."""
         self.validation_failures_total.labels(
             **self.get_common_labels_dict(failure_type=failure_type, **labels)
-        ).inc()
+        ).inc(count)
+    
+    def set_broker_latency(self, broker: str, stage: str, stat: str, seconds: float, **labels):
+        """Set a broker latency statistic."""
+        self.client_broker_latency_seconds.labels(
+            **self.get_common_labels_dict(broker=broker, stage=stage, stat=stat, **labels)
+        ).set(seconds)
+    
+    def set_partition_queue_depth(self, topic: str, partition: str, queue: str, count: int, **labels):
+        """Set the number of messages in a librdkafka partition queue."""
+        self.client_partition_queue_messages.labels(
+            **self.get_common_labels_dict(topic=topic, partition=partition, queue=queue, **labels)
+        ).set(count)
+    
+    def set_client_batch_size(self, topic: str, stat: str, size_bytes: float, messages: float, **labels):
+        """Set produced batch size statistics."""
+        self.client_batch_bytes.labels(**self.get_common_labels_dict(topic=topic, stat=stat, **labels)).set(size_bytes)
+        self.client_batch_messages.labels(**self.get_common_labels_dict(topic=topic, stat=stat, **labels)).set(messages)
+    
+    def set_compression_ratio(self, ratio: float, **labels):
+        """Set the producer compression ratio."""
+        self.client_compression_ratio.labels(**self.get_common_labels_dict(**labels)).set(ratio)
 
 
 class KafkaProducerMetrics(PrometheusMetrics):
@@ -172,6 +272,7 @@ class KafkaProducerMetrics(PrometheusMetrics):
     def __init__(self, registry: CollectorRegistry = None):
         super().__init__("kafka-producer", registry)
         self._init_producer_metrics()
+        self._init_client_stats_metrics()
     
     def _init_producer_metrics(self):
         """Initialize producer-specific metrics."""
@@ -202,12 +303,20 @@ class KafkaProducerMetrics(PrometheusMetrics):
             self.common_labels,
             registry=self.registry
         )
+        
+        self.in_flight_messages = Gauge(
+            'kafka_producer_in_flight_messages',
+            'Messages handed to the producer and not yet acknowledged',
+            self.common_labels,
+            registry=self.registry,
+            multiprocess_mode='livesum'
+        )
     
-    def record_message_sent(self, topic: str = "unknown", **labels):
-        """Record a message sent to Kafka."""
+    def record_message_sent(self, topic: str = "unknown", count: int = 1, **labels):
+        """Record messages sent to Kafka."""
         self.messages_sent_total.labels(
             **self.get_common_labels_dict(topic=topic, **labels)
-        ).inc()
+        ).inc(count)
     
     def record_send_failure(self, topic: str = "unknown", error_type: str = "unknown", **labels):
         """Record a send failure."""
@@ -224,6 +333,10 @@ class KafkaProducerMetrics(PrometheusMetrics):
     def record_batch_size(self, size: int, **labels):
         """Record batch size."""
         self.batch_size.labels(**self.get_common_labels_dict(**labels)).observe(size)
+    
+    def set_in_flight_messages(self, count: int, **labels):
+        """Set the number of unacknowledged messages."""
+        self.in_flight_messages.labels(**self.get_common_labels_dict(**labels)).set(count)
 
 
 class KafkaConsumerMetrics(PrometheusMetrics):
@@ -234,6 +347,7 @@ class KafkaConsumerMetrics(PrometheusMetrics):
     def __init__(self, registry: CollectorRegistry = None):
         super().__init__("kafka-consumer", registry)
         self._init_consumer_metrics()
+        self._init_client_stats_metrics()
     
     def _init_consumer_metrics(self):
         """Initialize consumer-specific metrics."""
@@ -248,7 +362,8 @@ class KafkaConsumerMetrics(PrometheusMetrics):
             'kafka_consumer_lag',
             'Current consumer lag',
             self.common_labels + ['topic', 'partition'],
-            registry=self.registry
+            registry=self.registry,
+            multiprocess_mode='livemax'
         )
         
         self.commit_duration_seconds = Histogram(
@@ -264,12 +379,27 @@ class KafkaConsumerMetrics(PrometheusMetrics):
             self.common_labels,
             registry=self.registry
         )
+        
+        self.deserialization_queue_depth = Gauge(
+            'kafka_consumer_deserialization_queue_depth',
+            'Chunks submitted to the deserialization pool and not yet decoded',
+            self.common_labels,
+            registry=self.registry,
+            multiprocess_mode='livesum'
+        )
+        
+        self.deserialization_chunk_seconds = Histogram(
+            'kafka_consumer_deserialization_chunk_seconds',
+            'Time a deserialization worker spent decoding one chunk',
+            self.common_labels,
+            registry=self.registry
+        )
     
-    def record_message_consumed(self, topic: str = "unknown", partition: str = "unknown", **labels):
-        """Record a message consumed from Kafka."""
+    def record_message_consumed(self, topic: str = "unknown", partition: str = "unknown", count: int = 1, **labels):
+        """Record messages consumed from Kafka."""
         self.messages_consumed_total.labels(
             **self.get_common_labels_dict(topic=topic, partition=partition, **labels)
-        ).inc()
+        ).inc(count)
     
     def set_consumer_lag(self, lag: int, topic: str = "unknown", partition: str = "unknown", **labels):
         """Set consumer lag."""
@@ -284,6 +414,14 @@ class KafkaConsumerMetrics(PrometheusMetrics):
     def record_rebalance(self, **labels):
         """Record a partition rebalance."""
         self.rebalance_total.labels(**self.get_common_labels_dict(**labels)).inc()
+    
+    def set_deserialization_queue_depth(self, depth: int, **labels):
+        """Set the number of chunks waiting in the deserialization pool."""
+        self.deserialization_queue_depth.labels(**self.get_common_labels_dict(**labels)).set(depth)
+    
+    def record_deserialization_chunk(self, duration: float, **labels):
+        """Record the decode time of one deserialization chunk."""
+        self.deserialization_chunk_seconds.labels(**self.get_common_labels_dict(**labels)).observe(duration)
 
 
 class TimescaleDBSinkMetrics(PrometheusMetrics):
@@ -322,7 +460,8 @@ class TimescaleDBSinkMetrics(PrometheusMetrics):
             'timescaledb_sink_database_connections',
             'Current number of database connections',
             self.common_labels,
-            registry=self.registry
+            registry=self.registry,
+            multiprocess_mode='livesum'
         )
         
         self.maintenance_runs_total = Counter(
@@ -331,6 +470,175 @@ class TimescaleDBSinkMetrics(PrometheusMetrics):
             self.common_labels + ['operation_type'],
             registry=self.registry
         )
+        
+        self.database_pool_checkouts_total = Counter(
+            'timescaledb_sink_database_pool_checkouts_total',
+            'Total number of write connections checked out of the pool',
+            self.common_labels,
+            registry=self.registry
+        )
+        
+        self.database_pool_wait_seconds = Histogram(
+            'timescaledb_sink_database_pool_wait_seconds',
+            'Time spent waiting for a pooled write connection',
+            self.common_labels,
+            registry=self.registry
+        )
+        
+        self.database_pool_reconnects_total = Counter(
+            'timescaledb_sink_database_pool_reconnects_total',
+            'Total number of write connections replaced after a failure',
+            self.common_labels,
+            registry=self.registry
+        )
+        
+        self.adaptive_batch_size = Gauge(
+            'timescaledb_sink_adaptive_batch_size',
+            'Current batch size chosen by the adaptive batch controller',
+            self.common_labels,
+            registry=self.registry,
+            multiprocess_mode='liveall'
+        )
+        
+        self.adaptive_commit_interval_seconds = Gauge(
+            'timescaledb_sink_adaptive_commit_interval_seconds',
+            'Current commit interval chosen by the adaptive batch controller',
+            self.common_labels,
+            registry=self.registry,
+            multiprocess_mode='liveall'
+        )
+        
+        self.batch_controller_decisions_total = Counter(
+            'timescaledb_sink_batch_controller_decisions_total',
+            'Total number of adaptive batch controller decisions',
+            self.common_labels + ['decision'],
+            registry=self.registry
+        )
+        
+        self.spill_depth_bytes = Gauge(
+            'timescaledb_sink_spill_depth_bytes',
+            'Bytes of failed batches waiting in the disk spill buffer',
+            self.common_labels,
+            registry=self.registry,
+            multiprocess_mode='livesum'
+        )
+        
+        self.spill_pending_batches = Gauge(
+            'timescaledb_sink_spill_pending_batches',
+            'Number of failed batches waiting in the disk spill buffer',
+            self.common_labels,
+            registry=self.registry,
+            multiprocess_mode='livesum'
+        )
+        
+        self.spilled_batches_total = Counter(
+            'timescaledb_sink_spilled_batches_total',
+            'Total number of batches written to the disk spill buffer',
+            self.common_labels,
+            registry=self.registry
+        )
+        
+        self.spilled_rows_total = Counter(
+            'timescaledb_sink_spilled_rows_total',
+            'Total number of readings written to the disk spill buffer',
+            self.common_labels,
+            registry=self.registry
+        )
+        
+        self.dropped_batches_total = Counter(
+            'timescaledb_sink_dropped_batches_total',
+            'Total number of batches neither inserted nor spilled; their offsets are not stored',
+            self.common_labels,
+            registry=self.registry
+        )
+        
+        self.spill_dropped_batches_total = Counter(
+            'timescaledb_sink_spill_dropped_batches_total',
+            'Total number of batches dropped because the spill buffer was full or unwritable',
+            self.common_labels,
+            registry=self.registry
+        )
+        
+        self.spill_replayed_rows_total = Counter(
+            'timescaledb_sink_spill_replayed_rows_total',
+            'Total number of spilled readings replayed into TimescaleDB',
+            self.common_labels,
+            registry=self.registry
+        )
+        
+        self.cagg_refresh_duration_seconds = Histogram(
+            'timescaledb_sink_cagg_refresh_duration_seconds',
+            'Time spent refreshing one dirty window of a continuous aggregate',
+            self.common_labels + ['aggregate'],
+            buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+            registry=self.registry
+        )
+        
+        self.cagg_refresh_windows_total = Counter(
+            'timescaledb_sink_cagg_refresh_windows_total',
+            'Total number of continuous aggregate windows refreshed',
+            self.common_labels + ['aggregate', 'status'],
+            registry=self.registry
+        )
+        
+        self.cagg_refresh_rows_total = Counter(
+            'timescaledb_sink_cagg_refresh_rows_total',
+            'Total number of inserted readings covered by refreshed continuous aggregate windows',
+            self.common_labels + ['aggregate'],
+            registry=self.registry
+        )
+        
+        self.cagg_refresh_span_seconds_total = Counter(
+            'timescaledb_sink_cagg_refresh_span_seconds_total',
+            'Total length of refreshed continuous aggregate windows in seconds',
+            self.common_labels + ['aggregate'],
+            registry=self.registry
+        )
+        
+        self.cagg_dirty_windows = Gauge(
+            'timescaledb_sink_cagg_dirty_windows',
+            'Number of dirty time windows waiting for a continuous aggregate refresh',
+            self.common_labels,
+            registry=self.registry,
+            multiprocess_mode='livesum'
+        )
+        
+        self.query_cache_hits_total = Counter(
+            'timescaledb_sink_query_cache_hits_total',
+            'Total number of read queries answered from the query cache',
+            self.common_labels + ['query_type'],
+            registry=self.registry
+        )
+        
+        self.query_cache_misses_total = Counter(
+            'timescaledb_sink_query_cache_misses_total',
+            'Total number of read queries sent to the database (miss, expired, invalidated)',
+            self.common_labels + ['query_type', 'reason'],
+            registry=self.registry
+        )
+        
+        self.query_cache_evictions_total = Counter(
+            'timescaledb_sink_query_cache_evictions_total',
+            'Total number of query cache entries evicted by the entry or size limit',
+            self.common_labels,
+            registry=self.registry
+        )
+        
+        self.query_cache_entries = Gauge(
+            'timescaledb_sink_query_cache_entries',
+            'Number of cached query results',
+            self.common_labels,
+            registry=self.registry,
+            multiprocess_mode='livesum'
+        )
+        
+        self.query_cache_bytes = Gauge(
+            'timescaledb_sink_query_cache_bytes',
+            'Estimated size of cached query results in bytes',
+            self.common_labels,
+            registry=self.registry,
+            multiprocess_mode='livesum'
+        )
     
     def record_records_inserted(self, count: int, table: str = "unknown", **labels):
         """Record records inserted."""
@@ -354,6 +662,84 @@ class TimescaleDBSinkMetrics(PrometheusMetrics):
         """Set database connection count."""
         self.database_connections.labels(**self.get_common_labels_dict(**labels)).set(count)
     
+    def record_pool_checkout(self, wait_time: float, **labels):
+        """Record a write connection checkout and the time spent waiting for it."""
+        self.database_pool_checkouts_total.labels(**self.get_common_labels_dict(**labels)).inc()
+        self.database_pool_wait_seconds.labels(**self.get_common_labels_dict(**labels)).observe(wait_time)
+    
+    def record_pool_reconnect(self, **labels):
+        """Record a write connection replaced after a failure."""
+        self.database_pool_reconnects_total.labels(**self.get_common_labels_dict(**labels)).inc()
+    
+    def set_adaptive_batch(self, batch_size: int, commit_interval: float, **labels):
+        """Set the batch size and commit interval chosen by the adaptive controller."""
+        self.adaptive_batch_size.labels(**self.get_common_labels_dict(**labels)).set(batch_size)
+        self.adaptive_commit_interval_seconds.labels(**self.get_common_labels_dict(**labels)).set(commit_interval)
+    
+    def record_batch_controller_decision(self, decision: str, **labels):
+        """Record an adaptive batch controller decision."""
+        self.batch_controller_decisions_total.labels(
+            **self.get_common_labels_dict(decision=decision, **labels)
+        ).inc()
+    
+    def set_spill_depth(self, depth_bytes: int, pending_batches: int, **labels):
+        """Set the spill buffer depth."""
+        self.spill_depth_bytes.labels(**self.get_common_labels_dict(**labels)).set(depth_bytes)
+        self.spill_pending_batches.labels(**self.get_common_labels_dict(**labels)).set(pending_batches)
+    
+    def record_batch_spilled(self, rows: int, **labels):
+        """Record a batch written to the spill buffer."""
+        self.spilled_batches_total.labels(**self.get_common_labels_dict(**labels)).inc()
+        self.spilled_rows_total.labels(**self.get_common_labels_dict(**labels)).inc(rows)
+    
+    def record_batch_dropped(self, **labels):
+        """Record a batch that was neither inserted nor spilled."""
+        self.dropped_batches_total.labels(**self.get_common_labels_dict(**labels)).inc()
+    
+    def record_spill_dropped(self, **labels):
+        """Record a batch dropped because it could not be spilled."""
+        self.spill_dropped_batches_total.labels(**self.get_common_labels_dict(**labels)).inc()
+    
+    def record_spill_replayed(self, rows: int, **labels):
+        """Record spilled readings replayed into TimescaleDB."""
+        self.spill_replayed_rows_total.labels(**self.get_common_labels_dict(**labels)).inc(rows)
+    
+    def record_cagg_refresh(self, aggregate: str, duration: float, rows: int, span_seconds: float,
+                            status: str = "ok", **labels):
+        """Record the refresh of one dirty window of a continuous aggregate."""
+        self.cagg_refresh_windows_total.labels(
+            **self.get_common_labels_dict(aggregate=aggregate, status=status, **labels)
+        ).inc()
+        if status != "ok":
+            return
+        self.cagg_refresh_duration_seconds.labels(**self.get_common_labels_dict(aggregate=aggregate, **labels)).observe(duration)
+        self.cagg_refresh_rows_total.labels(**self.get_common_labels_dict(aggregate=aggregate, **labels)).inc(rows)
+        self.cagg_refresh_span_seconds_total.labels(
+            **self.get_common_labels_dict(aggregate=aggregate, **labels)
+        ).inc(span_seconds)
+    
+    def set_cagg_dirty_windows(self, count: int, **labels):
+        """Set the number of dirty windows waiting for a refresh."""
+        self.cagg_dirty_windows.labels(**self.get_common_labels_dict(**labels)).set(count)
+    
+    def record_query_cache_request(self, query_type: str, result: str, **labels):
+        """Record a read query looked up in the query cache."""
+        if result == "hit":
+            self.query_cache_hits_total.labels(**self.get_common_labels_dict(query_type=query_type, **labels)).inc()
+        else:
+            self.query_cache_misses_total.labels(
+                **self.get_common_labels_dict(query_type=query_type, reason=result, **labels)
+            ).inc()
+    
+    def record_query_cache_eviction(self, **labels):
+        """Record a query cache entry evicted by the entry or size limit."""
+        self.query_cache_evictions_total.labels(**self.get_common_labels_dict(**labels)).inc()
+    
+    def set_query_cache_size(self, entries: int, size_bytes: int, **labels):
+        """Set the number and estimated size of cached query results."""
+        self.query_cache_entries.labels(**self.get_common_labels_dict(**labels)).set(entries)
+        self.query_cache_bytes.labels(**self.get_common_labels_dict(**labels)).set(size_bytes)
+    
     def record_maintenance_run(self, operation_type: str = "unknown", **labels):
         """Record a maintenance operation."""
         self.maintenance_runs_total.labels(
@@ -0,0 +1,267 @@
+"""
+Persistent on-disk cache of Schema Registry lookups.
+
+Schema IDs and their schemas never change once registered, so they can be
+kept across restarts: a service that finds the schema it produces with, or
+the writer schemas it has decoded before, in the cache starts and keeps
+decoding without talking to the Schema Registry. A background thread warms
+and refreshes the cache while the registry is reachable.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, Any, Optional, Callable
+
+from src.utils.logger import log
+
+
+_CACHE_FILE = "schemas.json"
+
+
+def schema_fingerprint(schema_str: str) -> str:
+    """
+    Get a fingerprint of a schema that ignores whitespace and key order.
+
+    Args:
+        schema_str: Avro schema as a string
+
+    Returns:
+        SHA-256 hex digest of the canonical JSON form
+    """
+    try:
+        canonical = json.dumps(json.loads(schema_str), sort_keys=True, separators=(',', ':'))
+    except ValueError:
+        canonical = schema_str
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class SchemaCache:
+    """
+    Schema Registry lookups persisted as one JSON file.
+
+    Holds three maps: schema ID to schema string, subject to its latest
+    version, and (subject, schema fingerprint) to the ID the schema was
+    registered under. Every change is written to a temporary file and
+    renamed over the cache file, so a crash never leaves a partial cache.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Initialize the cache and load it from disk.
+
+        Args:
+            directory: Directory for the cache file
+        """
+        self.directory = directory
+        self.path = os.path.join(directory, _CACHE_FILE)
+
+        self.schemas: Dict[int, str] = {}
+        self.subjects: Dict[str, Dict[str, int]] = {}
+        self.registrations: Dict[str, Dict[str, int]] = {}
+
+        self.registry_available = True
+        self.running = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+        self._load()
+
+    def _load(self):
+        """
+        Read the cache file; a missing or unreadable file leaves the cache empty.
+        """
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.schemas = {int(schema_id): schema_str for schema_id, schema_str in data.get('schemas', {}).items()}
+            self.subjects = data.get('subjects', {})
+            self.registrations = data.get('registrations', {})
+            log.info(f"Loaded {len(self.schemas)} cached schemas for {len(self.subjects)} subjects from {self.path}")
+        except FileNotFoundError:
+            log.info(f"No schema cache at {self.path}, starting empty")
+        except (OSError, ValueError, AttributeError) as e:
+            log.warning(f"Ignoring unreadable schema cache {self.path}: {str(e)}")
+
+    def _save(self):
+        """
+        Write the cache file atomically. Must be called with the lock held.
+        """
+        data = {
+            'schemas': {str(schema_id): schema_str for schema_id, schema_str in self.schemas.items()},
+            'subjects': self.subjects,
+            'registrations': self.registrations
+        }
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.error(f"Could not write schema cache {self.path}: {str(e)}")
+
+    def get_schema(self, schema_id: int) -> Optional[str]:
+        """
+        Get a cached schema by ID.
+
+        Args:
+            schema_id: Schema Registry ID
+
+        Returns:
+            Schema string or None if not cached
+        """
+        return self.schemas.get(schema_id)
+
+    def put_schema(self, schema_id: int, schema_str: str):
+        """
+        Cache a schema by ID.
+
+        Args:
+            schema_id: Schema Registry ID
+            schema_str: Schema string
+        """
+        with self._lock:
+            if self.schemas.get(schema_id) == schema_str:
+                return
+            self.schemas[schema_id] = schema_str
+            self._save()
+
+    def get_latest(self, subject: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the cached latest version of a subject.
+
+        Args:
+            subject: Subject name
+
+        Returns:
+            Dictionary with subject, version, id and schema, or None if not cached
+        """
+        latest = self.subjects.get(subject)
+        if latest is None or latest['id'] not in self.schemas:
+            return None
+        return {
+            "subject": subject,
+            "version": latest['version'],
+            "id": latest['id'],
+            "schema": self.schemas[latest['id']]
+        }
+
+    def put_latest(self, subject: str, schema_id: int, version: int, schema_str: str):
+        """
+        Cache the latest version of a subject.
+
+        Args:
+            subject: Subject name
+            schema_id: Schema Registry ID of the latest version
+            version: Latest version number
+            schema_str: Schema string of the latest version
+        """
+        with self._lock:
+            latest = {'id': schema_id, 'version': version}
+            if self.subjects.get(subject) == latest and self.schemas.get(schema_id) == schema_str:
+                return
+            self.subjects[subject] = latest
+            self.schemas[schema_id] = schema_str
+            self.registrations.setdefault(subject, {})[schema_fingerprint(schema_str)] = schema_id
+            self._save()
+
+    def get_registered_id(self, subject: str, schema_str: str) -> Optional[int]:
+        """
+        Get the ID a schema was registered under for a subject.
+
+        Args:
+            subject: Subject name
+            schema_str: Schema string
+
+        Returns:
+            Schema ID or None if not cached
+        """
+        return self.registrations.get(subject, {}).get(schema_fingerprint(schema_str))
+
+    def put_registered_id(self, subject: str, schema_str: str, schema_id: int):
+        """
+        Cache the ID a schema was registered under for a subject.
+
+        Args:
+            subject: Subject name
+            schema_str: Schema string
+            schema_id: Schema Registry ID
+        """
+        with self._lock:
+            fingerprint = schema_fingerprint(schema_str)
+            if self.registrations.get(subject, {}).get(fingerprint) == schema_id and schema_id in self.schemas:
+                return
+            self.registrations.setdefault(subject, {})[fingerprint] = schema_id
+            self.schemas[schema_id] = schema_str
+            self._save()
+
+    def has_subject(self, subject: str) -> bool:
+        """
+        Check whether any schema of a subject is cached.
+        """
+        return subject in self.subjects or bool(self.registrations.get(subject))
+
+    def refresh(self, client, subjects=()):
+        """
+        Refresh the latest version of every cached subject from the registry.
+
+        Args:
+            client: SchemaRegistryClient
+            subjects: Additional subjects to warm
+
+        Returns:
+            True if the registry answered, False otherwise
+        """
+        for subject in set(self.subjects) | set(self.registrations) | set(subjects):
+            try:
+                latest = client.get_latest_version(subject)
+            except Exception as e:
+                if getattr(e, 'http_status_code', None) == 404:
+                    continue
+                if self.registry_available:
+                    log.warning(f"Schema Registry unavailable, using cached schemas: {str(e)}")
+                self.registry_available = False
+                return False
+            self.put_latest(subject, latest.schema_id, latest.version, latest.schema.schema_str)
+
+        if not self.registry_available:
+            log.info("Schema Registry available again, schema cache refreshed")
+        self.registry_available = True
+        return True
+
+    def start_refresh(self, client, interval: float, subjects: Callable[[], Any] = None):
+        """
+        Start a thread that warms the cache now and refreshes it periodically.
+
+        Args:
+            client: SchemaRegistryClient
+            interval: Seconds between refreshes
+            subjects: Function returning additional subjects to warm
+        """
+        if self.running:
+            return
+        self.running = True
+
+        def refresher():
+            while self.running:
+                try:
+                    self.refresh(client, subjects() if subjects else ())
+                except Exception as e:
+                    log.error(f"Error refreshing schema cache: {str(e)}")
+                self._wake.wait(timeout=interval)
+                self._wake.clear()
+
+        self._thread = threading.Thread(target=refresher, name="schema-cache-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Stop the refresh thread.
+        """
+        self.running = False
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
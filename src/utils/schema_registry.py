@@ -9,6 +9,13 @@ from confluent_kafka.serialization import SerializationContext, MessageField
 
 from src.utils.logger import log
 from src.config.config import settings
+from src.data_storage.models import CompactSensorReading, RuuviTagAdvertisement
+from src.utils.avro_codec import FastAvroDecoder, FastAvroEncoder, UnsupportedSchemaError
+from src.utils.schema_cache import SchemaCache
+from src.data_ingestion.deserialization_pool import DeserializationPool
+
+# Values the sensor serializer has always filled in for missing or None fields
+_SENSOR_NONE_DEFAULTS = {'device_metadata': {}, 'status': 'ACTIVE', 'tags': []}
 
 class SchemaRegistry:
     """
@@ -32,10 +39,26 @@ class SchemaRegistry:
         # Cache for registered schemas to avoid repeated registration attempts
         self._registered_schemas: Set[str] = set()
         
+        # Compiled sensor encoders by topic; None means the topic uses AvroSerializer
+        self._fast_encoders: Dict[str, Optional[FastAvroEncoder]] = {}
+        
+        # On-disk cache of schema lookups so startup and decoding don't depend on the registry
+        self.schema_cache = None
+        if settings.schema_registry.cache_enabled:
+            self.schema_cache = SchemaCache(settings.schema_registry.cache_directory)
+        
         log.info(f"Schema Registry client initialized with URL: {self.schema_registry_url}")
         
         # Load schemas
         self._load_schemas()
+        
+        # Warm the cache in the background and keep it fresh while the registry is reachable
+        if self.schema_cache is not None:
+            self.schema_cache.start_refresh(
+                self.schema_registry,
+                settings.schema_registry.cache_refresh_interval,
+                subjects=lambda: [f"{settings.kafka.topic_name}-value", f"{settings.kafka.envelope_topic_name}-value"]
+            )
     
     def _load_schemas(self):
         """
@@ -54,6 +77,19 @@ class SchemaRegistry:
                 self.sensor_schema = avro.schema.parse(self.sensor_schema_str)
                 
             log.info(f"Loaded sensor schema from: {self.sensor_schema_path}")
+            
+            # Load RuuviTag advertisement envelope schema
+            self.envelope_schema_path = settings.schema_registry.envelope_schema_path
+            
+            if not os.path.exists(self.envelope_schema_path):
+                log.error(f"Schema file not found: {self.envelope_schema_path}")
+                raise FileNotFoundError(f"Schema file not found: {self.envelope_schema_path}")
+            
+            with open(self.envelope_schema_path, 'r') as f:
+                self.envelope_schema_str = f.read()
+                self.envelope_schema = avro.schema.parse(self.envelope_schema_str)
+                
+            log.info(f"Loaded envelope schema from: {self.envelope_schema_path}")
             log.debug(f"Schema compatibility level: {settings.schema_registry.compatibility_level}")
 
             
@@ -83,12 +119,68 @@ class SchemaRegistry:
                 from_dict=self._dict_to_sensor,
             )
             
+            # Compiled decoder for the consumer hot path; AvroDeserializer stays as its fallback
+            self.fast_decoder = None
+            if settings.schema_registry.fast_decoder:
+                self.fast_decoder = FastAvroDecoder(
+                    reader_schema_str=self.sensor_schema_str,
+                    schema_fetcher=self._fetch_schema_by_id,
+                    from_dict=lambda record: self._dict_to_sensor(record, None),
+                    fallback=lambda data, topic: self.sensor_deserializer(
+                        data, SerializationContext(topic, MessageField.VALUE)
+                    )
+                )
+            
+            # RuuviTag advertisement envelope serializer and deserializer
+            self.envelope_serializer = AvroSerializer(
+                schema_registry_client=self.schema_registry,
+                schema_str=self.envelope_schema_str,
+                to_dict=lambda advertisement, ctx: RuuviTagAdvertisement.from_dict(advertisement).to_dict()
+            )
+            
+            self.envelope_deserializer = AvroDeserializer(
+                schema_registry_client=self.schema_registry,
+                schema_str=self.envelope_schema_str,
+                from_dict=lambda record, ctx: RuuviTagAdvertisement.from_dict(record),
+            )
+            
+            self.fast_envelope_decoder = None
+            if settings.schema_registry.fast_decoder:
+                self.fast_envelope_decoder = FastAvroDecoder(
+                    reader_schema_str=self.envelope_schema_str,
+                    schema_fetcher=self._fetch_schema_by_id,
+                    from_dict=RuuviTagAdvertisement.from_dict,
+                    fallback=lambda data, topic: self.envelope_deserializer(
+                        data, SerializationContext(topic, MessageField.VALUE)
+                    )
+                )
+            
             log.info("Initialized Avro serializers and deserializers")
         
         except Exception as e:
             log.error(f"Error initializing serializers: {str(e)}")
             raise
     
+    def _fetch_schema_by_id(self, schema_id: int) -> str:
+        """
+        Get a writer schema by ID, from the schema cache if possible.
+        
+        Args:
+            schema_id: Schema Registry ID
+            
+        Returns:
+            Schema string
+        """
+        if self.schema_cache is not None:
+            schema_str = self.schema_cache.get_schema(schema_id)
+            if schema_str is not None:
+                return schema_str
+        
+        schema_str = self.schema_registry.get_schema(schema_id).schema_str
+        if self.schema_cache is not None:
+            self.schema_cache.put_schema(schema_id, schema_str)
+        return schema_str
+    
     def _sensor_to_dict(self, sensor_reading: Dict[str, Any], ctx) -> Dict[str, Any]:
         """
         Convert a sensor reading dictionary to a format compatible with Avro serialization.
@@ -101,7 +193,10 @@ class SchemaRegistry:
             Dictionary formatted for Avro serialization
         """
         # Make a copy to avoid modifying the original
-        avro_reading = dict(sensor_reading)
+        if isinstance(sensor_reading, CompactSensorReading):
+            avro_reading = sensor_reading.to_dict()
+        else:
+            avro_reading = dict(sensor_reading)
         
         # Ensure all fields are present with appropriate types
         if 'device_metadata' not in avro_reading or avro_reading['device_metadata'] is None:
@@ -145,10 +240,10 @@ class SchemaRegistry:
             ctx: Deserialization context
             
         Returns:
-            Sensor reading dictionary
+            CompactSensorReading if compact readings are enabled, otherwise the dictionary
         """
-        # This is a simple pass-through for now, but can be extended
-        # to handle any special conversion needed when deserializing
+        if settings.schema_registry.compact_readings:
+            return CompactSensorReading.from_dict(avro_reading)
         return avro_reading
     
     def register_schema(self, subject: str, schema_str: str) -> Optional[int]:
@@ -171,12 +266,24 @@ class SchemaRegistry:
             # Add caching to avoid repetitive registration attempts
             if subject in self._registered_schemas:
                 return None
+            
+            # A schema registered in an earlier run keeps its ID; the refresh thread picks up changes
+            if self.schema_cache is not None:
+                cached_id = self.schema_cache.get_registered_id(subject, schema_str)
+                if cached_id is not None:
+                    log.info(f"Using cached schema ID {cached_id} for subject {subject}")
+                    self._registered_schemas.add(subject)
+                    return cached_id
                 
             # Check if schema already exists in Schema Registry
             try:
                 # Check latest version of schema
                 latest_schema = self.schema_registry.get_latest_version(subject)
                 log.info(f"Schema already exists for subject {subject} with ID: {latest_schema.schema_id}")
+                if self.schema_cache is not None:
+                    self.schema_cache.put_latest(
+                        subject, latest_schema.schema_id, latest_schema.version, latest_schema.schema.schema_str
+                    )
 
                 # Add to cache even though we didn't register it
                 self._registered_schemas.add(subject)
@@ -192,6 +299,8 @@ class SchemaRegistry:
 
             log.info(f"Schema registered with ID: {schema_id}")
             log.debug(f"Schema compatibility level: {settings.schema_registry.compatibility_level}")
+            if self.schema_cache is not None:
+                self.schema_cache.put_registered_id(subject, schema_str, schema_id)
 
             # Add to cache after successful registration
             self._registered_schemas.add(subject)
@@ -225,9 +334,28 @@ class SchemaRegistry:
             else:
                 return self.schema_registry.get_version(subject, version)
         except Exception as e:
+            if version == "latest" and self.schema_cache is not None:
+                cached = self.schema_cache.get_latest(subject)
+                if cached is not None:
+                    log.warning(f"Schema Registry unavailable, using cached latest schema for {subject}: {str(e)}")
+                    return cached
             log.error(f"Error getting schema: {str(e)}")
             return None
     
+    def has_cached_schema(self, subject: str) -> bool:
+        """
+        Check whether a subject's schema is in the on-disk cache.
+        
+        Services whose subject is cached can start while the Schema Registry is unavailable.
+        
+        Args:
+            subject: Subject name
+            
+        Returns:
+            True if the subject is cached
+        """
+        return self.schema_cache is not None and self.schema_cache.has_subject(subject)
+    
     def get_subjects(self) -> List[str]:
         """
         Get all subjects from the Schema Registry.
@@ -308,6 +436,71 @@ class SchemaRegistry:
             log.error(f"Error checking compatibility: {str(e)}")
             return False
     
+    def _prepare_encoder(self, topic: str, schema_str: str, none_defaults: Dict[str, Any] = None) -> Optional[FastAvroEncoder]:
+        """
+        Resolve the ID of a topic's value schema and compile its encoder.
+        
+        Called once per topic; the result is cached. Returns None (and the
+        topic keeps using AvroSerializer) if the fast encoder is disabled or the
+        schema ID cannot be resolved.
+        
+        Args:
+            topic: Kafka topic name
+            schema_str: Value schema of the topic
+            none_defaults: Values encoded in place of missing or None fields
+            
+        Returns:
+            FastAvroEncoder for the topic or None
+        """
+        if topic in self._fast_encoders:
+            return self._fast_encoders[topic]
+        
+        encoder = None
+        if settings.schema_registry.fast_encoder:
+            subject = f"{topic}-value"
+            try:
+                schema_id = None
+                if self.schema_cache is not None:
+                    schema_id = self.schema_cache.get_registered_id(subject, schema_str)
+                if schema_id is None:
+                    # Same lookup AvroSerializer does on every call; registering an existing schema returns its ID
+                    schema_id = self.schema_registry.register_schema(subject, Schema(schema_str, schema_type="AVRO"))
+                    if self.schema_cache is not None:
+                        self.schema_cache.put_registered_id(subject, schema_str, schema_id)
+                encoder = FastAvroEncoder(schema_str, schema_id, none_defaults=none_defaults)
+                log.info(f"Compiled Avro encoder for subject {subject} with schema ID {schema_id}")
+            except UnsupportedSchemaError as e:
+                log.warning(f"Using AvroSerializer for {subject}: {str(e)}")
+            except Exception as e:
+                log.warning(f"Could not resolve schema ID for {subject}, using AvroSerializer: {str(e)}")
+        
+        self._fast_encoders[topic] = encoder
+        return encoder
+    
+    def prepare_sensor_encoder(self, topic: str) -> Optional[FastAvroEncoder]:
+        """
+        Resolve the sensor schema ID for a topic and compile its encoder.
+        
+        Args:
+            topic: Kafka topic name
+            
+        Returns:
+            FastAvroEncoder for the topic or None
+        """
+        return self._prepare_encoder(topic, self.sensor_schema_str, _SENSOR_NONE_DEFAULTS)
+    
+    def prepare_envelope_encoder(self, topic: str) -> Optional[FastAvroEncoder]:
+        """
+        Resolve the envelope schema ID for a topic and compile its encoder.
+        
+        Args:
+            topic: Kafka topic name
+            
+        Returns:
+            FastAvroEncoder for the topic or None
+        """
+        return self._prepare_encoder(topic, self.envelope_schema_str)
+    
     def serialize_sensor_reading(self, reading: Dict[str, Any], topic: str) -> bytes:
         """
         Serialize a sensor reading using Avro and Schema Registry.
@@ -320,6 +513,10 @@ class SchemaRegistry:
             Serialized data as bytes
         """
         try:
+            encoder = self._fast_encoders[topic] if topic in self._fast_encoders else self.prepare_sensor_encoder(topic)
+            if encoder is not None:
+                return encoder.encode(reading)
+            
             # Register schema if needed
             subject = f"{topic}-value"
             self.register_schema(subject, self.sensor_schema_str)
@@ -334,6 +531,97 @@ class SchemaRegistry:
             log.error(f"Error serializing sensor reading: {str(e)}")
             raise
     
+    def serialize_many(self, readings: List[Dict[str, Any]], topic: str) -> List[bytes]:
+        """
+        Serialize several sensor readings for the same topic.
+        
+        Args:
+            readings: Sensor readings
+            topic: Kafka topic name
+            
+        Returns:
+            Serialized messages in input order
+        """
+        encoder = self._fast_encoders[topic] if topic in self._fast_encoders else self.prepare_sensor_encoder(topic)
+        if encoder is None:
+            return [self.serialize_sensor_reading(reading, topic) for reading in readings]
+        
+        try:
+            return encoder.encode_many(readings)
+        except Exception as e:
+            log.error(f"Error serializing {len(readings)} sensor readings: {str(e)}")
+            raise
+    
+    def serialize_envelope(self, advertisement: RuuviTagAdvertisement, topic: str) -> bytes:
+        """
+        Serialize a RuuviTag advertisement envelope.
+        
+        Args:
+            advertisement: RuuviTagAdvertisement or advertisement dictionary
+            topic: Kafka topic name
+            
+        Returns:
+            Serialized data as bytes
+        """
+        try:
+            encoder = self._fast_encoders[topic] if topic in self._fast_encoders else self.prepare_envelope_encoder(topic)
+            if encoder is not None:
+                return encoder.encode(advertisement)
+            
+            self.register_schema(f"{topic}-value", self.envelope_schema_str)
+            return self.envelope_serializer(advertisement, SerializationContext(topic, MessageField.VALUE))
+            
+        except Exception as e:
+            log.error(f"Error serializing RuuviTag advertisement: {str(e)}")
+            raise
+    
+    def deserialize_envelope(self, data: bytes, topic: str) -> RuuviTagAdvertisement:
+        """
+        Deserialize an Avro-encoded RuuviTag advertisement envelope.
+        
+        Args:
+            data: Serialized data as bytes
+            topic: Kafka topic name
+            
+        Returns:
+            RuuviTagAdvertisement; readings() expands it into sensor readings
+        """
+        try:
+            if self.fast_envelope_decoder is not None:
+                return self.fast_envelope_decoder.decode(data, topic)
+            
+            return self.envelope_deserializer(data, SerializationContext(topic, MessageField.VALUE))
+            
+        except Exception as e:
+            log.error(f"Error deserializing RuuviTag advertisement: {str(e)}")
+            raise
+    
+    def create_deserialization_pool(self, topic: str, workers: int = None, chunk_size: int = 100,
+                                    mode: str = "auto", metrics=None) -> DeserializationPool:
+        """
+        Create a pool that deserializes sensor readings of a topic in parallel.
+        
+        Args:
+            topic: Kafka topic name
+            workers: Number of workers (defaults to the number of CPUs)
+            chunk_size: Maximum number of messages per chunk
+            mode: "process", "thread" or "auto"
+            metrics: Optional KafkaConsumerMetrics instance
+            
+        Returns:
+            DeserializationPool producing the same records as deserialize_sensor_reading
+        """
+        return DeserializationPool(
+            decode_fn=lambda data: self.deserialize_sensor_reading(data, topic),
+            reader_schema_str=self.sensor_schema_str,
+            schema_fetcher=self._fetch_schema_by_id,
+            from_dict=lambda record: self._dict_to_sensor(record, None),
+            workers=workers,
+            chunk_size=chunk_size,
+            mode=mode,
+            metrics=metrics
+        )
+    
     def deserialize_sensor_reading(self, data: bytes, topic: str) -> Dict[str, Any]:
         """
         Deserialize Avro-encoded sensor reading data.
@@ -346,6 +634,9 @@ class SchemaRegistry:
             Deserialized sensor reading
         """
         try:
+            if self.fast_decoder is not None:
+                return self.fast_decoder.decode(data, topic)
+            
             # Create deserialization context
             ctx = SerializationContext(topic, MessageField.VALUE)
             
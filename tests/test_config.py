@@ -0,0 +1,38 @@
+"""
+YAML values that are false or zero must not fall through to the environment default.
+"""
+
+from src.config import config
+from src.config.config import _bool_setting, KafkaSettings, DataSinkSettings, TimescaleDBSettings
+
+
+def test_yaml_false_wins_over_env_default(monkeypatch):
+    monkeypatch.delenv("DATA_SINK_SPILL_ENABLED", raising=False)
+
+    assert _bool_setting(False, "DATA_SINK_SPILL_ENABLED", "True") is False
+    assert _bool_setting(None, "DATA_SINK_SPILL_ENABLED", "True") is True
+
+
+def test_missing_yaml_value_reads_env(monkeypatch):
+    monkeypatch.setenv("DATA_SINK_SPILL_ENABLED", "no")
+
+    assert _bool_setting(None, "DATA_SINK_SPILL_ENABLED", "True") is False
+
+
+def test_yaml_zero_disables_kafka_statistics(monkeypatch):
+    monkeypatch.setattr(config, 'yaml_config', {'kafka': {'statistics_interval_ms': 0}})
+    monkeypatch.delenv("KAFKA_STATISTICS_INTERVAL_MS", raising=False)
+
+    assert KafkaSettings().statistics_interval_ms == 0
+
+
+def test_yaml_zero_disables_spill_replay_limit_and_merge_gap(monkeypatch):
+    monkeypatch.setattr(config, 'yaml_config', {
+        'data_sink': {'spill_replay_rows_per_sec': 0},
+        'timescaledb': {'cagg_merge_gap': 0}
+    })
+    monkeypatch.delenv("DATA_SINK_SPILL_REPLAY_ROWS_PER_SEC", raising=False)
+    monkeypatch.delenv("TIMESCALEDB_CAGG_MERGE_GAP", raising=False)
+
+    assert DataSinkSettings().spill_replay_rows_per_sec == 0
+    assert TimescaleDBSettings().cagg_merge_gap == 0
@@ -0,0 +1,93 @@
+"""
+device_latest counts only include the readings a batch stored.
+"""
+
+from datetime import datetime, timezone
+
+from src.data_storage.copy_ingest import CopyIngestEngine
+from src.data_storage.device_latest import DeviceLatestCollector
+from src.data_storage.ruuvitag_rows import RuuviTagRowCollector, MEASUREMENT_COLUMNS, new_measurements
+
+
+MAC = 'AA:BB:CC:DD:EE:FF'
+TIMESTAMP = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _reading(device_id, value, **extra):
+    reading = {'device_id': device_id, 'device_type': 'temperature', 'timestamp': TIMESTAMP.isoformat(),
+               'value': value, 'unit': 'C'}
+    reading.update(extra)
+    return reading
+
+
+def _ruuvitag_rows(*fields):
+    collector = RuuviTagRowCollector()
+    for field_name in fields:
+        collector.add((f"{MAC}_{field_name}", field_name, TIMESTAMP, 1.0) + (None,) * 10 +
+                      (field_name == 'humidity', None, None, {'parent_device': MAC}, ['ruuvitag']))
+    return collector.rows()
+
+
+def test_replayed_wide_row_adds_no_readings():
+    rows = _ruuvitag_rows('temperature', 'humidity')
+    stored = {(MAC, TIMESTAMP): tuple(column in ('temperature', 'humidity') for column in MEASUREMENT_COLUMNS)}
+
+    assert new_measurements(rows, stored) == []
+
+
+def test_split_advertisement_counts_only_new_measurements():
+    rows = _ruuvitag_rows('temperature', 'humidity')
+    stored = {(MAC, TIMESTAMP): tuple(column == 'temperature' for column in MEASUREMENT_COLUMNS)}
+
+    assert new_measurements(rows, stored) == [(f"{MAC}_humidity", True, 1.0)]
+    assert len(new_measurements(rows, {})) == 2
+
+
+def test_rows_apply_counts_without_changing_the_collector():
+    latest = DeviceLatestCollector()
+    latest.add_batch([_reading('temp-001', 20.0), _reading('temp-001', 22.0), _reading('temp-002', 5.0)])
+
+    counts = [('temp-001', 1, 0, 20.0, 1), ('temp-001', 1, 1, 22.0, 1)]
+    rows = {row[0]: row for row in latest.rows(counts)}
+    assert rows['temp-001'][8:] == (2, 1, 42.0, 2)
+    assert rows['temp-002'][8:] == (0, 0, 0.0, 0)
+
+    # A retried transaction starts from the same collector
+    assert {row[0]: row for row in latest.rows(counts)} == rows
+
+
+class _Cursor:
+    def __init__(self, merged):
+        self.merged = merged
+        self.statements = []
+        self.rowcount = -1
+
+    def execute(self, statement, parameters=None):
+        self.statements.append(statement)
+
+    def copy_expert(self, statement, payload):
+        self.statements.append(statement)
+
+    def fetchall(self):
+        return self.merged
+
+
+def test_merged_copy_counts_rows_the_merge_returned():
+    engine = CopyIngestEngine(table='sensor_readings', copy_format='text', merge_conflicts=True)
+    cur = _Cursor([('temp-001', 1, 0, 20.0, 1)])
+    counts = []
+
+    rows_inserted = engine.copy_rows(cur, [_reading('temp-001', 20.0), _reading('temp-001', 20.0)], counts)
+
+    assert rows_inserted == 1
+    assert counts == [('temp-001', 1, 0, 20.0, 1)]
+    assert 'RETURNING device_id, is_anomaly, value' in cur.statements[-1]
+
+
+def test_direct_copy_counts_every_row():
+    engine = CopyIngestEngine(table='sensor_readings', copy_format='text', merge_conflicts=False)
+    counts = []
+
+    engine.copy_rows(_Cursor([]), [_reading('temp-001', 20.0), _reading('temp-001', 21.0, is_anomaly=True)], counts)
+
+    assert counts == [('temp-001', 2, 1, 41.0, 2)]
@@ -0,0 +1,104 @@
+"""
+With normalized storage, readers and continuous aggregates follow the readings to the fact table.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pytest
+
+from src.config.config import settings
+from src.data_storage.database import db_manager
+from src.data_storage.export import StreamingExporter
+from src.data_storage.timescaledb_sink import TimescaleDBSink
+
+
+class _Cursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class _Connection:
+    def cursor(self):
+        return _Cursor()
+
+    def commit(self):
+        pass
+
+
+class _Pool:
+    @contextmanager
+    def connection(self):
+        yield _Connection()
+
+
+class _DeviceKeys:
+    def commit(self, device_versions):
+        pass
+
+
+class _Aggregates:
+    def __init__(self, sources=None):
+        self.sources = sources or {}
+        self.dirty = []
+
+    def mark_dirty(self, min_us, max_us, rows=0):
+        self.dirty.append((min_us, max_us, rows))
+
+    def tier_sources(self):
+        return self.sources
+
+
+@pytest.fixture
+def normalized(monkeypatch):
+    monkeypatch.setattr(settings.timescaledb, 'normalized_storage', True)
+    monkeypatch.setattr(settings.timescaledb, 'enable_continuous_aggregates', True)
+
+
+def test_readers_query_the_normalized_view(normalized, monkeypatch):
+    queries = []
+    monkeypatch.setattr(db_manager, '_cached_query',
+                        lambda query_type, query, parameters=None, device_id=None: queries.append(query) or [])
+
+    db_manager.get_recent_readings('temp-001')
+    db_manager.get_recent_readings()
+    db_manager.get_timeseries_data('temp-001')
+    db_manager.get_device_stats('temp-001')
+
+    assert len(queries) == 4
+    assert all('FROM sensor_readings_normalized' in query for query in queries)
+    assert StreamingExporter(dsn='postgresql://localhost/test').table == 'sensor_readings_normalized'
+
+
+def test_fact_writes_mark_aggregate_windows_dirty(normalized, monkeypatch):
+    aggregates = _Aggregates()
+    monkeypatch.setattr(db_manager, 'write_pool', _Pool())
+    monkeypatch.setattr(db_manager, 'device_keys', _DeviceKeys())
+    monkeypatch.setattr(db_manager, 'continuous_aggregates', aggregates)
+    monkeypatch.setattr(db_manager, 'query_cache', None)
+    monkeypatch.setattr(db_manager, '_insert_facts', lambda cur, readings, counts: (len(readings), None))
+    monkeypatch.setattr(db_manager, '_upsert_device_latest', lambda cur, rows: None)
+    timestamps = [datetime(2026, 1, 1, 12, minute, tzinfo=timezone.utc) for minute in (0, 5)]
+    readings = [{'device_id': 'temp-001', 'device_type': 'temperature', 'timestamp': timestamp.isoformat(),
+                 'value': 21.5, 'unit': 'C'} for timestamp in timestamps]
+
+    assert db_manager.insert_sensor_readings_batch(readings) == 2
+
+    assert aggregates.dirty == [(int(timestamps[0].timestamp() * 1000000),
+                                 int(timestamps[1].timestamp() * 1000000), 2)]
+
+
+def test_sink_refuses_minute_aggregate_on_the_main_table(normalized, monkeypatch):
+    sink = object.__new__(TimescaleDBSink)
+
+    monkeypatch.setattr(db_manager, 'continuous_aggregates',
+                        _Aggregates({'sensor_readings_1m': settings.timescaledb.main_table}))
+    with pytest.raises(Exception, match='sensor_readings_1m reads sensor_readings'):
+        sink._check_aggregate_source()
+
+    monkeypatch.setattr(db_manager, 'continuous_aggregates',
+                        _Aggregates({'sensor_readings_1m': settings.timescaledb.facts_table}))
+    sink._check_aggregate_source()
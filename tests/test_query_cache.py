@@ -0,0 +1,49 @@
+"""
+Cached results are invalidated by every commit of their device, whatever its timestamps.
+"""
+
+from src.data_storage.query_cache import QueryCache
+
+
+def _cache():
+    return QueryCache(max_entries=16, max_bytes=1024 * 1024, ttls={}, default_ttl=60)
+
+
+def _load(cache, loads, device=None):
+    def loader():
+        loads.append(device)
+        return [{'device': device, 'load': len(loads)}]
+
+    return cache.get_or_load('recent_readings', 'SELECT 1', {'device': device}, loader, device)
+
+
+def test_backfilled_commit_invalidates_device_and_global_results():
+    cache = _cache()
+    loads = []
+    _load(cache, loads, 'temp-001')
+    _load(cache, loads)
+
+    cache.record_commit({'temp-001'})
+
+    _load(cache, loads, 'temp-001')
+    _load(cache, loads)
+    assert loads == ['temp-001', None, 'temp-001', None]
+
+
+def test_commit_of_one_device_keeps_other_device_results():
+    cache = _cache()
+    loads = []
+    _load(cache, loads, 'temp-001')
+    _load(cache, loads, 'temp-002')
+
+    # A device with a clock far ahead no longer pins the others
+    cache.record_commit({'temp-002'})
+    cache.record_commit({'temp-002'})
+
+    _load(cache, loads, 'temp-001')
+    _load(cache, loads, 'temp-002')
+    assert loads == ['temp-001', 'temp-002', 'temp-002']
+
+    cache.record_commit({'temp-001'})
+    _load(cache, loads, 'temp-001')
+    assert loads == ['temp-001', 'temp-002', 'temp-002', 'temp-001']
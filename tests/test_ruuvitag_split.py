@@ -0,0 +1,101 @@
+"""
+Splitting RuuviTag readings off a batch must not lose them when the insert fails.
+"""
+
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import psycopg2
+import pytest
+
+from src.config.config import settings
+from src.data_storage.columnar_batch import ColumnarBatch
+from src.data_storage.database import db_manager
+from src.data_storage.timescaledb_sink import TimescaleDBSink
+
+
+MAC = 'AA:BB:CC:DD:EE:FF'
+
+
+def _readings():
+    timestamp = datetime.now(timezone.utc).isoformat()
+    ruuvitag = [
+        {'device_id': f"{MAC}_{field}", 'device_type': field, 'timestamp': timestamp, 'value': 1.0,
+         'unit': 'x', 'device_metadata': {'parent_device': MAC}, 'tags': ['ruuvitag']}
+        for field in ('temperature', 'humidity', 'pressure')
+    ]
+    other = [{'device_id': 'temp-001', 'device_type': 'temperature', 'timestamp': timestamp,
+              'value': 21.5, 'unit': 'C'}]
+    return ruuvitag + other
+
+
+class _FailingPool:
+    @contextmanager
+    def connection(self):
+        raise psycopg2.OperationalError("connection refused")
+        yield
+
+
+class _SpillBuffer:
+    def __init__(self):
+        self.batches = []
+
+    def append(self, readings):
+        self.batches.append(readings)
+        return True
+
+    def pending_batches(self):
+        return len(self.batches)
+
+
+class _Replayer:
+    db_available = True
+
+    def notify(self):
+        pass
+
+
+class _Metrics:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+@pytest.fixture
+def wide_rows(monkeypatch):
+    monkeypatch.setattr(settings.timescaledb, 'ruuvitag_wide_rows', True)
+    monkeypatch.setattr(db_manager, 'write_pool', _FailingPool())
+
+
+def test_failed_insert_leaves_columnar_batch_intact(wide_rows):
+    batch = ColumnarBatch()
+    batch.extend(_readings())
+    batch.build()
+
+    with pytest.raises(psycopg2.OperationalError):
+        db_manager.insert_sensor_readings_batch(batch, raise_on_error=True)
+
+    assert len(batch) == 4
+    assert sorted(reading['device_id'] for reading in batch.to_readings()) == sorted(
+        reading['device_id'] for reading in _readings()
+    )
+
+
+def test_failed_wide_row_insert_spills_full_batch(wide_rows):
+    sink = object.__new__(TimescaleDBSink)
+    sink.spill_buffer = _SpillBuffer()
+    sink.spill_replayer = _Replayer()
+    sink.store_offsets_in_db = False
+    sink.batch_controller = None
+    sink.batch_validator = None
+    sink.metrics = _Metrics()
+    sink._stats_lock = threading.Lock()
+    sink.stats = {'messages_stored': 0, 'batch_count': 0, 'errors': 0, 'batches_spilled': 0}
+
+    batch = ColumnarBatch()
+    batch.extend(_readings())
+    batch.build()
+
+    assert sink._insert_with_retries(batch) == 0
+    assert len(sink.spill_buffer.batches) == 1
+    assert len(sink.spill_buffer.batches[0]) == 4
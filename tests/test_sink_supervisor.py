@@ -0,0 +1,66 @@
+"""
+The supervisor restarts workers whose processing loop stops making progress.
+"""
+
+import queue
+import time
+
+from src.data_storage.sink_supervisor import SinkSupervisor
+
+
+class _Process:
+    def __init__(self, pid):
+        self.pid = pid
+        self.exitcode = None
+        self.terminated = False
+
+    def is_alive(self):
+        return not self.terminated
+
+    def terminate(self):
+        self.terminated = True
+
+    def join(self, timeout=None):
+        pass
+
+
+class _Queue:
+    def __init__(self, reports):
+        self.reports = list(reports)
+
+    def get(self, timeout=None):
+        if not self.reports:
+            raise queue.Empty
+        return self.reports.pop(0)
+
+
+def _supervisor(reports):
+    supervisor = SinkSupervisor(workers=1, metrics_port=1)
+    supervisor.stall_timeout = 60
+    supervisor.running = True
+    supervisor.report_queue = _Queue(reports)
+    supervisor.processes[0] = _Process(pid=100)
+    supervisor.started_at[0] = time.time() - 600
+    supervisor.last_progress[0] = time.time()
+    return supervisor
+
+
+def test_worker_reporting_without_progress_is_restarted():
+    stalled_since = time.time() - 120
+    supervisor = _supervisor([(0, 100, stalled_since, {'messages_processed': 5})])
+
+    supervisor._collect_reports()
+    supervisor._check_workers()
+
+    assert 0 not in supervisor.processes
+    assert 0 in supervisor.next_start
+
+
+def test_worker_making_progress_is_kept():
+    supervisor = _supervisor([(0, 100, time.time() - 5, {'messages_processed': 5})])
+
+    supervisor._collect_reports()
+    supervisor._check_workers()
+
+    assert not supervisor.processes[0].terminated
+    assert supervisor.worker_stats[0] == {'messages_processed': 5}
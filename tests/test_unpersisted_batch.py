@@ -0,0 +1,139 @@
+"""
+A batch that is neither inserted nor spilled must not let its offsets advance.
+"""
+
+import queue
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import psycopg2
+import pytest
+
+from src.config.config import settings
+from src.data_storage.database import db_manager
+from src.data_storage.pipelined_sink import PipelinedTimescaleDBSink, PendingBatch
+from src.data_storage.timescaledb_sink import TimescaleDBSink
+
+
+class _FailingPool:
+    @contextmanager
+    def connection(self):
+        raise psycopg2.OperationalError("connection refused")
+        yield
+
+
+class _FullSpillBuffer:
+    def append(self, readings):
+        return False
+
+    def pending_batches(self):
+        return 0
+
+
+class _Replayer:
+    db_available = True
+
+    def notify(self):
+        pass
+
+
+class _Metrics:
+    def __init__(self):
+        self.dropped = 0
+
+    def record_batch_dropped(self):
+        self.dropped += 1
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class _TopicPartition:
+    def __init__(self, topic, partition):
+        self.topic = topic
+        self.partition = partition
+
+
+class _Consumer:
+    def __init__(self):
+        self.seeks = []
+
+    def assignment(self):
+        return [_TopicPartition('sensors', 0), _TopicPartition('sensors', 1)]
+
+    def seek(self, partition):
+        self.seeks.append((partition.topic, partition.partition, partition.offset))
+
+
+class _KafkaConsumer:
+    def __init__(self):
+        self.consumer = _Consumer()
+        self.running = True
+
+
+def _reading():
+    return {'device_id': 'temp-001', 'device_type': 'temperature',
+            'timestamp': datetime.now(timezone.utc).isoformat(), 'value': 21.5, 'unit': 'C'}
+
+
+@pytest.fixture
+def failing_db(monkeypatch):
+    monkeypatch.setattr(db_manager, 'write_pool', _FailingPool())
+    monkeypatch.setattr(settings.data_sink, 'max_retries', 0)
+    monkeypatch.setattr(settings.data_sink, 'retry_backoff', 0)
+
+
+def _sink(spill_buffer):
+    sink = object.__new__(TimescaleDBSink)
+    sink.running = True
+    sink.kafka_consumer = _KafkaConsumer()
+    sink.spill_buffer = spill_buffer
+    sink.spill_replayer = _Replayer() if spill_buffer else None
+    sink.store_offsets_in_db = True
+    sink.batch_controller = None
+    sink.metrics = _Metrics()
+    sink._stats_lock = threading.Lock()
+    sink.stats = {'messages_stored': 0, 'batch_count': 0, 'errors': 0,
+                  'batches_spilled': 0, 'batches_dropped': 0}
+    sink.batch = [_reading(), _reading()]
+    sink.batch_start_offsets = {('sensors', 0): 10, ('sensors', 1): 40}
+    sink.batch_offsets = {('sensors', 0): 11, ('sensors', 1): 40}
+    return sink
+
+
+@pytest.mark.parametrize('spill_buffer', [None, _FullSpillBuffer()], ids=['spill_disabled', 'spill_full'])
+def test_dropped_batch_rewinds_its_partitions(failing_db, spill_buffer):
+    sink = _sink(spill_buffer)
+
+    sink.commit_batch()
+
+    assert sorted(sink.kafka_consumer.consumer.seeks) == [('sensors', 0, 10), ('sensors', 1, 40)]
+    assert sink.batch_offsets == {}
+    assert sink.batch_start_offsets == {}
+    assert sink.stats['batches_dropped'] == 1
+    assert sink.metrics.dropped == 1
+    assert sink.running
+
+
+def test_lost_batch_stops_its_writer():
+    sink = object.__new__(PipelinedTimescaleDBSink)
+    sink.completed = queue.Queue()
+    sink.write_failed = threading.Event()
+    written = []
+
+    def insert(readings, write_pool=None, offsets=None):
+        written.append(offsets)
+        return None
+
+    sink._insert_with_retries = insert
+
+    batch_queue = queue.Queue()
+    batch_queue.put(PendingBatch(0, [_reading()], {('sensors', 0): 11}))
+    batch_queue.put(PendingBatch(1, [_reading()], {('sensors', 0): 12}))
+    batch_queue.put(None)
+    sink._writer_loop(batch_queue, write_pool=None)
+
+    assert written == [{('sensors', 0): 11}]
+    assert sink.write_failed.is_set()
+    assert sink.completed.empty()